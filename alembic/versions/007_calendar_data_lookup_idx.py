@@ -0,0 +1,29 @@
+"""add calendar_data lookup index
+
+Revision ID: 007_calendar_data_lookup_idx
+Revises: 006_add_test_mode_fields
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '007_calendar_data_lookup_idx'
+down_revision = '006_add_test_mode_fields'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add (year, month, day, hour) index used by CalendarRepository lookups"""
+    op.create_index(
+        'ix_calendar_data_ymdh',
+        'calendar_data',
+        ['gregorian_year', 'gregorian_month', 'gregorian_day', 'gregorian_hour'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Remove calendar_data lookup index"""
+    op.drop_index('ix_calendar_data_ymdh', table_name='calendar_data')
@@ -0,0 +1,37 @@
+"""add processed_webhook_events
+
+Revision ID: 008_add_processed_webhook_events
+Revises: 007_calendar_data_lookup_idx
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_add_processed_webhook_events'
+down_revision = '007_calendar_data_lookup_idx'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add table used to deduplicate redelivered LINE webhook events across workers"""
+    op.create_table(
+        'processed_webhook_events',
+        sa.Column('webhook_event_id', sa.String(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('webhook_event_id')
+    )
+    op.create_index(
+        op.f('ix_processed_webhook_events_created_at'),
+        'processed_webhook_events',
+        ['created_at'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Remove processed_webhook_events table"""
+    op.drop_index(op.f('ix_processed_webhook_events_created_at'), table_name='processed_webhook_events')
+    op.drop_table('processed_webhook_events')
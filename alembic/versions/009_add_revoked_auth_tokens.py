@@ -0,0 +1,41 @@
+"""add revoked_auth_tokens
+
+Revision ID: 009_add_revoked_auth_tokens
+Revises: 008_add_processed_webhook_events
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_add_revoked_auth_tokens'
+down_revision = '008_add_processed_webhook_events'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add revocation list for signed access tokens"""
+    op.create_table(
+        'revoked_auth_tokens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('token_id', sa.String(length=32), nullable=True),
+        sa.Column('user_id', sa.String(length=100), nullable=True),
+        sa.Column('revoked_at', sa.Float(), nullable=False),
+        sa.Column('expires_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_revoked_auth_tokens_id'), 'revoked_auth_tokens', ['id'], unique=False)
+    op.create_index(op.f('ix_revoked_auth_tokens_token_id'), 'revoked_auth_tokens', ['token_id'], unique=False)
+    op.create_index(op.f('ix_revoked_auth_tokens_user_id'), 'revoked_auth_tokens', ['user_id'], unique=False)
+    op.create_index(op.f('ix_revoked_auth_tokens_expires_at'), 'revoked_auth_tokens', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove revoked_auth_tokens table"""
+    op.drop_index(op.f('ix_revoked_auth_tokens_expires_at'), table_name='revoked_auth_tokens')
+    op.drop_index(op.f('ix_revoked_auth_tokens_user_id'), table_name='revoked_auth_tokens')
+    op.drop_index(op.f('ix_revoked_auth_tokens_token_id'), table_name='revoked_auth_tokens')
+    op.drop_index(op.f('ix_revoked_auth_tokens_id'), table_name='revoked_auth_tokens')
+    op.drop_table('revoked_auth_tokens')
@@ -0,0 +1,26 @@
+"""add user_devices last_seen indexes
+
+Revision ID: 010_user_devices_last_seen_idx
+Revises: 009_add_revoked_auth_tokens
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '010_user_devices_last_seen_idx'
+down_revision = '009_add_revoked_auth_tokens'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add indexes for active-device lookups and the inactive-device sweeper"""
+    op.create_index('ix_user_devices_user_id_last_seen', 'user_devices', ['user_id', 'last_seen'], unique=False)
+    op.create_index('ix_user_devices_last_seen', 'user_devices', ['last_seen'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove user_devices last_seen indexes"""
+    op.drop_index('ix_user_devices_last_seen', table_name='user_devices')
+    op.drop_index('ix_user_devices_user_id_last_seen', table_name='user_devices')
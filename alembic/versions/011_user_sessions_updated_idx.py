@@ -0,0 +1,32 @@
+"""add linebot_user_sessions updated_at index
+
+Revision ID: 011_user_sessions_updated_idx
+Revises: 010_user_devices_last_seen_idx
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_user_sessions_updated_idx'
+down_revision = '010_user_devices_last_seen_idx'
+branch_labels = None
+depends_on = None
+
+
+def _has_user_sessions() -> bool:
+    # linebot_user_sessions 由 create_all 建立，舊的資料庫可能沒有這張表
+    return sa.inspect(op.get_bind()).has_table('linebot_user_sessions')
+
+
+def upgrade() -> None:
+    """Index updated_at so the expiry sweeper can purge stale sessions by range"""
+    if _has_user_sessions():
+        op.create_index('ix_linebot_user_sessions_updated_at', 'linebot_user_sessions', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove linebot_user_sessions updated_at index"""
+    if _has_user_sessions():
+        op.drop_index('ix_linebot_user_sessions_updated_at', table_name='linebot_user_sessions')
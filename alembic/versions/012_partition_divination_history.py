@@ -0,0 +1,138 @@
+"""partition divination_history by month and add divination_history_archive
+
+Revision ID: 012_partition_divination_history
+Revises: 011_user_sessions_updated_idx
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_partition_divination_history'
+down_revision = '011_user_sessions_updated_idx'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_history_indexes() -> None:
+    op.create_index('ix_divination_history_user_id_divination_time', 'divination_history',
+                    ['user_id', 'divination_time'], unique=False)
+    op.create_index('ix_divination_history_divination_time', 'divination_history', ['divination_time'], unique=False)
+
+
+def _drop_history_indexes() -> None:
+    op.drop_index('ix_divination_history_divination_time', table_name='divination_history')
+    op.drop_index('ix_divination_history_user_id_divination_time', table_name='divination_history')
+
+
+def _partition_postgresql() -> None:
+    """Rebuild divination_history as a table range-partitioned by divination_time (one partition per month)"""
+    bind = op.get_bind()
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('divination_history', 'id')")).scalar()
+
+    op.execute("ALTER TABLE divination_history RENAME TO divination_history_unpartitioned")
+    op.execute("ALTER INDEX IF EXISTS divination_history_pkey RENAME TO divination_history_unpartitioned_pkey")
+    op.execute("ALTER INDEX IF EXISTS ix_divination_history_id RENAME TO ix_divination_history_unpartitioned_id")
+
+    # 分區鍵必須包含在主鍵內；id 仍由原本的序列產生
+    op.execute(
+        "CREATE TABLE divination_history "
+        "(LIKE divination_history_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (divination_time)"
+    )
+    op.execute("ALTER TABLE divination_history ADD CONSTRAINT divination_history_pkey PRIMARY KEY (id, divination_time)")
+    op.execute(
+        "ALTER TABLE divination_history ADD CONSTRAINT divination_history_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES linebot_users (id) ON DELETE CASCADE"
+    )
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY divination_history.id")
+
+    oldest = bind.execute(sa.text("SELECT min(divination_time) FROM divination_history_unpartitioned")).scalar()
+    current = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = (oldest or current).replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    while month <= _add_months(current, MONTHS_AHEAD):
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE divination_history_{month.year:04d}_{month.month:02d} PARTITION OF divination_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+        month = next_month
+    op.execute("CREATE TABLE divination_history_default PARTITION OF divination_history DEFAULT")
+
+    op.execute("INSERT INTO divination_history SELECT * FROM divination_history_unpartitioned")
+    op.execute("DROP TABLE divination_history_unpartitioned")
+    op.create_index('ix_divination_history_id', 'divination_history', ['id'], unique=False)
+    _create_history_indexes()
+
+
+def _unpartition_postgresql() -> None:
+    """Copy rows back into a plain divination_history table"""
+    bind = op.get_bind()
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('divination_history', 'id')")).scalar()
+
+    _drop_history_indexes()
+    op.execute("DROP INDEX IF EXISTS ix_divination_history_id")
+    op.execute("ALTER TABLE divination_history RENAME TO divination_history_partitioned")
+    op.execute("ALTER INDEX IF EXISTS divination_history_pkey RENAME TO divination_history_partitioned_pkey")
+
+    op.execute(
+        "CREATE TABLE divination_history "
+        "(LIKE divination_history_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    op.execute("ALTER TABLE divination_history ADD CONSTRAINT divination_history_pkey PRIMARY KEY (id)")
+    op.execute(
+        "ALTER TABLE divination_history ADD CONSTRAINT divination_history_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES linebot_users (id) ON DELETE CASCADE"
+    )
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY divination_history.id")
+    op.execute("INSERT INTO divination_history SELECT * FROM divination_history_partitioned")
+    op.execute("DROP TABLE divination_history_partitioned")
+    op.create_index('ix_divination_history_id', 'divination_history', ['id'], unique=False)
+
+
+def upgrade() -> None:
+    """Partition divination_history by month on PostgreSQL (indexes only elsewhere) and add the archive table"""
+    if op.get_bind().dialect.name == 'postgresql':
+        _partition_postgresql()
+    else:
+        _create_history_indexes()
+
+    op.create_table(
+        'divination_history_archive',
+        sa.Column('history_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('divination_time', sa.DateTime(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('raw_bytes', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('history_id')
+    )
+    op.create_index('ix_divination_history_archive_user_id', 'divination_history_archive', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop the archive table and restore a plain divination_history table"""
+    archived = op.get_bind().execute(sa.text("SELECT count(*) FROM divination_history_archive")).scalar()
+    if archived:
+        # 歸檔的 JSON 只存在於歸檔表，刪表前需先還原
+        raise RuntimeError(f"divination_history_archive 仍有 {archived} 筆歸檔資料，請先還原後再降級")
+
+    op.drop_index('ix_divination_history_archive_user_id', table_name='divination_history_archive')
+    op.drop_table('divination_history_archive')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        _unpartition_postgresql()
+    else:
+        _drop_history_indexes()
@@ -0,0 +1,47 @@
+"""add taichi_chart_snapshots and snapshot references on divination_history
+
+Revision ID: 013_add_taichi_chart_snapshots
+Revises: 012_partition_divination_history
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013_add_taichi_chart_snapshots'
+down_revision = '012_partition_divination_history'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Store taichi charts once per unique content and reference them from divination_history"""
+    op.create_table(
+        'taichi_chart_snapshots',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('raw_bytes', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('content_hash')
+    )
+    op.add_column('divination_history', sa.Column('chart_slot', sa.String(length=32), nullable=True))
+    op.add_column('divination_history', sa.Column('chart_version', sa.String(length=16), nullable=True))
+    op.add_column('divination_history', sa.Column('snapshot_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_divination_history_chart_slot', 'divination_history', ['chart_slot'])
+
+
+def downgrade() -> None:
+    """Remove snapshot references and the taichi_chart_snapshots table"""
+    referenced = op.get_bind().execute(
+        sa.text("SELECT count(*) FROM divination_history WHERE snapshot_hash IS NOT NULL")
+    ).scalar()
+    if referenced:
+        # 這些記錄的 JSON 只存在於快照表，刪表前需先還原為內嵌欄位
+        raise RuntimeError(f"divination_history 仍有 {referenced} 筆記錄引用太極盤快照，請先還原後再降級")
+
+    op.drop_index('ix_divination_history_chart_slot', table_name='divination_history')
+    op.drop_column('divination_history', 'snapshot_hash')
+    op.drop_column('divination_history', 'chart_version')
+    op.drop_column('divination_history', 'chart_slot')
+    op.drop_table('taichi_chart_snapshots')
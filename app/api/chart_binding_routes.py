@@ -4,12 +4,11 @@ from pydantic import BaseModel
 from typing import Dict, Any, Optional
 import logging
 
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.logic.user_binding import UserBindingManager
-from app.logic.purple_star_chart import PurpleStarChart
+from app.logic.bound_chart_store import bound_chart_store, redact_chart_for_tier
 from app.models.birth_info import BirthInfo
 from app.models.schemas import BirthInfoSchema
-from app.db.repository import CalendarRepository
 from app.utils.permission_middleware import RequireFree, check_user_permissions
 
 logger = logging.getLogger(__name__)
@@ -45,23 +44,10 @@ async def calculate_chart_and_save(
     try:
         # 計算命盤
         birth_info = BirthInfo(**request.birth_data.dict())
-        calendar_repo = CalendarRepository(db)
-        
-        chart = PurpleStarChart(birth_info, calendar_repo)
-        chart.initialize()
-        chart.calculate_stars()
-        
-        chart_result = chart.get_chart()
+        chart_result = bound_chart_store.compute_chart(birth_info)
         
         # 免費版限制：移除四化詳細解釋
-        if "four_transformations" in chart_result:
-            for transformation in chart_result["four_transformations"]:
-                if "explanation" in transformation:
-                    transformation["explanation"] = "詳細解釋需要付費會員"
-                if "analysis" in transformation:
-                    transformation["analysis"] = "詳細分析需要付費會員"
-        
-        chart_result["version"] = "free"
+        redact_chart_for_tier(chart_result, is_premium=False)
         chart_result["calculated_for_user"] = current_user_id
         
         response = ChartBindingResponse(
@@ -166,44 +152,21 @@ async def get_binding_status(
 
 @router.get("/bound-chart")
 async def get_bound_chart(
-    db: Session = Depends(get_db),
-    current_user_id: str = RequireFree
+    current_user_id: str = RequireFree,
+    db: Session = Depends(get_read_db)
 ):
     """獲取已綁定的命盤（快速查詢）"""
     try:
-        # 檢查是否已綁定
-        if not UserBindingManager.is_user_bound(current_user_id, db):
+        # 讀取綁定時寫入的命盤快照（單筆查詢）；副本上還沒有剛建立的綁定時改讀主資料庫
+        chart_result = bound_chart_store.load(db, current_user_id)
+        if chart_result is None and db.fall_back_to_primary():
+            chart_result = bound_chart_store.load(db, current_user_id)
+        if chart_result is None:
             raise HTTPException(status_code=404, detail="帳號尚未綁定命盤")
         
-        # 獲取綁定的生辰資料
-        birth_data = UserBindingManager.get_user_birth_info(current_user_id, db)
-        if not birth_data:
-            raise HTTPException(status_code=404, detail="找不到綁定的命盤資料")
-        
-        # 計算命盤
-        birth_info = BirthInfo(**birth_data)
-        calendar_repo = CalendarRepository(db)
-        
-        chart = PurpleStarChart(birth_info, calendar_repo)
-        chart.initialize()
-        chart.calculate_stars()
-        
-        chart_result = chart.get_chart()
-        
         # 檢查用戶權限決定返回內容
         user_permissions = check_user_permissions(current_user_id, db)
-        
-        if not user_permissions.get("is_premium", False):
-            # 免費版限制
-            if "four_transformations" in chart_result:
-                for transformation in chart_result["four_transformations"]:
-                    if "explanation" in transformation:
-                        transformation["explanation"] = "詳細解釋需要付費會員"
-                    if "analysis" in transformation:
-                        transformation["analysis"] = "詳細分析需要付費會員"
-            chart_result["version"] = "free"
-        else:
-            chart_result["version"] = "premium"
+        redact_chart_for_tier(chart_result, is_premium=user_permissions.get("is_premium", False))
         
         chart_result["bound_user_id"] = current_user_id
         chart_result["is_bound_chart"] = True
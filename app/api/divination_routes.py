@@ -8,7 +8,7 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any
 
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.logic.permission_manager import permission_manager
 from app.logic.divination import (
     can_divination_this_week,
@@ -131,7 +131,7 @@ async def set_divination_gender(user_id: str, gender: str, db: Session = Depends
         raise HTTPException(status_code=500, detail="設定失敗")
 
 @router.get("/history/{user_id}")
-async def get_divination_history(user_id: str, limit: int = 10, db: Session = Depends(get_db)):
+async def get_divination_history(user_id: str, limit: int = 10, db: Session = Depends(get_read_db)):
     """獲取用戶的占卜歷史記錄"""
     try:
         from app.models.divination import DivinationRecord
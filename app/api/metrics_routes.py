@@ -0,0 +1,58 @@
+"""
+運行指標 API
+彙整連線池、讀取副本、快取與背景工作的統計（需帶 X-Metrics-Token；未設定 METRICS_TOKEN 時端點停用）
+"""
+import hmac
+import logging
+import os
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.db import database
+from app.db.calendar_cache import calendar_lookup_cache
+from app.db.pool_metrics import get_pool_stats
+from app.logic.device_manager import device_manager
+from app.logic.taichi_snapshots import taichi_snapshot_store
+from app.utils.logging_config import get_logging_stats
+from app.utils.maintenance import maintenance_scheduler
+from app.utils.outbound_messages import push_quota_tracker
+from app.utils.single_flight import async_chart_single_flight, chart_single_flight
+from app.utils.webhook_dedup import webhook_deduplicator
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["運行指標"])
+
+
+def _check_metrics_token(request: Request):
+    expected = os.getenv("METRICS_TOKEN")
+    if not expected:
+        # 未設定權杖時不公開指標
+        raise HTTPException(status_code=503, detail="指標端點未啟用")
+    if not hmac.compare_digest(request.headers.get("X-Metrics-Token", ""), expected):
+        raise HTTPException(status_code=403, detail="無效的指標存取權杖")
+
+
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    """運行指標"""
+    _check_metrics_token(request)
+    return {
+        "db_pool": {
+            "mode": database.POOL_MODE,
+            "plan": database.pool_plan.to_dict(),
+            "pools": get_pool_stats(),
+        },
+        "read_replicas": database.read_router.get_stats(),
+        "calendar_cache": calendar_lookup_cache.get_stats(),
+        "chart_single_flight": {
+            "sync": chart_single_flight.get_stats(),
+            "async": async_chart_single_flight.get_stats(),
+        },
+        "devices": device_manager.get_stats(),
+        "taichi_snapshots": taichi_snapshot_store.get_stats(),
+        "maintenance": maintenance_scheduler.get_stats(),
+        "webhook_dedup": webhook_deduplicator.get_stats(),
+        "push_quota": push_quota_tracker.get_stats(),
+        "logging": get_logging_stats(),
+    }
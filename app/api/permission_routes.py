@@ -5,12 +5,17 @@ import logging
 from datetime import datetime
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from app.db.database import get_db
 from app.logic.permission_manager import permission_manager
 from app.models.linebot_models import LineBotUser
+from app.models.user_permissions import UserPermissions
+from app.utils.auth_tokens import InvalidTokenError, auth_token_service
+from app.utils.line_id_token import IdTokenVerificationError, verify_line_id_token
+from app.utils.permission_middleware import extract_bearer_token
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +40,82 @@ class AdminSetRequest(BaseModel):
     """管理員設置請求模型"""
     target_user_id: str
 
+class TokenRequest(BaseModel):
+    """
+    權杖發行請求模型
+
+    身分由 LINE ID token 證明；已持有有效權杖時改以 Authorization: Bearer 續發。
+    權杖一律綁定設備指紋。
+    """
+    device_fingerprint: str
+    id_token: Optional[str] = None
+
+def _token_claims_for_user(db: Session, user_id: str) -> Dict[str, Any]:
+    """查詢發行權杖所需的角色、每日上限與付費到期時間（不建立用戶）"""
+    user = db.query(LineBotUser).filter(LineBotUser.line_user_id == user_id).first()
+    if user and user.is_admin():
+        role, default_limit = "admin", 999999
+    elif user and user.is_premium():
+        role, default_limit = "premium", 1000
+    else:
+        role, default_limit = "free", 100
+    
+    permissions = db.query(UserPermissions).filter(UserPermissions.user_id == user_id).first()
+    premium_until = None
+    if permissions and permissions.subscription_end and role == "premium":
+        premium_until = permissions.subscription_end.timestamp()
+    return {
+        "role": role,
+        "daily_limit": permissions.get_daily_api_limit() if permissions else default_limit,
+        "premium_until": premium_until,
+    }
+
+async def _authenticate_token_request(token_request: TokenRequest, http_request: Request) -> str:
+    """確認請求者身分，回傳 LINE 用戶 ID（以現有權杖續發，或驗證 LINE ID token）"""
+    current_token = extract_bearer_token(http_request)
+    if current_token:
+        try:
+            return auth_token_service.verify(current_token, token_request.device_fingerprint).user_id
+        except InvalidTokenError as e:
+            raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    if token_request.id_token:
+        try:
+            return await run_in_threadpool(verify_line_id_token, token_request.id_token)
+        except IdTokenVerificationError as e:
+            raise HTTPException(status_code=401, detail=str(e))
+    raise HTTPException(status_code=401, detail="需要 LINE ID token 或有效的存取權杖")
+
+@router.post("/token")
+async def issue_access_token(token_request: TokenRequest, http_request: Request, db: Session = Depends(get_db)):
+    """發行短期簽章權杖（受保護的 API 以 Authorization: Bearer 帶入，驗證時不查詢資料庫）"""
+    user_id = await _authenticate_token_request(token_request, http_request)
+    try:
+        claims = _token_claims_for_user(db, user_id)
+        token = auth_token_service.issue(user_id, device_fingerprint=token_request.device_fingerprint, **claims)
+        return {
+            "access_token": token,
+            "token_type": "bearer",
+            "expires_in": auth_token_service.ttl_seconds,
+            "role": claims["role"],
+        }
+        
+    except Exception as e:
+        logger.error(f"發行權杖失敗 {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="發行權杖失敗")
+
+@router.post("/token/revoke")
+async def revoke_access_token(http_request: Request, db: Session = Depends(get_db)):
+    """撤銷目前使用的權杖（登出）"""
+    token = extract_bearer_token(http_request)
+    if not token:
+        raise HTTPException(status_code=401, detail="未提供權杖")
+    try:
+        claims = auth_token_service.verify(token, http_request.headers.get("X-Device-Fingerprint"))
+    except InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    auth_token_service.revoke_token(db, claims)
+    return {"success": True}
+
 @router.get("/status/{user_id}")
 async def get_user_status(user_id: str, db: Session = Depends(get_db)):
     """獲取用戶權限狀態"""
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Any, Dict, Optional
+import json
 import logging
 
 from app.logic.purple_star_chart import PurpleStarChart
 from app.models.birth_info import BirthInfo
 from app.models.schemas import BirthInfoSchema, PurpleStarChartSchema, ChartRequestWithCustomStem
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.db.repository import CalendarRepository
+from app.utils.fast_json import FastJSONResponse, chart_response
+from app.utils.single_flight import chart_single_flight
 from app.utils.permission_middleware import (
     RequireFree, 
     RequirePremium, 
@@ -19,7 +22,34 @@ from app.utils.permission_middleware import (
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/protected", tags=["受保護的功能"])
+router = APIRouter(prefix="/protected", tags=["受保護的功能"], default_response_class=FastJSONResponse)
+
+
+def _compute_taichi_sihua(birth_data: dict, taichi_branch: str, db: Session, include_chart: bool) -> Dict[str, Any]:
+    """
+    計算太極點天干與四化解釋（可選附帶太極盤）
+
+    相同出生資料與太極點的並發請求共用一次計算，返回的內容不可修改。
+    """
+    def compute() -> Dict[str, Any]:
+        chart = PurpleStarChart(birth_info=BirthInfo(**birth_data), db=db)
+        chart.apply_taichi(taichi_branch)
+
+        # 獲取太極點天干
+        taichi_stem = chart.palaces[f"太極{taichi_branch}"].stem
+
+        result = {
+            "taichi_stem": taichi_stem,
+            # 獲取太極點四化解釋
+            "explanations": chart.get_taichi_sihua_explanations(taichi_stem)
+        }
+        if include_chart:
+            result["chart"] = chart.get_chart()
+        return result
+
+    key = ("taichi-sihua", json.dumps(birth_data, sort_keys=True, default=str), taichi_branch, include_chart)
+    return chart_single_flight.do(key, compute)
+
 
 # ============ 免費功能 ============
 
@@ -49,7 +79,7 @@ async def get_basic_chart(
         result["version"] = "free"
         result["user_id"] = current_user_id
         
-        return result
+        return chart_response(result)
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail="請求的資源不存在")
@@ -95,7 +125,7 @@ async def get_premium_chart(
         result["version"] = "premium"
         result["user_id"] = current_user_id
         
-        return result
+        return chart_response(result)
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail="請求的資源不存在")
@@ -227,7 +257,7 @@ async def get_daily_fortune_premium(
 async def get_all_users(
     skip: int = Query(0, description="跳過記錄數"),
     limit: int = Query(100, description="返回記錄數"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user_id: str = RequireAdmin
 ):
     """獲取所有用戶列表（管理員功能）"""
@@ -329,7 +359,7 @@ def get_purple_star_chart_taichi(request: dict, db: Session = Depends(get_db)):
         chart = PurpleStarChart(birth_info=birth_info, db=db)
         chart.apply_taichi(taichi_branch)
         
-        return chart.get_chart()
+        return chart_response(chart.get_chart())
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail="請求的資源不存在")
@@ -347,23 +377,14 @@ def get_taichi_sihua_explanations(request: dict, db: Session = Depends(get_db)):
         if not birth_data or not taichi_branch:
             raise HTTPException(status_code=400, detail="birth_data and taichi_branch are required")
         
-        birth_info = BirthInfo(**birth_data)
-        
-        chart = PurpleStarChart(birth_info=birth_info, db=db)
-        chart.apply_taichi(taichi_branch)
-        
-        # 獲取太極點天干
-        taichi_stem = chart.palaces[f"太極{taichi_branch}"].stem
-        
-        # 獲取太極點四化解釋
-        explanations = chart.get_taichi_sihua_explanations(taichi_stem)
+        result = _compute_taichi_sihua(birth_data, taichi_branch, db, include_chart=False)
         
         return {
             "success": True,
             "birth_info": birth_data,
             "taichi_branch": taichi_branch,
-            "taichi_stem": taichi_stem,
-            "explanations": explanations
+            "taichi_stem": result["taichi_stem"],
+            "explanations": result["explanations"]
         }
         
     except ValueError as e:
@@ -382,24 +403,15 @@ def get_taichi_chart_with_sihua(request: dict, db: Session = Depends(get_db)):
         if not birth_data or not taichi_branch:
             raise HTTPException(status_code=400, detail="birth_data and taichi_branch are required")
         
-        birth_info = BirthInfo(**birth_data)
-        
-        chart = PurpleStarChart(birth_info=birth_info, db=db)
-        chart.apply_taichi(taichi_branch)
-        
-        # 獲取太極點天干
-        taichi_stem = chart.palaces[f"太極{taichi_branch}"].stem
-        
-        # 獲取太極點四化解釋
-        explanations = chart.get_taichi_sihua_explanations(taichi_stem)
+        result = _compute_taichi_sihua(birth_data, taichi_branch, db, include_chart=True)
         
         return {
             "success": True,
             "birth_info": birth_data,
             "taichi_branch": taichi_branch,
-            "taichi_stem": taichi_stem,
-            "chart": chart.get_chart(),
-            "explanations": explanations
+            "taichi_stem": result["taichi_stem"],
+            "chart": result["chart"],
+            "explanations": result["explanations"]
         }
         
     except ValueError as e:
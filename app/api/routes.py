@@ -5,21 +5,33 @@ from app.models.birth_info import BirthInfo
 from app.models.schemas import BirthInfoSchema, PurpleStarChartSchema, ChartRequestWithCustomStem
 from app.db.database import get_db
 from app.db.repository import CalendarRepository
+from app.utils.conditional_response import ConditionalChartRoute
+from app.utils.fast_json import FastJSONResponse, SerializedJSON, chart_response
+from app.utils.single_flight import chart_single_flight
 from typing import Optional
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
-@router.post("/chart", response_model=PurpleStarChartSchema)
+# 命盤結果是確定的：回應提供 ETag（GET / HEAD 支援 304）與壓縮
+# 依當下時間回應的路由（如 /calendar/current-lunar）不可放在此路由器
+chart_router = APIRouter(default_response_class=FastJSONResponse, route_class=ConditionalChartRoute)
+
+# 直接回傳預先序列化的回應（不經 response_model 驗證），結構只記錄在 OpenAPI 文件
+@chart_router.post("/chart", response_class=FastJSONResponse, responses={200: {"model": PurpleStarChartSchema}})
 def get_purple_star_chart(birth_data: BirthInfoSchema, db: Session = Depends(get_db)):
     try:
         birth_info = BirthInfo(**birth_data.dict())
         
-        chart = PurpleStarChart(birth_info=birth_info, db=db)
-        
-        return chart.get_chart()
+        # 相同出生資料的並發請求共用一次排盤與序列化結果
+        key = ("chart", json.dumps(birth_data.dict(), sort_keys=True, default=str))
+        serialized = chart_single_flight.do(
+            key, lambda: SerializedJSON.of(PurpleStarChart(birth_info=birth_info, db=db).get_chart())
+        )
+        return chart_response(serialized)
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail="請求的資源不存在")
@@ -27,7 +39,7 @@ def get_purple_star_chart(birth_data: BirthInfoSchema, db: Session = Depends(get
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/major-limits")
+@chart_router.post("/chart/major-limits")
 def get_chart_with_major_limits(
     birth_data: BirthInfoSchema, 
     current_age: Optional[int] = Query(None, description="當前年齡，用於確定當前大限"),
@@ -39,7 +51,7 @@ def get_chart_with_major_limits(
         
         chart = PurpleStarChart(birth_info=birth_info, db=db)
         
-        return chart.get_chart(include_major_limits=True, current_age=current_age)
+        return chart_response(chart.get_chart(include_major_limits=True, current_age=current_age))
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail="請求的資源不存在")
@@ -47,7 +59,7 @@ def get_chart_with_major_limits(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/minor-limits")
+@chart_router.post("/chart/minor-limits")
 def get_chart_with_minor_limits(
     birth_data: BirthInfoSchema, 
     target_age: Optional[int] = Query(None, description="目標年齡，用於確定特定年齡的小限"),
@@ -59,7 +71,7 @@ def get_chart_with_minor_limits(
         
         chart = PurpleStarChart(birth_info=birth_info, db=db)
         
-        return chart.get_chart(include_minor_limits=True, target_age=target_age)
+        return chart_response(chart.get_chart(include_minor_limits=True, target_age=target_age))
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail="請求的資源不存在")
@@ -67,7 +79,7 @@ def get_chart_with_minor_limits(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/full-limits")
+@chart_router.post("/chart/full-limits")
 def get_chart_with_full_limits(
     birth_data: BirthInfoSchema,
     current_age: Optional[int] = Query(None, description="當前年齡，用於確定當前大限"),
@@ -80,12 +92,12 @@ def get_chart_with_full_limits(
         
         chart = PurpleStarChart(birth_info=birth_info, db=db)
         
-        return chart.get_chart(
+        return chart_response(chart.get_chart(
             include_major_limits=True, 
             current_age=current_age,
             include_minor_limits=True, 
             target_age=target_age
-        )
+        ))
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail="請求的資源不存在")
@@ -93,7 +105,7 @@ def get_chart_with_full_limits(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/annual-fortune")
+@chart_router.post("/chart/annual-fortune")
 def get_chart_with_annual_fortune(
     birth_data: BirthInfoSchema,
     target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
@@ -119,7 +131,7 @@ def get_chart_with_annual_fortune(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/monthly-fortune")
+@chart_router.post("/chart/monthly-fortune")
 def get_chart_with_monthly_fortune(
     birth_data: BirthInfoSchema,
     target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
@@ -146,7 +158,7 @@ def get_chart_with_monthly_fortune(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/daily-fortune")
+@chart_router.post("/chart/daily-fortune")
 def get_chart_with_daily_fortune(
     birth_data: BirthInfoSchema,
     target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
@@ -174,6 +186,42 @@ def get_chart_with_daily_fortune(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
+# GET 版本：出生資料改由查詢參數傳入，前端輪詢時帶 If-None-Match 即可得到 304
+@chart_router.get("/chart", response_class=FastJSONResponse, responses={200: {"model": PurpleStarChartSchema}})
+def get_purple_star_chart_by_query(birth_data: BirthInfoSchema = Depends(), db: Session = Depends(get_db)):
+    """以查詢參數獲取紫微斗數命盤"""
+    return get_purple_star_chart(birth_data, db)
+
+@chart_router.get("/chart/annual-fortune")
+def get_chart_with_annual_fortune_by_query(
+    birth_data: BirthInfoSchema = Depends(),
+    target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
+    db: Session = Depends(get_db)
+):
+    """以查詢參數獲取流年資訊"""
+    return get_chart_with_annual_fortune(birth_data, target_year, db)
+
+@chart_router.get("/chart/monthly-fortune")
+def get_chart_with_monthly_fortune_by_query(
+    birth_data: BirthInfoSchema = Depends(),
+    target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
+    target_month: Optional[int] = Query(None, description="目標月份（農曆月1-12），如不指定則使用當前月份"),
+    db: Session = Depends(get_db)
+):
+    """以查詢參數獲取流月資訊"""
+    return get_chart_with_monthly_fortune(birth_data, target_year, target_month, db)
+
+@chart_router.get("/chart/daily-fortune")
+def get_chart_with_daily_fortune_by_query(
+    birth_data: BirthInfoSchema = Depends(),
+    target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
+    target_month: Optional[int] = Query(None, description="目標月份（農曆月1-12），如不指定則使用當前月份"),
+    target_day: Optional[int] = Query(None, description="目標日期（農曆日1-30），如不指定則使用當前日期"),
+    db: Session = Depends(get_db)
+):
+    """以查詢參數獲取流日資訊"""
+    return get_chart_with_daily_fortune(birth_data, target_year, target_month, target_day, db)
+
 @router.get("/calendar/current-lunar")
 def get_current_lunar_data(db: Session = Depends(get_db)):
     """獲取當前時間的農曆數據"""
@@ -219,7 +267,7 @@ def get_current_lunar_data(db: Session = Depends(get_db)):
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/four-transformations-explanations")
+@chart_router.post("/chart/four-transformations-explanations")
 def get_four_transformations_explanations(
     birth_data: BirthInfoSchema,
     db: Session = Depends(get_db)
@@ -244,7 +292,7 @@ def get_four_transformations_explanations(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/four-transformations-explanations-custom-stem")
+@chart_router.post("/chart/four-transformations-explanations-custom-stem")
 def get_four_transformations_explanations_custom_stem(
     request: dict,
     db: Session = Depends(get_db)
@@ -276,7 +324,7 @@ def get_four_transformations_explanations_custom_stem(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/four-transformations-explanations-transformed")
+@chart_router.post("/chart/four-transformations-explanations-transformed")
 def get_four_transformations_explanations_transformed(
     request: dict,
     db: Session = Depends(get_db)
@@ -313,7 +361,7 @@ def get_four_transformations_explanations_transformed(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/annual-fortune-four-transformations")
+@chart_router.post("/chart/annual-fortune-four-transformations")
 def get_annual_fortune_four_transformations(
     birth_data: BirthInfoSchema,
     target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
@@ -347,7 +395,7 @@ def get_annual_fortune_four_transformations(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/monthly-fortune-four-transformations")
+@chart_router.post("/chart/monthly-fortune-four-transformations")
 def get_monthly_fortune_four_transformations(
     birth_data: BirthInfoSchema,
     target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
@@ -382,7 +430,7 @@ def get_monthly_fortune_four_transformations(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/daily-fortune-four-transformations")
+@chart_router.post("/chart/daily-fortune-four-transformations")
 def get_daily_fortune_four_transformations(
     birth_data: BirthInfoSchema,
     target_year: Optional[int] = Query(None, description="目標年份（西元年），如不指定則使用當前年份"),
@@ -418,7 +466,7 @@ def get_daily_fortune_four_transformations(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/major-limits-four-transformations")
+@chart_router.post("/chart/major-limits-four-transformations")
 def get_major_limits_four_transformations(
     birth_data: BirthInfoSchema,
     current_age: Optional[int] = Query(None, description="當前年齡，用於確定當前大限"),
@@ -461,7 +509,7 @@ def get_major_limits_four_transformations(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/minor-limits-four-transformations")
+@chart_router.post("/chart/minor-limits-four-transformations")
 def get_minor_limits_four_transformations(
     birth_data: BirthInfoSchema,
     target_age: Optional[int] = Query(None, description="目標年齡，用於確定特定年齡的小限"),
@@ -504,7 +552,7 @@ def get_minor_limits_four_transformations(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/evil-stars-minute-branch")
+@chart_router.post("/chart/evil-stars-minute-branch")
 def get_chart_with_evil_stars_minute_branch(
     request: dict,
     db: Session = Depends(get_db)
@@ -551,7 +599,7 @@ def get_chart_with_evil_stars_minute_branch(
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
 
-@router.post("/chart/with-custom-stem")
+@chart_router.post("/chart/with-custom-stem")
 async def get_chart_with_custom_stem(request: ChartRequestWithCustomStem, db: Session = Depends(get_db)):
     """獲取套用自定義天干四化的命盤"""
     try:
@@ -574,3 +622,6 @@ async def get_chart_with_custom_stem(request: ChartRequestWithCustomStem, db: Se
     except Exception as e:
         logger.error(f"命盤計算失敗: {e}")
         raise HTTPException(status_code=500, detail="服務暫時不可用")
+
+# 命盤路由在全部定義後併入主路由器（保留 ConditionalChartRoute）
+router.include_router(chart_router)
@@ -6,11 +6,10 @@ import logging
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
 from app.db.database import get_db
 from app.models.linebot_models import LineBotUser
+from app.utils.rate_limiter import rate_limiter
 from app.services.time_divination_service import (
     TimeDivinationService, 
     TimeDivinationRequest, 
@@ -20,7 +19,7 @@ from app.services.time_divination_service import (
 logger = logging.getLogger(__name__)
 
 # 限流器
-limiter = Limiter(key_func=get_remote_address)
+limiter = rate_limiter
 router = APIRouter()
 
 @router.post("/api/time-divination", response_model=TimeDivinationResponse)
@@ -11,21 +11,25 @@ from linebot.v3 import WebhookParser
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.messaging import (
     Configuration, ApiClient, MessagingApi, ReplyMessageRequest, 
-    TextMessage, PushMessageRequest, QuickReply, QuickReplyItem, PostbackAction
+    TextMessage, QuickReply, QuickReplyItem, PostbackAction
 )
 from linebot.v3.webhooks import (
     MessageEvent, TextMessageContent, PostbackEvent, FollowEvent, UnfollowEvent
 )
 
 from ..config.linebot_config import LineBotConfig
-from ..logic.divination_logic import get_divination_result
+from ..logic.divination_logic import get_divination_result_async
+from ..logic.divination_history import latest_divination, load_divination_payload
 from ..logic.permission_manager import permission_manager
 from ..utils.divination_flex_message import DivinationFlexMessageGenerator
 from ..utils.new_function_menu import new_function_menu_generator
 from ..utils.flex_instructions import FlexInstructionsGenerator
+from ..utils.outbound_messages import OutboundComposer
+from ..utils.webhook_dedup import webhook_deduplicator
 from ..models.linebot_models import LineBotUser, DivinationHistory
-from ..db.database import get_db
+from ..db.database import get_db, read_router
 from datetime import datetime
+from typing import Optional
 import traceback
 
 router = APIRouter()
@@ -130,7 +134,7 @@ class WebhookHandler:
             user = await self.get_or_create_user(self.user_id, self.db)
             
             # 執行占卜
-            divination_result = get_divination_result(self.db, user, gender)
+            divination_result = await get_divination_result_async(self.db, user, gender)
             
             if divination_result.get('success'):
                 # 從占卜結果中獲取記錄 ID (不重複創建)
@@ -144,17 +148,11 @@ class WebhookHandler:
                 flex_messages = divination_flex_generator.generate_divination_messages(divination_result, user_type=user_type)
                 
                 if flex_messages:
-                    # 發送結果
-                    line_bot_api.reply_message(
-                        ReplyMessageRequest(
-                            reply_token=self.reply_token,
-                            messages=flex_messages
-                        )
-                    )
-                    
-                    # 管理員額外功能
+                    # 發送結果（管理員額外功能放在同一次回覆中）
+                    composer = self.create_composer().add(flex_messages)
                     if user.is_admin():
-                        await self.send_admin_quick_buttons(record_id)
+                        composer.add(self.create_admin_quick_buttons(record_id))
+                    composer.send()
                 else:
                     self.reply_text("占卜結果生成失敗，請稍後再試。")
             else:
@@ -164,8 +162,12 @@ class WebhookHandler:
             logger.error(f"處理占卜失敗: {e}")
             self.reply_text("占卜過程發生錯誤，請稍後再試。")
     
-    async def send_admin_quick_buttons(self, record_id: int = None):
-        """發送管理員快速按鈕"""
+    def create_composer(self) -> OutboundComposer:
+        """建立本事件的訊息組合器（優先使用 reply token 的 5 則額度）"""
+        return OutboundComposer(line_bot_api, self.reply_token, self.user_id)
+    
+    def create_admin_quick_buttons(self, record_id: int = None) -> Optional[TextMessage]:
+        """建立管理員快速按鈕訊息"""
         try:
             quick_reply = QuickReply(
                 items=[
@@ -193,23 +195,13 @@ class WebhookHandler:
                 ]
             )
             
-            message = TextMessage(
+            return TextMessage(
                 text="👑 管理員快速功能",
                 quickReply=quick_reply
             )
-            
-            # 延遲發送避免衝突
-            import asyncio
-            await asyncio.sleep(0.5)
-            
-            line_bot_api.push_message(
-                PushMessageRequest(
-                    to=self.user_id,
-                    messages=[message]
-                )
-            )
         except Exception as e:
-            logger.error(f"發送管理員快速按鈕失敗: {e}")
+            logger.error(f"建立管理員快速按鈕失敗: {e}")
+            return None
     
     async def handle_follow_event(self):
         """處理關注事件"""
@@ -319,7 +311,7 @@ class WebhookHandler:
             user = await self.get_or_create_user(self.user_id, self.db)
             
             # 直接進行占卜
-            divination_result = get_divination_result(self.db, user, gender)
+            divination_result = await get_divination_result_async(self.db, user, gender)
             logger.info(f"占卜結果獲取完成，成功：{divination_result.get('success')}")
             
             if divination_result.get('success'):
@@ -335,16 +327,12 @@ class WebhookHandler:
                 
                 if flex_messages:
                     logger.info("發送占卜結果")
-                    line_bot_api.reply_message(
-                        ReplyMessageRequest(
-                            reply_token=self.reply_token,
-                            messages=flex_messages
-                        )
-                    )
+                    composer = self.create_composer().add(flex_messages)
                     
-                    # 如果是管理員，發送快速按鈕
+                    # 如果是管理員，附上快速按鈕
                     if user.is_admin():
-                        await self.send_admin_quick_buttons(record_id)
+                        composer.add(self.create_admin_quick_buttons(record_id))
+                    composer.send()
                 else:
                     logger.error("生成占卜結果訊息失敗")
                     self.reply_text("占卜結果生成失敗，請稍後再試。")
@@ -469,9 +457,13 @@ class WebhookHandler:
                     return
                 
                 # 獲取用戶最新的占卜記錄
-                latest_record = self.db.query(DivinationHistory).filter(
-                    DivinationHistory.user_id == user.id
-                ).order_by(DivinationHistory.divination_time.desc()).first()
+                with read_router.read_session(self.user_id, str(user.id)) as read_db:
+                    latest_record = latest_divination(read_db, user.id)
+                    payload = load_divination_payload(read_db, latest_record) if latest_record else None
+                    # 副本上還沒有剛寫入的記錄或快照時改讀主資料庫
+                    if (payload is None or not any(payload.values())) and read_db.fall_back_to_primary():
+                        latest_record = latest_divination(read_db, user.id)
+                        payload = load_divination_payload(read_db, latest_record) if latest_record else None
                 
                 if not latest_record:
                     logger.error(f"未找到用戶 {user.id} 的占卜記錄")
@@ -482,9 +474,9 @@ class WebhookHandler:
                 
                 # 恢復占卜結果數據
                 try:
-                    sihua_results = json.loads(latest_record.sihua_results or "[]")
-                    taichi_palace_mapping = json.loads(latest_record.taichi_palace_mapping or "{}")
-                    taichi_chart_data = json.loads(latest_record.taichi_chart_data or "{}")
+                    sihua_results = json.loads(payload["sihua_results"] or "[]")
+                    taichi_palace_mapping = json.loads(payload["taichi_palace_mapping"] or "{}")
+                    taichi_chart_data = json.loads(payload["taichi_chart_data"] or "{}")
                     
                     logger.info(f"數據解析成功 - 四化結果: {len(sihua_results)}個, 太極映射: {len(taichi_palace_mapping)}個")
                     
@@ -523,41 +515,11 @@ class WebhookHandler:
                     )
                     
                     if detail_message:
-                        # 檢查返回的是單個 Flex 訊息還是多個文字訊息
-                        if isinstance(detail_message, list):
-                            # 多個文字訊息：分別發送
-                            logger.info(f"✅ 發送 {len(detail_message)} 條{sihua_type}星詳細解釋文字訊息")
-                            
-                            # 先回覆第一條訊息
-                            line_bot_api.reply_message(
-                                ReplyMessageRequest(
-                                    reply_token=self.reply_token,
-                                    messages=[detail_message[0]]
-                                )
-                            )
-                            
-                            # 如果有更多訊息，使用 push 發送（避免 reply_token 只能用一次的限制）
-                            if len(detail_message) > 1:
-                                import asyncio
-                                await asyncio.sleep(0.5)  # 稍微延遲避免訊息衝突
-                                
-                                for message in detail_message[1:]:
-                                    line_bot_api.push_message(
-                                        PushMessageRequest(
-                                            to=self.user_id,
-                                            messages=[message]
-                                        )
-                                    )
-                                    await asyncio.sleep(0.3)  # 每條訊息間隔
-                        else:
-                            # 單個 Flex 訊息
-                            line_bot_api.reply_message(
-                                ReplyMessageRequest(
-                                    reply_token=self.reply_token,
-                                    messages=[detail_message]
-                                )
-                            )
-                            logger.info(f"✅ {sihua_type}星詳細解釋 Flex 訊息發送成功")
+                        # 單個 Flex 訊息或訊息列表：先填滿回覆額度，超過 5 則才批次推播
+                        composer = self.create_composer().add(detail_message)
+                        message_count = len(composer)
+                        pushed = composer.send()
+                        logger.info(f"✅ {sihua_type}星詳細解釋發送成功（{message_count} 則，推播 {pushed} 則）")
                     else:
                         self.reply_text(f"無法生成{sihua_type}星的詳細解釋，可能該類型的四化星不存在於您的占卜結果中。")
                     
@@ -729,9 +691,7 @@ class WebhookHandler:
         
         if record_id == "latest":
             # 獲取最新占卜記錄
-            target_record = self.db.query(DivinationHistory).filter(
-                DivinationHistory.user_id == user.id
-            ).order_by(DivinationHistory.divination_time.desc()).first()
+            target_record = latest_divination(self.db, user.id)
         else:
             # 獲取指定 ID 的占卜記錄
             try:
@@ -747,10 +707,12 @@ class WebhookHandler:
         
         if target_record:
             try:
+                # 超過保留期的記錄 JSON 欄位已歸檔
+                payload = load_divination_payload(self.db, target_record)
                 # 解析太極宮對映
-                taichi_palace_mapping = json.loads(target_record.taichi_palace_mapping or "{}")
+                taichi_palace_mapping = json.loads(payload["taichi_palace_mapping"] or "{}")
                 # 解析太極盤數據 (注意：這裡存儲的是 palaces 數據，不是 basic_chart)
-                taichi_chart_palaces = json.loads(target_record.taichi_chart_data or "{}")
+                taichi_chart_palaces = json.loads(payload["taichi_chart_data"] or "{}")
                 
                 logger.info(f"太極宮對映數據: {len(taichi_palace_mapping)} 個宮位")
                 logger.info(f"太極盤宮位數據: {len(taichi_chart_palaces)} 個宮位")
@@ -875,9 +837,8 @@ class WebhookHandler:
             
             if chart_data == "latest":
                 # 獲取最新占卜記錄
-                latest_record = self.db.query(DivinationHistory).filter(
-                    DivinationHistory.user_id == user.id
-                ).order_by(DivinationHistory.divination_time.desc()).first()
+                with read_router.read_session(self.user_id, str(user.id)) as read_db:
+                    latest_record = latest_divination(read_db, user.id)
                 
                 if latest_record:
                     chart_info = f"""📊 基本命盤資訊
@@ -995,7 +956,7 @@ class WebhookHandler:
                 logger.info(f"✅ 解析指定時間成功: {current_time}")
             
             # 4. 執行占卜（完全復用本週占卜邏輯）
-            divination_result = get_divination_result(self.db, user, gender, current_time)
+            divination_result = await get_divination_result_async(self.db, user, gender, current_time)
             logger.info(f"占卜結果獲取完成，成功：{divination_result.get('success')}")
             
             if divination_result.get('success'):
@@ -1014,16 +975,12 @@ class WebhookHandler:
                 
                 if flex_messages:
                     logger.info("發送占卜結果")
-                    line_bot_api.reply_message(
-                        ReplyMessageRequest(
-                            reply_token=self.reply_token,
-                            messages=flex_messages
-                        )
-                    )
+                    composer = self.create_composer().add(flex_messages)
                     
-                    # 如果是管理員，發送快速按鈕（復用本週占卜邏輯）
+                    # 如果是管理員，附上快速按鈕（復用本週占卜邏輯）
                     if user.is_admin() and record_id:
-                        await self.send_admin_quick_buttons(int(record_id))
+                        composer.add(self.create_admin_quick_buttons(int(record_id)))
+                    composer.send()
                 else:
                     logger.error("生成占卜結果訊息失敗")
                     self.reply_text("占卜結果生成失敗，請稍後再試。")
@@ -1164,6 +1121,10 @@ async def line_bot_webhook_new(request: Request, db: Session = Depends(get_db)):
     
     # 處理每個事件
     for event in events:
+        # 重送或重複的事件在任何資料庫或排盤工作之前略過
+        if not webhook_deduplicator.claim(event):
+            continue
+        
         handler = WebhookHandler()
         handler.db = db
         handler.user_id = event.source.user_id
@@ -1215,6 +1176,8 @@ async def line_bot_webhook_new(request: Request, db: Session = Depends(get_db)):
         except Exception as e:
             logger.error(f"處理事件時發生錯誤 (用戶: {handler.user_id}): {e}")
             logger.error(traceback.format_exc())
+            # 處理失敗時撤銷去重登記，LINE 重送時仍會處理
+            webhook_deduplicator.release(event)
             
             # 嘗試回復錯誤訊息
             if hasattr(handler, 'reply_token') and handler.reply_token:
@@ -301,6 +301,8 @@ class LineBotConfig:
     class Tables:
         USERS = "linebot_users"
         DIVINATION_HISTORY = "divination_history" 
+        DIVINATION_HISTORY_ARCHIVE = "divination_history_archive"
+        TAICHI_CHART_SNAPSHOTS = "taichi_chart_snapshots"
         CHART_BINDINGS = "chart_bindings"
         MEMBERSHIP = "user_membership"
 
@@ -0,0 +1,204 @@
+"""
+農曆資料查詢快取
+位於 CalendarRepository 之前的進程內讀穿快取：未命中時一次載入整個月份，
+查無資料的日期也會被記錄（負快取），避免每個請求都查詢 calendar_data。
+快取內容是不可變的 CalendarRecord，而不是 ORM 物件，可安全地在執行緒與會話之間共用。
+"""
+import calendar
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.calendar import CalendarData
+from app.utils.chinese_calendar import ChineseCalendar
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CalendarRecord:
+    """calendar_data 單筆記錄的不可變副本（欄位與 CalendarData 相同）"""
+    id: int
+    gregorian_datetime: datetime
+    gregorian_year: int
+    gregorian_month: int
+    gregorian_day: int
+    gregorian_hour: int
+    lunar_year_in_chinese: str
+    lunar_month_in_chinese: str
+    lunar_day_in_chinese: str
+    is_leap_month_in_chinese: bool
+    year_gan_zhi: str
+    month_gan_zhi: str
+    day_gan_zhi: str
+    hour_gan_zhi: str
+    minute_gan_zhi: Optional[str] = None
+    solar_term_today: Optional[str] = None
+    solar_term_in_hour: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: CalendarData) -> "CalendarRecord":
+        return cls(**{column.name: getattr(row, column.name) for column in CalendarData.__table__.columns})
+
+
+@dataclass
+class _MonthEntry:
+    """單一月份的快取內容：日 -> {小時: 記錄}"""
+    days: Dict[int, Dict[int, CalendarRecord]]
+    expires_at: Optional[float]  # None 表示不過期
+
+
+@dataclass
+class CalendarCacheStats:
+    """快取統計"""
+    hits: int = 0
+    misses: int = 0
+    negative_hits: int = 0
+    prefetch_queries: int = 0
+    prefetched_rows: int = 0
+    evictions: int = 0
+    branch_fallbacks: int = 0
+    day_fallbacks: int = 0
+
+    def to_dict(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "prefetch_queries": self.prefetch_queries,
+            "prefetched_rows": self.prefetched_rows,
+            "evictions": self.evictions,
+            "branch_fallbacks": self.branch_fallbacks,
+            "day_fallbacks": self.day_fallbacks,
+        }
+
+
+class CalendarLookupCache:
+    """以（年, 月, 日, 時辰地支）為鍵的農曆資料快取"""
+
+    def __init__(self, max_months: int = 240, negative_ttl: float = 300.0):
+        """
+        Args:
+            max_months: 最多快取的月份數（LRU 淘汰）
+            negative_ttl: 含缺漏日期的月份快取秒數，過期後重新查詢以取得新導入的資料
+        """
+        self.max_months = max_months
+        self.negative_ttl = negative_ttl
+        self._months: "OrderedDict[Tuple[int, int], _MonthEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CalendarCacheStats()
+
+    def get(self, db_session: Session, year: int, month: int, day: int, hour: int) -> Optional[CalendarRecord]:
+        """
+        查詢指定時間的農曆資料
+
+        優先返回同一小時的記錄，其次為同一時辰地支的記錄，最後為當天任一記錄；
+        當天完全沒有資料時返回 None。
+        """
+        records = self.get_day(db_session, year, month, day)
+        if not records:
+            return None
+
+        if hour in records:
+            return records[hour]
+
+        hour_branch = ChineseCalendar.get_hour_branch(hour)
+        for record_hour in sorted(records):
+            if ChineseCalendar.get_hour_branch(record_hour) == hour_branch:
+                self._count("branch_fallbacks")
+                return records[record_hour]
+
+        self._count("day_fallbacks")
+        return records[min(records)]
+
+    def get_day(self, db_session: Session, year: int, month: int, day: int) -> Dict[int, CalendarRecord]:
+        """返回某天所有已知記錄（小時 -> 記錄）的副本，沒有資料時返回空字典"""
+        entry = self._get_month(year, month)
+        if entry is None:
+            self._count("misses")
+            entry = self._prefetch_month(db_session, year, month)
+        else:
+            self._count("hits")
+
+        records = entry.days.get(day)
+        if not records:
+            self._count("negative_hits")
+            return {}
+        return dict(records)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self._stats, counter, getattr(self._stats, counter) + 1)
+
+    def invalidate(self, year: Optional[int] = None, month: Optional[int] = None):
+        """清除快取；指定年月時只清除該月份"""
+        with self._lock:
+            if year is None:
+                self._months.clear()
+            else:
+                for key in [key for key in self._months if key[0] == year and (month is None or key[1] == month)]:
+                    del self._months[key]
+
+    def get_stats(self) -> Dict:
+        """獲取快取統計"""
+        with self._lock:
+            stats = self._stats.to_dict()
+            stats["cached_months"] = len(self._months)
+        return stats
+
+    def _get_month(self, year: int, month: int) -> Optional[_MonthEntry]:
+        with self._lock:
+            entry = self._months.get((year, month))
+            if entry is None:
+                return None
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                del self._months[(year, month)]
+                return None
+            self._months.move_to_end((year, month))
+            return entry
+
+    def _prefetch_month(self, db_session: Session, year: int, month: int) -> _MonthEntry:
+        """一次查詢載入整個月份"""
+        rows: List[CalendarData] = db_session.query(CalendarData).filter(
+            CalendarData.gregorian_year == year,
+            CalendarData.gregorian_month == month
+        ).order_by(CalendarData.gregorian_day, CalendarData.gregorian_hour).all()
+
+        days: Dict[int, Dict[int, CalendarRecord]] = {}
+        for row in rows:
+            # 複製為不可變的值，快取不持有任何會話的 ORM 物件
+            days.setdefault(row.gregorian_day, {}).setdefault(row.gregorian_hour, CalendarRecord.from_row(row))
+
+        # 整月資料齊全才永久快取，否則短時間後重新查詢
+        complete = len(days) >= self._days_in_month(year, month)
+        entry = _MonthEntry(days=days, expires_at=None if complete else time.monotonic() + self.negative_ttl)
+
+        with self._lock:
+            self._months[(year, month)] = entry
+            self._months.move_to_end((year, month))
+            while len(self._months) > self.max_months:
+                self._months.popitem(last=False)
+                self._stats.evictions += 1
+            self._stats.prefetch_queries += 1
+            self._stats.prefetched_rows += len(rows)
+
+        if not complete:
+            logger.warning(f"{year}-{month:02d} 的農曆數據不完整（{len(days)} 天），將在 {self.negative_ttl:.0f} 秒後重新查詢")
+        logger.info(f"已預載 {year}-{month:02d} 的農曆數據，共 {len(rows)} 筆")
+        return entry
+
+    @staticmethod
+    def _days_in_month(year: int, month: int) -> int:
+        return calendar.monthrange(year, month)[1]
+
+
+# 全局快取實例
+calendar_lookup_cache = CalendarLookupCache()
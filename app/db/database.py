@@ -3,10 +3,14 @@
 """
 import os
 import logging
+from fastapi import Request
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from app.db.pool_metrics import AdaptivePoolSizer, InstrumentedQueuePool, PoolPlan, instrument_pool, plan_pool_size
+from app.db.replica_routing import ReplicaRouter, request_user_keys, request_write_deadline
+
 # 設置日誌
 logger = logging.getLogger(__name__)
 
@@ -30,20 +34,71 @@ def get_database_url():
 # 獲取數據庫 URL
 DATABASE_URL = get_database_url()
 
+# 連線池大小：static 直接使用 DB_POOL_SIZE / DB_MAX_OVERFLOW；
+# adaptive 依 worker 數（WEB_CONCURRENCY）平分 DB_MAX_CONNECTIONS，並在執行期間調整 overflow
+POOL_MODE = os.getenv("DB_POOL_MODE", "static").lower()
+if POOL_MODE == "adaptive":
+    pool_plan = plan_pool_size(
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        max_connections=int(os.getenv("DB_MAX_CONNECTIONS", "100")),
+        reserved_connections=int(os.getenv("DB_RESERVED_CONNECTIONS", "5")),
+        requested_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        requested_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    )
+    logger.info(f"連線池自適應模式: {pool_plan.to_dict()}")
+else:
+    pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    pool_plan = PoolPlan(pool_size, max_overflow, max_overflow, pool_size + max_overflow)
+
+def _create_engine(url: str, pool_size: int, max_overflow: int):
+    return create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        echo=os.getenv("ECHO_SQL", "false").lower() == "true"
+    )
+
 # 創建數據庫引擎
 logger.info("正在創建數據庫引擎...")
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
-    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
-    pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
-    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
-    echo=os.getenv("ECHO_SQL", "false").lower() == "true"
+engine = _create_engine(DATABASE_URL, pool_plan.pool_size, pool_plan.max_overflow)
+pool_metrics = instrument_pool(engine.pool, "primary")
+pool_sizer = (
+    AdaptivePoolSizer(engine.pool, pool_metrics, overflow_ceiling=pool_plan.overflow_ceiling)
+    if POOL_MODE == "adaptive" else None
 )
 
 # 創建會話工廠
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _create_replica_engines():
+    """讀取副本（REPLICA_DATABASE_URLS，以逗號分隔；未設定時只使用主資料庫）"""
+    replicas = {}
+    urls = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+    for index, url in enumerate(urls, start=1):
+        if url.startswith("postgres://"):
+            url = url.replace("postgres://", "postgresql://", 1)
+        name = f"replica{index}"
+        replicas[name] = _create_engine(url, pool_plan.pool_size, pool_plan.max_overflow)
+        instrument_pool(replicas[name].pool, name)
+    if replicas:
+        logger.info(f"已設定 {len(replicas)} 個讀取副本")
+    return replicas
+
+# 讀取副本路由（主資料庫會話提交的寫入會記錄 read-your-writes）
+read_router = ReplicaRouter(
+    engine,
+    _create_replica_engines(),
+    max_lag_seconds=float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5")),
+    read_your_writes_seconds=float(os.getenv("REPLICA_READ_YOUR_WRITES_SECONDS", "10")),
+    lag_check_seconds=float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5")),
+)
+if read_router.replicas:
+    read_router.track_writes(SessionLocal)
+
 # 創建基礎模型類
 Base = declarative_base()
 
@@ -51,6 +106,14 @@ Base = declarative_base()
 def get_db():
     """獲取數據庫會話"""
     db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    """獲取唯讀數據庫會話（讀取副本，請求用戶剛寫入過時改讀主資料庫）"""
+    db = read_router.read_session(*request_user_keys(request), wrote_until=request_write_deadline(request))
     try:
         yield db
     finally:
@@ -146,6 +146,8 @@ def init_test_data(limit_rows=None):
                 
         finally:
             db.close()
+            # 只在啟動時使用一次，釋放連線避免佔用資料庫的連線額度
+            engine.dispose()
             
     except Exception as e:
         logger.error(f"初始化數據失敗：{e}")
@@ -0,0 +1,326 @@
+"""
+資料庫連線池監控與自適應大小
+- InstrumentedQueuePool：記錄取得連線的等待時間（直方圖）、逾時次數、使用中 / overflow 連線數與連線存活時間
+- plan_pool_size：依 worker 數與資料庫連線上限分配每個 worker 的連線預算
+- AdaptivePoolSizer：依觀察到的等待與並行量，在預算內調整可用的 overflow 連線數
+
+統計由 get_pool_stats() 取得（/metrics 端點）。
+
+調整 overflow 需要使用 QueuePool 的內部屬性 _max_overflow / _overflow_lock，
+只在 requirements.txt 固定的 SQLAlchemy 版本上驗證過；屬性不存在時停用自適應調整。
+"""
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# 等待時間直方圖的上界（毫秒）
+DEFAULT_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+DEFAULT_SLOW_CHECKOUT_MS = 50.0
+DEFAULT_RESIZE_INTERVAL_SECONDS = 30
+
+_registry: Dict[str, "PoolMetrics"] = {}
+
+
+class LatencyHistogram:
+    """固定區間的延遲直方圖（最後一格為超過所有上界）"""
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.buckets_ms, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, q: float) -> float:
+        """以區間上界估計百分位數"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                bound = self.buckets_ms[index] if index < len(self.buckets_ms) else self.max_ms
+                return round(min(float(bound), self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> Dict:
+        labels = [f"le_{bound}ms" for bound in self.buckets_ms] + ["inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+@dataclass
+class PoolWindow:
+    """兩次調整之間觀察到的使用量"""
+    checkouts: int = 0
+    slow_checkouts: int = 0
+    timeouts: int = 0
+    peak_in_use: int = 0
+
+
+class PoolMetrics:
+    """單一連線池的統計"""
+
+    def __init__(self, name: str, slow_checkout_ms: float = DEFAULT_SLOW_CHECKOUT_MS):
+        self.name = name
+        self.slow_checkout_ms = slow_checkout_ms
+        self.pool: Optional[QueuePool] = None
+        self._lock = threading.Lock()
+        self.checkout_latency = LatencyHistogram()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.peak_in_use = 0
+        self.resizes: List[Dict] = []
+        self._connected_at: Dict[int, float] = {}
+        self._window = PoolWindow()
+
+    def record_checkout(self, wait_ms: float, in_use: int):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_latency.observe(wait_ms)
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            self._window.checkouts += 1
+            self._window.peak_in_use = max(self._window.peak_in_use, in_use)
+            if wait_ms >= self.slow_checkout_ms:
+                self._window.slow_checkouts += 1
+
+    def record_timeout(self, wait_ms: float):
+        with self._lock:
+            self.timeouts += 1
+            self.checkout_latency.observe(wait_ms)
+            self._window.timeouts += 1
+
+    def take_window(self) -> PoolWindow:
+        """取出並重設目前的觀察區間"""
+        with self._lock:
+            window, self._window = self._window, PoolWindow()
+        return window
+
+    def record_resize(self, old_overflow: int, new_overflow: int, reason: str):
+        with self._lock:
+            self.resizes = (self.resizes + [{
+                "at": time.time(), "max_overflow": new_overflow, "previous": old_overflow, "reason": reason,
+            }])[-20:]
+
+    # ---------- 連線池事件 ----------
+
+    def attach(self, pool: QueuePool):
+        """監聽連線建立與關閉，用來計算連線存活時間"""
+        self.pool = pool
+        pool.metrics = self
+
+        def on_connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.connects += 1
+                self._connected_at[id(connection_record)] = time.monotonic()
+
+        def on_close(dbapi_connection, connection_record):
+            with self._lock:
+                self._connected_at.pop(id(connection_record), None)
+
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+        event.listen(pool, "connect", on_connect)
+        event.listen(pool, "close", on_close)
+        event.listen(pool, "invalidate", on_invalidate)
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            ages = [now - connected_at for connected_at in self._connected_at.values()]
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "peak_in_use": self.peak_in_use,
+                "checkout_latency": self.checkout_latency.to_dict(),
+                "connection_age_seconds": {
+                    "open": len(ages),
+                    "mean": round(sum(ages) / len(ages), 1) if ages else 0.0,
+                    "max": round(max(ages), 1) if ages else 0.0,
+                },
+                "resizes": list(self.resizes),
+            }
+        if self.pool is not None:
+            stats.update({
+                "pool_size": self.pool.size(),
+                "max_overflow": self.pool.max_overflow(),
+                "in_use": self.pool.checkedout(),
+                "idle": self.pool.checkedin(),
+                "overflow": self.pool.overflow(),
+            })
+        return stats
+
+
+class InstrumentedQueuePool(QueuePool):
+    """記錄取得連線等待時間與逾時的 QueuePool"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_timeout((time.perf_counter() - started) * 1000)
+            raise
+        if self.metrics is not None:
+            self.metrics.record_checkout((time.perf_counter() - started) * 1000, self.checkedout())
+        return connection
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        if self.metrics is not None:
+            self.metrics.pool = pool
+            pool.metrics = self.metrics
+        return pool
+
+    def supports_overflow_resize(self) -> bool:
+        """目前的 SQLAlchemy 版本是否提供調整 overflow 所需的內部屬性"""
+        return hasattr(self, "_overflow_lock") and isinstance(getattr(self, "_max_overflow", None), int)
+
+    def max_overflow(self) -> int:
+        return getattr(self, "_max_overflow", 0)
+
+    def set_max_overflow(self, max_overflow: int):
+        """調整可用的 overflow 連線數（已借出的 overflow 連線歸還時自然關閉）"""
+        if not self.supports_overflow_resize():
+            raise NotImplementedError("此 SQLAlchemy 版本的 QueuePool 不支援調整 max_overflow")
+        with self._overflow_lock:
+            self._max_overflow = max_overflow
+
+
+def instrument_pool(pool: InstrumentedQueuePool, name: str) -> PoolMetrics:
+    """為連線池建立統計並登記到 /metrics"""
+    metrics = PoolMetrics(name)
+    metrics.attach(pool)
+    _registry[name] = metrics
+    return metrics
+
+
+def get_pool_stats() -> Dict:
+    return {name: metrics.get_stats() for name, metrics in _registry.items()}
+
+
+@dataclass(frozen=True)
+class PoolPlan:
+    """每個 worker 的連線池大小"""
+    pool_size: int
+    max_overflow: int
+    overflow_ceiling: int
+    connection_budget: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def plan_pool_size(workers: int, max_connections: int, reserved_connections: int,
+                   requested_size: int, requested_overflow: int) -> PoolPlan:
+    """
+    依 worker 數平分資料庫連線上限
+
+    Args:
+        workers: 同時運行的 worker 行程數
+        max_connections: 資料庫允許的連線數
+        reserved_connections: 保留給遷移、管理工具與讀取副本以外用途的連線數
+        requested_size: 設定的 pool_size（預算不足時縮小）
+        requested_overflow: 設定的 max_overflow（起始值，之後由 AdaptivePoolSizer 調整）
+    """
+    budget = max(2, (max_connections - reserved_connections) // max(1, workers))
+    pool_size = max(1, min(requested_size, budget - 1))
+    ceiling = budget - pool_size
+    return PoolPlan(
+        pool_size=pool_size,
+        max_overflow=min(requested_overflow, ceiling),
+        overflow_ceiling=ceiling,
+        connection_budget=budget,
+    )
+
+
+class AdaptivePoolSizer:
+    """
+    依觀察區間調整 overflow：有逾時或等待過久時增加，連續幾個區間使用量都在 pool_size 以內時減少
+
+    Args:
+        overflow_ceiling: 每個 worker 可用的 overflow 上限（plan_pool_size 計算）
+    """
+
+    def __init__(self, pool: InstrumentedQueuePool, metrics: PoolMetrics, overflow_ceiling: int,
+                 min_overflow: int = 0, step: int = 2, idle_windows_before_shrink: int = 3):
+        self.pool = pool
+        self.metrics = metrics
+        self.overflow_ceiling = overflow_ceiling
+        self.min_overflow = min_overflow
+        self.step = step
+        self.idle_windows_before_shrink = idle_windows_before_shrink
+        self._idle_windows = 0
+        self.enabled = pool.supports_overflow_resize()
+        if not self.enabled:
+            logger.warning("⚠️ QueuePool 缺少 overflow 內部屬性，停用連線池自適應調整")
+
+    def adjust(self) -> Optional[int]:
+        """依上一個區間調整一次，回傳新的 max_overflow（未調整時為 None）"""
+        if not self.enabled:
+            return None
+        pool = self.metrics.pool or self.pool
+        window = self.metrics.take_window()
+        current = pool.max_overflow()
+        target, reason = current, None
+
+        if window.timeouts or window.slow_checkouts:
+            self._idle_windows = 0
+            target = min(self.overflow_ceiling, current + self.step)
+            reason = f"逾時 {window.timeouts} 次、等待過久 {window.slow_checkouts} 次"
+        elif window.peak_in_use <= pool.size():
+            self._idle_windows += 1
+            if self._idle_windows >= self.idle_windows_before_shrink:
+                self._idle_windows = 0
+                target = max(self.min_overflow, current - self.step)
+                reason = f"尖峰使用 {window.peak_in_use} 條未超過 pool_size"
+        else:
+            self._idle_windows = 0
+
+        if target == current:
+            return None
+        pool.set_max_overflow(target)
+        self.metrics.record_resize(current, target, reason)
+        logger.info(f"🔧 連線池 {self.metrics.name} max_overflow {current} → {target}（{reason}）")
+        return target
+
+    async def run(self, interval_seconds: float = DEFAULT_RESIZE_INTERVAL_SECONDS):
+        """背景工作：定期調整"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                self.adjust()
+            except Exception as e:
+                logger.warning(f"調整連線池大小失敗: {e}")
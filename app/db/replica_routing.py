@@ -0,0 +1,308 @@
+"""
+讀取副本路由
+明確標示為唯讀的工作單元（read_session / get_read_db）把查詢送到讀取副本，寫入一律送到主資料庫：
+- 副本延遲超過 max_lag_seconds 或無法連線時改讀主資料庫
+- 用戶自己寫入後的 read_your_writes_seconds 內，該用戶的讀取仍走主資料庫，避免讀到舊資料
+
+read-your-writes 有兩層：
+- 行程內以用戶 ID 記錄最近的寫入（只在同一個 worker 內有效，LINE webhook 依賴這一層）
+- HTTP 請求有寫入時，回應帶上 ryw_until cookie（寫入後應讀主資料庫到的時間）；
+  之後的請求不論送到哪個 worker，get_read_db 都依 cookie 改讀主資料庫
+
+副本延遲由背景工作（run_lag_monitor）量測，請求路徑只讀取上次量測的結果。
+未設定任何副本時，read_session 與一般的主資料庫會話相同。
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_LAG_SECONDS = 5.0
+DEFAULT_READ_YOUR_WRITES_SECONDS = 10.0
+DEFAULT_LAG_CHECK_SECONDS = 5.0
+
+# 寫入的物件上用來識別用戶的欄位
+_USER_KEY_ATTRIBUTES = ("line_user_id", "user_id")
+
+# 跨 worker 的 read-your-writes：cookie 與標頭的值為 epoch 秒數
+READ_YOUR_WRITES_COOKIE = "ryw_until"
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes-Until"
+
+# 目前請求提交過寫入的用戶 ID（由 read_your_writes_middleware 設定）
+_request_writes: ContextVar[Optional[Set[str]]] = ContextVar("replica_request_writes", default=None)
+
+_POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def probe_replication_lag(engine: Engine) -> float:
+    """查詢副本延遲秒數（PostgreSQL 以重播時間計算，其他資料庫只確認可以連線）"""
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            return float(connection.execute(_POSTGRES_LAG_SQL).scalar() or 0.0)
+        connection.execute(text("SELECT 1"))
+        return 0.0
+
+
+def request_write_deadline(request) -> Optional[float]:
+    """從 cookie 或標頭取出 read-your-writes 的期限（epoch 秒數），格式不正確時為 None"""
+    value = request.cookies.get(READ_YOUR_WRITES_COOKIE) or request.headers.get(READ_YOUR_WRITES_HEADER)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def request_user_keys(request) -> List[str]:
+    """從請求取出用來判斷 read-your-writes 的用戶 ID"""
+    token_claims = getattr(request.state, "token_claims", None)
+    keys = [
+        request.path_params.get("user_id"),
+        request.headers.get("X-User-ID"),
+        request.query_params.get("user_id"),
+        getattr(token_claims, "user_id", None),
+    ]
+    return [key for key in keys if key]
+
+
+class RoutingSession(Session):
+    """read_engine 存在時讀取走副本；flush 與 INSERT / UPDATE / DELETE 仍走主資料庫"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        read_engine = self.info.get("read_engine")
+        if read_engine is not None and not self._flushing and not isinstance(clause, UpdateBase):
+            return read_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+    def fall_back_to_primary(self) -> bool:
+        """之後的讀取改走主資料庫（例如副本上找不到剛寫入的資料），原本就在主資料庫時回傳 False"""
+        return self.info.pop("read_engine", None) is not None
+
+
+@dataclass
+class ReplicaState:
+    """副本與最近一次量測的延遲"""
+    name: str
+    engine: Engine
+    lag_seconds: Optional[float] = None
+    checked_at: Optional[float] = None
+
+
+@dataclass
+class RoutingStats:
+    """讀取路由統計"""
+    replica_reads: int = 0
+    primary_reads: int = 0
+    read_your_writes: int = 0
+    lag_fallbacks: int = 0
+    probe_errors: int = 0
+
+
+class ReplicaRouter:
+    """
+    讀取副本路由器
+
+    Args:
+        primary_engine: 主資料庫
+        replica_engines: 名稱 -> 副本 engine
+        max_lag_seconds: 可接受的副本延遲
+        read_your_writes_seconds: 用戶寫入後讀取固定走主資料庫的時間
+        lag_check_seconds: 副本延遲的量測間隔
+        wall_clock: 比較 ryw_until cookie 用的時鐘（epoch 秒數）
+    """
+
+    def __init__(self, primary_engine: Engine, replica_engines: Optional[Dict[str, Engine]] = None,
+                 max_lag_seconds: float = DEFAULT_MAX_LAG_SECONDS,
+                 read_your_writes_seconds: float = DEFAULT_READ_YOUR_WRITES_SECONDS,
+                 lag_check_seconds: float = DEFAULT_LAG_CHECK_SECONDS,
+                 lag_probe: Callable[[Engine], float] = probe_replication_lag,
+                 clock: Callable[[], float] = time.monotonic,
+                 wall_clock: Callable[[], float] = time.time):
+        self.primary_engine = primary_engine
+        self.replicas = [ReplicaState(name, replica) for name, replica in (replica_engines or {}).items()]
+        self.max_lag_seconds = max_lag_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.lag_check_seconds = lag_check_seconds
+        self.lag_probe = lag_probe
+        self.clock = clock
+        self.wall_clock = wall_clock
+        # run_lag_monitor 執行後，請求路徑不再同步量測延遲
+        self.background_probe = False
+        self.session_factory = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False,
+                                            bind=primary_engine)
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._recent_writes: Dict[str, float] = {}
+        self._round_robin = itertools.count()
+        self._stats = RoutingStats()
+        if self.replicas:
+            self.track_writes(self.session_factory)
+
+    # ---------- read-your-writes ----------
+
+    def track_writes(self, target):
+        """在 sessionmaker（或 Session 類別）上記錄提交的寫入屬於哪些用戶"""
+        from sqlalchemy import event
+
+        def after_flush(session, flush_context):
+            keys = session.info.setdefault("written_user_keys", set())
+            for instance in itertools.chain(session.new, session.dirty, session.deleted):
+                for attribute in _USER_KEY_ATTRIBUTES:
+                    value = getattr(instance, attribute, None)
+                    if value is not None:
+                        keys.add(str(value))
+
+        def after_commit(session):
+            keys = session.info.pop("written_user_keys", None)
+            if keys:
+                self.record_write(*keys)
+                request_writes = _request_writes.get()
+                if request_writes is not None:
+                    request_writes.update(keys)
+
+        def after_rollback(session):
+            session.info.pop("written_user_keys", None)
+
+        event.listen(target, "after_flush", after_flush)
+        event.listen(target, "after_commit", after_commit)
+        event.listen(target, "after_rollback", after_rollback)
+
+    def record_write(self, *user_keys: str):
+        expires_at = self.clock() + self.read_your_writes_seconds
+        with self._lock:
+            for key in user_keys:
+                self._recent_writes[key] = expires_at
+
+    def _write_deadline_pending(self, wrote_until: Optional[float]) -> bool:
+        """cookie 的期限尚未到（超過 read_your_writes_seconds 以後的期限視為無效）"""
+        if wrote_until is None:
+            return False
+        remaining = wrote_until - self.wall_clock()
+        return 0 < remaining <= self.read_your_writes_seconds
+
+    async def read_your_writes_middleware(self, request, call_next):
+        """HTTP 中間件：請求提交過寫入時，回應帶上 ryw_until cookie 供其他 worker 判斷"""
+        request_writes: Set[str] = set()
+        token = _request_writes.set(request_writes)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_writes.reset(token)
+        if request_writes:
+            response.set_cookie(
+                READ_YOUR_WRITES_COOKIE, f"{self.wall_clock() + self.read_your_writes_seconds:.3f}",
+                max_age=int(self.read_your_writes_seconds) + 1, httponly=True, samesite="lax",
+            )
+        return response
+
+    def _recently_wrote(self, user_keys: Iterable[str], now: float) -> bool:
+        with self._lock:
+            if len(self._recent_writes) > 10000:
+                self._recent_writes = {key: at for key, at in self._recent_writes.items() if at > now}
+            return any(self._recent_writes.get(key, 0) > now for key in user_keys)
+
+    # ---------- 副本選擇 ----------
+
+    def _refresh_lag(self, replica: ReplicaState, now: float, force: bool = False):
+        if not force and replica.checked_at is not None and now - replica.checked_at < self.lag_check_seconds:
+            return
+        # 同時只有一個執行緒量測，其他執行緒沿用上次的結果
+        if not self._probe_lock.acquire(blocking=False):
+            return
+        try:
+            replica.lag_seconds = self.lag_probe(replica.engine)
+        except Exception as e:
+            replica.lag_seconds = None
+            with self._lock:
+                self._stats.probe_errors += 1
+            logger.warning(f"讀取副本 {replica.name} 無法使用: {e}")
+        finally:
+            replica.checked_at = now
+            self._probe_lock.release()
+
+    def refresh_lags(self) -> int:
+        """量測所有副本的延遲（阻塞，由背景工作在執行緒中呼叫），回傳量測的副本數"""
+        for replica in self.replicas:
+            self._refresh_lag(replica, self.clock(), force=True)
+        return len(self.replicas)
+
+    async def run_lag_monitor(self):
+        """背景工作：每 lag_check_seconds 在執行緒中量測一次副本延遲"""
+        self.background_probe = True
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(self.refresh_lags)
+                except Exception as e:
+                    logger.warning(f"量測讀取副本延遲失敗: {e}")
+                await asyncio.sleep(self.lag_check_seconds)
+        finally:
+            self.background_probe = False
+
+    def _replica_usable(self, replica: ReplicaState, now: float) -> bool:
+        if self.background_probe:
+            # 背景量測停擺時，過舊的結果不再採用
+            if replica.checked_at is None or now - replica.checked_at > 3 * self.lag_check_seconds:
+                return False
+        else:
+            self._refresh_lag(replica, now)
+        return replica.lag_seconds is not None and replica.lag_seconds <= self.max_lag_seconds
+
+    def choose_engine(self, *user_keys: str, wrote_until: Optional[float] = None) -> Optional[Engine]:
+        """
+        選擇讀取用的副本，回傳 None 表示讀主資料庫
+
+        Args:
+            wrote_until: 請求帶來的 read-your-writes 期限（ryw_until cookie）
+        """
+        if not self.replicas:
+            return None
+        now = self.clock()
+        if self._write_deadline_pending(wrote_until) or (user_keys and self._recently_wrote(user_keys, now)):
+            with self._lock:
+                self._stats.read_your_writes += 1
+                self._stats.primary_reads += 1
+            return None
+
+        start = next(self._round_robin)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self._replica_usable(replica, now):
+                with self._lock:
+                    self._stats.replica_reads += 1
+                return replica.engine
+
+        with self._lock:
+            self._stats.lag_fallbacks += 1
+            self._stats.primary_reads += 1
+        return None
+
+    def read_session(self, *user_keys: str, wrote_until: Optional[float] = None) -> Session:
+        """建立唯讀工作單元的會話（傳入用戶 ID 或 ryw_until 期限以保證讀到自己的寫入）"""
+        read_engine = self.choose_engine(*user_keys, wrote_until=wrote_until)
+        session = self.session_factory()
+        if read_engine is not None:
+            session.info["read_engine"] = read_engine
+        return session
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = asdict(self._stats)
+            stats["tracked_writers"] = len(self._recent_writes)
+        stats["replicas"] = [
+            {"name": replica.name, "lag_seconds": replica.lag_seconds} for replica in self.replicas
+        ]
+        return stats
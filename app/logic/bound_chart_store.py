@@ -0,0 +1,170 @@
+"""
+綁定命盤快照
+綁定時計算一次命盤，以 JSON 快照存入 ChartBinding.chart_data；
+查詢時只讀取一筆記錄並依會員等級遮蔽內容。
+快照帶有演算法版本（app.logic.chart_version），排盤相關模組或資料變更後會在下次查詢時重新計算。
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.logic.chart_version import CHART_ALGORITHM_VERSION
+from app.logic.purple_star_chart import PurpleStarChart
+from app.models.birth_info import BirthInfo
+from app.models.linebot_models import ChartBinding, LineBotUser
+from app.utils import fast_json
+
+logger = logging.getLogger(__name__)
+
+# 快照格式變更時遞增
+SNAPSHOT_SCHEMA_VERSION = 1
+
+# 綁定資料沒有出生地時使用台北座標（與 PurpleStarChart 預設相同）
+DEFAULT_LONGITUDE = 121.5654
+DEFAULT_LATITUDE = 25.0330
+
+PREMIUM_ONLY_EXPLANATION = "詳細解釋需要付費會員"
+PREMIUM_ONLY_ANALYSIS = "詳細分析需要付費會員"
+
+
+# 快照記錄的版本：演算法版本加上快照格式版本
+SNAPSHOT_VERSION = f"{CHART_ALGORITHM_VERSION}.{SNAPSHOT_SCHEMA_VERSION}"
+
+
+def redact_chart_for_tier(chart: Dict[str, Any], is_premium: bool) -> Dict[str, Any]:
+    """依會員等級處理命盤內容（會直接修改傳入的字典）"""
+    if not is_premium:
+        # 免費版限制：移除四化詳細解釋
+        for transformation in chart.get("four_transformations") or []:
+            if "explanation" in transformation:
+                transformation["explanation"] = PREMIUM_ONLY_EXPLANATION
+            if "analysis" in transformation:
+                transformation["analysis"] = PREMIUM_ONLY_ANALYSIS
+        chart["version"] = "free"
+    else:
+        chart["version"] = "premium"
+    return chart
+
+
+class BoundChartStore:
+    """綁定命盤的快照存取"""
+
+    def __init__(self, algorithm_version: str = SNAPSHOT_VERSION):
+        self.algorithm_version = algorithm_version
+
+    @staticmethod
+    def compute_chart(birth_info: BirthInfo) -> Dict[str, Any]:
+        """計算命盤（PurpleStarChart 建構時已完成初始化與安星）"""
+        return PurpleStarChart(birth_info=birth_info).get_chart()
+
+    def bind(self, db: Session, line_user_id: str, birth_data: Dict[str, Any],
+             commit: bool = True) -> Optional[ChartBinding]:
+        """
+        建立或更新命盤綁定，並同時寫入命盤快照
+
+        Args:
+            db: 數據庫會話
+            line_user_id: LINE 用戶 ID
+            birth_data: 出生資料（year, month, day, hour, minute, gender, 可選 calendar_type）
+            commit: 是否立即提交（由呼叫端與其他變更一起提交時傳 False）
+        """
+        user = db.query(LineBotUser).filter(LineBotUser.line_user_id == line_user_id).first()
+        if not user:
+            logger.warning(f"綁定命盤失敗，找不到用戶: {line_user_id}")
+            return None
+
+        binding = db.query(ChartBinding).filter(ChartBinding.user_id == user.id).first()
+        if binding is None:
+            binding = ChartBinding(user_id=user.id)
+            db.add(binding)
+
+        binding.birth_year = birth_data["year"]
+        binding.birth_month = birth_data["month"]
+        binding.birth_day = birth_data["day"]
+        binding.birth_hour = birth_data["hour"]
+        binding.birth_minute = birth_data["minute"]
+        binding.gender = birth_data["gender"]
+        binding.calendar_type = birth_data.get("calendar_type", binding.calendar_type or "lunar")
+
+        self._store_snapshot(binding, self.compute_chart(self._birth_info_from_data(birth_data)))
+        if commit:
+            db.commit()
+        logger.info(f"✅ 已綁定命盤並寫入快照: {line_user_id}")
+        return binding
+
+    def load(self, db: Session, line_user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        讀取綁定命盤（單筆查詢）；快照缺少或版本過期時重新計算並寫回
+
+        Returns:
+            命盤字典（每次返回新的物件，可直接修改），未綁定時返回 None
+        """
+        binding = db.query(ChartBinding).join(LineBotUser, ChartBinding.user).filter(
+            LineBotUser.line_user_id == line_user_id
+        ).first()
+        if binding is None:
+            return None
+
+        chart = self._read_snapshot(binding)
+        if chart is not None:
+            return chart
+
+        logger.info(f"命盤快照不存在或版本過期，重新計算: {line_user_id}")
+        chart = self.compute_chart(self._birth_info_from_binding(binding))
+        self._store_snapshot(binding, chart)
+        try:
+            db.commit()
+        except Exception as e:
+            # 寫回失敗不影響本次查詢，下次再重新計算
+            db.rollback()
+            logger.error(f"寫回命盤快照失敗 {line_user_id}: {e}")
+        return chart
+
+    def _read_snapshot(self, binding: ChartBinding) -> Optional[Dict[str, Any]]:
+        if not binding.chart_data:
+            return None
+        try:
+            snapshot = fast_json.loads(binding.chart_data)
+        except (TypeError, ValueError):
+            logger.warning(f"命盤快照格式錯誤，將重新計算: binding_id={binding.id}")
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get("algorithm_version") != self.algorithm_version:
+            return None
+        return snapshot.get("chart")
+
+    def _store_snapshot(self, binding: ChartBinding, chart: Dict[str, Any]):
+        binding.chart_data = fast_json.dumps({
+            "algorithm_version": self.algorithm_version,
+            "computed_at": datetime.utcnow().isoformat(),
+            "chart": chart,
+        })
+
+    @staticmethod
+    def _birth_info_from_data(birth_data: Dict[str, Any]) -> BirthInfo:
+        return BirthInfo(
+            year=birth_data["year"],
+            month=birth_data["month"],
+            day=birth_data["day"],
+            hour=birth_data["hour"],
+            minute=birth_data["minute"],
+            gender=birth_data["gender"],
+            longitude=birth_data.get("longitude", DEFAULT_LONGITUDE),
+            latitude=birth_data.get("latitude", DEFAULT_LATITUDE)
+        )
+
+    @classmethod
+    def _birth_info_from_binding(cls, binding: ChartBinding) -> BirthInfo:
+        return cls._birth_info_from_data({
+            "year": binding.birth_year,
+            "month": binding.birth_month,
+            "day": binding.birth_day,
+            "hour": binding.birth_hour,
+            "minute": binding.birth_minute,
+            "gender": binding.gender,
+        })
+
+
+# 全局綁定命盤存取實例
+bound_chart_store = BoundChartStore()
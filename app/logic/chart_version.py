@@ -0,0 +1,49 @@
+"""
+排盤演算法版本
+以所有影響命盤輸出的模組與資料檔的原始碼雜湊作為版本，下列用途共用同一個版本：
+- 綁定命盤快照（bound_chart_store）過期判斷
+- 命盤回應的 ETag（conditional_response）
+- 占卜記錄引用的太極盤快照（taichi_snapshots）
+
+原始碼以外的規則變更（例如重新導入 calendar_data）時遞增 CHART_RULES_REVISION。
+"""
+import hashlib
+import importlib
+import inspect
+from typing import Iterable
+
+CHART_RULES_REVISION = 1
+
+# 會影響 PurpleStarChart.get_chart() / 太極盤輸出的模組
+CHART_SOURCE_MODULES = (
+    "app.logic.purple_star_chart",
+    "app.logic.star_calculator",
+    "app.logic.sihua_overlay",
+    "app.logic.palace_view",
+    "app.data.heavenly_stems.four_transformations",
+    "app.models.stars",
+    "app.models.birth_info",
+    "app.utils.chinese_calendar",
+    "app.db.repository",
+    "app.db.calendar_cache",
+)
+
+
+def compute_algorithm_version(modules: Iterable[str] = CHART_SOURCE_MODULES,
+                              revision: int = CHART_RULES_REVISION) -> str:
+    """以模組原始碼雜湊計算演算法版本"""
+    digest = hashlib.sha256(str(revision).encode("utf-8"))
+    for name in modules:
+        module = importlib.import_module(name)
+        try:
+            source = inspect.getsource(module)
+        except (OSError, TypeError):
+            # 沒有原始碼（例如只部署 .pyc）時退回模組名稱
+            source = name
+        digest.update(name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(source.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+CHART_ALGORITHM_VERSION = compute_algorithm_version()
@@ -1,12 +1,21 @@
 """
 設備管理邏輯
 管理用戶設備限制和設備清理
+
+受保護的請求只查詢行程內的設備快取，last_seen 先在記憶體彙總再定期批次寫回；
+超過 device_inactive_days 未使用的設備由維護排程（app.utils.maintenance）批次刪除，不在請求中處理。
+
+user_devices 的時間欄位不帶時區，存放台北時間；與欄位比較或寫入的時間一律先轉為不帶時區的台北時間。
 """
 import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_, bindparam, func, update
 
 from app.models.user_devices import UserDevice
 from app.models.linebot_models import LineBotUser
@@ -16,16 +25,156 @@ logger = logging.getLogger(__name__)
 # 台北時區
 TAIPEI_TZ = timezone(timedelta(hours=8))
 
+DEVICE_CACHE_TTL_SECONDS = 60
+DEVICE_CACHE_MAX_USERS = 10000
+LAST_SEEN_FLUSH_SECONDS = 60
+DEVICE_SWEEP_INTERVAL_SECONDS = 3600
+DEVICE_SWEEP_BATCH_SIZE = 1000
+
 def get_current_taipei_time() -> datetime:
     """獲取當前台北時間"""
     return datetime.now(TAIPEI_TZ)
 
+
+class DeviceSetCache:
+    """
+    每位用戶已登記設備指紋的快取（LRU + TTL）
+
+    設備新增或被清理時會主動失效；TTL 只是保險，避免其他 worker 的變更永遠看不到。
+    """
+
+    def __init__(self, ttl_seconds: float = DEVICE_CACHE_TTL_SECONDS, max_users: int = DEVICE_CACHE_MAX_USERS):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._entries: "OrderedDict[str, Tuple[float, frozenset]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[frozenset]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: str, fingerprints) -> frozenset:
+        fingerprints = frozenset(fingerprints)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, fingerprints)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return fingerprints
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cached_users": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class LastSeenRecorder:
+    """在記憶體彙總設備的最後使用時間與調用次數，定期以一次 executemany 寫回 user_devices"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (user_id, device_fingerprint) -> [last_seen, calls]
+        self._pending: Dict[Tuple[str, str], list] = {}
+
+    def touch(self, user_id: str, device_fingerprint: str, seen_at: datetime):
+        with self._lock:
+            entry = self._pending.get((user_id, device_fingerprint))
+            if entry is None:
+                self._pending[(user_id, device_fingerprint)] = [seen_at, 1]
+            else:
+                entry[0] = max(entry[0], seen_at)
+                entry[1] += 1
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, db: Session) -> int:
+        """
+        寫回彙總的 last_seen
+
+        Returns:
+            寫回的設備數
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        table = UserDevice.__table__
+        statement = update(table).where(and_(
+            table.c.user_id == bindparam("b_user_id"),
+            table.c.device_fingerprint == bindparam("b_fingerprint"),
+        )).values(
+            last_seen=bindparam("b_seen"),
+            last_activity=bindparam("b_seen"),
+            total_api_calls=func.coalesce(table.c.total_api_calls, 0) + bindparam("b_calls"),
+        )
+        try:
+            db.execute(statement, [
+                {"b_user_id": user_id, "b_fingerprint": fingerprint, "b_seen": _as_naive_taipei(seen_at), "b_calls": calls}
+                for (user_id, fingerprint), (seen_at, calls) in pending.items()
+            ])
+            db.commit()
+            return len(pending)
+        except Exception as e:
+            db.rollback()
+            # 寫回失敗時放回待寫入的記錄，下次再試
+            with self._lock:
+                for key, (seen_at, calls) in pending.items():
+                    entry = self._pending.setdefault(key, [seen_at, 0])
+                    entry[0] = max(entry[0], seen_at)
+                    entry[1] += calls
+            logger.error(f"寫回設備最後使用時間失敗: {e}")
+            return 0
+
+
+@dataclass
+class DeviceSweepResult:
+    """一次設備清理的結果"""
+    deleted: int = 0
+    last_seen_flushed: int = 0
+    duration_ms: float = 0.0
+    finished_at: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
 class DeviceManager:
     """設備管理器"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[DeviceSetCache] = None,
+                 last_seen_recorder: Optional[LastSeenRecorder] = None):
         self.max_devices_per_user = 3  # 每個用戶最多3台設備
         self.device_inactive_days = 7  # 設備非活躍天數閾值
+        self.cache = cache or DeviceSetCache()
+        self.last_seen_recorder = last_seen_recorder or LastSeenRecorder()
+        self.last_sweep: Optional[DeviceSweepResult] = None
     
     def get_user_devices(self, user_id: str, db: Session) -> List[UserDevice]:
         """獲取用戶的所有設備"""
@@ -41,16 +190,16 @@ class DeviceManager:
             return []
     
     def get_active_devices(self, user_id: str, hours: int = 24, db: Session = None) -> List[UserDevice]:
-        """獲取指定時間內活躍的設備"""
+        """獲取指定時間內活躍的設備（使用 (user_id, last_seen) 索引）"""
         try:
-            threshold = get_current_taipei_time() - timedelta(hours=hours)
+            threshold = _as_naive_taipei(get_current_taipei_time() - timedelta(hours=hours))
             
             devices = db.query(UserDevice).filter(
                 and_(
                     UserDevice.user_id == user_id,
                     UserDevice.last_seen > threshold
                 )
-            ).order_by(UserDevice.last_activity.desc()).all()
+            ).order_by(UserDevice.last_seen.desc()).all()
             
             return devices
             
@@ -58,27 +207,67 @@ class DeviceManager:
             logger.error(f"獲取活躍設備失敗 {user_id}: {e}")
             return []
     
+    def get_device_fingerprints(self, user_id: str, db: Session) -> frozenset:
+        """獲取用戶已登記的設備指紋（優先使用快取）"""
+        fingerprints = self.cache.get(user_id)
+        if fingerprints is None:
+            rows = db.query(UserDevice.device_fingerprint).filter(UserDevice.user_id == user_id).all()
+            fingerprints = self.cache.put(user_id, (row.device_fingerprint for row in rows))
+        return fingerprints
+
+    def check_device_permission(self, user_id: str, device_fingerprint: str, db: Session) -> Dict[str, Any]:
+        """
+        檢查設備是否可以使用（已登記的設備不查詢資料庫）
+
+        未登記的設備在數量未達上限時自動登記。
+        """
+        fingerprints = self.get_device_fingerprints(user_id, db)
+        if device_fingerprint in fingerprints:
+            self.last_seen_recorder.touch(user_id, device_fingerprint, get_current_taipei_time())
+            return {
+                "can_access": True,
+                "message": "設備已登記",
+                "registered_devices": len(fingerprints),
+                "max_devices": self.max_devices_per_user
+            }
+
+        result = self.register_device(user_id, {"device_fingerprint": device_fingerprint}, db)
+        if result["success"]:
+            return {
+                "can_access": True,
+                "message": "已登記新設備",
+                "registered_devices": len(self.get_device_fingerprints(user_id, db)),
+                "max_devices": self.max_devices_per_user
+            }
+        return {
+            "can_access": False,
+            "message": result.get("error", "設備數量已達上限"),
+            "registered_devices": len(fingerprints),
+            "max_devices": self.max_devices_per_user
+        }
+
     def register_device(self, user_id: str, device_info: Dict[str, Any], db: Session) -> Dict[str, Any]:
         """註冊新設備"""
         try:
-            device_id = device_info.get("device_id")
+            device_fingerprint = device_info.get("device_fingerprint") or device_info.get("device_id")
             device_name = device_info.get("device_name", "Unknown Device")
-            device_type = device_info.get("device_type", "mobile")
             
             # 檢查設備是否已存在
             existing_device = db.query(UserDevice).filter(
                 and_(
                     UserDevice.user_id == user_id,
-                    UserDevice.device_id == device_id
+                    UserDevice.device_fingerprint == device_fingerprint
                 )
             ).first()
             
             current_time = get_current_taipei_time()
+            # 欄位存不帶時區的台北時間，與 LastSeenRecorder 及背景清理一致
+            stored_time = _as_naive_taipei(current_time)
             
             if existing_device:
                 # 更新現有設備的活動時間
-                existing_device.last_seen = current_time
-                existing_device.last_activity = current_time
+                existing_device.last_seen = stored_time
+                existing_device.last_activity = stored_time
                 existing_device.device_name = device_name  # 更新設備名稱
                 device = existing_device
             else:
@@ -88,14 +277,15 @@ class DeviceManager:
                 ).count()
                 
                 if user_device_count >= self.max_devices_per_user:
-                    # 移除最舊的非活躍設備
+                    # 上限已滿時才在請求中讓出最舊的非活躍設備，其餘由背景清理
                     oldest_device = db.query(UserDevice).filter(
                         UserDevice.user_id == user_id
-                    ).order_by(UserDevice.last_activity.asc()).first()
+                    ).order_by(UserDevice.last_seen.asc()).first()
                     
-                    if oldest_device and oldest_device.last_activity < get_current_taipei_time() - timedelta(days=7):
+                    inactive_threshold = current_time - timedelta(days=self.device_inactive_days)
+                    if oldest_device and _as_taipei(oldest_device.last_seen) < inactive_threshold:
                         db.delete(oldest_device)
-                        logger.info(f"移除用戶 {user_id} 的舊設備: {oldest_device.device_id}")
+                        logger.info(f"移除用戶 {user_id} 的舊設備: {oldest_device.device_fingerprint}")
                     else:
                         return {
                             "success": False,
@@ -106,20 +296,20 @@ class DeviceManager:
                 # 創建新設備記錄
                 device = UserDevice(
                     user_id=user_id,
-                    device_id=device_id,
+                    device_fingerprint=device_fingerprint,
                     device_name=device_name,
-                    device_type=device_type,
-                    first_seen=current_time,
-                    last_seen=current_time,
-                    last_activity=current_time
+                    first_seen=stored_time,
+                    last_seen=stored_time,
+                    last_activity=stored_time
                 )
                 db.add(device)
             
             db.commit()
+            self.cache.invalidate(user_id)
             
             return {
                 "success": True,
-                "device_id": device_id,
+                "device_id": device_fingerprint,
                 "device_name": device_name,
                 "is_new": existing_device is None
             }
@@ -130,4 +320,77 @@ class DeviceManager:
             return {
                 "success": False,
                 "error": "註冊設備失敗"
-            } 
\ No newline at end of file
+            } 
+
+    def sweep_inactive_devices(self, db: Session, now: Optional[datetime] = None,
+                               batch_size: int = DEVICE_SWEEP_BATCH_SIZE) -> DeviceSweepResult:
+        """
+        批次刪除超過 device_inactive_days 未使用的設備
+
+        先寫回記憶體中的 last_seen，避免刪除最近才使用過的設備；每批各自提交，不長時間鎖表。
+        """
+        started = time.perf_counter()
+        result = DeviceSweepResult(last_seen_flushed=self.last_seen_recorder.flush(db))
+        threshold = _as_naive_taipei((now or get_current_taipei_time()) - timedelta(days=self.device_inactive_days))
+        try:
+            while True:
+                rows = db.query(UserDevice.id, UserDevice.user_id).filter(
+                    UserDevice.last_seen < threshold
+                ).limit(batch_size).all()
+                if not rows:
+                    break
+                db.query(UserDevice).filter(
+                    UserDevice.id.in_([row.id for row in rows])
+                ).delete(synchronize_session=False)
+                db.commit()
+                result.deleted += len(rows)
+                for user_id in {row.user_id for row in rows}:
+                    self.cache.invalidate(user_id)
+                if len(rows) < batch_size:
+                    break
+        except Exception as e:
+            db.rollback()
+            logger.error(f"清理非活躍設備失敗: {e}")
+
+        result.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        result.finished_at = get_current_taipei_time().isoformat()
+        self.last_sweep = result
+        logger.info(f"🧹 設備清理完成：刪除 {result.deleted} 筆，寫回 last_seen {result.last_seen_flushed} 筆，"
+                    f"耗時 {result.duration_ms}ms")
+        return result
+
+    def flush_last_seen(self) -> int:
+        """以新的資料庫會話寫回 last_seen"""
+        from app.db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return self.last_seen_recorder.flush(db)
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict:
+        """設備快取與清理統計"""
+        return {
+            "cache": self.cache.get_stats(),
+            "pending_last_seen": self.last_seen_recorder.pending(),
+            "last_sweep": self.last_sweep.to_dict() if self.last_sweep else None,
+        }
+
+
+def _as_taipei(value: Optional[datetime]) -> datetime:
+    """資料庫取回的時間可能不帶時區，視為台北時間"""
+    if value is None:
+        return datetime.min.replace(tzinfo=TAIPEI_TZ)
+    return value if value.tzinfo else value.replace(tzinfo=TAIPEI_TZ)
+
+
+def _as_naive_taipei(value: datetime) -> datetime:
+    """轉為不帶時區的台北時間，與 user_devices 的時間欄位比較或寫入"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(TAIPEI_TZ).replace(tzinfo=None)
+
+
+# 全局設備管理器實例
+device_manager = DeviceManager()
@@ -0,0 +1,269 @@
+"""
+占卜歷史的分區、保留與歸檔
+- PostgreSQL：divination_history 依 divination_time 按月分區（migration 012），ensure_monthly_partitions 預先建立未來月份
+- 其他資料庫：維持一般資料表，分區相關操作略過
+- archive_old_divinations：超過保留期的記錄把大型 JSON 欄位壓縮後移到 divination_history_archive（或 NDJSON 檔），
+  原記錄保留，次數統計不受影響（新記錄以太極盤快照參照保存，本身沒有內嵌 JSON）
+- latest_divination / count_divinations_since：熱門查詢都帶 divination_time 下界，分區表上只掃描相關月份
+"""
+import gzip
+import json
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+from app.logic.taichi_snapshots import CHART_JSON_FIELDS, taichi_snapshot_store
+from app.models.linebot_models import DivinationHistory, DivinationHistoryArchive
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_FIELDS = CHART_JSON_FIELDS
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_RETENTION_DAYS = 365
+DEFAULT_LATEST_LOOKBACK_DAYS = 31
+DEFAULT_ARCHIVE_BATCH_SIZE = 500
+DEFAULT_ARCHIVE_MAX_BATCHES = 20
+
+
+# ---------- 分區 ----------
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{DivinationHistory.__tablename__}_{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(db: Session) -> bool:
+    """divination_history 是否為 PostgreSQL 分區表"""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    relkind = db.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+        {"name": DivinationHistory.__tablename__},
+    ).scalar()
+    return relkind == "p"
+
+
+def ensure_monthly_partitions(db: Session, months_ahead: int = DEFAULT_MONTHS_AHEAD,
+                              now: Optional[datetime] = None) -> int:
+    """
+    建立本月起 months_ahead 個月內尚未存在的分區
+
+    Returns:
+        新建的分區數；非分區表回傳 0
+    """
+    if not is_partitioned(db):
+        return 0
+    table = DivinationHistory.__tablename__
+    current = month_start(now or datetime.utcnow())
+    created = 0
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        name = partition_name(start)
+        if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            continue
+        try:
+            db.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+            ))
+            db.commit()
+            created += 1
+            logger.info(f"🗂️ 已建立占卜歷史分區 {name}")
+        except Exception as e:
+            # DEFAULT 分區已有該月份的資料時無法建立，留給人工處理
+            db.rollback()
+            logger.warning(f"建立占卜歷史分區 {name} 失敗: {e}")
+    return created
+
+
+# ---------- 熱門查詢 ----------
+
+def latest_divination(db: Session, user_id: int, lookback_days: int = DEFAULT_LATEST_LOOKBACK_DAYS,
+                      now: Optional[datetime] = None) -> Optional[DivinationHistory]:
+    """
+    用戶最新的占卜記錄
+
+    先查最近 lookback_days 天（只掃描最近的分區），找不到才查全部
+    """
+    query = db.query(DivinationHistory).filter(DivinationHistory.user_id == user_id)
+    since = (now or datetime.utcnow()) - timedelta(days=lookback_days)
+    record = query.filter(DivinationHistory.divination_time >= since).order_by(
+        DivinationHistory.divination_time.desc()
+    ).first()
+    if record is None:
+        record = query.order_by(DivinationHistory.divination_time.desc()).first()
+    return record
+
+
+def count_divinations_since(db: Session, user_id: int, since: datetime) -> int:
+    """用戶自 since 起的占卜次數（週限制與統計）"""
+    return db.query(DivinationHistory).filter(
+        DivinationHistory.user_id == user_id,
+        DivinationHistory.divination_time >= since,
+    ).count()
+
+
+# ---------- 歸檔 ----------
+
+def compress_payload(record: DivinationHistory) -> bytes:
+    raw = json.dumps({field: getattr(record, field) for field in ARCHIVED_FIELDS}, ensure_ascii=False)
+    return zlib.compress(raw.encode("utf-8"))
+
+
+def decompress_payload(payload: bytes) -> Dict[str, Optional[str]]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+class TableArchiveSink:
+    """把 JSON 欄位壓縮寫入 divination_history_archive（與清空原欄位在同一個交易提交）"""
+
+    def write(self, db: Session, records: List[DivinationHistory]):
+        for record in records:
+            payload = compress_payload(record)
+            db.merge(DivinationHistoryArchive(
+                history_id=record.id,
+                user_id=record.user_id,
+                divination_time=record.divination_time,
+                payload=payload,
+                raw_bytes=sum(len((getattr(record, field) or "").encode("utf-8")) for field in ARCHIVED_FIELDS),
+            ))
+
+    def load(self, db: Session, record: DivinationHistory) -> Optional[Dict[str, Optional[str]]]:
+        archive = db.get(DivinationHistoryArchive, record.id)
+        return decompress_payload(archive.payload) if archive else None
+
+
+class NdjsonArchiveSink:
+    """
+    把 JSON 欄位寫入按月分檔的 gzip NDJSON（divination_history-YYYY-MM.ndjson.gz）
+
+    檔案在清空資料庫欄位之前寫入並 fsync；提交失敗重跑時同一筆可能寫入兩次，讀取時以 id 去重
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path_for(self, divination_time: datetime) -> str:
+        return os.path.join(self.directory, f"{DivinationHistory.__tablename__}-{divination_time:%Y-%m}.ndjson.gz")
+
+    def write(self, db: Session, records: List[DivinationHistory]):
+        os.makedirs(self.directory, exist_ok=True)
+        by_path: Dict[str, List[str]] = {}
+        for record in records:
+            line = json.dumps({
+                "id": record.id,
+                "user_id": record.user_id,
+                "divination_time": record.divination_time.isoformat(),
+                **{field: getattr(record, field) for field in ARCHIVED_FIELDS},
+            }, ensure_ascii=False)
+            by_path.setdefault(self.path_for(record.divination_time), []).append(line)
+        for path, lines in by_path.items():
+            # gzip 允許多個成員串接，追加寫入即可
+            with open(path, "ab") as handle:
+                handle.write(gzip.compress(("\n".join(lines) + "\n").encode("utf-8")))
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def load(self, db: Session, record: DivinationHistory) -> Optional[Dict[str, Optional[str]]]:
+        """從該月份的檔案找出記錄（同一筆寫入多次時以最後一次為準）"""
+        path = self.path_for(record.divination_time)
+        if not os.path.exists(path):
+            return None
+        prefix = json.dumps({"id": record.id})[:-1] + ","
+        found = None
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith(prefix):
+                    found = json.loads(line)
+        return {field: found.get(field) for field in ARCHIVED_FIELDS} if found else None
+
+
+def archive_old_divinations(db: Session, retention_days: int = DEFAULT_RETENTION_DAYS, sink=None,
+                            batch_size: int = DEFAULT_ARCHIVE_BATCH_SIZE,
+                            max_batches: int = DEFAULT_ARCHIVE_MAX_BATCHES,
+                            now: Optional[datetime] = None) -> int:
+    """
+    歸檔超過保留期記錄的 JSON 欄位，原記錄的欄位設為 NULL
+
+    Returns:
+        歸檔筆數；達到 max_batches 時剩下的留給下一次執行
+    """
+    sink = sink or TableArchiveSink()
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    pending = or_(*[getattr(DivinationHistory, field).isnot(None) for field in ARCHIVED_FIELDS])
+    archived = 0
+    try:
+        for _ in range(max_batches):
+            records = db.query(DivinationHistory).filter(
+                DivinationHistory.divination_time < cutoff, pending
+            ).order_by(DivinationHistory.divination_time).limit(batch_size).all()
+            if not records:
+                break
+            sink.write(db, records)
+            db.query(DivinationHistory).filter(
+                DivinationHistory.id.in_([record.id for record in records]),
+                DivinationHistory.divination_time < cutoff,
+            ).update({field: None for field in ARCHIVED_FIELDS}, synchronize_session=False)
+            db.commit()
+            db.expire_all()
+            archived += len(records)
+            if len(records) < batch_size:
+                break
+    except Exception:
+        db.rollback()
+        raise
+    return archived
+
+
+def load_divination_payload(db: Session, record: DivinationHistory) -> Dict[str, Optional[str]]:
+    """
+    取得記錄的 JSON 欄位：內嵌欄位、太極盤快照（經快取），最後是歸檔（歸檔表，設定 DIVINATION_ARCHIVE_DIR 時再查 NDJSON 檔）
+
+    回傳值不寫回原記錄，避免之後的提交把歸檔的資料搬回來
+    """
+    payload = {field: getattr(record, field) for field in ARCHIVED_FIELDS}
+    if any(value is not None for value in payload.values()):
+        return payload
+    if record.snapshot_hash:
+        snapshot = taichi_snapshot_store.load(db, record.snapshot_hash)
+        if snapshot is not None:
+            return snapshot
+    for sink in _archive_sinks():
+        archived = sink.load(db, record)
+        if archived is not None:
+            return archived
+    return payload
+
+
+def _create_default_sink():
+    """DIVINATION_ARCHIVE_DIR 設定時歸檔到 NDJSON 檔，否則寫入歸檔表"""
+    directory = os.getenv("DIVINATION_ARCHIVE_DIR")
+    return NdjsonArchiveSink(directory) if directory else TableArchiveSink()
+
+
+def _archive_sinks() -> List:
+    """讀取時依序查詢的歸檔位置（改用 NDJSON 之前寫入歸檔表的記錄仍可讀取）"""
+    sinks = [TableArchiveSink()]
+    directory = os.getenv("DIVINATION_ARCHIVE_DIR")
+    if directory:
+        sinks.append(NdjsonArchiveSink(directory))
+    return sinks
+
+
+def run_history_archival(db: Session) -> int:
+    """維護工作：依 DIVINATION_RETENTION_DAYS 歸檔舊記錄"""
+    retention_days = int(os.getenv("DIVINATION_RETENTION_DAYS", str(DEFAULT_RETENTION_DAYS)))
+    return archive_old_divinations(db, retention_days=retention_days, sink=_create_default_sink())
@@ -2,8 +2,10 @@
 占卜邏輯系統
 實現基於當下時間和性別的太極點占卜算法
 """
+import asyncio
 import json
 import logging
+from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Tuple, Optional, Any
 from sqlalchemy.orm import Session
@@ -12,28 +14,37 @@ import traceback
 from app.logic.purple_star_chart import PurpleStarChart
 from app.config.linebot_config import LineBotConfig
 from app.utils.chinese_calendar import ChineseCalendar
-from app.utils.timezone_helper import TimezoneHelper, TAIPEI_TZ
+from app.utils.timezone_helper import TimezoneHelper
 from app.models.linebot_models import DivinationHistory, LineBotUser
 from app.data.heavenly_stems.four_transformations import four_transformations_explanations
+from app.utils.fast_json import SerializedJSON
+from app.utils.single_flight import async_chart_single_flight, chart_single_flight
+from app.logic.chart_version import CHART_ALGORITHM_VERSION
+from app.logic.taichi_snapshots import taichi_slot_key, taichi_snapshot_store
 
 # 設置日誌
 logger = logging.getLogger(__name__)
 
-class TaipeiFormatter(logging.Formatter):
-    """台北時區的日誌格式化器"""
-    def formatTime(self, record, datefmt=None):
-        dt = datetime.fromtimestamp(record.created, tz=TAIPEI_TZ)
-        if datefmt:
-            return dt.strftime(datefmt)
-        else:
-            return dt.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+@dataclass(frozen=True)
+class TaichiChartResult:
+    """
+    太極盤計算結果（只取決於占卜時間與性別，可在並發請求間共用）
+
+    內容只序列化一次：同一份位元組存為 taichi_chart_snapshots 的共用快照（占卜記錄只保存參照），
+    各請求的回應物件由 load() 產生獨立副本。
+    """
+    palace_tiangan: str
+    palaces: SerializedJSON
+    sihua_results: SerializedJSON
+    taichi_palace_mapping: SerializedJSON
+    simplified_mode: bool = False
+
 
-# 設置日誌，使用台北時區
-logging.basicConfig(level=logging.INFO)
+def _taichi_flight_key(current_time: datetime, gender: str) -> Tuple:
+    """太極盤計算的合併鍵：精確到分鐘的時間與性別"""
+    return ("taichi", current_time.year, current_time.month, current_time.day,
+            current_time.hour, current_time.minute, gender)
 
-# 為所有處理程序設置台北時區格式化器  
-for handler in logging.root.handlers:
-    handler.setFormatter(TaipeiFormatter('%(asctime)s - %(levelname)s - %(message)s'))
 
 class DivinationLogic:
     """占卜邏輯核心類"""
@@ -76,7 +87,86 @@ class DivinationLogic:
             logger.error(f"計算分鐘地支錯誤：{e}")
             raise
 
-    def perform_divination(self, user: LineBotUser, gender: str, current_time: datetime = None, db: Optional[Session] = None) -> Dict:
+    def compute_taichi_chart(self, current_time: datetime, gender: str, minute_dizhi: str,
+                             db: Optional[Session] = None) -> TaichiChartResult:
+        """
+        建立太極盤並取得四化解釋
+
+        相同時間（分鐘）與性別的並發請求只計算一次並共用結果，返回值不可修改。
+        """
+        return chart_single_flight.do(
+            _taichi_flight_key(current_time, gender),
+            lambda: self._build_taichi_chart(current_time, gender, minute_dizhi, db)
+        )
+
+    def _build_taichi_chart(self, current_time: datetime, gender: str, minute_dizhi: str,
+                            db: Optional[Session] = None) -> TaichiChartResult:
+        # 同一時段、算法版本相符的快照已存在時直接沿用
+        if db is not None:
+            reused = self._load_taichi_snapshot(db, taichi_slot_key(current_time, gender))
+            if reused is not None:
+                return reused
+
+        # 創建原盤
+        chart = PurpleStarChart(
+            year=current_time.year,
+            month=current_time.month,
+            day=current_time.day,
+            hour=current_time.hour,
+            minute=current_time.minute,
+            gender=gender,
+            db=db
+        )
+        logger.info("原盤創建完成")
+
+        # 應用太極點旋轉，將原盤轉換為太極盤
+        chart.apply_taichi(minute_dizhi)
+        logger.info("太極盤轉換完成")
+
+        # 獲取太極點天干（現在太極盤的命宮天干）
+        taichi_palace = chart.palaces.get("命宮")
+        if not taichi_palace:
+            raise ValueError("太極盤中未找到命宮")
+        palace_tiangan = taichi_palace.stem
+
+        # 取得太極盤資料
+        palaces_data = chart.get_chart().get("palaces", {})
+        logger.info(f"太極盤資料獲取完成，宮位數量: {len(palaces_data)}")
+
+        # 基於太極盤獲取四化解釋
+        sihua_results = chart.get_taichi_sihua_explanations(palace_tiangan)
+
+        return TaichiChartResult(
+            palace_tiangan=palace_tiangan,
+            palaces=SerializedJSON.of(palaces_data),
+            sihua_results=SerializedJSON.of(sihua_results),
+            taichi_palace_mapping=SerializedJSON.of(chart.taichi_palace_mapping),
+            simplified_mode=getattr(chart, 'simplified_mode', False)
+        )
+
+    def _load_taichi_snapshot(self, db: Session, chart_slot: str) -> Optional[TaichiChartResult]:
+        """由既有快照還原太極盤（太極點天干即太極盤命宮的天干），失敗時返回 None 改為重新計算"""
+        try:
+            contents = taichi_snapshot_store.load_slot(db, chart_slot)
+            if not contents or not contents.get("taichi_chart_data"):
+                return None
+            palaces = json.loads(contents["taichi_chart_data"])
+            palace_tiangan = palaces.get("命宮", {}).get("tiangan")
+            if not palace_tiangan:
+                return None
+        except Exception as e:
+            logger.warning(f"讀取太極盤快照失敗，改為重新計算：{e}")
+            return None
+        logger.info(f"沿用時段 {chart_slot} 的太極盤快照")
+        return TaichiChartResult(
+            palace_tiangan=palace_tiangan,
+            palaces=SerializedJSON(contents["taichi_chart_data"].encode("utf-8")),
+            sihua_results=SerializedJSON((contents.get("sihua_results") or "[]").encode("utf-8")),
+            taichi_palace_mapping=SerializedJSON((contents.get("taichi_palace_mapping") or "{}").encode("utf-8")),
+        )
+
+    def perform_divination(self, user: LineBotUser, gender: str, current_time: datetime = None, db: Optional[Session] = None,
+                           taichi_result: Optional[TaichiChartResult] = None) -> Dict:
         """
         執行占卜邏輯 - 簡化版本，使用太極盤架構
         
@@ -85,6 +175,7 @@ class DivinationLogic:
             gender: 性別
             current_time: 指定時間（可選，默認使用當前時間）
             db: 數據庫會話（可選）
+            taichi_result: 已計算好的太極盤（可選，異步路徑先行合併計算時傳入）
             
         Returns:
             Dict: 占卜結果
@@ -107,64 +198,27 @@ class DivinationLogic:
             minute_dizhi = self.get_minute_dizhi(current_time)
             logger.info(f"太極點地支：{minute_dizhi}")
             
-            # 3. 創建原盤
-            chart = PurpleStarChart(
-                year=current_time.year,
-                month=current_time.month,
-                day=current_time.day,
-                hour=current_time.hour,
-                minute=current_time.minute,
-                gender=gender,
-                db=db
-            )
-            
-            logger.info("原盤創建完成")
-            
-            # 4. 應用太極點旋轉，將原盤轉換為太極盤
-            chart.apply_taichi(minute_dizhi)
-            logger.info("太極盤轉換完成")
-            
-            # 5. 獲取太極點天干（現在太極盤的命宮天干）
-            taichi_palace = chart.palaces.get("命宮")
-            if not taichi_palace:
-                raise ValueError("太極盤中未找到命宮")
-            
-            palace_tiangan = taichi_palace.stem
-            logger.info(f"太極點天干：{palace_tiangan}")
-            
-            # 6. 取得太極盤資料（在保存前先獲取）
-            taichi_chart_data = chart.get_chart()
-            logger.info("太極盤資料獲取完成")
-            
-            # 調試：檢查太極盤數據結構
-            palaces_data = taichi_chart_data.get("palaces", {})
-            logger.info(f"太極盤宮位數量: {len(palaces_data)}")
-            logger.info(f"太極盤宮位名稱: {list(palaces_data.keys())}")
-            
-            # 顯示前3個宮位的詳細數據（避免日誌過長）
-            for i, (palace_name, palace_data) in enumerate(palaces_data.items()):
-                if i < 3:
-                    logger.info(f"宮位 {palace_name} 數據: tiangan={palace_data.get('tiangan')}, dizhi={palace_data.get('dizhi')}, stars={len(palace_data.get('stars', []))}")
-                if i >= 3:
-                    break
-            
-            # 7. 基於太極盤獲取四化解釋
-            sihua_results = chart.get_taichi_sihua_explanations(palace_tiangan)
-            logger.info(f"四化解釋獲取完成，共 {len(sihua_results)} 個")
+            # 3-7. 建立太極盤並取得四化解釋（相同時間與性別的並發請求共用一次計算）
+            if taichi_result is None:
+                taichi_result = self.compute_taichi_chart(current_time, gender, minute_dizhi, db)
+            # 共用的計算結果不可修改，各請求由序列化內容產生自己的副本
+            palace_tiangan = taichi_result.palace_tiangan
+            taichi_palaces = taichi_result.palaces.load()
+            sihua_results = taichi_result.sihua_results.load()
+            taichi_palace_mapping = taichi_result.taichi_palace_mapping.load()
+            logger.info(f"太極點天干：{palace_tiangan}，四化解釋共 {len(sihua_results)} 個")
             
             # 8. 保存占卜記錄（僅在有數據庫且用戶存在時）
             divination_id = None
             if db is not None and user and hasattr(user, 'id') and user.id is not None:
                 try:
-                    sihua_json = json.dumps(sihua_results, ensure_ascii=False)
-                    taichi_mapping_json = json.dumps(chart.taichi_palace_mapping, ensure_ascii=False)
-                    taichi_chart_json = json.dumps(taichi_chart_data.get("palaces", {}), ensure_ascii=False)
-                    
-                    # 調試：檢查要保存的數據
-                    logger.info(f"準備保存 - 太極映射: {len(chart.taichi_palace_mapping)} 個")
-                    logger.info(f"準備保存 - 太極盤宮位: {len(taichi_chart_data.get('palaces', {}))} 個")
-                    logger.info(f"太極映射 JSON 長度: {len(taichi_mapping_json)} 字符")
-                    logger.info(f"太極盤 JSON 長度: {len(taichi_chart_json)} 字符")
+                    # 計算時已序列化的內容存為共用快照，記錄只保存參照
+                    snapshot_hash = taichi_snapshot_store.save(db, {
+                        "sihua_results": taichi_result.sihua_results.text,
+                        "taichi_palace_mapping": taichi_result.taichi_palace_mapping.text,
+                        "taichi_chart_data": taichi_result.palaces.text,
+                    })
+                    logger.info(f"準備保存 - 太極映射: {len(taichi_palace_mapping)} 個，太極盤宮位: {len(taichi_palaces)} 個，快照 {snapshot_hash[:12]}")
                     
                     divination_record = DivinationHistory(
                         user_id=user.id,
@@ -172,9 +226,9 @@ class DivinationLogic:
                         divination_time=current_time,
                         taichi_palace=f"{minute_dizhi}宮",
                         minute_dizhi=minute_dizhi,
-                        sihua_results=sihua_json,
-                        taichi_palace_mapping=taichi_mapping_json,
-                        taichi_chart_data=taichi_chart_json
+                        chart_slot=taichi_slot_key(current_time, gender),
+                        chart_version=CHART_ALGORITHM_VERSION,
+                        snapshot_hash=snapshot_hash
                     )
                     
                     db.add(divination_record)
@@ -204,11 +258,11 @@ class DivinationLogic:
                 "minute_dizhi": minute_dizhi,
                 "palace_tiangan": palace_tiangan,
                 "sihua_stars": sihua_stars,
-                "taichi_chart": taichi_chart_data.get("palaces", {}),  # 太極盤資料
-                "basic_chart": taichi_chart_data.get("palaces", {}),   # 向後兼容
+                "taichi_chart": taichi_palaces,  # 太極盤資料
+                "basic_chart": taichi_palaces,   # 向後兼容
                 "sihua_results": sihua_results,
-                "taichi_palace_mapping": chart.taichi_palace_mapping,
-                "simplified_mode": getattr(chart, 'simplified_mode', False)
+                "taichi_palace_mapping": taichi_palace_mapping,
+                "simplified_mode": taichi_result.simplified_mode
             }
             
             logger.info(f"占卜完成，模式：{'簡化' if result.get('simplified_mode', False) else '正常'}")
@@ -258,5 +312,33 @@ def get_divination_result(db: Optional[Session], user: LineBotUser, gender: str,
             "message": "占卜服務暫時不可用，請稍後重試"
         }
 
+async def get_divination_result_async(db: Optional[Session], user: LineBotUser, gender: str, current_time: datetime = None) -> Dict:
+    """
+    get_divination_result 的異步版本（webhook 等異步處理器使用）
+
+    太極盤在執行緒中計算，不阻塞事件迴圈；同一事件迴圈內相同時間與性別的請求合併為一次計算，
+    占卜記錄仍由各請求各自保存。合併只經過 async_chart_single_flight 一層，統計不會重複計數。
+    """
+    try:
+        if current_time is None:
+            current_time = TimezoneHelper.get_current_taipei_time()
+        else:
+            current_time = TimezoneHelper.to_taipei_time(current_time)
+        minute_dizhi = divination_logic.get_minute_dizhi(current_time)
+
+        taichi_result = await async_chart_single_flight.do(
+            _taichi_flight_key(current_time, gender),
+            lambda: asyncio.to_thread(divination_logic._build_taichi_chart, current_time, gender, minute_dizhi, db)
+        )
+        return divination_logic.perform_divination(user, gender, current_time, db, taichi_result=taichi_result)
+
+    except Exception as e:
+        logger.error(f"獲取占卜結果錯誤：{e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "占卜服務暫時不可用，請稍後重試"
+        }
+
 # 導出
-__all__ = ["DivinationLogic", "divination_logic", "get_divination_result"] 
\ No newline at end of file
+__all__ = ["DivinationLogic", "TaichiChartResult", "divination_logic", "get_divination_result", "get_divination_result_async"] 
\ No newline at end of file
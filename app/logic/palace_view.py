@@ -0,0 +1,162 @@
+"""
+旋轉宮位視圖
+太極盤、流年、流月、流日都是把同一組十二宮依某個地支重新起算命宮。
+RotatedChartView 只保存「依地支排列的原宮位陣列 + 起始偏移 + 宮名表」，
+建立時不複製任何宮位或星曜，讀寫都直接作用在原宮位上，需要時再 render() 成獨立的宮位。
+"""
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+EARTHLY_BRANCHES = ("子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥")
+BRANCH_INDEX = {branch: index for index, branch in enumerate(EARTHLY_BRANCHES)}
+
+
+@lru_cache(maxsize=32)
+def _name_index(names: Tuple[str, ...]) -> Dict[str, int]:
+    """宮名 -> 位置（每個宮名表只建立一次）"""
+    return {name: index for index, name in enumerate(names)}
+
+
+class PalaceView:
+    """宮位視圖：名稱取自旋轉後的宮名表，其餘欄位直接讀寫原宮位"""
+    __slots__ = ("name", "_palace")
+
+    def __init__(self, name: str, palace):
+        self.name = name
+        self._palace = palace
+
+    @property
+    def stars(self) -> List[str]:
+        return self._palace.stars
+
+    @stars.setter
+    def stars(self, value: List[str]):
+        self._palace.stars = value
+
+    @property
+    def element(self) -> str:
+        return self._palace.element
+
+    @property
+    def stem(self) -> str:
+        return self._palace.stem
+
+    @property
+    def branch(self) -> str:
+        return self._palace.branch
+
+    @property
+    def body_palace(self) -> bool:
+        return self._palace.body_palace
+
+    @body_palace.setter
+    def body_palace(self, value: bool):
+        self._palace.body_palace = value
+
+    def __repr__(self):
+        return f"PalaceView(name={self.name!r}, branch={self.branch!r}, stars={self.stars!r})"
+
+
+def palaces_by_branch(palaces: Mapping) -> List:
+    """
+    將宮位字典轉為依地支索引（子=0）排列的陣列
+
+    視圖直接返回其底層陣列（O(1)）；一般字典掃描一次，同地支取第一個宮位。
+    """
+    if isinstance(palaces, RotatedChartView):
+        return palaces.base
+    slots: List = [None] * 12
+    for palace in palaces.values():
+        index = BRANCH_INDEX.get(palace.branch)
+        if index is not None and slots[index] is None:
+            slots[index] = palace
+    return slots
+
+
+def named_branch_slots(palaces: Mapping) -> List[Optional[Tuple[str, object]]]:
+    """依地支索引排列的（宮名, 宮位），用於以地支查宮位而不必逐宮掃描"""
+    if isinstance(palaces, RotatedChartView):
+        return palaces.items_by_branch()
+    slots: List[Optional[Tuple[str, object]]] = [None] * 12
+    for name, palace in palaces.items():
+        index = BRANCH_INDEX.get(palace.branch)
+        if index is not None and slots[index] is None:
+            slots[index] = (name, palace)
+    return slots
+
+
+class RotatedChartView(Mapping):
+    """
+    以某地支為命宮的十二宮唯讀映射（宮名 -> PalaceView）
+
+    第 i 個宮名對應地支索引 (offset + i) % 12 的原宮位。
+    """
+    __slots__ = ("base", "offset", "names", "_index")
+
+    def __init__(self, base: Sequence, offset: int, names: Sequence[str]):
+        """
+        Args:
+            base: 依地支索引排列的原宮位（長度 12，缺少的位置為 None）
+            offset: 新命宮的地支索引
+            names: 十二宮名稱（由新命宮起順時針）
+        """
+        self.base = base
+        self.offset = offset % 12
+        self.names = tuple(names)
+        self._index = _name_index(self.names)
+
+    @classmethod
+    def from_palaces(cls, palaces: Mapping, start_branch: str, names: Sequence[str]) -> "RotatedChartView":
+        """由宮位字典或另一個視圖建立；對視圖再旋轉時共用同一個底層陣列"""
+        return cls(palaces_by_branch(palaces), BRANCH_INDEX[start_branch], names)
+
+    def __getitem__(self, name: str) -> PalaceView:
+        position = self._index[name]
+        palace = self.base[(self.offset + position) % 12]
+        if palace is None:
+            raise KeyError(name)
+        return PalaceView(name, palace)
+
+    def __iter__(self) -> Iterator[str]:
+        for position, name in enumerate(self.names):
+            if self.base[(self.offset + position) % 12] is not None:
+                yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def name_at_branch(self, branch: str) -> Optional[str]:
+        """返回某地支在此視圖中的宮名"""
+        index = BRANCH_INDEX[branch]
+        if self.base[index] is None:
+            return None
+        return self.names[(index - self.offset) % 12]
+
+    def items_by_branch(self) -> List[Optional[Tuple[str, PalaceView]]]:
+        """依地支索引排列的（宮名, 宮位視圖）"""
+        slots: List[Optional[Tuple[str, PalaceView]]] = [None] * 12
+        for index, palace in enumerate(self.base):
+            if palace is not None:
+                name = self.names[(index - self.offset) % 12]
+                slots[index] = (name, PalaceView(name, palace))
+        return slots
+
+    def render(self, palace_factory) -> Dict[str, object]:
+        """
+        產生獨立的宮位字典（複製星曜列表）
+
+        Args:
+            palace_factory: 宮位類別，例如 Palace
+        """
+        return {
+            name: palace_factory(
+                name=name,
+                stars=list(view.stars),
+                element=view.element,
+                stem=view.stem,
+                branch=view.branch,
+                body_palace=view.body_palace
+            )
+            for name, view in self.items()
+        }
@@ -9,7 +9,10 @@ from datetime import datetime, timedelta
 from sqlalchemy import func
 
 from app.models.linebot_models import LineBotUser, DivinationHistory
+from app.logic.divination_history import count_divinations_since, latest_divination
 from app.config.linebot_config import LineBotConfig
+from app.utils.auth_tokens import auth_token_service
+from app.utils.rate_limiter import rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +71,7 @@ class PermissionManager:
             user.membership_level = LineBotConfig.MembershipLevel.ADMIN
             user.updated_at = datetime.utcnow()
             db.commit()
+            rate_limiter.invalidate_user_limit(line_user_id)
             
             # 自動更新 Rich Menu
             self._update_user_rich_menu(line_user_id, is_admin=True)
@@ -86,6 +90,7 @@ class PermissionManager:
                 user.membership_level = LineBotConfig.MembershipLevel.ADMIN
                 user.updated_at = datetime.utcnow()
                 db.commit()
+                rate_limiter.invalidate_user_limit(line_user_id)
                 
                 logger.info(f"✅ 管理員權限設置成功: {line_user_id}")
                 return True
@@ -115,6 +120,7 @@ class PermissionManager:
             user.membership_level = LineBotConfig.MembershipLevel.PREMIUM
             user.updated_at = datetime.utcnow()
             db.commit()
+            rate_limiter.invalidate_user_limit(line_user_id)
             return True
         return False
     
@@ -127,6 +133,9 @@ class PermissionManager:
             user.membership_level = LineBotConfig.MembershipLevel.FREE
             user.updated_at = datetime.utcnow()
             db.commit()
+            rate_limiter.invalidate_user_limit(line_user_id)
+            # 已發行的權杖仍帶有付費角色
+            auth_token_service.revoke_user(db, line_user_id)
             return True
         return False
     
@@ -150,10 +159,7 @@ class PermissionManager:
         week_start = today - timedelta(days=days_since_monday)
         week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
         
-        weekly_count = db.query(DivinationHistory).filter(
-            DivinationHistory.user_id == user.id,  # 使用 user.id 而不是 line_user_id
-            DivinationHistory.divination_time >= week_start  # 修正：使用 divination_time 而不是 created_at
-        ).count()
+        weekly_count = count_divinations_since(db, user.id, week_start)
         
         if weekly_count < LineBotConfig.FREE_DIVINATION_WEEKLY_LIMIT:
             return {
@@ -232,10 +238,7 @@ class PermissionManager:
         week_start = today - timedelta(days=days_since_monday)
         week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
         
-        weekly_divinations = db.query(DivinationHistory).filter(
-            DivinationHistory.user_id == user.id,  # 使用 user.id 而不是 line_user_id
-            DivinationHistory.divination_time >= week_start  # 修正：使用 divination_time 而不是 created_at
-        ).count()
+        weekly_divinations = count_divinations_since(db, user.id, week_start)
         
         # 權限檢查
         divination_permission = self.check_divination_permission(db, user)
@@ -330,6 +333,8 @@ class PermissionManager:
             user.membership_level = LineBotConfig.MembershipLevel.PREMIUM
             user.updated_at = datetime.utcnow()
             db.commit()
+            rate_limiter.invalidate_user_limit(line_user_id)
+            auth_token_service.revoke_user(db, line_user_id)
             
             # 自動更新 Rich Menu
             self._update_user_rich_menu(line_user_id, is_admin=False)
@@ -354,9 +359,7 @@ class PermissionManager:
     def _get_last_divination_time(self, db: Session, user: LineBotUser) -> Optional[str]:
         """獲取最後一次占卜時間"""
         try:
-            last_record = db.query(DivinationHistory).filter(
-                DivinationHistory.user_id == user.id
-            ).order_by(DivinationHistory.divination_time.desc()).first()
+            last_record = latest_divination(db, user.id)
             
             if last_record:
                 return last_record.divination_time.isoformat()
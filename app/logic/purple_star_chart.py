@@ -1,5 +1,6 @@
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+import sys
+from typing import Dict, List, Mapping, Optional, Any, Tuple
 from datetime import datetime, date
 from dataclasses import dataclass
 import traceback
@@ -11,14 +12,19 @@ from app.utils.chinese_calendar import ChineseCalendar
 # 移除 sixtail_service 的靜態導入，改為動態導入避免循環導入
 
 from app.models.birth_info import BirthInfo
-from app.models.calendar import CalendarData  # 統一使用 calendar 模型
 from app.logic.star_calculator import StarCalculator
 from app.data.heavenly_stems.four_transformations import four_transformations_explanations
 from app.db.repository import CalendarRepository
+from app.logic.palace_view import BRANCH_INDEX, RotatedChartView
+from app.logic.sihua_overlay import SihuaOverlay, star_palace_index
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# 太極盤十二宮位順序（以命宮為起點，保持傳統計算順序）
+TAICHI_PALACE_NAMES = ("命宮", "父母宮", "福德宮", "田宅宮", "官祿宮", "交友宮",
+                       "遷移宮", "疾厄宮", "財帛宮", "子女宮", "夫妻宮", "兄弟宮")
+
+@dataclass(slots=True)
 class Palace:
     name: str  # 宮位名稱
     stars: List[str]  # 宮內星曜
@@ -27,21 +33,41 @@ class Palace:
     branch: str  # 地支
     body_palace: bool = False  # 是否為身宮
 
-@dataclass
-class SimplifiedCalendarData:
+# 需要駐留（sys.intern）的農曆字串欄位
+_INTERNED_LUNAR_FIELDS = (
+    "year_gan_zhi", "month_gan_zhi", "day_gan_zhi", "hour_gan_zhi", "minute_gan_zhi",
+    "lunar_year_in_chinese", "lunar_month_in_chinese", "lunar_day_in_chinese", "solar_term",
+)
+
+@dataclass(frozen=True, slots=True)
+class LunarInfo:
     """
-    簡化的農曆資料
-    用於簡化模式時的數據結構（已停用）
+    排盤用的農曆資料（不可變值物件）
+    取代以 ORM 的 CalendarData 作為暫存容器；ORM 模型只在存取資料庫時使用。
+    欄位名稱與 CalendarData 相同，既有的 self.calendar_data.xxx 讀取不需修改。
     """
+    gregorian_year: int
+    gregorian_month: int
+    gregorian_day: int
+    gregorian_hour: int
+    gregorian_minute: int
     year_gan_zhi: str  # 年干支
     month_gan_zhi: str  # 月干支
     day_gan_zhi: str  # 日干支
     hour_gan_zhi: str  # 時干支
     minute_gan_zhi: str  # 分干支
+    lunar_year_in_chinese: str  # 農曆年（中文）
     lunar_month_in_chinese: str  # 農曆月（中文）
     lunar_day_in_chinese: str  # 農曆日（中文）
-    solar_term: str  # 節氣
-    data_source: str  # 數據來源
+    solar_term: str = ""  # 節氣
+    data_source: str = "6tail"  # 數據來源
+
+    def __post_init__(self):
+        # 干支與農曆字串只有少數幾種，駐留後所有命盤共用同一個字串物件
+        for field_name in _INTERNED_LUNAR_FIELDS:
+            value = getattr(self, field_name)
+            if isinstance(value, str):
+                object.__setattr__(self, field_name, sys.intern(value))
 
 class PurpleStarChart:
     def __init__(self, year: int = None, month: int = None, day: int = None, hour: int = None, minute: int = None, gender: str = None, birth_info: BirthInfo = None, db: Session = None):
@@ -75,11 +101,15 @@ class PurpleStarChart:
         # 數據庫會話參數保留以維持API兼容性，但不再使用
         self.db = db
         self.star_calculator = StarCalculator()
-        self.palaces: Dict[str, Palace] = {}
-        self.calendar_data: Optional[CalendarData] = None
+        self.palaces: Mapping[str, Palace] = {}  # 套用太極點後為 RotatedChartView
+        self.calendar_data: Optional[LunarInfo] = None
         self.palace_order: List[str] = []
         self.taichi_palace_mapping: Dict[str, str] = {}
         
+        # 四化疊加層：宮位只保存星名與狀態，輸出時依 sihua_scopes 組合四化標記
+        self.sihua = SihuaOverlay()
+        self.sihua_scopes: Tuple[str, ...] = ("natal",)
+        
         # 初始化命盤
         self.initialize()
         
@@ -150,39 +180,33 @@ class PurpleStarChart:
             logger.error(f"無法導入 sixtail_service: {e}")
             raise RuntimeError("占卜系統目前維修中，請稍後再試。我們正在升級時間計算系統以提供更準確的服務。")
     
-    def _create_calendar_data_from_sixtail(self, sixtail_data: Dict) -> CalendarData:
-        """從6tail數據創建兼容的CalendarData對象"""
-        # 創建一個模擬的CalendarData對象
-        calendar_data = CalendarData()
-        
-        # 基本時間資料
-        calendar_data.gregorian_year = self.birth_info.year
-        calendar_data.gregorian_month = self.birth_info.month
-        calendar_data.gregorian_day = self.birth_info.day
-        calendar_data.gregorian_hour = self.birth_info.hour
-        calendar_data.gregorian_minute = self.birth_info.minute
-        
-        # 干支資料
+    def _create_calendar_data_from_sixtail(self, sixtail_data: Dict) -> LunarInfo:
+        """從6tail數據創建農曆資料值物件"""
         ganzhi = sixtail_data.get("ganzhi", {})
-        calendar_data.year_gan_zhi = ganzhi.get("year", "甲子")
-        calendar_data.month_gan_zhi = ganzhi.get("month", "甲子")
-        calendar_data.day_gan_zhi = ganzhi.get("day", "甲子")
-        calendar_data.hour_gan_zhi = ganzhi.get("hour", "甲子")
-        
-        # 計算分干支 (6tail系統沒有分干支，使用時干支)
-        calendar_data.minute_gan_zhi = ganzhi.get("hour", "甲子")
-        
-        # 農曆資料
         lunar = sixtail_data.get("lunar", {})
-        calendar_data.lunar_month_in_chinese = lunar.get("month_chinese", "正月")
-        calendar_data.lunar_day_in_chinese = lunar.get("day_chinese", "初一")
-        calendar_data.lunar_year_in_chinese = lunar.get("year_chinese", "甲子年")
         
-        # 其他資料
-        calendar_data.solar_term = sixtail_data.get("solar_term", "")
-        calendar_data.data_source = "6tail"
-        
-        return calendar_data
+        return LunarInfo(
+            # 基本時間資料
+            gregorian_year=self.birth_info.year,
+            gregorian_month=self.birth_info.month,
+            gregorian_day=self.birth_info.day,
+            gregorian_hour=self.birth_info.hour,
+            gregorian_minute=self.birth_info.minute,
+            # 干支資料
+            year_gan_zhi=ganzhi.get("year", "甲子"),
+            month_gan_zhi=ganzhi.get("month", "甲子"),
+            day_gan_zhi=ganzhi.get("day", "甲子"),
+            hour_gan_zhi=ganzhi.get("hour", "甲子"),
+            # 計算分干支 (6tail系統沒有分干支，使用時干支)
+            minute_gan_zhi=ganzhi.get("hour", "甲子"),
+            # 農曆資料
+            lunar_year_in_chinese=lunar.get("year_chinese", "甲子年"),
+            lunar_month_in_chinese=lunar.get("month_chinese", "正月"),
+            lunar_day_in_chinese=lunar.get("day_chinese", "初一"),
+            # 其他資料
+            solar_term=sixtail_data.get("solar_term", "") or "",
+            data_source="6tail"
+        )
     
     def _calculate_ming_palace(self):
         """計算命宮位置"""
@@ -286,7 +310,8 @@ class PurpleStarChart:
         
         logger.info(f"準備傳遞給StarCalculator的birth_info: {birth_info_for_calculator}")
         
-        self.star_calculator.calculate_stars(birth_info_for_calculator, self.palaces)
+        self.star_calculator.calculate_stars(birth_info_for_calculator, self.palaces, apply_transformations=False)
+        self.sihua.set_layer("natal", year_stem)
         
         # 檢查計算結果
         for palace_name, palace_info in self.palaces.items():
@@ -368,44 +393,41 @@ class PurpleStarChart:
 
     def apply_custom_stem_transformations(self, custom_stem: str):
         """應用自定義天干的四化到命盤中，並回傳解釋"""
-        # 首先清除所有現有的四化標記
-        self._clear_all_transformations()
-        
-        # 準備birth_info給StarCalculator使用
-        year_stem = self.calendar_data.year_gan_zhi[0]  # 生年天干
-        year_branch = self.calendar_data.year_gan_zhi[1]  # 生年地支
-        ming_branch = self.palace_order[0]  # 命宮地支（第一個宮位）
-        
-        # 從calendar_data中獲取農曆日期和月份
-        lunar_day = ChineseCalendar.parse_chinese_day(self.calendar_data.lunar_day_in_chinese)
-        lunar_month = ChineseCalendar.parse_chinese_month(self.calendar_data.lunar_month_in_chinese)
-        
-        birth_info_for_calculator = {
-            'year_stem': custom_stem,  # 使用自定義天干替代原生年天干
-            'year_branch': year_branch,
-            'ming_branch': ming_branch,
-            'lunar_day': lunar_day,
-            'lunar_month': lunar_month,
-            'lunar_hour_branch': ChineseCalendar.get_hour_branch(self.birth_info.hour)
-        }
-        
-        # 應用自定義天干的四化
-        self.star_calculator._apply_four_transformations(birth_info_for_calculator, self.palaces)
+        # 以自定義天干的四化層取代生年四化（宮位資料不變）
+        self.sihua.set_layer("custom", custom_stem)
+        self.sihua_scopes = ("custom",)
 
         # 回傳計算後的四化解釋
         return self.get_four_transformations_explanations_by_stem(custom_stem)
 
+    def set_sihua_layer(self, scope: str, stem: str):
+        """
+        設定四化層（大限、流月、流日等由呼叫端提供天干）
+
+        Args:
+            scope: 四化層名稱，見 sihua_overlay.SIHUA_SCOPES
+            stem: 該層的天干
+        """
+        return self.sihua.set_layer(scope, stem)
+
     def _clear_all_transformations(self):
         """清除所有宮位中星曜的四化標記"""
-        for palace_name, palace_info in self.palaces.items():
-            updated_stars = []
-            for star in palace_info.stars:
-                # 移除所有四化標記（化祿、化權、化科、化忌）
-                cleaned_star = star
-                for transformation in ['化祿', '化權', '化科', '化忌']:
-                    cleaned_star = cleaned_star.replace(transformation, '')
-                updated_stars.append(cleaned_star)
-            palace_info.stars = updated_stars
+        self.sihua_scopes = ()
+
+    def _render_palaces(self, sihua_scopes: Optional[Tuple[str, ...]] = None) -> Dict[str, Palace]:
+        """組合四化標記後的宮位（輸出用，星曜列表為新的列表）"""
+        scopes = self.sihua_scopes if sihua_scopes is None else sihua_scopes
+        return {
+            name: Palace(
+                name=palace.name,
+                stars=self.sihua.render_stars(palace.stars, scopes),
+                element=palace.element,
+                stem=palace.stem,
+                branch=palace.branch,
+                body_palace=palace.body_palace
+            )
+            for name, palace in self.palaces.items()
+        }
 
     def calculate_major_limits(self, current_age: int = None):
         """計算大限"""
@@ -428,11 +450,18 @@ class PurpleStarChart:
             'gender': self.birth_info.gender
         }
         
-        return self.star_calculator.calculate_major_limits(
+        major_limits = self.star_calculator.calculate_major_limits(
             birth_info_for_calculator, 
-            self.palaces, 
+            self._render_palaces(), 
             current_age
         )
+        
+        # 當前大限的宮干作為大限四化層
+        current_major_limit = major_limits.get("當前大限") if isinstance(major_limits, dict) else None
+        if current_major_limit and current_major_limit.get("天干"):
+            self.sihua.set_layer("major_limit", current_major_limit["天干"])
+        
+        return major_limits
     
     def calculate_minor_limits(self, target_age: int = None):
         """計算小限"""
@@ -457,102 +486,68 @@ class PurpleStarChart:
         
         return self.star_calculator.calculate_minor_limits(
             birth_info_for_calculator, 
-            self.palaces, 
+            self._render_palaces(), 
             target_age
         )
     
     def calculate_annual_fortune(self, target_year: int = None):
         """計算流年"""
-        # 準備傳遞給StarCalculator的birth_info
-        year_stem = self.calendar_data.year_gan_zhi[0]  # 生年天干
-        year_branch = self.calendar_data.year_gan_zhi[1]  # 生年地支
-        ming_branch = self.palace_order[0]  # 命宮地支（第一個宮位）
-        
-        # 從calendar_data中獲取農曆日期和月份
-        lunar_day = ChineseCalendar.parse_chinese_day(self.calendar_data.lunar_day_in_chinese)
-        lunar_month = ChineseCalendar.parse_chinese_month(self.calendar_data.lunar_month_in_chinese)
-        
-        birth_info_for_calculator = {
-            'year_stem': year_stem,
-            'year_branch': year_branch,
-            'ming_branch': ming_branch,
-            'lunar_day': lunar_day,
-            'lunar_month': lunar_month,
-            'lunar_hour_branch': ChineseCalendar.get_hour_branch(self.birth_info.hour),
-            'gender': self.birth_info.gender
-        }
-        
-        return self.star_calculator.calculate_annual_fortune(
-            birth_info_for_calculator, 
-            self.palaces, 
+        annual_fortune = self.star_calculator.calculate_annual_fortune(
+            self._fortune_birth_info(), 
+            self._render_palaces(), 
             target_year
         )
+        
+        # 流年天干作為流年四化層
+        year = annual_fortune["目標年份"]
+        self.sihua.set_layer("annual", ChineseCalendar.HEAVENLY_STEMS[(year - 4) % 10])
+        
+        return annual_fortune
     
-    def calculate_monthly_fortune(self, target_year: int = None, target_month: int = None):
+    def calculate_monthly_fortune(self, target_year: int = None, target_month: int = None, annual_fortune: Dict = None):
         """計算流月"""
         # 首先計算流年
-        annual_fortune = self.calculate_annual_fortune(target_year)
-        
-        # 準備傳遞給StarCalculator的birth_info
-        year_stem = self.calendar_data.year_gan_zhi[0]  # 生年天干
-        year_branch = self.calendar_data.year_gan_zhi[1]  # 生年地支
-        ming_branch = self.palace_order[0]  # 命宮地支（第一個宮位）
-        
-        # 從calendar_data中獲取農曆日期和月份
-        lunar_day = ChineseCalendar.parse_chinese_day(self.calendar_data.lunar_day_in_chinese)
-        lunar_month = ChineseCalendar.parse_chinese_month(self.calendar_data.lunar_month_in_chinese)
-        
-        birth_info_for_calculator = {
-            'year_stem': year_stem,
-            'year_branch': year_branch,
-            'ming_branch': ming_branch,
-            'lunar_day': lunar_day,
-            'lunar_month': lunar_month,
-            'lunar_hour_branch': ChineseCalendar.get_hour_branch(self.birth_info.hour),
-            'gender': self.birth_info.gender
-        }
+        if annual_fortune is None:
+            annual_fortune = self.calculate_annual_fortune(target_year)
         
         return self.star_calculator.calculate_monthly_fortune(
-            birth_info_for_calculator, 
-            self.palaces, 
+            self._fortune_birth_info(), 
+            self._render_palaces(), 
             annual_fortune,
             target_month
         )
     
     def calculate_daily_fortune(self, target_year: int = None, target_month: int = None, target_day: int = None):
         """計算流日"""
-        # 首先計算流年和流月
+        # 首先計算流年和流月（流月沿用同一份流年結果）
         annual_fortune = self.calculate_annual_fortune(target_year)
-        monthly_fortune = self.calculate_monthly_fortune(target_year, target_month)
-        
-        # 準備傳遞給StarCalculator的birth_info
-        year_stem = self.calendar_data.year_gan_zhi[0]  # 生年天干
-        year_branch = self.calendar_data.year_gan_zhi[1]  # 生年地支
-        ming_branch = self.palace_order[0]  # 命宮地支（第一個宮位）
+        monthly_fortune = self.calculate_monthly_fortune(target_year, target_month, annual_fortune=annual_fortune)
         
+        return self.star_calculator.calculate_daily_fortune(
+            self._fortune_birth_info(), 
+            self._render_palaces(), 
+            annual_fortune,
+            monthly_fortune,
+            target_day
+        )
+    
+    def _fortune_birth_info(self) -> Dict:
+        """準備傳遞給StarCalculator的birth_info（流年/流月/流日共用）"""
         # 從calendar_data中獲取農曆日期和月份
         lunar_day = ChineseCalendar.parse_chinese_day(self.calendar_data.lunar_day_in_chinese)
         lunar_month = ChineseCalendar.parse_chinese_month(self.calendar_data.lunar_month_in_chinese)
         
-        birth_info_for_calculator = {
-            'year_stem': year_stem,
-            'year_branch': year_branch,
-            'ming_branch': ming_branch,
+        return {
+            'year_stem': self.calendar_data.year_gan_zhi[0],  # 生年天干
+            'year_branch': self.calendar_data.year_gan_zhi[1],  # 生年地支
+            'ming_branch': self.palace_order[0],  # 命宮地支（第一個宮位）
             'lunar_day': lunar_day,
             'lunar_month': lunar_month,
             'lunar_hour_branch': ChineseCalendar.get_hour_branch(self.birth_info.hour),
             'gender': self.birth_info.gender
         }
         
-        return self.star_calculator.calculate_daily_fortune(
-            birth_info_for_calculator, 
-            self.palaces, 
-            annual_fortune,
-            monthly_fortune,
-            target_day
-        )
-        
-    def get_chart(self, include_major_limits: bool = False, current_age: int = None, include_minor_limits: bool = False, target_age: int = None) -> Dict:
+    def get_chart(self, include_major_limits: bool = False, current_age: int = None, include_minor_limits: bool = False, target_age: int = None, sihua_scopes: Optional[Tuple[str, ...]] = None) -> Dict:
         """
         獲取完整命盤數據
         
@@ -561,6 +556,7 @@ class PurpleStarChart:
             current_age: 當前年齡（用於計算大限）
             include_minor_limits: 是否包含小限
             target_age: 目標年齡（用於計算小限）
+            sihua_scopes: 要組合的四化層（例如 ("natal", "annual")），預設為 self.sihua_scopes
             
         Returns:
             命盤數據字典
@@ -594,7 +590,7 @@ class PurpleStarChart:
             }
             
             # 添加宮位資訊
-            for name, palace in self.palaces.items():
+            for name, palace in self._render_palaces(sihua_scopes).items():
                 chart_data["palaces"][name] = {
                     "name": palace.name,
                     "stars": palace.stars,
@@ -682,8 +678,8 @@ class PurpleStarChart:
         將原盤轉換為太極盤：根據太極點地支重新旋轉十二宮位
         
         這個方法會：
-        1. 將原本的 self.palaces 按太極點地支重新排序
-        2. 更新每個宮位的名稱、地支、天干、星曜位置
+        1. 以太極點地支為命宮，建立原盤的旋轉視圖（RotatedChartView）
+        2. 宮位名稱依太極盤重新命名，地支、天干、星曜直接共用原宮位
         3. 替換 self.palaces 為太極盤
         4. 後續所有計算都基於這個太極盤
         
@@ -693,70 +689,27 @@ class PurpleStarChart:
         try:
             logger.info(f"開始應用太極點旋轉，太極點地支：{taichi_branch}")
             
-            # 十二地支順序
-            branches = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
-            
-            # 十二宮位順序（以命宮為起點，保持傳統計算順序）
-            palace_names = ["命宮", "父母宮", "福德宮", "田宅宮", "官祿宮", "交友宮", 
-                           "遷移宮", "疾厄宮", "財帛宮", "子女宮", "夫妻宮", "兄弟宮"]
-            
-            # 找到太極點地支的索引
-            try:
-                taichi_index = branches.index(taichi_branch)
-            except ValueError:
+            if taichi_branch not in BRANCH_INDEX:
                 logger.error(f"無效的太極點地支: {taichi_branch}")
                 return  # 不執行旋轉
             
-            # 建立原盤地支到宮位對象的映射
-            original_branch_to_palace = {}
-            for palace_name, palace in self.palaces.items():
-                original_branch_to_palace[palace.branch] = palace
-            
-            logger.info(f"原盤地支對應：{list(original_branch_to_palace.keys())}")
-            
-            # 建立新的太極盤
-            new_palaces = {}
-            new_palace_order = []
-            # 初始化太極宮對映
-            self.taichi_palace_mapping = {}
+            # 建立旋轉視圖：共用原盤的宮位與星曜，不複製
+            taichi_palaces = RotatedChartView.from_palaces(self.palaces, taichi_branch, TAICHI_PALACE_NAMES)
             
-            for i in range(12):
-                # 計算新宮位對應的原始地支
-                original_branch_index = (taichi_index + i) % 12
-                original_branch = branches[original_branch_index]
-                
-                # 獲取原宮位對象
-                original_palace = original_branch_to_palace.get(original_branch)
-                if not original_palace:
-                    logger.warning(f"未找到地支 {original_branch} 對應的原宮位")
-                    continue
-                
-                # 建立新宮位名稱
-                new_palace_name = palace_names[i]
-                
-                # 儲存太極宮對映關係
-                self.taichi_palace_mapping[original_branch] = new_palace_name
-                
-                # 創建新的宮位對象，保留原宮位的星曜、天干、地支等屬性
-                new_palace = Palace(
-                    name=new_palace_name,
-                    stars=original_palace.stars.copy(),  # 星曜保持不變
-                    element=original_palace.element,     # 五行屬性保持不變
-                    stem=original_palace.stem,           # 天干保持不變
-                    branch=original_branch,              # 地支保持不變
-                    body_palace=original_palace.body_palace  # 身宮標記保持不變
-                )
-                
-                new_palaces[new_palace_name] = new_palace
-                new_palace_order.append(new_palace_name)
-                
-                logger.info(f"太極盤映射：{new_palace_name} ← 原{original_palace.name}（{original_branch}）")
+            # 太極宮對映：原始地支 -> 太極盤宮位名稱
+            self.taichi_palace_mapping = {
+                palace.branch: name for name, palace in taichi_palaces.items()
+            }
             
             # 替換原盤為太極盤
-            self.palaces = new_palaces
-            self.palace_order = new_palace_order
+            self.palaces = taichi_palaces
+            self.palace_order = list(taichi_palaces)
+            
+            # 太極點宮干作為太極四化層
+            if "命宮" in taichi_palaces:
+                self.sihua.set_layer("taichi", taichi_palaces["命宮"].stem)
             
-            logger.info(f"太極盤轉換完成，新宮位順序：{new_palace_order}")
+            logger.info(f"太極盤轉換完成，新宮位順序：{self.palace_order}")
             logger.info(f"太極點命宮地支：{taichi_branch}，現在對應「命宮」")
             
         except Exception as e:
@@ -789,27 +742,16 @@ class PurpleStarChart:
             
             logger.info(f"四化星：{sihua_stars}")
             
-            # 2. 在太極盤中找到四化星的宮位並獲取解釋
+            # 2. 在太極盤中找到四化星的宮位並獲取解釋（星曜 -> 宮位索引只建立一次）
             results = []
+            star_palaces = star_palace_index(self.palaces)
             
             for trans_type, star_name in sihua_stars.items():
                 # 清理星曜名稱
                 clean_star_name = star_name.replace("化祿", "").replace("化權", "").replace("化科", "").replace("化忌", "").strip()
                 
                 # 在太極盤中找到星曜所在的宮位
-                star_palace = None
-                for palace_name, palace in self.palaces.items():
-                    for star in palace.stars:
-                        clean_palace_star = str(star).replace("化祿", "").replace("化權", "").replace("化科", "").replace("化忌", "")
-                        if "（" in clean_palace_star:
-                            clean_palace_star = clean_palace_star.split("（")[0]
-                        clean_palace_star = clean_palace_star.strip()
-                        
-                        if clean_palace_star == clean_star_name:
-                            star_palace = palace_name
-                            break
-                    if star_palace:
-                        break
+                star_palace = star_palaces.get(clean_star_name)
                 
                 if not star_palace:
                     logger.warning(f"未在太極盤中找到星曜 {star_name}")
@@ -0,0 +1,109 @@
+"""
+四化疊加層
+宮位中的星曜只保存星名與狀態（例如「太陽（入廟）」），
+生年、自定義天干、大限、流年、流月、流日、太極等四化各自是一層「星曜 -> 四化類型」的對照，
+只在輸出時才組合成「太陽（入廟）化祿」這樣的字串，切換或疊加四化不需要改動宮位資料。
+"""
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+from app.logic.star_calculator import StarCalculator
+
+logger = logging.getLogger(__name__)
+
+SIHUA_TYPES = ("祿", "權", "科", "忌")
+
+# 四化層（同時套用多層時依此順序組合）
+SIHUA_SCOPES = ("natal", "custom", "major_limit", "annual", "monthly", "daily", "taichi")
+
+
+def base_star_name(star: str) -> str:
+    """去除狀態描述與四化標記，例如「太陽（入廟）化祿」->「太陽」"""
+    name = star.split("（")[0] if "（" in star else star
+    for sihua_type in SIHUA_TYPES:
+        if name.endswith(f"化{sihua_type}"):
+            return name[:-2]
+    return name
+
+
+@lru_cache(maxsize=16)
+def _stem_table(stem: str) -> Dict[str, str]:
+    """天干 -> {星曜: 四化類型}"""
+    return {star: sihua_type for sihua_type, star in StarCalculator.FOUR_TRANSFORMATIONS.get(stem, {}).items()}
+
+
+@dataclass(frozen=True)
+class SihuaLayer:
+    """單一四化層"""
+    scope: str
+    stem: str
+    stars: Mapping[str, str]  # 星曜 -> 四化類型
+
+    @classmethod
+    def from_stem(cls, scope: str, stem: str) -> "SihuaLayer":
+        return cls(scope=scope, stem=stem, stars=_stem_table(stem))
+
+
+class SihuaOverlay:
+    """四化疊加層集合"""
+
+    def __init__(self):
+        self._layers: Dict[str, SihuaLayer] = {}
+
+    def set_layer(self, scope: str, stem: str) -> Optional[SihuaLayer]:
+        """
+        設定某一層的天干（O(4)）
+
+        Returns:
+            設定後的層；天干不在四化表中時移除該層並返回 None
+        """
+        if scope not in SIHUA_SCOPES:
+            raise ValueError(f"未知的四化層: {scope}")
+        if stem not in StarCalculator.FOUR_TRANSFORMATIONS:
+            logger.error(f"天干 {stem} 不在四化對照表中")
+            self._layers.pop(scope, None)
+            return None
+        layer = SihuaLayer.from_stem(scope, stem)
+        self._layers[scope] = layer
+        return layer
+
+    def get_layer(self, scope: str) -> Optional[SihuaLayer]:
+        return self._layers.get(scope)
+
+    def remove_layer(self, scope: str):
+        self._layers.pop(scope, None)
+
+    def transformations(self, star_name: str, scopes: Sequence[str]) -> List[str]:
+        """某星曜在指定各層的四化類型（依層順序，去除重複）"""
+        result: List[str] = []
+        for scope in scopes:
+            layer = self._layers.get(scope)
+            if layer is None:
+                continue
+            sihua_type = layer.stars.get(star_name)
+            if sihua_type and sihua_type not in result:
+                result.append(sihua_type)
+        return result
+
+    def render_star(self, star: str, scopes: Sequence[str]) -> str:
+        """組合星曜字串，例如「太陽（入廟）」+ 生年化祿 ->「太陽（入廟）化祿」"""
+        sihua_types = self.transformations(base_star_name(star), scopes)
+        if not sihua_types:
+            return star
+        return star + "".join(f"化{sihua_type}" for sihua_type in sihua_types)
+
+    def render_stars(self, stars: Iterable[str], scopes: Sequence[str]) -> List[str]:
+        if not scopes or not self._layers:
+            return list(stars)
+        return [self.render_star(star, scopes) for star in stars]
+
+
+def star_palace_index(palaces: Mapping) -> Dict[str, str]:
+    """星曜 -> 所在宮位名稱（同名星曜取第一個宮位）"""
+    index: Dict[str, str] = {}
+    for palace_name, palace in palaces.items():
+        for star in palace.stars:
+            index.setdefault(base_star_name(star), palace_name)
+    return index
@@ -1,11 +1,22 @@
+import sys
 from typing import Dict, List, Optional, Tuple
 from app.models.stars import Star, star_registry
 from app.utils.chinese_calendar import ChineseCalendar
 from app.data.heavenly_stems.four_transformations import four_transformations_explanations
+from app.logic.palace_view import BRANCH_INDEX, named_branch_slots
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 流年、流月、流日十二宮名稱（固定順序，由該期命宮起順時針）
+ANNUAL_PALACE_NAMES = (
+    "流年命宮", "流年父母", "流年福德", "流年田宅",
+    "流年官祿", "流年交友", "流年遷移", "流年疾厄",
+    "流年財帛", "流年子女", "流年夫妻", "流年兄弟"
+)
+MONTHLY_PALACE_NAMES = tuple(name.replace("流年", "流月") for name in ANNUAL_PALACE_NAMES)
+DAILY_PALACE_NAMES = tuple(name.replace("流年", "流日") for name in ANNUAL_PALACE_NAMES)
+
 class StarCalculator:
     """星曜計算工具類"""
     
@@ -320,13 +331,15 @@ class StarCalculator:
     def __init__(self):
         self.stars = {}
 
-    def calculate_stars(self, birth_info: Dict, palaces: Dict):
+    def calculate_stars(self, birth_info: Dict, palaces: Dict, apply_transformations: bool = True):
         """
         計算所有星曜位置。
 
         Args:
             birth_info (Dict): 包含生辰資訊的字典
             palaces (Dict): 宮位資訊字典
+            apply_transformations (bool): 是否將生年四化標記寫入星曜字串；
+                PurpleStarChart 改以四化疊加層（SihuaOverlay）在輸出時組合
         """
         # 1. 定命宮和身宮
         self._determine_life_and_body_palace(birth_info, palaces)
@@ -356,7 +369,8 @@ class StarCalculator:
         self._place_fire_bell_stars(birth_info, palaces)
         
         # 10. 安放四化（祿權科忌）
-        self._apply_four_transformations(birth_info, palaces)
+        if apply_transformations:
+            self._apply_four_transformations(birth_info, palaces)
     
     def _determine_five_elements_bureau(self, year_stem: str, ming_branch: str) -> str:
         """
@@ -450,7 +464,7 @@ class StarCalculator:
                                 if existing_star_name == star_name:
                                     # 找到已存在的星曜，更新其狀態
                                     if state:
-                                        updated_stars.append(f"{star_name}（{state}）")
+                                        updated_stars.append(sys.intern(f"{star_name}（{state}）"))
                                     else:
                                         updated_stars.append(star_name)
                                     existing_star_found = True
@@ -463,7 +477,7 @@ class StarCalculator:
                             else:
                                 # 星曜不存在，添加新星曜
                                 if state:
-                                    palace_info.stars.append(f"{star_name}（{state}）")
+                                    palace_info.stars.append(sys.intern(f"{star_name}（{state}）"))
                                 else:
                                     palace_info.stars.append(star_name)
                         break
@@ -1240,42 +1254,32 @@ class StarCalculator:
         計算流年十二宮
         
         Args:
-            palaces: 本命宮位資訊
+            palaces: 本命宮位資訊（字典或太極盤視圖）
             annual_ming_branch: 流年命宮地支
             
         Returns:
             Dict: 流年宮位對應關係
         """
-        # 流年十二宮名稱（固定順序）
-        annual_palace_names = [
-            "流年命宮", "流年父母", "流年福德", "流年田宅", 
-            "流年官祿", "流年交友", "流年遷移", "流年疾厄", 
-            "流年財帛", "流年子女", "流年夫妻", "流年兄弟"
-        ]
-        
-        # 從流年命宮開始，按地支順序排列
-        annual_ming_index = self.EARTHLY_BRANCHES.index(annual_ming_branch)
+        # 以流年命宮為起點的旋轉：第 i 個流年宮位對應地支索引 (流年命宮 + i) % 12
+        annual_ming_index = BRANCH_INDEX[annual_ming_branch]
+        natal_slots = named_branch_slots(palaces)
         annual_palaces = {}
         
-        for i, annual_name in enumerate(annual_palace_names):
-            # 計算該流年宮位對應的地支
-            branch_index = (annual_ming_index + i) % 12
-            branch = self.EARTHLY_BRANCHES[branch_index]
-            
+        for i, annual_name in enumerate(ANNUAL_PALACE_NAMES):
             # 找到本命盤中對應該地支的宮位
-            corresponding_palace = None
-            for palace_name, palace_info in palaces.items():
-                if palace_info.branch == branch:
-                    corresponding_palace = {
-                        "本命宮位": palace_name,
-                        "地支": branch,
-                        "天干": palace_info.stem,
-                        "五行": palace_info.element,
-                        "星曜": palace_info.stars.copy()
-                    }
-                    break
+            slot = natal_slots[(annual_ming_index + i) % 12]
+            if slot is None:
+                annual_palaces[annual_name] = None
+                continue
             
-            annual_palaces[annual_name] = corresponding_palace
+            palace_name, palace_info = slot
+            annual_palaces[annual_name] = {
+                "本命宮位": palace_name,
+                "地支": palace_info.branch,
+                "天干": palace_info.stem,
+                "五行": palace_info.element,
+                "星曜": list(palace_info.stars)
+            }
         
         return annual_palaces
     
@@ -1325,10 +1329,8 @@ class StarCalculator:
         Returns:
             str: 宮位名稱
         """
-        for palace_name, palace_info in palaces.items():
-            if palace_info.branch == target_branch:
-                return palace_name
-        return None
+        slot = named_branch_slots(palaces)[BRANCH_INDEX[target_branch]]
+        return slot[0] if slot else None
     
     def _find_annual_palace_branch(self, annual_fortune: Dict, target_palace_name: str) -> str:
         """
@@ -1369,43 +1371,31 @@ class StarCalculator:
         if not monthly_start_branch:
             return {}
         
-        # 流月十二宮名稱（固定順序）
-        monthly_palace_names = [
-            "流月命宮", "流月父母", "流月福德", "流月田宅", 
-            "流月官祿", "流月交友", "流月遷移", "流月疾厄", 
-            "流月財帛", "流月子女", "流月夫妻", "流月兄弟"
-        ]
-        
         # 計算目標月份的流月命宮位置
         # 一月在起始位置，二月在下一位置，以此類推
-        start_index = self.EARTHLY_BRANCHES.index(monthly_start_branch)
-        target_month_index = (start_index + target_month - 1) % 12
-        target_month_branch = self.EARTHLY_BRANCHES[target_month_index]
+        target_month_index = (BRANCH_INDEX[monthly_start_branch] + target_month - 1) % 12
+        
+        # 流年宮位依地支索引排列，之後每個流月宮位都是 O(1) 查詢
+        annual_slots = self._period_branch_slots(annual_fortune.get("流年宮位", {}))
         
         # 從目標月份的流月命宮開始，按地支順序排列流月十二宮
         monthly_palaces = {}
-        annual_palaces = annual_fortune.get("流年宮位", {})
-        
-        for i, monthly_name in enumerate(monthly_palace_names):
-            # 計算該流月宮位對應的地支
-            branch_index = (target_month_index + i) % 12
-            branch = self.EARTHLY_BRANCHES[branch_index]
-            
-            # 找到流年盤中對應該地支的宮位資訊
-            corresponding_palace = None
-            for annual_palace_name, annual_palace_info in annual_palaces.items():
-                if annual_palace_info and annual_palace_info.get("地支") == branch:
-                    corresponding_palace = {
-                        "流年宮位": annual_palace_name,
-                        "本命宮位": annual_palace_info.get("本命宮位"),
-                        "地支": branch,
-                        "天干": annual_palace_info.get("天干"),
-                        "五行": annual_palace_info.get("五行"),
-                        "星曜": annual_palace_info.get("星曜", []).copy()
-                    }
-                    break
+        for i, monthly_name in enumerate(MONTHLY_PALACE_NAMES):
+            slot = annual_slots[(target_month_index + i) % 12]
+            if slot is None:
+                monthly_palaces[monthly_name] = None
+                continue
             
-            monthly_palaces[monthly_name] = corresponding_palace
+            # 星曜列表與流年盤共用（流年盤渲染時已複製）
+            annual_palace_name, annual_palace_info = slot
+            monthly_palaces[monthly_name] = {
+                "流年宮位": annual_palace_name,
+                "本命宮位": annual_palace_info.get("本命宮位"),
+                "地支": annual_palace_info.get("地支"),
+                "天干": annual_palace_info.get("天干"),
+                "五行": annual_palace_info.get("五行"),
+                "星曜": list(annual_palace_info.get("星曜", []))
+            }
         
         return monthly_palaces
     
@@ -1496,64 +1486,52 @@ class StarCalculator:
         if not daily_start_branch:
             return {}
         
-        # 流日十二宮名稱（固定順序）
-        daily_palace_names = [
-            "流日命宮", "流日父母", "流日福德", "流日田宅", 
-            "流日官祿", "流日交友", "流日遷移", "流日疾厄", 
-            "流日財帛", "流日子女", "流日夫妻", "流日兄弟"
-        ]
-        
         # 計算目標日期的流日命宮位置
         # 一日在起始位置，二日在下一位置，以此類推
-        start_index = self.EARTHLY_BRANCHES.index(daily_start_branch)
-        target_day_index = (start_index + target_day - 1) % 12
-        target_day_branch = self.EARTHLY_BRANCHES[target_day_index]
+        target_day_index = (BRANCH_INDEX[daily_start_branch] + target_day - 1) % 12
+        
+        annual_slots = self._period_branch_slots(annual_fortune.get("流年宮位", {}))
+        monthly_slots = self._period_branch_slots(monthly_fortune.get("流月宮位", {}))
         
         # 從目標日期的流日命宮開始，按地支順序排列流日十二宮
         daily_palaces = {}
-        annual_palaces = annual_fortune.get("流年宮位", {})
-        monthly_palaces = monthly_fortune.get("流月宮位", {})
-        
-        for i, daily_name in enumerate(daily_palace_names):
-            # 計算該流日宮位對應的地支
+        for i, daily_name in enumerate(DAILY_PALACE_NAMES):
             branch_index = (target_day_index + i) % 12
-            branch = self.EARTHLY_BRANCHES[branch_index]
             
             # 找到對應的宮位資訊（優先從流月盤中找，再從流年盤中找）
-            corresponding_palace = None
-            
-            # 先從流月盤中找
-            for monthly_palace_name, monthly_palace_info in monthly_palaces.items():
-                if monthly_palace_info and monthly_palace_info.get("地支") == branch:
-                    corresponding_palace = {
-                        "流月宮位": monthly_palace_name,
-                        "流年宮位": monthly_palace_info.get("流年宮位"),
-                        "本命宮位": monthly_palace_info.get("本命宮位"),
-                        "地支": branch,
-                        "天干": monthly_palace_info.get("天干"),
-                        "五行": monthly_palace_info.get("五行"),
-                        "星曜": monthly_palace_info.get("星曜", []).copy()
-                    }
-                    break
-            
-            # 如果流月盤中沒找到，從流年盤中找
-            if not corresponding_palace:
-                for annual_palace_name, annual_palace_info in annual_palaces.items():
-                    if annual_palace_info and annual_palace_info.get("地支") == branch:
-                        corresponding_palace = {
-                            "流月宮位": None,
-                            "流年宮位": annual_palace_name,
-                            "本命宮位": annual_palace_info.get("本命宮位"),
-                            "地支": branch,
-                            "天干": annual_palace_info.get("天干"),
-                            "五行": annual_palace_info.get("五行"),
-                            "星曜": annual_palace_info.get("星曜", []).copy()
-                        }
-                        break
+            if monthly_slots[branch_index] is not None:
+                monthly_palace_name, palace_info = monthly_slots[branch_index]
+                annual_palace_name = palace_info.get("流年宮位")
+            elif annual_slots[branch_index] is not None:
+                monthly_palace_name = None
+                annual_palace_name, palace_info = annual_slots[branch_index]
+            else:
+                daily_palaces[daily_name] = None
+                continue
             
-            daily_palaces[daily_name] = corresponding_palace
+            daily_palaces[daily_name] = {
+                "流月宮位": monthly_palace_name,
+                "流年宮位": annual_palace_name,
+                "本命宮位": palace_info.get("本命宮位"),
+                "地支": palace_info.get("地支"),
+                "天干": palace_info.get("天干"),
+                "五行": palace_info.get("五行"),
+                "星曜": list(palace_info.get("星曜", []))
+            }
         
         return daily_palaces
+    
+    @staticmethod
+    def _period_branch_slots(period_palaces: Dict) -> List[Optional[Tuple[str, Dict]]]:
+        """將流年/流月宮位依地支索引排列（同地支取第一個）"""
+        slots: List[Optional[Tuple[str, Dict]]] = [None] * 12
+        for palace_name, palace_info in period_palaces.items():
+            if not palace_info:
+                continue
+            index = BRANCH_INDEX.get(palace_info.get("地支"))
+            if index is not None and slots[index] is None:
+                slots[index] = (palace_name, palace_info)
+        return slots
 
     def get_explanation_for_palace(self, star_name: str, transformation_type: str, palace_name: str, birth_info: Dict) -> Dict:
         """
@@ -0,0 +1,192 @@
+"""
+太極盤快照存儲
+太極盤（四化結果、太極宮對映、十二宮資料）只取決於占卜時間與性別，同一時段的占卜內容完全相同。
+占卜記錄只保存時段鍵、算法版本與快照雜湊；內容以 SHA-256 定址、zlib 壓縮後在 taichi_chart_snapshots 只存一份。
+讀取時經由進程內 LRU 快取還原，查看詳細解釋等路徑不必重複解壓。
+
+算法版本與綁定命盤、ETag 共用 CHART_ALGORITHM_VERSION；同一時段、版本相符的既有快照可直接沿用，不必重新排盤。
+"""
+import hashlib
+import json
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.logic.chart_version import CHART_ALGORITHM_VERSION
+from app.models.linebot_models import DivinationHistory, TaichiChartSnapshot
+
+logger = logging.getLogger(__name__)
+
+CHART_JSON_FIELDS = ("sihua_results", "taichi_palace_mapping", "taichi_chart_data")
+DEFAULT_CACHE_ENTRIES = 1024
+DEFAULT_COMPACT_BATCH_SIZE = 500
+DEFAULT_COMPACT_MAX_BATCHES = 20
+
+
+def taichi_slot_key(when: datetime, gender: str) -> str:
+    """占卜時段鍵：精確到分鐘的時間與性別，例如 202610181230-M"""
+    return f"{when:%Y%m%d%H%M}-{gender}"
+
+
+def _canonical(contents: Dict[str, Optional[str]]) -> bytes:
+    return json.dumps({field: contents.get(field) for field in CHART_JSON_FIELDS},
+                      ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+
+def content_hash(contents: Dict[str, Optional[str]]) -> str:
+    return hashlib.sha256(_canonical(contents)).hexdigest()
+
+
+@dataclass
+class SnapshotStats:
+    """快照存儲統計"""
+    saves: int = 0
+    inserted: int = 0
+    deduplicated: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    missing: int = 0
+    evictions: int = 0
+    slot_hits: int = 0
+    slot_misses: int = 0
+
+
+class TaichiSnapshotStore:
+    """內容定址的太極盤快照（寫入去重、讀取經 LRU 快取）"""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Dict[str, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = SnapshotStats()
+
+    def save(self, db: Session, contents: Dict[str, Optional[str]]) -> str:
+        """
+        保存快照（已存在時不重複寫入），回傳內容雜湊
+
+        與占卜記錄在同一個交易中提交；並發寫入同一份內容時以 savepoint 吸收主鍵衝突
+        """
+        canonical = _canonical(contents)
+        digest = hashlib.sha256(canonical).hexdigest()
+        inserted = False
+        if db.get(TaichiChartSnapshot, digest) is None:
+            try:
+                with db.begin_nested():
+                    db.add(TaichiChartSnapshot(
+                        content_hash=digest, payload=zlib.compress(canonical), raw_bytes=len(canonical),
+                    ))
+                inserted = True
+            except IntegrityError:
+                pass
+        with self._lock:
+            self._stats.saves += 1
+            if inserted:
+                self._stats.inserted += 1
+            else:
+                self._stats.deduplicated += 1
+        # 快取以內容雜湊為鍵，即使外層交易回滾內容仍然正確
+        self._remember(digest, {field: contents.get(field) for field in CHART_JSON_FIELDS})
+        return digest
+
+    def load(self, db: Session, digest: str) -> Optional[Dict[str, Optional[str]]]:
+        """依雜湊取得快照內容（JSON 字串），不存在時回傳 None"""
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                self._stats.cache_hits += 1
+                return dict(cached)
+            self._stats.cache_misses += 1
+        snapshot = db.get(TaichiChartSnapshot, digest)
+        if snapshot is None:
+            with self._lock:
+                self._stats.missing += 1
+            logger.warning(f"找不到太極盤快照 {digest}")
+            return None
+        contents = json.loads(zlib.decompress(snapshot.payload).decode("utf-8"))
+        self._remember(digest, contents)
+        return dict(contents)
+
+    def load_slot(self, db: Session, chart_slot: str,
+                  chart_version: str = CHART_ALGORITHM_VERSION) -> Optional[Dict[str, Optional[str]]]:
+        """
+        取得同一時段、同一算法版本已保存的快照內容，沒有時回傳 None
+
+        算法版本不符（或舊記錄轉換時版本為空）的快照不會沿用
+        """
+        digest = db.query(DivinationHistory.snapshot_hash).filter(
+            DivinationHistory.chart_slot == chart_slot,
+            DivinationHistory.chart_version == chart_version,
+            DivinationHistory.snapshot_hash.isnot(None),
+        ).limit(1).scalar()
+        contents = self.load(db, digest) if digest else None
+        with self._lock:
+            if contents is None:
+                self._stats.slot_misses += 1
+            else:
+                self._stats.slot_hits += 1
+        return contents
+
+    def _remember(self, digest: str, contents: Dict[str, Optional[str]]):
+        with self._lock:
+            self._cache[digest] = contents
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self._stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = asdict(self._stats)
+            stats["cached_snapshots"] = len(self._cache)
+        return stats
+
+
+def compact_inline_divinations(db: Session, store: Optional[TaichiSnapshotStore] = None,
+                               batch_size: int = DEFAULT_COMPACT_BATCH_SIZE,
+                               max_batches: int = DEFAULT_COMPACT_MAX_BATCHES) -> int:
+    """
+    把舊記錄內嵌的 JSON 欄位轉為快照參照（算法版本未知，chart_version 保持 NULL）
+
+    Returns:
+        轉換筆數；達到 max_batches 時剩下的留給下一次執行
+    """
+    store = store or taichi_snapshot_store
+    inline = or_(*[getattr(DivinationHistory, field).isnot(None) for field in CHART_JSON_FIELDS])
+    compacted = 0
+    try:
+        for _ in range(max_batches):
+            records = db.query(DivinationHistory).filter(
+                DivinationHistory.snapshot_hash.is_(None), inline
+            ).order_by(DivinationHistory.id).limit(batch_size).all()
+            if not records:
+                break
+            for record in records:
+                record.snapshot_hash = store.save(db, {field: getattr(record, field) for field in CHART_JSON_FIELDS})
+                record.chart_slot = taichi_slot_key(record.divination_time, record.gender)
+                for field in CHART_JSON_FIELDS:
+                    setattr(record, field, None)
+            db.commit()
+            compacted += len(records)
+            if len(records) < batch_size:
+                break
+    except Exception:
+        db.rollback()
+        raise
+    return compacted
+
+
+# 全局太極盤快照存儲實例
+taichi_snapshot_store = TaichiSnapshotStore()
@@ -10,9 +10,11 @@ from typing import Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
+from app.logic.bound_chart_store import bound_chart_store
 from app.models.linebot_models import LineBotUser
 from app.models.pending_binding import PendingBinding
 from app.db.database import get_db
+from app.utils.maintenance import purge_expired_pending_bindings
 
 logger = logging.getLogger(__name__)
 
@@ -122,11 +124,7 @@ class UserBindingManager:
                 }
             
             # 執行綁定
-            line_user.system_user_id = target_user_id
-            binding.is_used = True
-            binding.used_at = get_current_taipei_time()
-            
-            db.commit()
+            self.complete_binding(db, binding, line_user, target_user_id)
             
             return {
                 "success": True,
@@ -150,6 +148,20 @@ class UserBindingManager:
                 "error": "綁定過程發生錯誤"
             }
     
+    def complete_binding(self, db: Session, pending_binding: PendingBinding, line_user: LineBotUser,
+                         target_user_id: str) -> None:
+        """
+        完成綁定：標記待綁定記錄已使用，並以其出生資料計算一次命盤寫入快照
+        
+        綁定與命盤快照在同一個交易中提交；之後查詢綁定命盤只讀取快照
+        """
+        line_user.system_user_id = target_user_id
+        pending_binding.is_used = True
+        pending_binding.used_at = get_current_taipei_time()
+        if pending_binding.birth_data:
+            bound_chart_store.bind(db, line_user.line_user_id, pending_binding.birth_data, commit=False)
+        db.commit()
+    
     def cleanup_expired_bindings(self, db: Session) -> int:
         """
         清理過期的綁定記錄
@@ -161,15 +173,7 @@ class UserBindingManager:
             int: 清理的記錄數量
         """
         try:
-            expired_count = db.query(PendingBinding).filter(
-                PendingBinding.expires_at < get_current_taipei_time()
-            ).count()
-            
-            db.query(PendingBinding).filter(
-                PendingBinding.expires_at < get_current_taipei_time()
-            ).delete()
-            
-            db.commit()
+            expired_count = purge_expired_pending_bindings(db)
             
             logger.info(f"清理了 {expired_count} 條過期綁定記錄")
             return expired_count
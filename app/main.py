@@ -2,17 +2,13 @@
 FastAPI 主應用程序
 """
 import os
+import asyncio
 import subprocess
 import sys
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.staticfiles import StaticFiles
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 from app.api import routes
 from app.api import divination_routes
 from app.api import time_divination_routes
@@ -22,36 +18,30 @@ from app.api import protected_routes
 from app.api import payment_routes
 from app.api import chart_binding_routes
 from app.api import webhook_new  # New LINE Bot webhook (重構版)
+from app.api import metrics_routes
 from app.logic.divination_logic import divination_logic
 from datetime import datetime, timezone, timedelta
 from fastapi import Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import get_db, pool_sizer, read_router
 import logging
 from app.utils.security_middleware import security_check_middleware
+from app.utils.rate_limiter import rate_limiter
+from app.utils.logging_config import configure_logging
+from app.utils.auth_tokens import auth_token_service
+from app.logic.device_manager import device_manager
+from app.utils.maintenance import maintenance_scheduler
+from app.utils.static_assets import CachedStaticFiles
 
 # 台北時區
 TAIPEI_TZ = timezone(timedelta(hours=8))
 
-class TaipeiFormatter(logging.Formatter):
-    """台北時區的日誌格式化器"""
-    def formatTime(self, record, datefmt=None):
-        dt = datetime.fromtimestamp(record.created, tz=TAIPEI_TZ)
-        if datefmt:
-            return dt.strftime(datefmt)
-        else:
-            return dt.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
-
-# 設置日誌，使用台北時區
-logging.basicConfig(level=logging.INFO)
+# 設置日誌（台北時區、背景執行緒批次寫入）
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# 為所有處理程序設置台北時區格式化器
-for handler in logging.root.handlers:
-    handler.setFormatter(TaipeiFormatter('%(asctime)s - %(levelname)s - %(message)s'))
-
-# 速率限制器
-limiter = Limiter(key_func=get_remote_address)
+# 速率限制器（與其他路由共用同一個計數後端）
+limiter = rate_limiter
 
 def run_database_migrations():
     """在應用啟動時運行數據庫遷移"""
@@ -103,12 +93,29 @@ async def lifespan(app: FastAPI):
     run_database_migrations()
     init_test_data()
     # setup_rich_menu() 已被移除，因為新的 Handler 會在初始化時自動同步
+    usage_flusher = asyncio.create_task(rate_limiter.run_usage_flusher())
+    revocation_refresher = asyncio.create_task(auth_token_service.run_revocation_refresher())
+    expiry_sweeper = asyncio.create_task(maintenance_scheduler.run_forever())
+    background_tasks = [expiry_sweeper, revocation_refresher, usage_flusher]
+    if pool_sizer is not None:
+        background_tasks.append(asyncio.create_task(pool_sizer.run()))
+    if read_router.replicas:
+        background_tasks.append(asyncio.create_task(read_router.run_lag_monitor()))
     logger.info("應用啟動完成")
     
     yield
     
     # 關閉時執行
     logger.info("應用正在關閉...")
+    for task in background_tasks:
+        task.cancel()
+    for task in background_tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    # 寫回尚未寫入的設備 last_seen（平時由維護排程定期寫回）
+    await asyncio.to_thread(device_manager.flush_last_seen)
 
 app = FastAPI(
     title="Purple Star Astrology API",
@@ -117,17 +124,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# 添加靜態文件支持
+# 添加靜態文件支持（static/build 內為內容雜湊檔名的建置版本，可長期快取）
 static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
 if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+    app.mount("/static", CachedStaticFiles(directory=static_dir), name="static")
     logger.info(f"靜態文件服務已啟用，目錄: {static_dir}")
 else:
     logger.warning(f"靜態文件目錄不存在: {static_dir}")
 
 assets_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets")
 if os.path.exists(assets_dir):
-    app.mount("/assets", StaticFiles(directory=assets_dir), name="assets")
+    app.mount("/assets", CachedStaticFiles(directory=assets_dir), name="assets")
     logger.info(f"Assets 文件服務已啟用，目錄: {assets_dir}")
 else:
     logger.warning(f"Assets 文件目錄不存在: {assets_dir}")
@@ -152,10 +159,8 @@ app.add_middleware(
     max_age=3600,  # 預檢請求快取時間
 )
 
-# 3. 速率限制中間件
+# 3. 速率限制（由各端點的 @limiter.limit 裝飾器檢查，超過時回應 429）
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
 
 # 4. 請求大小限制中間件
 @app.middleware("http")
@@ -195,6 +200,10 @@ async def add_security_headers(request: Request, call_next):
 # 6. 安全檢查中間件
 app.middleware("http")(security_check_middleware)
 
+# 7. 讀取副本的 read-your-writes cookie（多個 worker 共用）
+if read_router.replicas:
+    app.middleware("http")(read_router.read_your_writes_middleware)
+
 # API路由
 app.include_router(routes.router, prefix="/api")
 app.include_router(divination_routes.router)
@@ -205,6 +214,7 @@ app.include_router(protected_routes.router, prefix="/api")
 app.include_router(payment_routes.router, prefix="/api/payment")
 app.include_router(chart_binding_routes.router, prefix="/api")
 app.include_router(webhook_new.router, prefix="/api/webhook_new")
+app.include_router(metrics_routes.router)
 
 @app.get("/")
 @limiter.limit("10/minute")  # 首頁限制
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 class CalendarData(Base):
     __tablename__ = 'calendar_data'
+    __table_args__ = (
+        # CalendarRepository 以年月日時查詢
+        Index('ix_calendar_data_ymdh', 'gregorian_year', 'gregorian_month', 'gregorian_day', 'gregorian_hour'),
+    )
 
     id = Column(Integer, primary_key=True)
     gregorian_datetime = Column(DateTime, nullable=False, index=True)
@@ -1,7 +1,7 @@
 """
 LINE Bot 資料庫模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint, text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint, Index, LargeBinary, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, timedelta
@@ -133,15 +133,53 @@ class DivinationHistory(Base):
     # 完整太極盤資料 (JSON格式存儲，可選)
     taichi_chart_data = Column(Text)  # 存儲完整太極盤資料的JSON
     
+    # 太極盤快照參照（新記錄的上述 JSON 欄位為空，內容依雜湊存於 taichi_chart_snapshots）
+    chart_slot = Column(String(32))     # 占卜時段鍵，例如 202610181230-M
+    chart_version = Column(String(16))  # 排盤演算法版本 CHART_ALGORITHM_VERSION（舊記錄轉換時為空）
+    snapshot_hash = Column(String(64))  # taichi_chart_snapshots.content_hash
+    
     # 時間戳
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # 關聯
     user = relationship("LineBotUser", back_populates="divination_history")
     
+    # PostgreSQL 上依 divination_time 按月分區（見 app/logic/divination_history.py）
+    __table_args__ = (
+        Index("ix_divination_history_user_id_divination_time", "user_id", "divination_time"),
+        Index("ix_divination_history_divination_time", "divination_time"),
+        Index("ix_divination_history_chart_slot", "chart_slot"),
+    )
+    
     def __repr__(self):
         return f"<DivinationHistory(user_id={self.user_id}, time='{self.divination_time}')>"
 
+class TaichiChartSnapshot(Base):
+    """太極盤快照表（內容定址，相同的太極盤只存一份）"""
+    __tablename__ = LineBotConfig.Tables.TAICHI_CHART_SNAPSHOTS
+    
+    content_hash = Column(String(64), primary_key=True)  # 未壓縮內容的 SHA-256
+    payload = Column(LargeBinary, nullable=False)  # zlib 壓縮的 JSON 欄位
+    raw_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<TaichiChartSnapshot(content_hash={self.content_hash[:12]})>"
+
+class DivinationHistoryArchive(Base):
+    """占卜歷史歸檔表（超過保留期的記錄，JSON 欄位以 zlib 壓縮保存）"""
+    __tablename__ = LineBotConfig.Tables.DIVINATION_HISTORY_ARCHIVE
+    
+    history_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    divination_time = Column(DateTime, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # zlib 壓縮的 JSON 欄位
+    raw_bytes = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<DivinationHistoryArchive(history_id={self.history_id}, time='{self.divination_time}')>"
+
 class ChartBinding(Base):
     """命盤綁定表"""
     __tablename__ = LineBotConfig.Tables.CHART_BINDINGS
@@ -176,6 +214,16 @@ class ChartBinding(Base):
     def __repr__(self):
         return f"<ChartBinding(user_id={self.user_id}, birth={self.birth_year}/{self.birth_month}/{self.birth_day})>"
 
+class ProcessedWebhookEvent(Base):
+    """已處理的 webhook 事件（多個 worker 共用的去重記錄）"""
+    __tablename__ = "processed_webhook_events"
+    
+    webhook_event_id = Column(String(64), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<ProcessedWebhookEvent(webhook_event_id='{self.webhook_event_id}')>"
+
 class UserSession(Base):
     """用戶對話狀態表"""
     __tablename__ = "linebot_user_sessions"
@@ -189,7 +237,7 @@ class UserSession(Base):
     
     # 時間戳
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f"<UserSession(line_user_id='{self.line_user_id}', state='{self.current_state}')>"
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Float, Integer, String
+from app.db.database import Base
+
+class RevokedAuthToken(Base):
+    """已撤銷的存取權杖（token_id 為空時表示撤銷該用戶在 revoked_at 之前發行的所有權杖）"""
+    __tablename__ = "revoked_auth_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    token_id = Column(String(32), nullable=True, index=True)
+    user_id = Column(String(100), nullable=True, index=True)
+    
+    # epoch 秒；過期後權杖本身已失效，記錄可以清除
+    revoked_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<RevokedAuthToken(user_id='{self.user_id}', token_id='{self.token_id}')>"
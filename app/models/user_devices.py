@@ -1,10 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index
 from sqlalchemy.sql import func
 from app.db.database import Base
 from datetime import datetime, timedelta
 
 class UserDevice(Base):
     __tablename__ = "user_devices"
+    __table_args__ = (
+        # 查詢用戶的活躍設備
+        Index("ix_user_devices_user_id_last_seen", "user_id", "last_seen"),
+        # 背景清理依 last_seen 範圍刪除
+        Index("ix_user_devices_last_seen", "last_seen"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String(100), nullable=False, index=True)
@@ -208,20 +208,23 @@ class DivinationStateMachine:
         logger.info(f"重置占卜會話: {user_id}")
         return True
     
-    def cleanup_old_sessions(self, max_age_hours: int = 24):
-        """清理過期會話"""
+    def cleanup_old_sessions(self, max_age_hours: int = 24, limit: Optional[int] = None):
+        """清理過期會話（limit 限制單次清理數量，剩下的留給下一次）"""
         current_time = datetime.now()
         to_remove = []
         
-        for user_id, session in self.sessions.items():
+        for user_id, session in list(self.sessions.items()):
             age = current_time - session.updated_at
             if age.total_seconds() > max_age_hours * 3600:
                 to_remove.append(user_id)
+                if limit is not None and len(to_remove) >= limit:
+                    break
         
         for user_id in to_remove:
-            del self.sessions[user_id]
-            logger.info(f"清理過期會話: {user_id}")
+            self.sessions.pop(user_id, None)
         
+        if to_remove:
+            logger.info(f"清理過期會話 {len(to_remove)} 個")
         return len(to_remove)
 
 # 全局狀態機實例
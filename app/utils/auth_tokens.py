@@ -0,0 +1,236 @@
+"""
+簽章存取權杖
+發行時查詢一次用戶的角色、付費到期時間與每日上限，以 HMAC-SHA256 簽章後交給前端；
+受保護的路由只在行程內驗證簽章、到期時間、設備綁定與撤銷清單，不需要查詢資料庫
+（設備數量限制另由 device_manager 的行程內快取檢查）。
+
+撤銷清單由背景工作定期從 revoked_auth_tokens 重新載入（降級、登出時寫入），
+因此撤銷最多延遲一個刷新週期生效；權杖本身的有效期也很短。
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_TTL_SECONDS = 15 * 60
+DEFAULT_REVOCATION_REFRESH_SECONDS = 30
+TOKEN_VERSION = 1
+
+
+class InvalidTokenError(Exception):
+    """權杖無效（格式、簽章、過期、撤銷或設備不符）"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def device_binding(device_fingerprint: Optional[str]) -> Optional[str]:
+    """權杖內只存設備指紋的雜湊"""
+    if not device_fingerprint:
+        return None
+    return hashlib.sha256(device_fingerprint.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    """權杖內容"""
+    user_id: str
+    role: str
+    daily_limit: int
+    issued_at: float
+    expires_at: float
+    token_id: str
+    premium_until: Optional[float] = None
+    device: Optional[str] = None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    def is_premium(self, now: Optional[float] = None) -> bool:
+        if self.is_admin:
+            return True
+        if self.role != "premium":
+            return False
+        return self.premium_until is None or (time.time() if now is None else now) < self.premium_until
+
+
+class RevocationList:
+    """已撤銷的權杖 ID，以及「某時間點之前發行的權杖全部失效」的用戶"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._token_ids: Set[str] = set()
+        self._users_revoked_at: Dict[str, float] = {}
+        self.refreshed_at: Optional[float] = None
+
+    def is_revoked(self, claims: TokenClaims) -> bool:
+        # 讀取不加鎖：刷新時整個替換集合
+        if claims.token_id in self._token_ids:
+            return True
+        revoked_at = self._users_revoked_at.get(claims.user_id)
+        return revoked_at is not None and claims.issued_at <= revoked_at
+
+    def replace(self, token_ids: Set[str], users_revoked_at: Dict[str, float]):
+        with self._lock:
+            self._token_ids = set(token_ids)
+            self._users_revoked_at = dict(users_revoked_at)
+            self.refreshed_at = time.time()
+
+    def add_token(self, token_id: str):
+        with self._lock:
+            self._token_ids = self._token_ids | {token_id}
+
+    def add_user(self, user_id: str, revoked_at: float):
+        with self._lock:
+            users = dict(self._users_revoked_at)
+            users[user_id] = max(revoked_at, users.get(user_id, 0))
+            self._users_revoked_at = users
+
+    def refresh(self, db) -> int:
+        """從資料庫重新載入尚未過期的撤銷記錄，回傳筆數"""
+        from app.models.revoked_tokens import RevokedAuthToken
+
+        rows = db.query(RevokedAuthToken).filter(RevokedAuthToken.expires_at > time.time()).all()
+        token_ids = {row.token_id for row in rows if row.token_id}
+        users: Dict[str, float] = {}
+        for row in rows:
+            if row.user_id and not row.token_id:
+                users[row.user_id] = max(row.revoked_at, users.get(row.user_id, 0))
+        self.replace(token_ids, users)
+        return len(rows)
+
+
+class AuthTokenService:
+    """
+    權杖發行與驗證
+
+    Args:
+        secret: HMAC 金鑰（多個 worker 必須相同，預設讀取 AUTH_TOKEN_SECRET）
+        ttl_seconds: 權杖有效期
+    """
+
+    def __init__(self, secret: Optional[bytes] = None, ttl_seconds: int = DEFAULT_TOKEN_TTL_SECONDS,
+                 revocations: Optional[RevocationList] = None, clock: Callable[[], float] = time.time):
+        if secret is None:
+            configured = os.getenv("AUTH_TOKEN_SECRET")
+            if configured:
+                secret = configured.encode("utf-8")
+            else:
+                logger.warning("未設定 AUTH_TOKEN_SECRET，使用隨機金鑰（重啟或多個 worker 時權杖會失效）")
+                secret = secrets.token_bytes(32)
+        self._secret = secret
+        self.ttl_seconds = ttl_seconds
+        self.revocations = revocations or RevocationList()
+        self.clock = clock
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self._secret, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, user_id: str, role: str, daily_limit: int, premium_until: Optional[float] = None,
+              device_fingerprint: Optional[str] = None) -> str:
+        """發行權杖（時間皆為 epoch 秒）"""
+        now = self.clock()
+        claims = TokenClaims(
+            user_id=user_id,
+            role=role,
+            daily_limit=daily_limit,
+            issued_at=now,
+            expires_at=now + self.ttl_seconds,
+            token_id=secrets.token_urlsafe(12),
+            premium_until=premium_until,
+            device=device_binding(device_fingerprint),
+        )
+        body = dict(asdict(claims), v=TOKEN_VERSION)
+        payload = _b64encode(json.dumps(body, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str, device_fingerprint: Optional[str] = None) -> TokenClaims:
+        """驗證權杖，失敗時拋出 InvalidTokenError"""
+        try:
+            payload, signature = token.split(".")
+        except (AttributeError, ValueError):
+            raise InvalidTokenError("權杖格式錯誤")
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise InvalidTokenError("權杖簽章錯誤")
+        try:
+            body = json.loads(_b64decode(payload))
+            if body.pop("v", None) != TOKEN_VERSION:
+                raise InvalidTokenError("權杖版本不符")
+            claims = TokenClaims(**body)
+        except InvalidTokenError:
+            raise
+        except Exception:
+            raise InvalidTokenError("權杖內容錯誤")
+
+        if claims.expires_at <= self.clock():
+            raise InvalidTokenError("權杖已過期")
+        if claims.device is not None and claims.device != device_binding(device_fingerprint):
+            raise InvalidTokenError("權杖與設備不符")
+        if self.revocations.is_revoked(claims):
+            raise InvalidTokenError("權杖已撤銷")
+        return claims
+
+    def revoke_user(self, db, user_id: str) -> None:
+        """撤銷用戶目前所有的權杖（例如降級之後）"""
+        from app.models.revoked_tokens import RevokedAuthToken
+
+        now = self.clock()
+        self.revocations.add_user(user_id, now)
+        self._persist(db, RevokedAuthToken(user_id=user_id, revoked_at=now, expires_at=now + self.ttl_seconds))
+
+    def revoke_token(self, db, claims: TokenClaims) -> None:
+        """撤銷單一權杖（例如登出）"""
+        from app.models.revoked_tokens import RevokedAuthToken
+
+        self.revocations.add_token(claims.token_id)
+        self._persist(db, RevokedAuthToken(token_id=claims.token_id, user_id=claims.user_id,
+                                           revoked_at=self.clock(), expires_at=claims.expires_at))
+
+    @staticmethod
+    def _persist(db, record) -> None:
+        """寫入撤銷記錄供其他 worker 載入（失敗時至少本行程已生效）"""
+        try:
+            db.add(record)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"寫入權杖撤銷記錄失敗: {e}")
+
+    def refresh_revocations(self) -> int:
+        """以新的資料庫會話重新載入撤銷清單"""
+        from app.db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return self.revocations.refresh(db)
+        finally:
+            db.close()
+
+    async def run_revocation_refresher(self, interval_seconds: float = DEFAULT_REVOCATION_REFRESH_SECONDS):
+        """背景工作：定期重新載入撤銷清單"""
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh_revocations)
+            except Exception as e:
+                logger.warning(f"重新載入權杖撤銷清單失敗: {e}")
+            await asyncio.sleep(interval_seconds)
+
+
+# 全局權杖服務實例
+auth_token_service = AuthTokenService()
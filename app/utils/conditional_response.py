@@ -0,0 +1,172 @@
+"""
+命盤回應的條件請求與壓縮
+同一份出生資料的命盤是確定的，ETag 由「演算法版本 + 路徑 + 查詢參數 + 請求內容 + 解析後的預設日期」雜湊而成，
+不需要先計算命盤；GET / HEAD 請求帶 If-None-Match 即可直接得到 304，省下排盤與傳輸。
+超過大小門檻的 200 回應依 Accept-Encoding 以 brotli（已安裝時）或 gzip 壓縮。
+
+依 RFC 9110，If-None-Match 符合時只有 GET / HEAD 能回應 304；POST 仍正常處理，
+回應附上 ETag 供前端自行比對是否需要重繪。POST 路由省不下排盤，
+需要輪詢的前端應改用 GET 版本（/chart 與流年 / 流月 / 流日）。
+
+只有結果由請求內容與「今天」決定的路由可以使用此路由類別；
+回應當下時間的路由（如 /calendar/current-lunar）ETag 永遠不變，不可套用。
+"""
+import gzip
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.logic.chart_version import CHART_ALGORITHM_VERSION
+from app.utils.timezone_helper import TAIPEI_TZ
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    brotli = None
+    HAS_BROTLI = False
+
+# 小於此大小的回應不壓縮
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# 可回應 304 的方法（RFC 9110 §13.1.2）
+NOT_MODIFIED_METHODS = ("GET", "HEAD")
+
+# 未指定時以「今天」為預設值的查詢參數（流年 / 流月 / 流日，以及依今年推算的大限 / 小限年齡）
+DATE_DEFAULT_PARAMS = ("target_year", "target_month", "target_day", "current_age", "target_age")
+
+
+def compute_chart_etag(path: str, query: str, body: bytes, default_date: Optional[str] = None) -> Optional[str]:
+    """
+    計算命盤請求的 ETag；請求內容不是 JSON 時返回 None（不提供條件請求）
+
+    Args:
+        path: 請求路徑
+        query: 查詢字串
+        body: 請求內容
+        default_date: 有參數使用預設日期時，解析後的台北日期（YYYY-MM-DD）
+    """
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        return None
+
+    digest = hashlib.sha256()
+    for part in (
+        CHART_ALGORITHM_VERSION,
+        path,
+        "&".join(sorted(query.split("&"))) if query else "",
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":")),
+        default_date or "",
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    # 壓縮後的位元組會不同，使用弱 ETag
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否符合（弱比較）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """依 Accept-Encoding 選擇壓縮方式（忽略 q=0）"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name.strip().lower())
+    if HAS_BROTLI and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress_response(response: Response, accept_encoding: Optional[str],
+                      min_size: int = COMPRESSION_MIN_SIZE) -> Response:
+    """壓縮已完整產生的回應（直接修改並返回同一個物件）"""
+    body = getattr(response, "body", None)
+    if not body or len(body) < min_size or "content-encoding" in response.headers:
+        return response
+
+    response.headers["Vary"] = "Accept-Encoding"
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    response.body = compressed
+    response.headers["Content-Encoding"] = encoding
+    response.headers["Content-Length"] = str(len(compressed))
+    return response
+
+
+class ConditionalChartRoute(APIRoute):
+    """
+    命盤路由類別：提供 ETag（GET / HEAD 另支援 304）與回應壓縮
+
+    用法：APIRouter(route_class=ConditionalChartRoute)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        query_names = {param.name for param in self.dependant.query_params}
+        self.date_default_params = tuple(name for name in DATE_DEFAULT_PARAMS if name in query_names)
+
+    def get_route_handler(self) -> Callable:
+        original_handler = super().get_route_handler()
+
+        async def conditional_handler(request: Request) -> Response:
+            if request.method not in NOT_MODIFIED_METHODS and request.method != "POST":
+                return await original_handler(request)
+
+            # request.body() 會被快取，原路由仍可再次讀取
+            etag = compute_chart_etag(
+                request.url.path, request.url.query, await request.body(), self._default_date(request)
+            )
+            if (etag and request.method in NOT_MODIFIED_METHODS
+                    and etag_matches(request.headers.get("if-none-match"), etag)):
+                return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+            response = await original_handler(request)
+            if response.status_code != 200:
+                return response
+            if etag:
+                response.headers["ETag"] = etag
+            return compress_response(response, request.headers.get("accept-encoding"))
+
+        return conditional_handler
+
+    def _default_date(self, request: Request) -> Optional[str]:
+        """有日期參數未指定時，結果取決於今天（台北時間）"""
+        if any(request.query_params.get(name) is None for name in self.date_default_params):
+            return datetime.now(TAIPEI_TZ).strftime("%Y-%m-%d")
+        return None
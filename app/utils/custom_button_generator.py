@@ -1,16 +1,154 @@
 from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
 import os
+import json
+import random
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 import math
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FONT_PATH = os.path.join(PROJECT_ROOT, "assets", "NotoSansTC-Regular.otf")
+# 依序嘗試的字體（專案字體、macOS、Linux 部署環境）
+FONT_CANDIDATES = (
+    FONT_PATH,
+    "/System/Library/Fonts/Arial.ttf",
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+BUTTON_CACHE_DIR = os.getenv("BUTTON_CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache", "buttons"))
+
+# 繪製邏輯變更時遞增，使舊的快取失效
+RENDER_VERSION = 1
+
+
+@lru_cache(maxsize=16)
+def _load_font(size: int) -> ImageFont.ImageFont:
+    """載入字體（同一尺寸只載入一次）"""
+    for font_path in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+@lru_cache(maxsize=8)
+def _gradient_background(size: Tuple[int, int]) -> Image.Image:
+    """星空漸變底圖（依尺寸快取，唯讀共用）"""
+    width, height = size
+    background = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(background)
+    for y in range(height):
+        progress = y / height
+        r = int(20 + progress * 30)
+        g = int(25 + progress * 35)
+        b = int(60 + progress * 80)
+        draw.line([(0, y), (width, y)], fill=(r, g, b, 200))
+    return background
+
+
+@lru_cache(maxsize=8)
+def _glow_layer(size: Tuple[int, int]) -> Image.Image:
+    """模糊後的發光層（依尺寸快取）"""
+    glow = Image.new('RGBA', size, (0, 0, 0, 0))
+    glow_draw = ImageDraw.Draw(glow)
+    
+    width, height = size
+    center_x, center_y = width // 2, height // 2
+    
+    # 繪製多層發光圓圈
+    for i in range(5):
+        radius = 80 + i * 20
+        alpha = 30 - i * 5
+        glow_draw.ellipse([center_x - radius, center_y - radius, 
+                          center_x + radius, center_y + radius], 
+                         fill=(255, 255, 255, alpha))
+    
+    # 模糊發光效果
+    return glow.filter(ImageFilter.GaussianBlur(radius=10))
+
+
+@lru_cache(maxsize=256)
+def _hash_file_contents(path: str, mtime: float, size: int) -> str:
+    """檔案內容雜湊（修改時間與大小只作為快取鍵，檔案變更後自然失效）"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _file_hash(path: str) -> str:
+    """檔案內容雜湊（依路徑、修改時間與大小記憶）"""
+    stat = os.stat(path)
+    return _hash_file_contents(os.path.abspath(path), stat.st_mtime, stat.st_size)
+
+
+def _image_hash(image: Image.Image) -> str:
+    """圖片像素內容雜湊（含模式與尺寸）"""
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode('utf-8'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class ButtonRenderCache:
+    """按鈕渲染結果的磁碟快取，以（來源圖片雜湊, 尺寸, 文字, 樣式）為鍵"""
+    
+    def __init__(self, cache_dir: str = BUTTON_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+    
+    def make_key(self, *parts) -> str:
+        payload = json.dumps([RENDER_VERSION, *parts], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+    
+    def get(self, key: str) -> Optional[Image.Image]:
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        with Image.open(path) as cached:
+            return cached.copy()
+    
+    def put(self, key: str, image: Image.Image):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # 先寫暫存檔再改名，避免平行渲染時讀到半寫的檔案
+        tmp_path = f"{self.path_for(key)}.{os.getpid()}.tmp"
+        image.save(tmp_path, format="PNG")
+        os.replace(tmp_path, self.path_for(key))
+
+
+def _render_button_to_file(args: Tuple[Dict, str, int, str, int]) -> Optional[str]:
+    """進程池工作函數：渲染單一按鈕並存檔（沿用主生成器的字體大小）"""
+    config, output_path, index, cache_dir, font_size = args
+    generator = CustomButtonGenerator(cache_dir=cache_dir)
+    generator.font_size = font_size
+    try:
+        button = generator._create_button_from_config(config, index)
+        button.save(output_path)
+        print(f"✅ 成功創建按鈕: {output_path}")
+        return output_path
+    except Exception as e:
+        print(f"❌ 創建按鈕失敗 (配置 {index+1}): {e}")
+        return None
+
+
 class CustomButtonGenerator:
     """
     生成器，可以將用戶提供的圖片轉換為按鈕
     """
     
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = BUTTON_CACHE_DIR):
         self.button_size = (200, 200)
         self.font_size = 24
+        # cache_dir 為 None 時停用渲染快取
+        self.render_cache = ButtonRenderCache(cache_dir) if cache_dir else None
         
     def create_button_from_image(self, 
                                image_path: str, 
@@ -32,6 +170,24 @@ class CustomButtonGenerator:
             add_border: 是否添加邊框
             add_shadow: 是否添加陰影
         """
+        button_size = tuple(button_size)
+        text_color = tuple(text_color)
+        
+        # 查詢渲染快取
+        try:
+            source_hash = _file_hash(image_path)
+        except (OSError, TypeError):
+            source_hash = None
+        cache_key = None
+        if self.render_cache and source_hash:
+            cache_key = self.render_cache.make_key(
+                source_hash, button_size, button_text, text_color, add_background, add_border, add_shadow,
+                self.font_size
+            )
+            cached = self.render_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         # 載入用戶圖片
         try:
             user_image = Image.open(image_path)
@@ -42,9 +198,9 @@ class CustomButtonGenerator:
         # 創建按鈕畫布
         button = Image.new('RGBA', button_size, (0, 0, 0, 0))
         
-        # 添加背景
+        # 添加背景（星星位置以來源與文字為種子，輸出可重現）
         if add_background:
-            self._add_starry_background(button)
+            self._add_starry_background(button, seed=f"{source_hash}:{button_text}")
         
         # 處理用戶圖片
         processed_image = self._process_user_image(user_image, button_size)
@@ -67,6 +223,9 @@ class CustomButtonGenerator:
         # 添加文字
         button = self._add_text(button, button_text, text_color)
         
+        if cache_key:
+            self.render_cache.put(cache_key, button)
+        
         return button
     
     def _process_user_image(self, user_image: Image.Image, button_size: Tuple[int, int]) -> Optional[Image.Image]:
@@ -104,51 +263,28 @@ class CustomButtonGenerator:
             print(f"處理圖片時出錯: {e}")
             return None
     
-    def _add_starry_background(self, button: Image.Image):
+    def _add_starry_background(self, button: Image.Image, seed: Optional[str] = None):
         """添加星空背景"""
-        draw = ImageDraw.Draw(button)
         width, height = button.size
         
         # 漸變背景
-        for y in range(height):
-            progress = y / height
-            r = int(20 + progress * 30)
-            g = int(25 + progress * 35)
-            b = int(60 + progress * 80)
-            draw.line([(0, y), (width, y)], fill=(r, g, b, 200))
+        button.paste(_gradient_background(button.size), (0, 0))
+        draw = ImageDraw.Draw(button)
         
         # 添加星星
-        import random
+        rng = random.Random(seed)
         for _ in range(15):
-            x = random.randint(0, width)
-            y = random.randint(0, height)
-            size = random.randint(1, 3)
-            brightness = random.randint(150, 255)
+            x = rng.randint(0, width)
+            y = rng.randint(0, height)
+            size = rng.randint(1, 3)
+            brightness = rng.randint(150, 255)
             draw.ellipse([x-size, y-size, x+size, y+size], 
                         fill=(brightness, brightness, brightness, 180))
     
     def _add_glow_effect(self, button: Image.Image) -> Image.Image:
         """添加發光效果"""
-        # 創建發光層
-        glow = Image.new('RGBA', button.size, (0, 0, 0, 0))
-        glow_draw = ImageDraw.Draw(glow)
-        
-        width, height = button.size
-        center_x, center_y = width // 2, height // 2
-        
-        # 繪製多層發光圓圈
-        for i in range(5):
-            radius = 80 + i * 20
-            alpha = 30 - i * 5
-            glow_draw.ellipse([center_x - radius, center_y - radius, 
-                              center_x + radius, center_y + radius], 
-                             fill=(255, 255, 255, alpha))
-        
-        # 模糊發光效果
-        glow = glow.filter(ImageFilter.GaussianBlur(radius=10))
-        
         # 合併發光效果
-        result = Image.alpha_composite(glow, button)
+        result = Image.alpha_composite(_glow_layer(button.size), button)
         return result
     
     def _add_border(self, button: Image.Image) -> Image.Image:
@@ -168,14 +304,7 @@ class CustomButtonGenerator:
         draw = ImageDraw.Draw(button)
         width, height = button.size
         
-        # 嘗試載入字體
-        try:
-            font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", self.font_size)
-        except:
-            try:
-                font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", self.font_size)
-            except:
-                font = ImageFont.load_default()
+        font = _load_font(self.font_size)
         
         # 計算文字位置
         bbox = draw.textbbox((0, 0), text, font=font)
@@ -209,10 +338,7 @@ class CustomButtonGenerator:
                     fill=(100, 100, 100, 200), outline=(200, 200, 200, 255), width=3)
         
         # 問號
-        try:
-            font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", 48)
-        except:
-            font = ImageFont.load_default()
+        font = _load_font(48)
         
         draw.text((center_x - 12, center_y - 25), "?", fill=(255, 255, 255), font=font)
         
@@ -223,7 +349,8 @@ class CustomButtonGenerator:
     
     def create_button_set_from_images(self, 
                                     image_configs: List[Dict],
-                                    output_dir: str = "custom_buttons") -> List[str]:
+                                    output_dir: str = "custom_buttons",
+                                    workers: Optional[int] = None) -> List[str]:
         """
         批量創建按鈕
         
@@ -233,25 +360,28 @@ class CustomButtonGenerator:
                 - button_text: 按鈕文字
                 - output_name: 輸出檔名
                 - 其他可選參數
+            output_dir: 輸出目錄
+            workers: 平行渲染的進程數；None 或 1 時依序渲染
         """
         os.makedirs(output_dir, exist_ok=True)
-        output_paths = []
+        jobs = [
+            (config, os.path.join(output_dir, config.get('output_name', f'custom_button_{i+1}.png')), i)
+            for i, config in enumerate(image_configs)
+        ]
+        
+        if workers and workers > 1 and len(jobs) > 1:
+            cache_dir = self.render_cache.cache_dir if self.render_cache else None
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    _render_button_to_file,
+                    [(config, output_path, i, cache_dir, self.font_size) for config, output_path, i in jobs]
+                ))
+            return [path for path in results if path]
         
-        for i, config in enumerate(image_configs):
+        output_paths = []
+        for config, output_path, i in jobs:
             try:
-                button = self.create_button_from_image(
-                    image_path=config.get('image_path'),
-                    button_text=config.get('button_text', f'按鈕{i+1}'),
-                    button_size=config.get('button_size', (200, 200)),
-                    text_color=config.get('text_color', (255, 255, 255)),
-                    add_background=config.get('add_background', True),
-                    add_border=config.get('add_border', True),
-                    add_shadow=config.get('add_shadow', True)
-                )
-                
-                output_name = config.get('output_name', f'custom_button_{i+1}.png')
-                output_path = os.path.join(output_dir, output_name)
-                
+                button = self._create_button_from_config(config, i)
                 button.save(output_path)
                 output_paths.append(output_path)
                 print(f"✅ 成功創建按鈕: {output_path}")
@@ -261,6 +391,18 @@ class CustomButtonGenerator:
         
         return output_paths
     
+    def _create_button_from_config(self, config: Dict, index: int) -> Image.Image:
+        """依單一配置創建按鈕"""
+        return self.create_button_from_image(
+            image_path=config.get('image_path'),
+            button_text=config.get('button_text', f'按鈕{index+1}'),
+            button_size=config.get('button_size', (200, 200)),
+            text_color=config.get('text_color', (255, 255, 255)),
+            add_background=config.get('add_background', True),
+            add_border=config.get('add_border', True),
+            add_shadow=config.get('add_shadow', True)
+        )
+    
     def integrate_with_rich_menu(self, 
                                button_images: List[str],
                                button_configs: List[Dict],
@@ -281,37 +423,67 @@ class CustomButtonGenerator:
         
         # 計算按鈕位置
         positions = self._calculate_button_positions(len(button_images), background.size)
+        output_path = f"rich_menu_images/custom_{menu_type}_menu.png"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        # 背景、按鈕圖片與位置都沒變時直接使用快取的合成圖
+        cache_key = None
+        if self.render_cache:
+            try:
+                button_hashes = [_file_hash(path) for path in button_images]
+                cache_key = self.render_cache.make_key(
+                    "rich_menu", _image_hash(background), button_hashes, positions, button_configs
+                )
+            except OSError:
+                cache_key = None
+            if cache_key and os.path.exists(self.render_cache.path_for(cache_key)):
+                self.render_cache.hits += 1
+                shutil.copyfile(self.render_cache.path_for(cache_key), output_path)
+                return output_path, self._build_button_areas(button_images, positions, button_configs)
         
         # 將按鈕貼到背景上
-        button_areas = []
-        for i, (button_img_path, position, config) in enumerate(zip(button_images, positions, button_configs)):
+        for button_img_path, position in zip(button_images, positions):
             try:
-                button_img = Image.open(button_img_path)
-                
-                # 貼上按鈕
-                x, y = position
-                background.paste(button_img, (x, y), button_img if button_img.mode == 'RGBA' else None)
-                
-                # 記錄按鈕區域
-                button_areas.append({
-                    "bounds": {
-                        "x": x,
-                        "y": y,
-                        "width": button_img.width,
-                        "height": button_img.height
-                    },
-                    "action": config.get('action', {"type": "message", "text": f"按鈕{i+1}"})
-                })
+                with Image.open(button_img_path) as button_img:
+                    # 貼上按鈕
+                    x, y = position
+                    background.paste(button_img, (x, y), button_img if button_img.mode == 'RGBA' else None)
                 
             except Exception as e:
                 print(f"整合按鈕失敗 {button_img_path}: {e}")
         
         # 儲存最終的Rich Menu圖片
-        output_path = f"rich_menu_images/custom_{menu_type}_menu.png"
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
         background.save(output_path)
+        if cache_key:
+            self.render_cache.misses += 1
+            self.render_cache.put(cache_key, background)
         
-        return output_path, button_areas
+        return output_path, self._build_button_areas(button_images, positions, button_configs)
+    
+    def _build_button_areas(self,
+                            button_images: List[str],
+                            positions: List[Tuple[int, int]],
+                            button_configs: List[Dict]) -> List[Dict]:
+        """記錄按鈕區域"""
+        button_areas = []
+        for i, (button_img_path, position, config) in enumerate(zip(button_images, positions, button_configs)):
+            try:
+                with Image.open(button_img_path) as button_img:
+                    width, height = button_img.size
+            except Exception as e:
+                print(f"讀取按鈕尺寸失敗 {button_img_path}: {e}")
+                continue
+            x, y = position
+            button_areas.append({
+                "bounds": {
+                    "x": x,
+                    "y": y,
+                    "width": width,
+                    "height": height
+                },
+                "action": config.get('action', {"type": "message", "text": f"按鈕{i+1}"})
+            })
+        return button_areas
     
     def _calculate_button_positions(self, num_buttons: int, menu_size: Tuple[int, int]) -> List[Tuple[int, int]]:
         """計算按鈕在Rich Menu中的位置"""
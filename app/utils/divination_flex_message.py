@@ -15,6 +15,8 @@ import logging
 import os
 import time
 
+from app.utils.flex_packer import FlexBubblePacker, pack_text, split_text
+
 logger = logging.getLogger(__name__)
 
 class DivinationFlexMessageGenerator:
@@ -1095,9 +1097,12 @@ class DivinationFlexMessageGenerator:
         result: Dict[str, Any],
         sihua_type: str,
         user_type: str = "free"  # 新增用戶類型參數
-    ) -> Optional[Union[FlexMessage, List[TextMessage]]]:
+    ) -> Optional[Union[FlexMessage, List[Union[FlexMessage, TextMessage]]]]:
         """
-        生成四化詳細解釋消息 - 優化排版版本，支援超長內容分割
+        生成四化詳細解釋消息
+        
+        所有星曜與段落依 LINE 的大小限制精確封裝成最少的 bubble / carousel，
+        通常為單一 FlexMessage；超過一則 carousel 時返回多則訊息的列表。
         
         Args:
             result: 占卜結果數據
@@ -1105,248 +1110,147 @@ class DivinationFlexMessageGenerator:
             user_type: 用戶類型 - "admin"(管理員), "premium"(付費會員), "free"(免費會員)
             
         Returns:
-            包含完整解釋的 FlexMessage 或 TextMessage列表（當內容過長時）
+            FlexMessage，或內容超過一則訊息時的訊息列表
         """
         try:
             # 從占卜結果中提取四化數據
-            sihua_results = result.get("sihua_results", [])
-            sihua_list = []
-            
-            for sihua_info in sihua_results:
-                if sihua_info.get("type") == sihua_type:
-                    sihua_list.append(sihua_info)
-            
+            sihua_list = [
+                sihua_info for sihua_info in result.get("sihua_results", [])
+                if sihua_info.get("type") == sihua_type
+            ]
             if not sihua_list:
                 return None
                 
             color = self.SIHUA_COLORS.get(sihua_type, "#95A5A6")
             emoji = self.SIHUA_EMOJIS.get(sihua_type, "⭐")
             
-            # 估算總內容長度，包含 JSON 結構開銷
-            total_content_length = self._estimate_flex_message_size(sihua_list, sihua_type)
-            
-            # LINE Flex Message 建議限制約 10KB-20KB
-            # 為安全起見，我們設定在 5000 字符以內使用 Flex Message
-            if total_content_length > 5000:
-                logger.info(f"內容過長 ({total_content_length} 字符)，使用文字訊息代替 Flex Message")
+            try:
+                messages = self._pack_sihua_detail_messages(sihua_list, sihua_type, color, emoji)
+            except Exception as e:
+                logger.error(f"封裝 {sihua_type}星 Flex 訊息失敗，改用文字訊息: {e}")
                 return self._create_text_messages_for_long_content(sihua_list, sihua_type, user_type, emoji)
-            else:
-                logger.info(f"內容長度適中 ({total_content_length} 字符)，使用 Flex Message")
-                return self._create_single_bubble_detail_message(sihua_list, sihua_type, user_type, color, emoji)
+            
+            logger.info(f"{sihua_type}星詳細解釋封裝為 {len(messages)} 則 Flex 訊息")
+            return messages[0] if len(messages) == 1 else messages
                 
         except Exception as e:
             logger.error(f"生成四化詳細解釋失敗: {e}")
             return None
     
-    def _estimate_flex_message_size(self, sihua_list: List[Dict], sihua_type: str) -> int:
-        """估算 Flex Message 的大小（字符數）"""
-        try:
-            # 基礎結構開銷（JSON 格式、標籤等）
-            base_overhead = 2000
-            
-            # 每個星曜的內容
-            content_size = 0
-            for sihua_info in sihua_list:
-                star_name = str(sihua_info.get("star", ""))
-                palace = str(sihua_info.get("palace", ""))
-                explanation = str(sihua_info.get("explanation", ""))
-                
-                # 星曜名稱和宮位
-                content_size += len(star_name) + len(palace) + 50  # 50 是格式開銷
-                
-                # 解釋內容
-                content_size += len(explanation)
-                
-                # Flex 結構開銷（每個內容區塊）
-                content_size += 500
-            
-            # 四化說明
-            desc = self._get_detailed_sihua_description(sihua_type)
-            content_size += len(desc)
-            
-            return base_overhead + content_size
-            
-        except Exception as e:
-            logger.error(f"估算大小失敗: {e}")
-            return 10000  # 保守估算，使用文字訊息
-    
-    def _create_text_messages_for_long_content(self, sihua_list: List[Dict], sihua_type: str, 
-                                             user_type: str, emoji: str) -> List[TextMessage]:
-        """為超長內容創建多個文字訊息"""
-        try:
-            from linebot.v3.messaging import TextMessage
-            
-            messages = []
-            
-            # 第一條訊息：標題和總體說明
-            title_content = f"{emoji} {sihua_type}星完整解釋\n"
-            title_content += "▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪\n\n"
-            
-            # 四化總體說明
-            detailed_desc = self._get_detailed_sihua_description(sihua_type)
-            title_content += f"📖 四化概述\n{detailed_desc}\n\n"
-            title_content += f"✨ 您的命盤中共有 {len(sihua_list)} 顆{sihua_type}星\n"
-            title_content += "▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪"
-            
-            messages.append(TextMessage(text=title_content))
-            
-            # 為每顆星創建獨立訊息（每條訊息最多1400字，留出安全邊界）
-            for i, sihua_info in enumerate(sihua_list):
-                star_name = sihua_info.get("star", "未知星曜")
-                palace = sihua_info.get("palace", "")
-                explanation = sihua_info.get("explanation", "")
-                
-                # 星曜內容標題
-                star_content = f"⭐ {star_name} 在 {palace}\n"
-                star_content += "▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪\n\n"
-                
-                if explanation:
-                    # 將解釋按段落分組，並添加分類標籤
-                    explanation_parts = self._split_text_with_limit(explanation, 180)  # 每段180字
-                    
-                    current_category = ""  # 記錄當前分類，避免重複標籤
-                    
-                    for j, part in enumerate(explanation_parts):
-                        if not part.strip():
-                            continue
-                            
-                        # 獲取內容標籤
-                        label, _ = self._get_content_label(part)
-                        
-                        # 提取 emoji 和分類名稱
-                        if ' ' in label:
-                            emoji_part = label.split(' ')[0]
-                            category_name = label.split(' ', 1)[1]
-                        else:
-                            emoji_part = "📝"
-                            category_name = "詳細說明"
-                        
-                        # 只在分類改變時顯示新標籤
-                        if category_name != current_category:
-                            if current_category:  # 不是第一個分類，加個空行
-                                star_content += "\n"
-                            star_content += f"{emoji_part} {category_name}\n"
-                            star_content += "┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈\n"
-                            current_category = category_name
-                        
-                        star_content += f"{part.strip()}\n\n"
-                        
-                        # 檢查當前訊息長度，避免超過 LINE 文字訊息限制
-                        if len(star_content) > 1400:
-                            # 保存當前訊息
-                            star_content += "▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪"
-                            messages.append(TextMessage(text=star_content))
-                            
-                            # 開始新的訊息（如果還有剩餘內容）
-                            if j < len(explanation_parts) - 1:
-                                star_content = f"⭐ {star_name} 在 {palace} (續)\n"
-                                star_content += "▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪\n\n"
-                                current_category = ""  # 重置分類記錄
-                            else:
-                                star_content = ""
-                                break
-                
-                # 如果還有內容未發送，發送最後一條
-                if star_content and not star_content.endswith("▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪"):
-                    star_content += "▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪"
-                    messages.append(TextMessage(text=star_content))
-            
-            # 最後一條訊息：總結（如果訊息數量多）
-            if len(messages) > 3:  # 超過3條訊息時添加總結
-                summary_content = f"📋 {sihua_type}星解釋完畢\n"
-                summary_content += "▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪\n\n"
-                summary_content += f"✅ 已完整顯示 {len(sihua_list)} 顆{sihua_type}星解釋\n"
-                summary_content += f"📨 共發送 {len(messages)} 條詳細訊息\n\n"
-                summary_content += "💡 內容按類型分段，便於閱讀\n"
-                summary_content += "🔮 如需其他四化星解釋，請重新查看\n"
-                summary_content += "▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪"
-                
-                messages.append(TextMessage(text=summary_content))
-            
-            return messages
-            
-        except Exception as e:
-            logger.error(f"創建文字訊息失敗: {e}")
-            # 後備方案：簡單的文字訊息
-            fallback_text = f"{emoji} {sihua_type}星詳細解釋\n\n"
-            fallback_text += f"您的命盤中有 {len(sihua_list)} 顆{sihua_type}星，"
-            fallback_text += "內容較多，建議透過其他方式查看完整解釋。\n\n"
-            fallback_text += "如有疑問，請重新進行占卜。"
-            
-            return [TextMessage(text=fallback_text)]
-    
-    def _create_single_bubble_detail_message(self, sihua_list: List[Dict], sihua_type: str, 
-                                           user_type: str, color: str, emoji: str) -> FlexMessage:
-        """創建單個bubble的詳細解釋"""
-        body_contents = []
-        
-        # 詳細解釋標題 - 優化設計
-        body_contents.append(
-            FlexBox(
-                layout="horizontal",
-                contents=[
-                    FlexText(
-                        text=str(emoji),
-                        size="xxl",
-                        flex=0,
-                        color=color
-                    ),
-                    FlexText(
-                        text=f"{str(sihua_type)}星完整解釋",
-                        weight="bold",
-                        size="xl",
-                        color=color,
-                        flex=1,
-                        margin="md"
-                    )
-                ],
-                backgroundColor="#F8F9FA",
-                paddingAll="lg",
-                cornerRadius="8px"
-            )
+    def _pack_sihua_detail_messages(self, sihua_list: List[Dict], sihua_type: str,
+                                    color: str, emoji: str) -> List[FlexMessage]:
+        """將四化詳細解釋的元件封裝為最少的 Flex 訊息"""
+        packer = FlexBubblePacker(self._create_detail_bubble)
+        bubbles = packer.pack(
+            [self._create_sihua_star_block(sihua_info, color) for sihua_info in sihua_list],
+            header=self._create_sihua_detail_header(sihua_type, color, emoji),
+            footer=[self._create_sihua_detail_footer(color)],
+            continuation_header=lambda page: [self._create_sihua_continuation_title(sihua_type, color, emoji, page)]
         )
+        containers = packer.to_containers(bubbles)
         
-        # 四化總體說明 - 優化字數
-        detailed_desc = self._get_detailed_sihua_description(sihua_type)
-        if len(detailed_desc) > 120:  # 進一步減少總體說明字數
-            detailed_desc = detailed_desc[:120] + "..."
-        
-        body_contents.append(
-            FlexBox(
+        alt_text = f"🔮 {sihua_type}星完整解釋"
+        if len(containers) == 1:
+            return [FlexMessage(alt_text=alt_text, contents=containers[0])]
+        return [
+            FlexMessage(alt_text=f"{alt_text} ({index}/{len(containers)})", contents=container)
+            for index, container in enumerate(containers, 1)
+        ]
+    
+    def _create_detail_bubble(self, contents: List) -> FlexBubble:
+        """詳細解釋的 bubble 外框"""
+        return FlexBubble(
+            size="giga",  # 使用大尺寸
+            body=FlexBox(
                 layout="vertical",
-                contents=[
-                    FlexText(
-                        text="📖 四化概述",
-                        size="md",
-                        weight="bold",
-                        color="#34495E",
-                        margin="lg"
-                    ),
-                    FlexText(
-                        text=detailed_desc,
-                        size="sm",
-                        color="#5D6D7E",
-                        wrap=True,
-                        margin="sm"
-                    )
-                ],
-                backgroundColor="#FAFBFC",
-                paddingAll="md",
-                cornerRadius="6px",
-                margin="md"
-            )
+                contents=contents,
+                spacing="none",
+                paddingAll="lg"
+            ),
+            styles={
+                "body": {
+                    "backgroundColor": "#FFFFFF"
+                }
+            }
+        )
+    
+    def _create_sihua_detail_header(self, sihua_type: str, color: str, emoji: str) -> List[FlexBox]:
+        """詳細解釋標題與四化概述"""
+        title = FlexBox(
+            layout="horizontal",
+            contents=[
+                FlexText(
+                    text=str(emoji),
+                    size="xxl",
+                    flex=0,
+                    color=color
+                ),
+                FlexText(
+                    text=f"{str(sihua_type)}星完整解釋",
+                    weight="bold",
+                    size="xl",
+                    color=color,
+                    flex=1,
+                    margin="md"
+                )
+            ],
+            backgroundColor="#F8F9FA",
+            paddingAll="lg",
+            cornerRadius="8px"
         )
         
-        # 顯示具體星曜 - 限制數量並優化排版
-        max_stars = 3  # 減少顯示數量，避免過長
+        overview = FlexBox(
+            layout="vertical",
+            contents=[
+                FlexText(
+                    text="📖 四化概述",
+                    size="md",
+                    weight="bold",
+                    color="#34495E",
+                    margin="lg"
+                ),
+                FlexText(
+                    text=self._get_detailed_sihua_description(sihua_type),
+                    size="sm",
+                    color="#5D6D7E",
+                    wrap=True,
+                    margin="sm"
+                )
+            ],
+            backgroundColor="#FAFBFC",
+            paddingAll="md",
+            cornerRadius="6px",
+            margin="md"
+        )
+        return [title, overview]
+    
+    def _create_sihua_continuation_title(self, sihua_type: str, color: str, emoji: str, page: int) -> FlexBox:
+        """後續 bubble 的標題"""
+        return FlexBox(
+            layout="horizontal",
+            contents=[
+                FlexText(text=str(emoji), size="lg", flex=0, color=color),
+                FlexText(
+                    text=f"{sihua_type}星完整解釋（{page}）",
+                    weight="bold",
+                    size="md",
+                    color=color,
+                    flex=1,
+                    margin="md"
+                )
+            ],
+            backgroundColor="#F8F9FA",
+            paddingAll="md",
+            cornerRadius="8px"
+        )
+    
+    def _create_sihua_star_block(self, sihua_info: Dict, color: str) -> List[FlexBox]:
+        """單顆星曜的標題與解釋段落（封裝時盡量放在同一個 bubble）"""
+        star_name = sihua_info.get("star", "未知星曜")
+        palace = sihua_info.get("palace", "")
         
-        for i, sihua_info in enumerate(sihua_list[:max_stars]):
-            star_name = sihua_info.get("star", "未知星曜")
-            palace = sihua_info.get("palace", "")
-            explanation = sihua_info.get("explanation", "")
-            
-            # 星曜標題區域
-            star_header = FlexBox(
+        block = [
+            FlexBox(
                 layout="horizontal",
                 contents=[
                     FlexText(
@@ -1355,11 +1259,12 @@ class DivinationFlexMessageGenerator:
                         color=color,
                         flex=0
                     ),
+                    # 白色文字顯示在有色背景上
                     FlexText(
                         text=f"{star_name} 在 {palace}",
                         weight="bold",
                         size="md",
-                        color="#2C3E50",
+                        color="#FFFFFF",
                         flex=1,
                         margin="sm"
                     )
@@ -1369,231 +1274,116 @@ class DivinationFlexMessageGenerator:
                 cornerRadius="6px",
                 margin="lg"
             )
-            
-            # 修改文字顏色為白色以在有色背景上顯示
-            star_header.contents[1].color = "#FFFFFF"
-            
-            body_contents.append(star_header)
-            
-            # 完整解釋內容 - 優化分段和排版
-            if explanation:
-                # 處理字典格式的explanation
-                if isinstance(explanation, dict):
-                    # 將字典內容格式化為文字
-                    explanation_text = ""
-                    for key, value in explanation.items():
-                        if value:  # 確保值不為空
-                            explanation_text += f"{key}：{value}\n\n"
-                    explanation = explanation_text.strip()
-                
-                # 確保explanation是字串
-                if not isinstance(explanation, str):
-                    explanation = str(explanation)
-                
-                # 將解釋分段顯示，減少每段字數
-                explanation_parts = self._split_text_with_limit(explanation, 80)  # 減少到80字每段
-                
-                for j, part in enumerate(explanation_parts):
-                    if j >= 6:  # 增加段落限制，但減少每段字數
-                        break
-                        
-                    if part.strip():
-                        # 區分不同類型的內容
-                        label, label_color = self._get_content_label(part)
-                        
-                        # 為每段內容創建獨立的區塊
-                        content_block = FlexBox(
-                            layout="vertical",
-                            contents=[
-                                FlexText(
-                                    text=label,
-                                    size="xs",
-                                    color=label_color,
-                                    weight="bold",
-                                    margin="none"
-                                ),
-                                FlexText(
-                                    text=part.strip(),
-                                    size="sm",
-                                    color="#444444",
-                                    wrap=True,
-                                    margin="xs"
-                                )
-                            ],
-                            backgroundColor="#FFFFFF",
-                            paddingAll="sm",
-                            cornerRadius="4px",
-                            margin="sm",
-                            borderWidth="1px",
-                            borderColor="#E8E8E8"
-                        )
-                        
-                        body_contents.append(content_block)
+        ]
         
-        # 如果有更多星曜未顯示，添加提示
-        if len(sihua_list) > max_stars:
-            body_contents.append(
+        for part in split_text(self._explanation_text(sihua_info.get("explanation", "")), 80):
+            if not part.strip():
+                continue
+            # 區分不同類型的內容
+            label, label_color = self._get_content_label(part)
+            block.append(
                 FlexBox(
                     layout="vertical",
                     contents=[
-                        FlexSeparator(margin="lg", color="#E8E8E8"),
                         FlexText(
-                            text=f"📚 另有 {len(sihua_list) - max_stars} 顆{sihua_type}星",
-                            size="sm",
-                            color="#7B8794",
-                            align="center",
-                            margin="md"
+                            text=label,
+                            size="xs",
+                            color=label_color,
+                            weight="bold",
+                            margin="none"
                         ),
                         FlexText(
-                            text="完整內容已精簡顯示，如需更多詳情請重新占卜",
-                            size="xs",
-                            color="#95A5A6",
-                            align="center",
+                            text=part.strip(),
+                            size="sm",
+                            color="#444444",
+                            wrap=True,
                             margin="xs"
                         )
-                    ]
+                    ],
+                    backgroundColor="#FFFFFF",
+                    paddingAll="sm",
+                    cornerRadius="4px",
+                    margin="sm",
+                    borderWidth="1px",
+                    borderColor="#E8E8E8"
                 )
             )
-        
-        # 底部總結 - 優化設計
-        body_contents.append(
-            FlexBox(
-                layout="vertical",
-                contents=[
-                    FlexSeparator(margin="xl", color="#BDC3C7"),
-                    FlexBox(
-                        layout="horizontal",
-                        contents=[
-                            FlexText(
-                                text="📖",
-                                size="sm",
-                                color=color,
-                                flex=0
-                            ),
-                            FlexText(
-                                text="以上為完整的四化解釋內容",
-                                size="sm",
-                                color="#7B8794",
-                                flex=1,
-                                margin="sm"
-                            )
-                        ],
-                        margin="md"
-                    )
-                ]
-            )
-        )
-        
-        bubble = FlexBubble(
-            size="giga",  # 使用大尺寸
-            body=FlexBox(
-                layout="vertical",
-                contents=body_contents,
-                spacing="none",
-                paddingAll="lg"
-            ),
-            styles={
-                "body": {
-                    "backgroundColor": "#FFFFFF"
-                }
-            }
-        )
-        
-        return FlexMessage(
-            alt_text=f"🔮 {sihua_type}星完整解釋",
-            contents=bubble
+        return block
+    
+    def _create_sihua_detail_footer(self, color: str) -> FlexBox:
+        """底部總結"""
+        return FlexBox(
+            layout="vertical",
+            contents=[
+                FlexSeparator(margin="xl", color="#BDC3C7"),
+                FlexBox(
+                    layout="horizontal",
+                    contents=[
+                        FlexText(
+                            text="📖",
+                            size="sm",
+                            color=color,
+                            flex=0
+                        ),
+                        FlexText(
+                            text="以上為完整的四化解釋內容",
+                            size="sm",
+                            color="#7B8794",
+                            flex=1,
+                            margin="sm"
+                        )
+                    ],
+                    margin="md"
+                )
+            ]
         )
     
-    def _create_multi_bubble_detail_message(self, sihua_list: List[Dict], sihua_type: str,
-                                          user_type: str, color: str, emoji: str) -> FlexMessage:
-        """創建多個bubble的詳細解釋（內容過長時使用）"""
-        # 這個功能可以後續實現，目前先使用單bubble版本
-        return self._create_single_bubble_detail_message(sihua_list, sihua_type, user_type, color, emoji)
+    @staticmethod
+    def _explanation_text(explanation: Any) -> str:
+        """解釋內容轉為文字（字典格式逐項列出）"""
+        if isinstance(explanation, dict):
+            return "\n\n".join(f"{key}：{value}" for key, value in explanation.items() if value)
+        return explanation if isinstance(explanation, str) else str(explanation or "")
     
-    def _split_text_with_limit(self, text: str, max_length: int) -> List[str]:
-        """
-        將文字按指定長度分割，確保不超過字數限制 - 優化版本
-        
-        Args:
-            text: 要分割的文字
-            max_length: 每段的最大字數
+    def _create_text_messages_for_long_content(self, sihua_list: List[Dict], sihua_type: str, 
+                                             user_type: str, emoji: str) -> List[TextMessage]:
+        """以文字訊息顯示（Flex 訊息無法建立時的後備方案），段落封裝成最少的文字訊息"""
+        try:
+            paragraphs = [
+                f"{emoji} {sihua_type}星完整解釋\n▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪",
+                f"📖 四化概述\n{self._get_detailed_sihua_description(sihua_type)}",
+                f"✨ 您的命盤中共有 {len(sihua_list)} 顆{sihua_type}星",
+            ]
             
-        Returns:
-            分割後的文字列表
-        """
-        if not text or len(text) <= max_length:
-            return [text] if text else []
-        
-        # 優先按標點符號分割（句號、問號、驚嘆號）
-        major_punctuation = ['。', '？', '！', '；']
-        minor_punctuation = ['，', '、']
-        
-        # 先按主要標點分割
-        sentences = []
-        current_sentence = ""
-        
-        for char in text:
-            current_sentence += char
-            if char in major_punctuation:
-                sentences.append(current_sentence.strip())
-                current_sentence = ""
-        
-        # 如果還有剩餘文字
-        if current_sentence.strip():
-            sentences.append(current_sentence.strip())
-        
-        # 組合句子為段落，確保不超過字數限制
-        result = []
-        current_part = ""
-        
-        for sentence in sentences:
-            if not sentence:
-                continue
+            for sihua_info in sihua_list:
+                star_name = sihua_info.get("star", "未知星曜")
+                palace = sihua_info.get("palace", "")
+                paragraphs.append(f"⭐ {star_name} 在 {palace}\n▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪▪")
                 
-            # 檢查是否可以加入當前段落
-            test_part = current_part + sentence if current_part else sentence
+                current_category = ""  # 記錄當前分類，避免重複標籤
+                for part in split_text(self._explanation_text(sihua_info.get("explanation", "")), 180):
+                    if not part.strip():
+                        continue
+                    # 只在分類改變時顯示新標籤
+                    label, _ = self._get_content_label(part)
+                    category = label if ' ' in label else "📝 詳細說明"
+                    if category != current_category:
+                        paragraphs.append(f"{category}\n┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈\n{part.strip()}")
+                        current_category = category
+                    else:
+                        paragraphs.append(part.strip())
             
-            if len(test_part) <= max_length:
-                current_part = test_part
-            else:
-                # 如果當前段落不為空，先保存
-                if current_part:
-                    result.append(current_part)
-                    current_part = ""
-                
-                # 如果單句就超過限制，需要進一步分割
-                if len(sentence) > max_length:
-                    # 嘗試按次要標點分割
-                    sub_parts = []
-                    current_sub = ""
-                    
-                    for char in sentence:
-                        current_sub += char
-                        if char in minor_punctuation and len(current_sub) >= max_length * 0.7:
-                            sub_parts.append(current_sub.strip())
-                            current_sub = ""
-                    
-                    if current_sub.strip():
-                        sub_parts.append(current_sub.strip())
-                    
-                    # 如果還是太長，強制按字符分割
-                    for sub_part in sub_parts:
-                        if len(sub_part) <= max_length:
-                            result.append(sub_part)
-                        else:
-                            # 強制分割
-                            for i in range(0, len(sub_part), max_length):
-                                part = sub_part[i:i + max_length]
-                                if part:
-                                    result.append(part)
-                else:
-                    current_part = sentence
-        
-        # 添加最後一段
-        if current_part:
-            result.append(current_part)
-        
-        return result
+            return [TextMessage(text=text) for text in pack_text(paragraphs, continuation_prefix=f"{emoji} {sihua_type}星解釋（續）\n\n")]
+            
+        except Exception as e:
+            logger.error(f"創建文字訊息失敗: {e}")
+            # 後備方案：簡單的文字訊息
+            fallback_text = f"{emoji} {sihua_type}星詳細解釋\n\n"
+            fallback_text += f"您的命盤中有 {len(sihua_list)} 顆{sihua_type}星，"
+            fallback_text += "內容較多，建議透過其他方式查看完整解釋。\n\n"
+            fallback_text += "如有疑問，請重新進行占卜。"
+            
+            return [TextMessage(text=fallback_text)]
     
     def _get_content_label(self, text: str) -> Tuple[str, str]:
         """
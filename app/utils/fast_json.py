@@ -0,0 +1,87 @@
+"""
+快速 JSON 序列化
+優先使用 orjson（未安裝時退回標準庫 json），提供：
+- dumps_bytes / dumps / loads：命盤快照、占卜記錄 JSON 欄位使用
+- SerializedJSON：序列化一次、多處共用的位元組（HTTP 回應與資料庫欄位）
+- FastJSONResponse / chart_response：直接輸出位元組的回應類別；
+  命盤是內部產生的可信資料，chart_response 返回 Response 物件，不再經過 response_model 驗證與 jsonable_encoder
+"""
+import json
+import logging
+from typing import Any, Optional, Union
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+    logger.warning("⚠️ 未安裝 orjson，JSON 序列化使用標準庫")
+
+# 非字串的字典鍵（例如大限年齡）與標準庫 json 一樣轉為字串
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if HAS_ORJSON else 0
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """序列化為 UTF-8 位元組（不轉義中文，無多餘空白）"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, default=str, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """序列化為字串（資料庫 Text 欄位使用）"""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class SerializedJSON:
+    """已序列化的 JSON（不可變，可在請求與資料庫寫入間共用）"""
+    __slots__ = ("body", "_text")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._text: Optional[str] = None
+
+    @classmethod
+    def of(cls, obj: Any) -> "SerializedJSON":
+        return cls(dumps_bytes(obj))
+
+    @property
+    def text(self) -> str:
+        """字串形式（第一次使用時解碼）"""
+        if self._text is None:
+            self._text = self.body.decode("utf-8")
+        return self._text
+
+    def load(self) -> Any:
+        """反序列化為新的物件（每次返回獨立的副本）"""
+        return loads(self.body)
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+
+class FastJSONResponse(JSONResponse):
+    """以 orjson 輸出的 JSON 回應；內容為 SerializedJSON 或 bytes 時直接使用"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, SerializedJSON):
+            return content.body
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return dumps_bytes(content)
+
+
+def chart_response(content: Any, status_code: int = 200) -> FastJSONResponse:
+    """返回內部產生的命盤資料（略過 response_model 重新驗證）"""
+    return FastJSONResponse(content=content, status_code=status_code)
@@ -0,0 +1,251 @@
+"""
+Flex / 文字訊息封裝器
+每個元件只序列化一次並記錄精確的位元組大小，依 LINE 的限制把內容依序裝入最少的 bubble、carousel 與文字訊息，
+不需要先估算大小、超過後再重建。
+
+大小以 LINE SDK 實際送出的編碼計算（json.dumps 預設：非 ASCII 轉義為 \\uXXXX，分隔符為 ", "），
+因此中文每字以 6 bytes 計。
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from linebot.v3.messaging import FlexBubble, FlexCarousel
+
+logger = logging.getLogger(__name__)
+
+# LINE Messaging API 限制
+LINE_FLEX_BUBBLE_MAX_BYTES = 30 * 1024
+LINE_FLEX_CAROUSEL_MAX_BYTES = 50 * 1024
+LINE_CAROUSEL_MAX_BUBBLES = 12
+LINE_TEXT_MAX_CHARS = 5000
+LINE_MESSAGES_PER_REQUEST = 5
+
+# 列表中相鄰元素之間的分隔符 ", "
+_ITEM_SEPARATOR_BYTES = 2
+
+_MAJOR_PUNCTUATION = re.compile(r"[^。？！；]*[。？！；]|[^。？！；]+")
+_MINOR_PUNCTUATION = re.compile(r"[，、]")
+
+
+def json_size(model) -> int:
+    """LINE SDK 模型（或字典）送出時的 JSON 位元組數"""
+    data = model.to_dict() if hasattr(model, "to_dict") else model
+    return len(json.dumps(data))
+
+
+def _list_size(sizes: Iterable[int]) -> int:
+    """列表內元素（不含括號）的總大小"""
+    sizes = list(sizes)
+    return sum(sizes) + _ITEM_SEPARATOR_BYTES * max(len(sizes) - 1, 0)
+
+
+@dataclass
+class PackedBubble:
+    """已裝好的 bubble 及其精確大小"""
+    bubble: FlexBubble
+    size: int
+
+
+class FlexBubblePacker:
+    """
+    將元件依序裝入 bubble，再將 bubble 裝入 carousel
+
+    Args:
+        bubble_factory: contents 列表 -> FlexBubble（元件放在 body 的 contents 中）
+        max_bubble_bytes / max_carousel_bytes / max_bubbles: LINE 限制，可為安全起見調低
+    """
+
+    def __init__(self, bubble_factory: Callable[[List], FlexBubble],
+                 max_bubble_bytes: int = LINE_FLEX_BUBBLE_MAX_BYTES,
+                 max_carousel_bytes: int = LINE_FLEX_CAROUSEL_MAX_BYTES,
+                 max_bubbles: int = LINE_CAROUSEL_MAX_BUBBLES):
+        self.bubble_factory = bubble_factory
+        self.max_bubble_bytes = max_bubble_bytes
+        self.max_carousel_bytes = max_carousel_bytes
+        self.max_bubbles = max_bubbles
+        # 空 bubble 的大小只計算一次
+        self._empty_bubble_size = json_size(bubble_factory([]))
+        self._empty_carousel_size = json_size(FlexCarousel(contents=[]))
+
+    def pack(self, blocks: Sequence[Sequence], header: Sequence = (), footer: Sequence = (),
+             continuation_header: Optional[Callable[[int], Sequence]] = None) -> List[PackedBubble]:
+        """
+        依序裝入內容區塊（同一區塊盡量放在同一個 bubble）
+
+        Args:
+            blocks: 內容區塊，每個區塊是一組元件
+            header: 第一個 bubble 開頭的元件
+            footer: 最後的元件（放不下時另開 bubble）
+            continuation_header: 頁碼（從 2 起） -> 後續 bubble 開頭的元件
+        """
+        bubbles: List[PackedBubble] = []
+        header, footer = list(header), list(footer)
+        contents: List = list(header)
+        sizes: List[int] = self._measure(header)
+        # 開頭的標題元件數，只有標題的 bubble 視為空的
+        fixed = len(header)
+
+        def size_with(extra: Sequence[int] = ()) -> int:
+            return self._empty_bubble_size + _list_size(sizes + list(extra))
+
+        def fits(extra: Sequence[int]) -> bool:
+            return size_with(extra) <= self.max_bubble_bytes
+
+        def has_content() -> bool:
+            return len(contents) > fixed
+
+        def add(components: Sequence, component_sizes: Sequence[int]):
+            contents.extend(components)
+            sizes.extend(component_sizes)
+
+        def flush(last: bool = False):
+            nonlocal contents, sizes, fixed
+            bubbles.append(PackedBubble(self.bubble_factory(contents), size_with()))
+            next_header = [] if last or continuation_header is None else list(continuation_header(len(bubbles) + 1))
+            contents, sizes, fixed = next_header, self._measure(next_header), len(next_header)
+
+        for block in blocks:
+            block = list(block)
+            block_sizes = self._measure(block)
+            if not fits(block_sizes) and has_content():
+                flush()
+            if fits(block_sizes):
+                add(block, block_sizes)
+                continue
+            # 單一區塊超過一個 bubble：逐個元件裝入
+            for component, size in zip(block, block_sizes):
+                if not fits([size]) and has_content():
+                    flush()
+                if not fits([size]):
+                    logger.warning(f"單一 Flex 元件 {size} bytes 超過 bubble 上限 {self.max_bubble_bytes}")
+                add([component], [size])
+
+        footer_sizes = self._measure(footer)
+        if footer and not fits(footer_sizes) and has_content():
+            flush()
+        add(footer, footer_sizes)
+        if has_content() or not bubbles:
+            flush(last=True)
+        return bubbles
+
+    @staticmethod
+    def _measure(components: Sequence) -> List[int]:
+        return [json_size(component) for component in components]
+
+    def to_containers(self, bubbles: Sequence[PackedBubble]) -> List:
+        """
+        將 bubble 依序裝入最少的 carousel（每個 carousel 不超過 12 個 bubble 與大小上限）
+
+        Returns:
+            FlexBubble（只有一個時）或 FlexCarousel 的列表，每個元素是一則 Flex 訊息的內容
+        """
+        containers = []
+        group: List[PackedBubble] = []
+
+        def carousel_size(items: Sequence[PackedBubble]) -> int:
+            return self._empty_carousel_size + _list_size(item.size for item in items)
+
+        def flush():
+            if len(group) == 1:
+                containers.append(group[0].bubble)
+            elif group:
+                containers.append(FlexCarousel(contents=[item.bubble for item in group]))
+            group.clear()
+
+        for packed in bubbles:
+            if group and (len(group) >= self.max_bubbles or carousel_size(group + [packed]) > self.max_carousel_bytes):
+                flush()
+            group.append(packed)
+        flush()
+        return containers
+
+
+def split_text(text: str, max_length: int) -> List[str]:
+    """
+    將文字切成不超過 max_length 字的段落
+
+    優先在句號、問號、驚嘆號、分號處切分；單句過長時在逗號、頓號處（段落已達七成長度後）切分，
+    仍然過長則強制按字數切分。
+    """
+    if not text or len(text) <= max_length:
+        return [text] if text else []
+
+    sentences = [match.group().strip() for match in _MAJOR_PUNCTUATION.finditer(text)]
+
+    result: List[str] = []
+    current_part = ""
+    for sentence in sentences:
+        if not sentence:
+            continue
+        if len(current_part) + len(sentence) <= max_length:
+            current_part += sentence
+            continue
+        if current_part:
+            result.append(current_part)
+            current_part = ""
+        if len(sentence) <= max_length:
+            current_part = sentence
+            continue
+        for sub_part in _split_sentence(sentence, max_length):
+            if len(sub_part) <= max_length:
+                result.append(sub_part)
+            else:
+                result.extend(sub_part[i:i + max_length] for i in range(0, len(sub_part), max_length))
+
+    if current_part:
+        result.append(current_part)
+    return result
+
+
+def _split_sentence(sentence: str, max_length: int) -> List[str]:
+    """在次要標點處切分過長的句子"""
+    parts = []
+    start = 0
+    for match in _MINOR_PUNCTUATION.finditer(sentence):
+        end = match.end()
+        if end - start >= max_length * 0.7:
+            parts.append(sentence[start:end].strip())
+            start = end
+    rest = sentence[start:].strip()
+    if rest:
+        parts.append(rest)
+    return parts
+
+
+def pack_text(paragraphs: Iterable[str], max_chars: int = LINE_TEXT_MAX_CHARS, separator: str = "\n\n",
+              continuation_prefix: str = "") -> List[str]:
+    """
+    將段落依序裝入最少的文字訊息（每則不超過 max_chars 字）
+
+    Args:
+        paragraphs: 段落（單一段落過長時先以 split_text 切分）
+        continuation_prefix: 第二則起每則訊息開頭加上的文字
+    """
+    messages: List[str] = []
+    current: List[str] = []
+    current_length = 0
+
+    def pieces():
+        for paragraph in paragraphs:
+            if not paragraph:
+                continue
+            if len(paragraph) > max_chars - len(continuation_prefix):
+                yield from split_text(paragraph, max_chars - len(continuation_prefix))
+            else:
+                yield paragraph
+
+    for piece in pieces():
+        added = len(piece) + (len(separator) if current else 0)
+        if current and current_length + added > max_chars:
+            messages.append(separator.join(current))
+            current = [continuation_prefix + piece] if continuation_prefix else [piece]
+            current_length = len(current[0])
+            continue
+        current.append(piece)
+        current_length += added
+    if current:
+        messages.append(separator.join(current))
+    return messages
@@ -0,0 +1,52 @@
+"""
+LINE Login ID token 驗證
+前端（LIFF / LINE Login）取得的 ID token 交給 LINE 的驗證端點確認簽章、有效期與 channel，
+取得可信的 LINE 用戶 ID（sub）後才發行存取權杖。
+"""
+import logging
+import os
+from typing import Callable, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+LINE_ID_TOKEN_VERIFY_URL = "https://api.line.me/oauth2/v2.1/verify"
+DEFAULT_VERIFY_TIMEOUT_SECONDS = 5.0
+
+
+class IdTokenVerificationError(Exception):
+    """ID token 無效或無法驗證"""
+
+
+def verify_line_id_token(id_token: str, channel_id: Optional[str] = None,
+                         timeout: float = DEFAULT_VERIFY_TIMEOUT_SECONDS,
+                         post: Callable = requests.post) -> str:
+    """
+    驗證 LINE ID token，回傳 LINE 用戶 ID
+
+    Args:
+        channel_id: LINE Login channel ID（預設讀取 LINE_LOGIN_CHANNEL_ID）
+        post: HTTP POST 函數（測試時替換）
+    """
+    channel_id = channel_id or os.getenv("LINE_LOGIN_CHANNEL_ID")
+    if not channel_id:
+        raise IdTokenVerificationError("未設定 LINE_LOGIN_CHANNEL_ID，無法驗證 ID token")
+    try:
+        response = post(LINE_ID_TOKEN_VERIFY_URL, data={"id_token": id_token, "client_id": channel_id},
+                        timeout=timeout)
+    except requests.RequestException as e:
+        logger.warning(f"LINE ID token 驗證請求失敗: {e}")
+        raise IdTokenVerificationError("無法連線到 LINE 驗證 ID token")
+
+    if response.status_code != 200:
+        try:
+            reason = response.json().get("error_description", "ID token 無效")
+        except ValueError:
+            reason = "ID token 無效"
+        raise IdTokenVerificationError(reason)
+
+    user_id = response.json().get("sub")
+    if not user_id:
+        raise IdTokenVerificationError("ID token 缺少用戶 ID")
+    return user_id
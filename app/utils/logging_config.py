@@ -0,0 +1,290 @@
+"""
+日誌設定
+整個應用只在這裡設定一次根日誌：請求執行緒只把記錄放進有上限的佇列（QueueHandler），
+由背景執行緒（QueueListener）批次格式化並寫入 stdout / 檔案，請求不會等待日誌 I/O。
+
+佇列已滿時丟棄 INFO 以下的新記錄；WARNING 以上的記錄會擠掉最舊的一筆，
+丟棄的筆數由背景執行緒定期以一筆警告回報。
+fork 出的子行程（例如 ProcessPoolExecutor 的 worker）會建立新的佇列並重新啟動背景執行緒。
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.utils.timezone_helper import TAIPEI_TZ
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 256
+# 關閉時等待背景執行緒騰出佇列空間的秒數
+DEFAULT_STOP_TIMEOUT_SECONDS = 5.0
+
+# 可以延後到背景執行緒再轉成字串的參數型別
+_IMMUTABLE_ARG_TYPES = (str, int, float, bool, type(None))
+
+_configure_lock = threading.Lock()
+_listener: Optional["BatchingQueueListener"] = None
+_queue_handler: Optional["BoundedQueueHandler"] = None
+
+
+class TaipeiFormatter(logging.Formatter):
+    """台北時區的日誌格式化器"""
+    def formatTime(self, record, datefmt=None):
+        dt = datetime.fromtimestamp(record.created, tz=TAIPEI_TZ)
+        if datefmt:
+            return dt.strftime(datefmt)
+        else:
+            return dt.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+
+
+class StructuredLogPayload(dict):
+    """結構化的日誌內容，在背景執行緒格式化時才序列化為 JSON"""
+
+    def __str__(self) -> str:
+        return json.dumps(self, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """有上限的 QueueHandler，佇列滿時依等級丟棄記錄"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._lock_stats = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        不在請求執行緒格式化
+
+        只有參數可能在之後被修改時才先組成訊息；例外的 traceback 在同一個行程內直接交給背景執行緒格式化。
+        """
+        if record.args and not all(isinstance(arg, _IMMUTABLE_ARG_TYPES + (StructuredLogPayload,))
+                                   for arg in (record.args if isinstance(record.args, tuple) else (record.args,))):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                self._count_drop()
+                return
+            # 重要記錄擠掉最舊的一筆
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self._count_drop()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                self._count_drop()
+                return
+        with self._lock_stats:
+            self.enqueued += 1
+
+    def _count_drop(self):
+        with self._lock_stats:
+            self.dropped += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock_stats:
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "queued": self.queue.qsize(),
+                "max_size": self.queue.maxsize,
+            }
+
+
+class _BatchWriteMixin:
+    """一次寫入並 flush 一整批記錄"""
+
+    def handle_batch(self, records: List[logging.LogRecord]):
+        lines = []
+        for record in records:
+            if record.levelno < self.level or not self.filter(record):
+                continue
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        self.acquire()
+        try:
+            self.stream.write(self.terminator.join(lines) + self.terminator)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class BatchStreamHandler(_BatchWriteMixin, logging.StreamHandler):
+    """批次寫入的 StreamHandler"""
+
+
+class BatchFileHandler(_BatchWriteMixin, logging.FileHandler):
+    """批次寫入的 FileHandler"""
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """一次取出佇列中所有（最多 batch_size 筆）記錄，交給支援批次寫入的 handler"""
+
+    def __init__(self, log_queue: queue.Queue, *handlers, batch_size: int = DEFAULT_BATCH_SIZE,
+                 queue_handler: Optional[BoundedQueueHandler] = None,
+                 stop_timeout: float = DEFAULT_STOP_TIMEOUT_SECONDS):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        self.queue_handler = queue_handler
+        self.stop_timeout = stop_timeout
+        self._reported_drops = 0
+
+    def enqueue_sentinel(self):
+        """佇列已滿時等待背景執行緒騰出空間；逾時則擠掉最舊的記錄，關閉流程不會因 queue.Full 中斷"""
+        try:
+            self.queue.put(self._sentinel, timeout=self.stop_timeout)
+            return
+        except queue.Full:
+            pass
+        while True:
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(self._sentinel)
+                return
+            except queue.Full:
+                continue
+
+    def _drop_report(self) -> Optional[logging.LogRecord]:
+        if self.queue_handler is None:
+            return None
+        dropped = self.queue_handler.dropped
+        if dropped == self._reported_drops:
+            return None
+        newly_dropped, self._reported_drops = dropped - self._reported_drops, dropped
+        return logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                 f"⚠️ 日誌佇列已滿，丟棄 {newly_dropped} 筆記錄", None, None)
+
+    def _dispatch(self, records: List[logging.LogRecord]):
+        for handler in self.handlers:
+            if hasattr(handler, "handle_batch"):
+                handler.handle_batch(records)
+                continue
+            for record in records:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def _monitor(self):
+        log_queue = self.queue
+        while True:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            for _ in batch:
+                log_queue.task_done()
+
+            stop = any(record is self._sentinel for record in batch)
+            records = [record for record in batch if record is not self._sentinel]
+            report = self._drop_report()
+            if report is not None:
+                records.append(report)
+            if records:
+                self._dispatch(records)
+            if stop:
+                break
+
+
+def configure_logging(level: int = logging.INFO, log_file: Optional[str] = None,
+                      queue_size: Optional[int] = None) -> Optional[BoundedQueueHandler]:
+    """
+    設定根日誌（重複呼叫時不會重新設定）
+
+    Args:
+        level: 根日誌等級
+        log_file: 另外寫入的檔案（預設讀取 LOG_FILE 環境變數）
+        queue_size: 佇列上限（預設讀取 LOG_QUEUE_SIZE 環境變數）
+
+    Returns:
+        根日誌上的 QueueHandler
+    """
+    global _listener, _queue_handler
+    with _configure_lock:
+        if _listener is not None:
+            return _queue_handler
+
+        formatter = TaipeiFormatter(LOG_FORMAT)
+        handlers: List[logging.Handler] = [BatchStreamHandler(sys.stdout)]
+        log_file = log_file or os.getenv("LOG_FILE")
+        if log_file:
+            handlers.append(BatchFileHandler(log_file, encoding="utf-8"))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        _start_pipeline(handlers, queue_size or int(os.getenv("LOG_QUEUE_SIZE", str(DEFAULT_QUEUE_SIZE))))
+        logging.getLogger().setLevel(level)
+        atexit.register(shutdown_logging)
+        return _queue_handler
+
+
+def _start_pipeline(handlers: List[logging.Handler], queue_size: int):
+    """建立佇列、把根日誌換成 QueueHandler 並啟動背景執行緒"""
+    global _listener, _queue_handler
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = BoundedQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _queue_handler = queue_handler
+    _listener = BatchingQueueListener(log_queue, *handlers, queue_handler=queue_handler)
+    _listener.start()
+
+
+def _restart_after_fork():
+    """
+    子行程沒有父行程的背景執行緒，佇列的鎖也可能停在被持有的狀態：
+    以新的佇列重新啟動背景執行緒（handler 的鎖由 logging 模組在 fork 後重設）
+    """
+    global _configure_lock
+    if _listener is None:
+        return
+    _configure_lock = threading.Lock()
+    _start_pipeline(list(_listener.handlers), _listener.queue.maxsize)
+
+
+def shutdown_logging():
+    """寫出佇列中剩餘的記錄並停止背景執行緒"""
+    global _listener
+    with _configure_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def get_logging_stats() -> Dict:
+    """日誌佇列統計"""
+    return _queue_handler.get_stats() if _queue_handler is not None else {}
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from app.models.calendar import CalendarData
+from app.db.calendar_cache import calendar_lookup_cache
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +68,12 @@ class LunarDataGenerator:
         
         # 最終提交
         self.db_session.commit()
+        
+        # 新寫入的月份需要重新載入快取
+        month_cursor = datetime(start_date.year, start_date.month, 1)
+        while month_cursor <= end_date:
+            calendar_lookup_cache.invalidate(month_cursor.year, month_cursor.month)
+            month_cursor = datetime(month_cursor.year + month_cursor.month // 12, month_cursor.month % 12 + 1, 1)
         logger.info(f"農曆數據生成完成，共生成 {generated_count} 筆記錄")
         
         return generated_count
@@ -83,15 +90,8 @@ class LunarDataGenerator:
             是否成功創建記錄
         """
         try:
-            # 檢查是否已存在該記錄
-            existing = self.db_session.query(CalendarData).filter(
-                CalendarData.gregorian_year == date.year,
-                CalendarData.gregorian_month == date.month,
-                CalendarData.gregorian_day == date.day,
-                CalendarData.gregorian_hour == hour
-            ).first()
-            
-            if existing:
+            # 檢查是否已存在該記錄（整月預載的快取，避免逐小時查詢）
+            if hour in calendar_lookup_cache.get_day(self.db_session, date.year, date.month, date.day):
                 return False
             
             # 計算農曆信息
@@ -208,11 +208,9 @@ class LunarDataGenerator:
         """
         try:
             # 檢查是否已有該日期的數據
-            existing_count = self.db_session.query(CalendarData).filter(
-                CalendarData.gregorian_year == target_date.year,
-                CalendarData.gregorian_month == target_date.month,
-                CalendarData.gregorian_day == target_date.day
-            ).count()
+            existing_count = len(calendar_lookup_cache.get_day(
+                self.db_session, target_date.year, target_date.month, target_date.day
+            ))
             
             if existing_count >= 24:  # 如果已有24小時的數據
                 logger.info(f"日期 {target_date.date()} 已有完整的農曆數據")
@@ -0,0 +1,234 @@
+"""
+背景維護排程
+定期清除已過期的資料列與記憶體狀態，讓讀取路徑不必掃描越來越多的過期資料：
+- pending_bindings：expires_at 已過
+- linebot_user_sessions：updated_at 超過保留時間
+- processed_webhook_events：超過去重保留時間
+- revoked_auth_tokens：對應的權杖已過期
+- DivinationStateMachine 的記憶體會話
+- divination_history：預先建立未來月份的分區、歸檔超過保留期的 JSON 欄位
+- user_devices：寫回記憶體中彙總的 last_seen、刪除超過 device_inactive_days 未使用的設備
+
+每次只刪除有上限的批次並各自提交，不長時間鎖表；每個工作的執行次數、刪除筆數與耗時可由 get_stats 取得。
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from app.utils.timezone_helper import TAIPEI_TZ
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK_SECONDS = 30
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_BATCHES = 20
+USER_SESSION_MAX_AGE_HOURS = 24
+
+
+def purge_in_batches(db, model, condition, batch_size: int = DEFAULT_BATCH_SIZE,
+                     max_batches: int = DEFAULT_MAX_BATCHES) -> int:
+    """
+    依主鍵分批刪除符合條件的資料列（條件欄位需有索引）
+
+    Returns:
+        刪除筆數；達到 max_batches 時剩下的留給下一次執行
+    """
+    primary_key = model.__mapper__.primary_key[0]
+    deleted = 0
+    try:
+        for _ in range(max_batches):
+            keys = [row[0] for row in db.query(primary_key).filter(condition).limit(batch_size).all()]
+            if not keys:
+                break
+            db.query(model).filter(primary_key.in_(keys)).delete(synchronize_session=False)
+            db.commit()
+            deleted += len(keys)
+            if len(keys) < batch_size:
+                break
+    except Exception:
+        db.rollback()
+        raise
+    return deleted
+
+
+@dataclass
+class TaskStats:
+    """單一維護工作的執行統計"""
+    runs: int = 0
+    failures: int = 0
+    purged_total: int = 0
+    last_purged: int = 0
+    last_duration_ms: float = 0.0
+    last_run_at: Optional[str] = None
+    last_error: Optional[str] = None
+
+
+@dataclass
+class MaintenanceTask:
+    """
+    維護工作
+
+    Args:
+        func: 執行一次清理並回傳處理筆數
+        in_thread: 是否在執行緒中執行（資料庫工作）；記憶體工作直接在事件迴圈中執行
+    """
+    name: str
+    func: Callable[[], int]
+    interval_seconds: float
+    in_thread: bool = True
+    next_run_at: float = 0.0
+    stats: TaskStats = field(default_factory=TaskStats)
+
+
+class MaintenanceScheduler:
+    """依各工作的間隔輪流執行維護工作"""
+
+    def __init__(self, tick_seconds: float = DEFAULT_TICK_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.tick_seconds = tick_seconds
+        self.clock = clock
+        self.tasks: Dict[str, MaintenanceTask] = {}
+
+    def register(self, name: str, func: Callable[[], int], interval_seconds: float, in_thread: bool = True):
+        """登記維護工作（第一次在啟動後一個間隔內執行）"""
+        self.tasks[name] = MaintenanceTask(name, func, interval_seconds, in_thread)
+
+    async def run_task(self, task: MaintenanceTask) -> int:
+        """執行一次工作並記錄統計，例外不會中斷排程"""
+        started = time.perf_counter()
+        stats = task.stats
+        stats.runs += 1
+        try:
+            purged = await asyncio.to_thread(task.func) if task.in_thread else task.func()
+            stats.last_error = None
+        except Exception as e:
+            purged = 0
+            stats.failures += 1
+            stats.last_error = str(e)
+            logger.warning(f"維護工作 {task.name} 失敗: {e}")
+        stats.last_purged = purged
+        stats.purged_total += purged
+        stats.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        stats.last_run_at = datetime.now(TAIPEI_TZ).isoformat()
+        task.next_run_at = self.clock() + task.interval_seconds
+        if purged:
+            logger.info(f"🧹 維護工作 {task.name}：清除 {purged} 筆，耗時 {stats.last_duration_ms}ms")
+        return purged
+
+    async def run_due(self) -> int:
+        """執行所有到期的工作，回傳執行的工作數"""
+        now = self.clock()
+        due = [task for task in self.tasks.values() if task.next_run_at <= now]
+        for task in due:
+            await self.run_task(task)
+        return len(due)
+
+    async def run_forever(self):
+        """背景工作：每個 tick 檢查一次到期的維護工作"""
+        now = self.clock()
+        for task in self.tasks.values():
+            task.next_run_at = now + min(task.interval_seconds, self.tick_seconds)
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            await self.run_due()
+
+    def get_stats(self) -> Dict:
+        return {
+            name: dict(asdict(task.stats), interval_seconds=task.interval_seconds)
+            for name, task in self.tasks.items()
+        }
+
+
+def _with_session(func: Callable) -> Callable[[], int]:
+    """以新的資料庫會話執行清理"""
+    def run() -> int:
+        from app.db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return func(db)
+        finally:
+            db.close()
+    return run
+
+
+def purge_expired_pending_bindings(db) -> int:
+    from app.models.pending_binding import PendingBinding
+
+    return purge_in_batches(db, PendingBinding, PendingBinding.expires_at < datetime.now(TAIPEI_TZ))
+
+
+def purge_stale_user_sessions(db, max_age_hours: int = USER_SESSION_MAX_AGE_HOURS) -> int:
+    from app.models.linebot_models import UserSession
+
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    return purge_in_batches(db, UserSession, UserSession.updated_at < cutoff)
+
+
+def purge_processed_webhook_events(db) -> int:
+    from app.models.linebot_models import ProcessedWebhookEvent
+    from app.utils.webhook_dedup import DEFAULT_DEDUP_TTL_SECONDS
+
+    cutoff = datetime.utcnow() - timedelta(seconds=DEFAULT_DEDUP_TTL_SECONDS)
+    return purge_in_batches(db, ProcessedWebhookEvent, ProcessedWebhookEvent.created_at < cutoff)
+
+
+def purge_expired_revoked_tokens(db) -> int:
+    from app.models.revoked_tokens import RevokedAuthToken
+
+    return purge_in_batches(db, RevokedAuthToken, RevokedAuthToken.expires_at < time.time())
+
+
+def purge_divination_sessions(max_age_hours: int = USER_SESSION_MAX_AGE_HOURS) -> int:
+    from app.states.divination_state import divination_state_machine
+
+    return divination_state_machine.cleanup_old_sessions(max_age_hours, limit=DEFAULT_BATCH_SIZE * DEFAULT_MAX_BATCHES)
+
+
+def ensure_divination_partitions(db) -> int:
+    from app.logic.divination_history import ensure_monthly_partitions
+
+    return ensure_monthly_partitions(db)
+
+
+def archive_divination_history(db) -> int:
+    from app.logic.divination_history import run_history_archival
+
+    return run_history_archival(db)
+
+
+def flush_device_last_seen(db) -> int:
+    from app.logic.device_manager import device_manager
+
+    return device_manager.last_seen_recorder.flush(db)
+
+
+def sweep_inactive_devices(db) -> int:
+    from app.logic.device_manager import device_manager
+
+    return device_manager.sweep_inactive_devices(db).deleted
+
+
+def _create_default_scheduler() -> MaintenanceScheduler:
+    """建立預設的維護排程（MAINTENANCE_INTERVAL_SECONDS 調整資料表清理間隔）"""
+    from app.logic.device_manager import DEVICE_SWEEP_INTERVAL_SECONDS, LAST_SEEN_FLUSH_SECONDS
+
+    interval = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300"))
+    scheduler = MaintenanceScheduler()
+    scheduler.register("pending_bindings", _with_session(purge_expired_pending_bindings), interval)
+    scheduler.register("user_sessions", _with_session(purge_stale_user_sessions), interval * 3)
+    scheduler.register("processed_webhook_events", _with_session(purge_processed_webhook_events), interval * 2)
+    scheduler.register("revoked_auth_tokens", _with_session(purge_expired_revoked_tokens), interval * 2)
+    scheduler.register("divination_sessions", purge_divination_sessions, interval * 3, in_thread=False)
+    scheduler.register("divination_partitions", _with_session(ensure_divination_partitions), interval * 12)
+    scheduler.register("divination_archive", _with_session(archive_divination_history), interval * 12)
+    scheduler.register("device_last_seen", _with_session(flush_device_last_seen), LAST_SEEN_FLUSH_SECONDS)
+    scheduler.register("inactive_devices", _with_session(sweep_inactive_devices), DEVICE_SWEEP_INTERVAL_SECONDS)
+    return scheduler
+
+
+# 全局維護排程實例
+maintenance_scheduler = _create_default_scheduler()
@@ -11,6 +11,7 @@ from linebot.v3.messaging import (
     TemplateMessage, ImageCarouselTemplate, ImageCarouselColumn, 
     PostbackAction, TextMessage, QuickReply, QuickReplyItem
 )
+from app.utils.static_assets import asset_manifest
 
 logger = logging.getLogger(__name__)
 
@@ -192,28 +193,28 @@ Rich Menu 下方已提供基本功能
         """創建進階功能的 Image Carousel"""
         columns = [
             ImageCarouselColumn(
-                imageUrl="https://web-production-c5424.up.railway.app/static/2-1.png",
+                imageUrl=asset_manifest.url("static/2-1.png", "carousel"),
                 action=PostbackAction(
                     data="function=daxian_fortune",
                     displayText="🌟 大限運勢"
                 )
             ),
             ImageCarouselColumn(
-                imageUrl="https://web-production-c5424.up.railway.app/static/2-2.png",
+                imageUrl=asset_manifest.url("static/2-2.png", "carousel"),
                 action=PostbackAction(
                     data="function=xiaoxian_fortune",
                     displayText="🎯 小限運勢"
                 )
             ),
             ImageCarouselColumn(
-                imageUrl="https://web-production-c5424.up.railway.app/static/2-3.png",
+                imageUrl=asset_manifest.url("static/2-3.png", "carousel"),
                 action=PostbackAction(
                     data="function=yearly_fortune",
                     displayText="📅 流年運勢"
                 )
             ),
             ImageCarouselColumn(
-                imageUrl="https://web-production-c5424.up.railway.app/static/2-4.png",
+                imageUrl=asset_manifest.url("static/2-4.png", "carousel"),
                 action=PostbackAction(
                     data="function=monthly_fortune",
                     displayText="🌙 流月運勢"
@@ -0,0 +1,198 @@
+"""
+LINE 回覆訊息組合器
+一個事件的所有訊息先收集起來，優先填滿 reply token 的 5 則額度（回覆不計入推播額度），
+相鄰的短文字訊息合併為一則；超過 5 則時剩餘訊息以每次最多 5 則的 push 批次送出（不需要固定延遲，
+API 呼叫依序完成即保持順序），並記錄每位用戶使用的推播則數。
+
+只有 LINE 明確回應 reply token 無效（過期或已使用）時，第一批才改以 push 重送；
+逾時等結果不明的失敗可能已經送達，不重送以免用戶收到重複訊息。
+"""
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from linebot.v3.messaging import PushMessageRequest, ReplyMessageRequest, TextMessage
+from linebot.v3.messaging.exceptions import ApiException
+
+from app.utils.flex_packer import LINE_MESSAGES_PER_REQUEST, LINE_TEXT_MAX_CHARS
+from app.utils.timezone_helper import TAIPEI_TZ
+
+logger = logging.getLogger(__name__)
+
+# 合併文字訊息時使用的分隔
+TEXT_MERGE_SEPARATOR = "\n\n"
+
+
+@dataclass
+class PushUsage:
+    """單一用戶的推播用量"""
+    month: str
+    messages: int = 0
+    requests: int = 0
+
+
+class PushQuotaTracker:
+    """推播用量統計（每位用戶、每月；LINE 以每則訊息計算推播額度）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage: Dict[str, PushUsage] = {}
+        self._totals: Dict[str, int] = defaultdict(int)
+        self._replies = 0
+        self._reply_messages = 0
+
+    @staticmethod
+    def _current_month() -> str:
+        return datetime.now(TAIPEI_TZ).strftime("%Y-%m")
+
+    def record_push(self, user_id: str, message_count: int):
+        month = self._current_month()
+        with self._lock:
+            usage = self._usage.get(user_id)
+            if usage is None or usage.month != month:
+                usage = self._usage[user_id] = PushUsage(month=month)
+            usage.messages += message_count
+            usage.requests += 1
+            self._totals[month] += message_count
+
+    def record_reply(self, message_count: int):
+        with self._lock:
+            self._replies += 1
+            self._reply_messages += message_count
+
+    def get_usage(self, user_id: str) -> int:
+        """本月已推播給該用戶的訊息數"""
+        with self._lock:
+            usage = self._usage.get(user_id)
+            return usage.messages if usage and usage.month == self._current_month() else 0
+
+    def get_stats(self) -> Dict:
+        month = self._current_month()
+        with self._lock:
+            return {
+                "month": month,
+                "push_messages": self._totals.get(month, 0),
+                "push_users": sum(1 for usage in self._usage.values() if usage.month == month),
+                "replies": self._replies,
+                "reply_messages": self._reply_messages,
+            }
+
+
+def _is_plain_text(message) -> bool:
+    """可合併的純文字訊息（沒有 Quick Reply、表情等附加內容）"""
+    return (
+        isinstance(message, TextMessage)
+        and message.quick_reply is None
+        and not getattr(message, "emojis", None)
+        and getattr(message, "sender", None) is None
+    )
+
+
+def merge_text_messages(messages: Iterable, max_chars: int = LINE_TEXT_MAX_CHARS) -> List:
+    """合併相鄰的純文字訊息（合併後不超過 max_chars 字），其他訊息保持原順序"""
+    merged: List = []
+    for message in messages:
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None and _is_plain_text(previous) and _is_plain_text(message)
+            and len(previous.text) + len(TEXT_MERGE_SEPARATOR) + len(message.text) <= max_chars
+        ):
+            merged[-1] = TextMessage(text=previous.text + TEXT_MERGE_SEPARATOR + message.text)
+        else:
+            merged.append(message)
+    return merged
+
+
+def is_invalid_reply_token(error: Exception) -> bool:
+    """LINE 是否明確拒絕了 reply token（400 Invalid reply token）"""
+    if not isinstance(error, ApiException) or error.status != 400:
+        return False
+    body = error.body or b""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    return "invalid reply token" in body.lower()
+
+
+class OutboundComposer:
+    """
+    單一事件的訊息組合器
+
+    用法：
+        composer = OutboundComposer(line_bot_api, reply_token, user_id)
+        composer.add(flex_message, *text_messages)
+        composer.send()
+    """
+
+    def __init__(self, api, reply_token: Optional[str], user_id: Optional[str],
+                 quota_tracker: Optional[PushQuotaTracker] = None):
+        self.api = api
+        self.reply_token = reply_token
+        self.user_id = user_id
+        self.quota_tracker = quota_tracker or push_quota_tracker
+        self._messages: List = []
+
+    def add(self, *messages) -> "OutboundComposer":
+        """加入訊息（可傳入訊息列表，None 會被忽略）"""
+        for message in messages:
+            if message is None:
+                continue
+            if isinstance(message, (list, tuple)):
+                self.add(*message)
+            else:
+                self._messages.append(message)
+        return self
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def plan(self) -> List[List]:
+        """合併後依每次請求 5 則分批（第一批使用 reply token）"""
+        messages = merge_text_messages(self._messages)
+        return [messages[i:i + LINE_MESSAGES_PER_REQUEST] for i in range(0, len(messages), LINE_MESSAGES_PER_REQUEST)]
+
+    def send(self) -> int:
+        """
+        送出所有訊息
+
+        Returns:
+            以 push 送出的訊息數
+        """
+        batches = self.plan()
+        self._messages = []
+        if not batches:
+            return 0
+
+        if self.reply_token:
+            try:
+                self.api.reply_message(ReplyMessageRequest(reply_token=self.reply_token, messages=batches[0]))
+                self.quota_tracker.record_reply(len(batches[0]))
+                batches = batches[1:]
+            except Exception as e:
+                if is_invalid_reply_token(e):
+                    # reply token 過期或已使用：全部改以 push 送出
+                    logger.warning(f"reply token 無效，改用推播: {e}")
+                else:
+                    # 結果不明（例如逾時）或其他錯誤：第一批可能已送達，不重送
+                    logger.error(f"回覆訊息失敗，未改用推播以免重複送出 {len(batches[0])} 則: {e}")
+                    batches = batches[1:]
+            finally:
+                self.reply_token = None
+
+        pushed = 0
+        for batch in batches:
+            if not self.user_id:
+                logger.error(f"沒有用戶 ID，無法推播剩餘 {len(batch)} 則訊息")
+                break
+            self.api.push_message(PushMessageRequest(to=self.user_id, messages=batch))
+            self.quota_tracker.record_push(self.user_id, len(batch))
+            pushed += len(batch)
+        if pushed:
+            logger.info(f"📨 推播 {pushed} 則訊息給 {self.user_id}（本月共 {self.quota_tracker.get_usage(self.user_id)} 則）")
+        return pushed
+
+
+# 全局推播用量統計實例
+push_quota_tracker = PushQuotaTracker()
@@ -6,7 +6,9 @@ import logging
 
 from app.db.database import get_db
 from app.logic.permission_manager import PermissionManager
-from app.logic.device_manager import DeviceManager
+from app.logic.device_manager import device_manager
+from app.utils.rate_limiter import rate_limiter
+from app.utils.auth_tokens import InvalidTokenError, auth_token_service
 
 logger = logging.getLogger(__name__)
 
@@ -35,13 +37,87 @@ def extract_user_id_from_request(request: Request) -> Optional[str]:
     
     return None
 
+def extract_bearer_token(request: Request) -> Optional[str]:
+    """從 Authorization 標頭取得簽章權杖"""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    token = token.strip()
+    return token if scheme.lower() == "bearer" and token else None
+
+def _raise_rate_limited(rate_limit_result: dict):
+    raise HTTPException(
+        status_code=429, 
+        detail={
+            "error": "API調用次數已達每日限制",
+            "daily_limit": rate_limit_result["daily_limit"],
+            "remaining_calls": rate_limit_result["remaining_calls"]
+        }
+    )
+
+def _raise_premium_required():
+    raise HTTPException(
+        status_code=402, 
+        detail={
+            "error": "需要付費會員權限",
+            "message": "此功能僅限付費會員使用",
+            "upgrade_url": "/upgrade"
+        }
+    )
+
+def _raise_device_limit(device_check: dict):
+    raise HTTPException(
+        status_code=403,
+        detail={
+            "error": "設備數量超過限制",
+            "message": device_check["message"],
+            "registered_devices": device_check["registered_devices"],
+            "max_devices": device_check["max_devices"]
+        }
+    )
+
+def check_token_permission(token: str, request: Request, level: str, db: Session,
+                           check_device: bool = True) -> str:
+    """
+    以簽章權杖檢查權限（角色與付費到期在權杖內，不查詢資料庫）
+    
+    權杖綁定設備；設備數量限制由 device_manager 檢查（已登記的設備走行程內快取並記錄 last_seen）。
+    驗證後的權杖內容放在 request.state.token_claims
+    """
+    device_fingerprint = request.headers.get("X-Device-Fingerprint")
+    try:
+        claims = auth_token_service.verify(token, device_fingerprint)
+    except InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    if claims.device is None or not device_fingerprint:
+        raise HTTPException(status_code=401, detail="權杖未綁定設備", headers={"WWW-Authenticate": "Bearer"})
+    
+    rate_limit_result = rate_limiter.check_daily_api_quota(claims.user_id, db, daily_limit=claims.daily_limit)
+    if not rate_limit_result["can_call"]:
+        _raise_rate_limited(rate_limit_result)
+    
+    if check_device:
+        device_check = device_manager.check_device_permission(claims.user_id, device_fingerprint, db)
+        if not device_check["can_access"]:
+            _raise_device_limit(device_check)
+    
+    if level == PermissionLevel.ADMIN and not claims.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理員權限")
+    if level == PermissionLevel.PREMIUM and not claims.is_premium():
+        _raise_premium_required()
+    
+    request.state.token_claims = claims
+    return claims.user_id
+
 # 簡化的權限檢查依賴注入函數
 def get_user_permission_check(level: str = PermissionLevel.FREE, check_device: bool = True):
-    """權限檢查依賴注入函數"""
+    """權限檢查依賴注入函數（帶有簽章權杖時不查詢資料庫，否則使用 X-User-ID 逐項查詢）"""
     def permission_dependency(
         request: Request,
         db: Session = Depends(get_db)
     ) -> str:
+        token = extract_bearer_token(request)
+        if token:
+            return check_token_permission(token, request, level, db, check_device)
+        
         # 提取用戶ID
         user_id = extract_user_id_from_request(request)
         if not user_id:
@@ -49,32 +125,17 @@ def get_user_permission_check(level: str = PermissionLevel.FREE, check_device: b
         
         try:
             # 檢查API調用頻率限制
-            rate_limit_result = PermissionManager.check_api_rate_limit(user_id, db)
+            rate_limit_result = rate_limiter.check_daily_api_quota(user_id, db)
             if not rate_limit_result["can_call"]:
-                raise HTTPException(
-                    status_code=429, 
-                    detail={
-                        "error": "API調用次數已達每日限制",
-                        "daily_limit": rate_limit_result["daily_limit"],
-                        "remaining_calls": rate_limit_result["remaining_calls"]
-                    }
-                )
+                _raise_rate_limited(rate_limit_result)
             
             # 檢查設備限制
             if check_device:
                 device_fingerprint = request.headers.get("X-Device-Fingerprint")
                 if device_fingerprint:
-                    device_check = DeviceManager.check_device_permission(user_id, device_fingerprint, db)
+                    device_check = device_manager.check_device_permission(user_id, device_fingerprint, db)
                     if not device_check["can_access"]:
-                        raise HTTPException(
-                            status_code=403,
-                            detail={
-                                "error": "設備數量超過限制",
-                                "message": device_check["message"],
-                                "registered_devices": device_check["registered_devices"],
-                                "max_devices": device_check["max_devices"]
-                            }
-                        )
+                        _raise_device_limit(device_check)
             
             # 檢查功能權限
             if level == PermissionLevel.ADMIN:
@@ -83,14 +144,7 @@ def get_user_permission_check(level: str = PermissionLevel.FREE, check_device: b
                     
             elif level == PermissionLevel.PREMIUM:
                 if not PermissionManager.check_premium_access(user_id, db):
-                    raise HTTPException(
-                        status_code=402, 
-                        detail={
-                            "error": "需要付費會員權限",
-                            "message": "此功能僅限付費會員使用",
-                            "upgrade_url": "/upgrade"
-                        }
-                    )
+                    _raise_premium_required()
             
             return user_id
             
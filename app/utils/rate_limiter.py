@@ -0,0 +1,437 @@
+"""
+速率限制
+統一處理兩種限制：
+1. 端點的請求頻率（例如每個 IP 每分鐘 10 次），以 token bucket 計算
+2. 用戶每日 API 調用上限，以每日計數器計算
+
+計數存放在後端：預設為行程內記憶體；設定 RATE_LIMIT_STORAGE_URL（SQLite 檔案或 PostgreSQL）時
+改用共用資料表，多個 uvicorn worker 共用同一份計數。
+每日用量先在記憶體彙總，由背景工作定期批次寫回 user_permissions，而不是每次請求寫一次資料庫。
+"""
+import asyncio
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Column, Float, MetaData, String, Table, case, create_engine, event, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.utils.timezone_helper import TAIPEI_TZ
+
+logger = logging.getLogger(__name__)
+
+_PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_RATE_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(?:(\d+)\s*)?(second|minute|hour|day)s?\s*$")
+
+# 用戶設定的快取時間（會員等級變更時本行程立即失效，其他 worker 最多延遲這麼久生效）
+USER_LIMIT_CACHE_SECONDS = 300
+DEFAULT_USAGE_FLUSH_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """每 period_seconds 秒最多 capacity 次"""
+    capacity: int
+    period_seconds: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period_seconds
+
+    @classmethod
+    def parse(cls, text: str) -> "RateLimit":
+        """解析 "10/minute"、"100/2 hours" 形式的限制"""
+        match = _RATE_PATTERN.match(text.lower())
+        if not match:
+            raise ValueError(f"無法解析的速率限制: {text}")
+        count, multiplier, unit = match.groups()
+        return cls(int(count), int(multiplier or 1) * _PERIOD_SECONDS[unit])
+
+
+@dataclass
+class RateLimitResult:
+    """限制檢查結果"""
+    allowed: bool
+    remaining: float
+    retry_after: float = 0.0
+
+
+class MemoryRateLimitBackend:
+    """行程內的計數（每個 worker 各自計算）"""
+
+    # 檢查不會阻塞，可直接在事件迴圈中執行
+    blocking = False
+
+    # 每多少次操作清理一次過期的鍵
+    PURGE_EVERY = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> [value, updated_at, expires_at]
+        self._entries: Dict[str, list] = {}
+        self._operations = 0
+
+    def _maybe_purge(self, now: float):
+        self._operations += 1
+        if self._operations % self.PURGE_EVERY == 0:
+            expired = [key for key, entry in self._entries.items() if entry[2] <= now]
+            for key in expired:
+                del self._entries[key]
+
+    def take_token(self, key: str, limit: RateLimit, now: float) -> RateLimitResult:
+        with self._lock:
+            self._maybe_purge(now)
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                tokens = float(limit.capacity)
+            else:
+                tokens = min(float(limit.capacity), entry[0] + (now - entry[1]) * limit.refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._entries[key] = [tokens, now, now + limit.period_seconds]
+        return _bucket_result(allowed, tokens, limit)
+
+    def increment(self, key: str, limit: int, expires_at: float, initial: int, now: float) -> RateLimitResult:
+        with self._lock:
+            self._maybe_purge(now)
+            entry = self._entries.get(key)
+            used = initial if entry is None or entry[2] <= now else entry[0]
+            allowed = used < limit
+            if allowed:
+                used += 1
+            self._entries[key] = [used, now, expires_at]
+        return _counter_result(allowed, used, limit, expires_at, now)
+
+
+class SQLRateLimitBackend:
+    """
+    共用資料表計數（SQLite 檔案使用 WAL 模式，或 PostgreSQL）
+
+    每次檢查是條件式 UPDATE（鍵不存在時 INSERT ... ON CONFLICT DO NOTHING），由資料庫保證原子性；
+    token bucket 超過一個週期未使用時必然已補滿，每日計數的鍵含日期，因此過期的列只需定期清理。
+    資料表在初始化時自動建立。
+    """
+
+    # 每次檢查都會查詢資料庫，async 端點改在執行緒池執行
+    blocking = True
+
+    def __init__(self, url: str):
+        self.engine = create_engine(url, pool_pre_ping=True)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _enable_sqlite_wal)
+            self._dialect_insert = sqlite_insert
+        elif self.engine.dialect.name == "postgresql":
+            self._dialect_insert = postgresql_insert
+        else:
+            raise ValueError(f"速率限制共用存儲不支援 {self.engine.dialect.name}")
+        metadata = MetaData()
+        self.table = Table(
+            "rate_limit_counters", metadata,
+            Column("key", String(200), primary_key=True),
+            Column("value", Float, nullable=False),
+            Column("updated_at", Float, nullable=False),
+            Column("expires_at", Float, nullable=False, index=True),
+        )
+        metadata.create_all(self.engine, checkfirst=True)
+
+    def _insert(self, conn, key: str, value: float, now: float, expires_at: float) -> bool:
+        """插入新的計數，鍵已存在（或已被其他 worker 建立）時回傳 False"""
+        statement = self._dialect_insert(self.table).values(
+            key=key, value=value, updated_at=now, expires_at=expires_at
+        ).on_conflict_do_nothing(index_elements=["key"])
+        return conn.execute(statement).rowcount == 1
+
+    def _current_value(self, conn, key: str) -> Optional[Tuple[float, float]]:
+        row = conn.execute(select(self.table.c.value, self.table.c.updated_at).where(self.table.c.key == key)).first()
+        return (row.value, row.updated_at) if row else None
+
+    def take_token(self, key: str, limit: RateLimit, now: float) -> RateLimitResult:
+        t = self.table
+        refilled = t.c.value + (now - t.c.updated_at) * limit.refill_per_second
+        tokens = case((refilled > limit.capacity, float(limit.capacity)), else_=refilled)
+        with self.engine.begin() as conn:
+            updated = conn.execute(
+                update(t).where(t.c.key == key, tokens >= 1)
+                .values(value=tokens - 1, updated_at=now, expires_at=now + limit.period_seconds)
+            ).rowcount
+            if updated:
+                current = self._current_value(conn, key)
+                return _bucket_result(True, current[0] if current else 0.0, limit)
+            if self._insert(conn, key, limit.capacity - 1, now, now + limit.period_seconds):
+                return _bucket_result(True, limit.capacity - 1, limit)
+            current = self._current_value(conn, key)
+        remaining = min(limit.capacity, current[0] + (now - current[1]) * limit.refill_per_second) if current else 0.0
+        return _bucket_result(False, remaining, limit)
+
+    def increment(self, key: str, limit: int, expires_at: float, initial: int, now: float) -> RateLimitResult:
+        t = self.table
+        with self.engine.begin() as conn:
+            updated = conn.execute(
+                update(t).where(t.c.key == key, t.c.value < limit).values(value=t.c.value + 1, updated_at=now)
+            ).rowcount
+            if not updated and initial < limit:
+                updated = self._insert(conn, key, initial + 1, now, expires_at)
+            current = self._current_value(conn, key)
+        used = int(current[0]) if current else initial
+        return _counter_result(bool(updated), used, limit, expires_at, now)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """刪除過期的計數"""
+        now = time.time() if now is None else now
+        with self.engine.begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.expires_at <= now)).rowcount
+
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def _bucket_result(allowed: bool, tokens: float, limit: RateLimit) -> RateLimitResult:
+    retry_after = 0.0 if allowed else (1 - tokens) / limit.refill_per_second
+    return RateLimitResult(allowed=allowed, remaining=max(tokens, 0.0), retry_after=max(retry_after, 0.0))
+
+
+def _counter_result(allowed: bool, used: float, limit: int, expires_at: float, now: float) -> RateLimitResult:
+    return RateLimitResult(allowed=allowed, remaining=max(limit - used, 0),
+                           retry_after=0.0 if allowed else max(expires_at - now, 0.0))
+
+
+def _client_address(request: Request) -> str:
+    """與 slowapi 的 get_remote_address 相同：直接連線的位址"""
+    return request.client.host if request.client else "127.0.0.1"
+
+
+def _end_of_taipei_day(now: float) -> Tuple[date, float]:
+    current = datetime.fromtimestamp(now, TAIPEI_TZ)
+    next_day = datetime.combine(current.date() + timedelta(days=1), datetime.min.time(), TAIPEI_TZ)
+    return current.date(), next_day.timestamp()
+
+
+class DailyUsageRecorder:
+    """在記憶體彙總每位用戶每日的 API 調用次數，定期批次寫回 user_permissions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, date], int] = defaultdict(int)
+
+    def record(self, user_id: str, day: date, count: int = 1):
+        with self._lock:
+            self._pending[(user_id, day)] += count
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(self._pending.values())
+
+    def flush(self, db) -> int:
+        """
+        將彙總的用量寫回資料庫
+
+        Returns:
+            寫回的用戶數
+        """
+        from app.models.user_permissions import UserPermissions
+
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return 0
+
+        try:
+            user_ids = {user_id for user_id, _ in pending}
+            rows = {
+                row.user_id: row
+                for row in db.query(UserPermissions).filter(UserPermissions.user_id.in_(user_ids))
+            }
+            # 依日期順序套用，跨日的用量會重設計數
+            for (user_id, day), count in sorted(pending.items(), key=lambda item: item[0][1]):
+                row = rows.get(user_id)
+                if row is None:
+                    row = rows[user_id] = UserPermissions(user_id=user_id, daily_api_calls=0)
+                    db.add(row)
+                same_day = row.last_api_call_date is not None and row.last_api_call_date.date() == day
+                row.daily_api_calls = (row.daily_api_calls or 0) + count if same_day else count
+                row.last_api_call_date = datetime.combine(day, datetime.now(TAIPEI_TZ).time())
+            db.commit()
+            logger.info(f"📊 已寫回 {len(rows)} 位用戶的每日 API 用量")
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            # 寫回失敗時放回待寫入的用量，下次再試
+            with self._lock:
+                for key, count in pending.items():
+                    self._pending[key] += count
+            logger.error(f"寫回每日 API 用量失敗: {e}")
+            return 0
+
+
+class RateLimiter:
+    """
+    速率限制器
+
+    用法：
+        @router.get("/path")
+        @rate_limiter.limit("10/minute")
+        async def endpoint(request: Request): ...
+    """
+
+    def __init__(self, backend=None, usage_recorder: Optional[DailyUsageRecorder] = None,
+                 clock: Callable[[], float] = time.time):
+        self.backend = backend or MemoryRateLimitBackend()
+        self.usage_recorder = usage_recorder or DailyUsageRecorder()
+        self.clock = clock
+        self._user_limits: Dict[str, Tuple[int, date, int, float]] = {}
+        self._user_limits_lock = threading.Lock()
+
+    def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        """對指定的鍵消耗一個 token"""
+        return self.backend.take_token(key, limit, self.clock())
+
+    def limit(self, rate: str, key_func: Callable[[Request], str] = _client_address):
+        """端點裝飾器：超過限制時回應 429（端點需有 request: Request 參數）"""
+        parsed = RateLimit.parse(rate)
+
+        def decorator(func):
+            def check(args, kwargs):
+                request = kwargs.get("request")
+                if request is None:
+                    request = next((arg for arg in args if isinstance(arg, Request)), None)
+                if request is None:
+                    raise RuntimeError(f"{func.__name__} 需要 request: Request 參數才能限制速率")
+                key = f"{func.__module__}.{func.__name__}:{key_func(request)}"
+                result = self.hit(key, parsed)
+                if not result.allowed:
+                    logger.warning(f"速率限制 {rate} 已達上限: {key}")
+                    raise HTTPException(
+                        status_code=429,
+                        detail=f"Rate limit exceeded: {rate}",
+                        headers={"Retry-After": str(int(result.retry_after) + 1)},
+                    )
+
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if getattr(self.backend, "blocking", False):
+                        await run_in_threadpool(check, args, kwargs)
+                    else:
+                        check(args, kwargs)
+                    return await func(*args, **kwargs)
+                return async_wrapper
+
+            @wraps(func)
+            def sync_wrapper(*args, **kwargs):
+                check(args, kwargs)
+                return func(*args, **kwargs)
+            return sync_wrapper
+
+        return decorator
+
+    def invalidate_user_limit(self, user_id: str):
+        """會員等級或權限變更時清除快取的每日上限"""
+        with self._user_limits_lock:
+            self._user_limits.pop(user_id, None)
+
+    def _load_user_limit(self, user_id: str, db, day: date, now: float,
+                         daily_limit: Optional[int] = None) -> Tuple[int, int]:
+        """
+        讀取（並快取）用戶的每日上限與資料庫中今日已記錄的調用次數
+
+        已知上限時（例如來自簽章權杖），今日的調用次數每個 worker 每天只需讀取一次。
+        """
+        with self._user_limits_lock:
+            cached = self._user_limits.get(user_id)
+        if cached and cached[1] == day:
+            if daily_limit is not None:
+                return daily_limit, cached[2]
+            if now - cached[3] < USER_LIMIT_CACHE_SECONDS:
+                return cached[0], cached[2]
+
+        from app.models.user_permissions import UserPermissions
+
+        permissions = db.query(UserPermissions).filter(UserPermissions.user_id == user_id).first()
+        if permissions is None:
+            daily_limit = UserPermissions.daily_api_limit.default.arg if daily_limit is None else daily_limit
+            used_today = 0
+        else:
+            daily_limit = permissions.get_daily_api_limit() if daily_limit is None else daily_limit
+            last_call = permissions.last_api_call_date
+            used_today = (permissions.daily_api_calls or 0) if last_call and last_call.date() == day else 0
+        with self._user_limits_lock:
+            self._user_limits[user_id] = (daily_limit, day, used_today, now)
+        return daily_limit, used_today
+
+    def check_daily_api_quota(self, user_id: str, db, daily_limit: Optional[int] = None) -> Dict:
+        """
+        檢查並消耗用戶今日的 API 調用次數（只讀取資料庫，用量由 DailyUsageRecorder 批次寫回）
+
+        Args:
+            daily_limit: 已知的每日上限（未提供時從 user_permissions 讀取）
+
+        Returns:
+            {"can_call": bool, "daily_limit": int, "remaining_calls": int}
+        """
+        now = self.clock()
+        day, expires_at = _end_of_taipei_day(now)
+        daily_limit, used_today = self._load_user_limit(user_id, db, day, now, daily_limit)
+        result = self.backend.increment(f"api_daily:{user_id}:{day.isoformat()}", daily_limit,
+                                        expires_at, used_today, now)
+        if result.allowed:
+            self.usage_recorder.record(user_id, day)
+        return {
+            "can_call": result.allowed,
+            "daily_limit": daily_limit,
+            "remaining_calls": int(result.remaining),
+        }
+
+    def flush_usage(self) -> int:
+        """以新的資料庫會話寫回每日用量"""
+        from app.db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return self.usage_recorder.flush(db)
+        finally:
+            db.close()
+
+    async def run_usage_flusher(self, interval_seconds: float = DEFAULT_USAGE_FLUSH_SECONDS):
+        """背景工作：定期寫回每日用量並清理過期計數，取消時做最後一次寫回"""
+        try:
+            while True:
+                await asyncio.sleep(interval_seconds)
+                await asyncio.to_thread(self.flush_usage)
+                if hasattr(self.backend, "purge_expired"):
+                    await asyncio.to_thread(self.backend.purge_expired)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.flush_usage)
+            raise
+
+
+def _create_default_rate_limiter() -> RateLimiter:
+    """依環境變數建立速率限制器（RATE_LIMIT_STORAGE_URL 未設定時使用記憶體）"""
+    storage_url = os.getenv("RATE_LIMIT_STORAGE_URL")
+    if storage_url:
+        try:
+            backend = SQLRateLimitBackend(storage_url)
+            logger.info(f"速率限制使用共用存儲: {backend.engine.dialect.name}")
+            return RateLimiter(backend)
+        except Exception as e:
+            logger.warning(f"速率限制共用存儲無法使用，改用記憶體: {e}")
+    return RateLimiter()
+
+
+# 全局速率限制器實例
+rate_limiter = _create_default_rate_limiter()
@@ -111,8 +111,9 @@ class RichMenuManager:
     def upload_rich_menu_image(self, rich_menu_id: str, image_path: str) -> bool:
         """上傳 Rich Menu 圖片"""
         try:
+            content_type = "image/png" if image_path.lower().endswith(".png") else "image/jpeg"
             with open(image_path, 'rb') as f:
-                self.line_bot_api.set_rich_menu_image(rich_menu_id, "image/jpeg", f)
+                self.line_bot_api.set_rich_menu_image(rich_menu_id, content_type, f)
             logger.info(f"✅ 成功上傳 Rich Menu 圖片: {rich_menu_id}")
             return True
         except LineBotApiError as e:
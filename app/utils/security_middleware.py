@@ -1,15 +1,78 @@
 """
 安全中間件模組
+
+每個請求都會經過這裡，可疑字串與 IP 白名單在初始化時預先編譯：
+可疑字串合併為單一正規表示式，只有命中時才依原順序找出是哪一個字串；
+LINE IP 網段合併為排序後的整數區間以二分搜尋比對，並以每個 IP 的判定結果做 LRU 快取。
 """
 import os
+import re
+import bisect
+import ipaddress
 import logging
+from functools import lru_cache
 from fastapi import Request, HTTPException
-from typing import List, Optional
-from datetime import datetime, timezone, timedelta
-import json
+from typing import Iterable, List, Optional, Sequence, Tuple
+from datetime import datetime
+
+from app.utils.logging_config import StructuredLogPayload
+from app.utils.timezone_helper import TAIPEI_TZ
 
 logger = logging.getLogger(__name__)
 
+# 每個 IP 判定結果的快取上限
+IP_VERDICT_CACHE_SIZE = 4096
+
+
+class SubstringMatcher:
+    """以單一編譯後的正規表示式檢查多個子字串"""
+    
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self._regex = re.compile("|".join(re.escape(pattern) for pattern in self.patterns)) if self.patterns else None
+    
+    def first(self, text: str) -> Optional[str]:
+        """回傳依清單順序第一個出現在 text 中的子字串（與逐一 `in` 檢查的結果相同）"""
+        if self._regex is None or not self._regex.search(text):
+            return None
+        # 只有命中時才逐一比對，以保留原本的清單優先順序
+        for pattern in self.patterns:
+            if pattern in text:
+                return pattern
+        return None
+
+
+class IPNetworkSet:
+    """預先編譯的 IP 網段集合（IPv4 / IPv6 各自合併為排序後的整數區間）"""
+    
+    def __init__(self, networks: Iterable[str]):
+        ranges = {4: [], 6: []}
+        for network in networks:
+            net = ipaddress.ip_network(network, strict=False)
+            ranges[net.version].append((int(net.network_address), int(net.broadcast_address)))
+        self._starts = {}
+        self._ends = {}
+        for version, items in ranges.items():
+            merged = self._merge(items)
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+    
+    @staticmethod
+    def _merge(items: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted(items):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+    
+    def __contains__(self, ip) -> bool:
+        starts = self._starts[ip.version]
+        index = bisect.bisect_right(starts, int(ip)) - 1
+        return index >= 0 and int(ip) <= self._ends[ip.version][index]
+
+
 class SecurityMiddleware:
     """安全中間件類"""
     
@@ -34,46 +97,49 @@ class SecurityMiddleware:
             "script", "javascript", "onload", "onerror", "eval", "alert",
             "../", "..\\", "/etc/passwd", "/proc/", "cmd.exe", "powershell"
         ]
+        self.suspicious_agents = ["bot", "crawler", "spider", "scan", "hack"]
+        
+        # 預先編譯
+        self._pattern_matcher = SubstringMatcher(self.suspicious_patterns)
+        self._agent_matcher = SubstringMatcher(self.suspicious_agents)
+        self._line_networks = IPNetworkSet(self.line_ip_whitelist)
+        self._admin_ips = frozenset(self.admin_ip_whitelist) | {"127.0.0.1"}
+        self._line_ip_verdict = lru_cache(maxsize=IP_VERDICT_CACHE_SIZE)(self._check_line_ip_uncached)
+        self.line_ip_check_enabled = os.getenv("ENABLE_LINE_IP_CHECK", "false").lower() == "true"
     
-    def check_line_ip(self, client_ip: str) -> bool:
-        """檢查是否為 LINE 官方 IP"""
+    def _check_line_ip_uncached(self, client_ip: str) -> bool:
         try:
-            import ipaddress
-            client_ip_obj = ipaddress.ip_address(client_ip)
-            
-            for ip_range in self.line_ip_whitelist:
-                if client_ip_obj in ipaddress.ip_network(ip_range):
-                    return True
-            
-            return False
+            return ipaddress.ip_address(client_ip) in self._line_networks
         except Exception as e:
             logger.warning(f"IP 檢查失敗: {e}")
             return False
     
+    def check_line_ip(self, client_ip: str) -> bool:
+        """檢查是否為 LINE 官方 IP"""
+        return self._line_ip_verdict(client_ip)
+    
     def check_admin_ip(self, client_ip: str) -> bool:
         """檢查是否為管理員 IP"""
-        return client_ip in self.admin_ip_whitelist or client_ip == "127.0.0.1"
+        return client_ip in self._admin_ips
     
     def detect_suspicious_request(self, request: Request) -> Optional[str]:
         """檢測可疑請求"""
         try:
             # 檢查 URL 路徑
-            path = str(request.url.path).lower()
-            for pattern in self.suspicious_patterns:
-                if pattern in path:
-                    return f"可疑路徑模式: {pattern}"
+            pattern = self._pattern_matcher.first(str(request.url.path).lower())
+            if pattern:
+                return f"可疑路徑模式: {pattern}"
             
             # 檢查查詢參數
-            query_params = str(request.url.query).lower()
-            for pattern in self.suspicious_patterns:
-                if pattern in query_params:
-                    return f"可疑查詢參數: {pattern}"
+            pattern = self._pattern_matcher.first(str(request.url.query).lower())
+            if pattern:
+                return f"可疑查詢參數: {pattern}"
             
             # 檢查 User-Agent
             user_agent = request.headers.get("user-agent", "").lower()
-            suspicious_agents = ["bot", "crawler", "spider", "scan", "hack"]
-            for agent in suspicious_agents:
-                if agent in user_agent and "linebot" not in user_agent:
+            if "linebot" not in user_agent:
+                agent = self._agent_matcher.first(user_agent)
+                if agent:
                     return f"可疑 User-Agent: {agent}"
             
             return None
@@ -83,21 +149,22 @@ class SecurityMiddleware:
             return None
     
     def log_request(self, request: Request, response_status: int = None):
-        """記錄請求日誌"""
+        """記錄請求日誌（結構化內容由日誌背景執行緒序列化）"""
+        if not logger.isEnabledFor(logging.INFO):
+            return
         try:
-            client_ip = self.get_client_ip(request)
-            log_data = {
-                "timestamp": datetime.now(timezone(timedelta(hours=8))).isoformat(),
-                "method": request.method,
-                "url": str(request.url),
-                "client_ip": client_ip,
-                "user_agent": request.headers.get("user-agent", ""),
-                "referer": request.headers.get("referer", ""),
-                "response_status": response_status
-            }
+            log_data = StructuredLogPayload(
+                timestamp=datetime.now(TAIPEI_TZ).isoformat(),
+                method=request.method,
+                url=str(request.url),
+                client_ip=self.get_client_ip(request),
+                user_agent=request.headers.get("user-agent", ""),
+                referer=request.headers.get("referer", ""),
+                response_status=response_status,
+            )
             
             # 記錄到日誌
-            logger.info(f"API 請求: {json.dumps(log_data, ensure_ascii=False)}")
+            logger.info("API 請求: %s", log_data)
             
         except Exception as e:
             logger.error(f"請求日誌記錄失敗: {e}")
@@ -133,7 +200,7 @@ async def security_check_middleware(request: Request, call_next):
         # 2. LINE Webhook 特殊檢查
         if request.url.path == "/api/webhook_new/webhook-new":
             # 生產環境應啟用 IP 白名單檢查
-            if os.getenv("ENABLE_LINE_IP_CHECK", "false").lower() == "true":
+            if security_middleware.line_ip_check_enabled:
                 if not security_middleware.check_line_ip(client_ip):
                     logger.warning(f"非 LINE 官方 IP 嘗試訪問 webhook: {client_ip}")
                     raise HTTPException(status_code=403, detail="IP 不在白名單中")
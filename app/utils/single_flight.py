@@ -0,0 +1,154 @@
+"""
+單飛（single-flight）請求合併
+同一個鍵同時只執行一次計算，計算期間到達的相同請求等待並共用同一個結果。
+用於時段交界或客戶端重試時大量相同的命盤 / 占卜計算（快取尚未建立前的驚群情況）。
+
+注意：共用的結果是同一個物件，呼叫端若需要修改應自行複製。
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    """合併統計"""
+    calls: int = 0
+    executions: int = 0
+    coalesced: int = 0
+    errors: int = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesce_rate": self.coalesced / self.calls if self.calls else 0.0,
+            "errors": self.errors,
+        }
+
+
+class _Call:
+    """進行中的一次計算"""
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """執行緒版本（同步路由、執行緒池中的計算）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats = SingleFlightStats()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        執行 fn()；相同的鍵已在計算中時等待並返回該次的結果（或拋出該次的例外）
+
+        Args:
+            key: 計算輸入的鍵（必須可雜湊）
+            fn: 無參數的計算函數
+        """
+        with self._lock:
+            self._stats.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+            if call.waiters:
+                logger.debug(f"[{self.name}] 合併 {call.waiters} 個相同請求: {key}")
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self) -> Dict:
+        """獲取合併統計"""
+        with self._lock:
+            stats = self._stats.to_dict()
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+
+class AsyncSingleFlight:
+    """asyncio 版本（同一事件迴圈內的協程）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, "asyncio.Future"] = {}
+        self._stats = SingleFlightStats()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        await fn()；相同的鍵已在計算中時等待並共用該次的結果
+
+        計算在獨立的 Task 中執行，發起的請求被取消時不會中斷其他等待者。
+        """
+        self._stats.calls += 1
+        task = self._calls.get(key)
+        if task is not None:
+            self._stats.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._stats.executions += 1
+            task.add_done_callback(lambda finished: self._on_done(key, finished))
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: "asyncio.Future"):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._stats.errors += 1
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def get_stats(self) -> Dict:
+        """獲取合併統計"""
+        stats = self._stats.to_dict()
+        stats["in_flight"] = len(self._calls)
+        return stats
+
+
+# 全局命盤計算合併實例
+chart_single_flight = SingleFlight("chart")
+async_chart_single_flight = AsyncSingleFlight("chart")
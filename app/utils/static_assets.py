@@ -0,0 +1,264 @@
+"""
+靜態圖片資源管線
+將 LINE 直接引用的原始大圖（static/ 的 Image Carousel 圖片與 Rich Menu 圖片）預先縮放成實際需要的尺寸，
+輸出壓縮過的 PNG/JPEG/WebP 與內容雜湊檔名，並以 manifest 提供給 Image Carousel 與 Rich Menu 上傳腳本查詢。
+
+assets/ 的按鈕圖示與背景是按鈕 / 選單圖片生成器的合成素材，需要原始解析度，不在此管線內。
+
+建置：
+    python -m app.utils.static_assets
+"""
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STATIC_DIR = os.path.join(PROJECT_ROOT, "static")
+BUILD_DIR = os.path.join(STATIC_DIR, "build")
+MANIFEST_PATH = os.path.join(BUILD_DIR, "manifest.json")
+
+# 未設定 BASE_URL 時使用的正式環境網址
+DEFAULT_BASE_URL = "https://web-production-c5424.up.railway.app"
+
+# 帶雜湊檔名的檔案內容不會改變，可長期快取
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+
+@dataclass(frozen=True)
+class VariantProfile:
+    """輸出尺寸設定"""
+    name: str
+    sizes: Tuple[Tuple[int, int], ...]  # 候選尺寸，選擇長寬比最接近者
+    exact: bool = False  # True：裁切成精確尺寸（Rich Menu）；False：等比縮小至框內
+    formats: Tuple[str, ...] = ("png", "webp")
+    max_bytes: Optional[int] = None  # LINE 的檔案大小上限
+
+
+PROFILES = {
+    # Image Carousel 圖片（1:1，LINE 上限 1024x1024、1MB）
+    "carousel": VariantProfile("carousel", ((512, 512),), max_bytes=1024 * 1024),
+    # Rich Menu 圖片需完全符合選單尺寸，LINE 上限 1MB
+    "rich_menu": VariantProfile(
+        "rich_menu", ((2500, 1686), (2500, 843)), exact=True, formats=("jpeg", "png"), max_bytes=1024 * 1024
+    ),
+}
+
+# 原始圖片（相對專案根目錄的 glob） -> 要輸出的尺寸設定
+ASSET_SOURCES = {
+    "static/*.png": ["carousel"],
+    "richmenu_final.png": ["rich_menu"],
+}
+
+
+class AssetPipeline:
+    """靜態圖片建置器"""
+
+    def __init__(self, project_root: str = PROJECT_ROOT, build_dir: str = BUILD_DIR):
+        self.project_root = project_root
+        self.build_dir = build_dir
+
+    def build(self, sources: Dict[str, List[str]] = ASSET_SOURCES) -> Dict[str, Dict]:
+        """
+        建置所有圖片變體並寫出 manifest
+
+        Returns:
+            manifest：原始路徑 -> 尺寸設定 -> {格式: 輸出相對路徑, width, height, bytes}
+        """
+        os.makedirs(self.build_dir, exist_ok=True)
+        manifest: Dict[str, Dict] = {}
+        expected_files = set()
+        original_bytes = 0
+        output_bytes = 0
+
+        for pattern, profile_names in sources.items():
+            for source_path in sorted(glob.glob(os.path.join(self.project_root, pattern))):
+                logical_name = os.path.relpath(source_path, self.project_root).replace(os.sep, "/")
+                if logical_name.startswith("static/build/"):
+                    continue
+                original_bytes += os.path.getsize(source_path) * len(profile_names)
+
+                with Image.open(source_path) as source:
+                    source.load()
+                    for profile_name in profile_names:
+                        variant = self._build_variant(source, logical_name, PROFILES[profile_name])
+                        manifest.setdefault(logical_name, {})[profile_name] = variant
+                        for fmt in PROFILES[profile_name].formats:
+                            if fmt in variant:
+                                expected_files.add(os.path.basename(variant[fmt]))
+                        output_bytes += variant.get("bytes", 0)
+
+        self._remove_stale_files(expected_files)
+        with open(os.path.join(self.build_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+        logger.info(
+            f"靜態資源建置完成：{len(manifest)} 張原圖，"
+            f"{original_bytes / 1024 / 1024:.1f}MB -> {output_bytes / 1024 / 1024:.1f}MB（主要格式）"
+        )
+        return manifest
+
+    def _build_variant(self, source: Image.Image, logical_name: str, profile: VariantProfile) -> Dict:
+        image = self._resize(source, profile)
+        stem = os.path.splitext(os.path.basename(logical_name))[0]
+        variant = {"width": image.width, "height": image.height}
+
+        for fmt in profile.formats:
+            data = self._encode(image, fmt, profile.max_bytes)
+            if data is None:
+                logger.warning(f"{logical_name} 的 {profile.name} {fmt} 版本超過 {profile.max_bytes} bytes，略過")
+                continue
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            ext = "jpg" if fmt == "jpeg" else fmt
+            filename = f"{stem}.{profile.name}.{digest}.{ext}"
+            output_path = os.path.join(self.build_dir, filename)
+            if not os.path.exists(output_path):
+                with open(output_path, "wb") as f:
+                    f.write(data)
+            variant[fmt] = f"build/{filename}"
+            # 以第一個格式（LINE 使用的格式）的大小作為統計
+            variant.setdefault("bytes", len(data))
+
+        return variant
+
+    @staticmethod
+    def _resize(source: Image.Image, profile: VariantProfile) -> Image.Image:
+        source_ratio = source.width / source.height
+        target_w, target_h = min(profile.sizes, key=lambda size: abs(size[0] / size[1] - source_ratio))
+
+        if profile.exact:
+            # 等比放大/縮小覆蓋目標尺寸後置中裁切
+            scale = max(target_w / source.width, target_h / source.height)
+            resized = source.resize(
+                (max(target_w, round(source.width * scale)), max(target_h, round(source.height * scale))),
+                Image.LANCZOS
+            )
+            left = (resized.width - target_w) // 2
+            top = (resized.height - target_h) // 2
+            return resized.crop((left, top, left + target_w, top + target_h))
+
+        image = source.copy()
+        image.thumbnail((target_w, target_h), Image.LANCZOS)
+        return image
+
+    @staticmethod
+    def _encode(image: Image.Image, fmt: str, max_bytes: Optional[int]) -> Optional[bytes]:
+        """編碼圖片；JPEG 超過大小上限時逐步降低品質"""
+        qualities = [85, 75, 65, 55] if fmt in ("jpeg", "webp") else [None]
+        for quality in qualities:
+            buffer = io.BytesIO()
+            if fmt == "png":
+                # 保留透明度，以調色盤量化大幅縮小檔案
+                quantized = image.convert("RGBA").quantize(colors=256, method=Image.FASTOCTREE)
+                quantized.save(buffer, "PNG", optimize=True)
+            elif fmt == "jpeg":
+                AssetPipeline._flatten(image).save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(buffer, "WEBP", quality=quality, method=6)
+            data = buffer.getvalue()
+            if max_bytes is None or len(data) <= max_bytes:
+                return data
+        return None
+
+    @staticmethod
+    def _flatten(image: Image.Image) -> Image.Image:
+        """JPEG 不支援透明度，透明區域以星空背景色填滿"""
+        if image.mode in ("RGBA", "LA", "P"):
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (26, 26, 46))
+            background.paste(rgba, mask=rgba.split()[3])
+            return background
+        return image.convert("RGB")
+
+    def _remove_stale_files(self, expected_files):
+        for path in glob.glob(os.path.join(self.build_dir, "*")):
+            name = os.path.basename(path)
+            if name != "manifest.json" and name not in expected_files:
+                os.remove(path)
+
+
+class AssetManifest:
+    """讀取建置後的 manifest，將原始圖片解析為最佳化版本的網址"""
+
+    def __init__(self, manifest_path: str = MANIFEST_PATH):
+        self.manifest_path = manifest_path
+        self._manifest: Optional[Dict[str, Dict]] = None
+
+    @property
+    def manifest(self) -> Dict[str, Dict]:
+        if self._manifest is None:
+            try:
+                with open(self.manifest_path, encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+            except FileNotFoundError:
+                logger.warning(f"找不到靜態資源 manifest：{self.manifest_path}，將使用原始圖片")
+                self._manifest = {}
+        return self._manifest
+
+    def reload(self):
+        self._manifest = None
+
+    def resolve_path(self, logical_name: str, profile: str, fmt: Optional[str] = None) -> str:
+        """
+        返回相對於 static/ 的路徑（找不到變體時返回原始圖片路徑）
+
+        Args:
+            logical_name: 原始圖片路徑，例如 "static/2-1.png"
+            profile: 尺寸設定名稱，例如 "carousel"
+            fmt: 指定格式；預設為該設定的第一個格式（LINE 支援的 PNG/JPEG）
+        """
+        variant = self.manifest.get(logical_name, {}).get(profile)
+        if variant:
+            formats = [fmt] if fmt else list(PROFILES[profile].formats)
+            for candidate in formats:
+                if candidate in variant:
+                    return variant[candidate]
+        return logical_name
+
+    def resolve_file(self, logical_name: str, profile: str, fmt: Optional[str] = None) -> str:
+        """返回本機檔案路徑（上傳 Rich Menu 圖片用）"""
+        resolved = self.resolve_path(logical_name, profile, fmt)
+        if resolved == logical_name:
+            return os.path.join(PROJECT_ROOT, logical_name)
+        return os.path.join(STATIC_DIR, resolved)
+
+    def url(self, logical_name: str, profile: str, fmt: Optional[str] = None, base_url: Optional[str] = None) -> str:
+        """返回完整網址"""
+        base_url = (base_url or os.getenv("BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        resolved = self.resolve_path(logical_name, profile, fmt)
+        if resolved.startswith("build/"):
+            return f"{base_url}/static/{resolved}"
+        # 沒有建置版本時退回原始檔的掛載路徑
+        return f"{base_url}/{resolved}"
+
+
+class CachedStaticFiles(StaticFiles):
+    """加上 Cache-Control 的 StaticFiles（ETag / Last-Modified 由 Starlette 提供）"""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        relative_path = os.path.relpath(full_path, self.directory) if self.directory else ""
+        if relative_path.startswith("build" + os.sep) and not relative_path.endswith("manifest.json"):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = DEFAULT_CACHE_CONTROL
+        return response
+
+
+# 全局 manifest 實例
+asset_manifest = AssetManifest()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    AssetPipeline().build()
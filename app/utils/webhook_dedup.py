@@ -0,0 +1,250 @@
+"""
+LINE Webhook 事件去重
+webhook 回應太慢時 LINE 會重送事件（deliveryContext.isRedelivery = true，webhookEventId 不變），
+重複處理會造成重複的占卜記錄與命盤計算。
+
+以 webhookEventId 為鍵，先查詢有上限的記憶體 LRU，再（可選）向共用存儲登記，
+重複的事件在任何資料庫或排盤工作之前就被略過。多個 worker 時需搭配共用存儲。
+處理失敗時呼叫 release() 撤銷登記，之後的重送仍會被處理。
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# LINE 最多在一段時間內重送事件，保留一小時足以涵蓋
+DEFAULT_DEDUP_TTL_SECONDS = 3600
+DEFAULT_DEDUP_MAX_ENTRIES = 10000
+
+
+def event_key(event) -> Optional[str]:
+    """
+    取得事件的去重鍵
+
+    優先使用 webhookEventId；舊格式事件沒有時以來源、時間戳、類型與 reply token 組成。
+    """
+    webhook_event_id = getattr(event, "webhook_event_id", None)
+    if webhook_event_id:
+        return webhook_event_id
+
+    source = getattr(event, "source", None)
+    parts = [
+        getattr(event, "type", None),
+        getattr(source, "user_id", None),
+        getattr(event, "timestamp", None),
+        getattr(event, "reply_token", None),
+    ]
+    if all(part is None for part in parts):
+        return None
+    return "h:" + hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def is_redelivery(event) -> bool:
+    """事件是否為 LINE 的重送"""
+    delivery_context = getattr(event, "delivery_context", None)
+    return bool(getattr(delivery_context, "is_redelivery", False))
+
+
+@dataclass
+class DedupStats:
+    """去重統計"""
+    events: int = 0
+    duplicates: int = 0
+    redeliveries: int = 0
+    shared_duplicates: int = 0
+    shared_errors: int = 0
+    released: int = 0
+
+    @property
+    def duplicate_rate(self) -> float:
+        return self.duplicates / self.events if self.events else 0.0
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["duplicate_rate"] = round(self.duplicate_rate, 4)
+        return data
+
+
+class DatabaseEventStore:
+    """
+    以資料表為共用存儲（webhook_event_id 為主鍵，插入失敗即為重複）
+
+    使用獨立的 session，不影響請求本身的交易。
+    """
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        if session_factory is None:
+            from app.db.database import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+
+    def claim(self, key: str) -> bool:
+        """登記事件，已存在時回傳 False"""
+        from app.models.linebot_models import ProcessedWebhookEvent
+
+        db = self.session_factory()
+        try:
+            db.add(ProcessedWebhookEvent(webhook_event_id=key))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    def release(self, key: str) -> None:
+        """撤銷事件登記"""
+        from app.models.linebot_models import ProcessedWebhookEvent
+
+        db = self.session_factory()
+        try:
+            db.query(ProcessedWebhookEvent).filter(
+                ProcessedWebhookEvent.webhook_event_id == key
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def purge(self, older_than_seconds: int = DEFAULT_DEDUP_TTL_SECONDS) -> int:
+        """清除過期的登記，回傳刪除筆數"""
+        from app.models.linebot_models import ProcessedWebhookEvent
+
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+        db = self.session_factory()
+        try:
+            deleted = db.query(ProcessedWebhookEvent).filter(
+                ProcessedWebhookEvent.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+class WebhookEventDeduplicator:
+    """
+    Webhook 事件去重器
+
+    Args:
+        max_entries: 記憶體 LRU 的上限
+        ttl_seconds: 記錄保留時間
+        shared_store: 具有 claim(key) -> bool 與 release(key) 的共用存儲（可選）
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_DEDUP_MAX_ENTRIES,
+                 ttl_seconds: float = DEFAULT_DEDUP_TTL_SECONDS, shared_store=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared_store = shared_store
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = DedupStats()
+
+    def _seen_recently(self, key: str, now: float) -> bool:
+        expires_at = self._seen.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < now:
+            del self._seen[key]
+            return False
+        self._seen.move_to_end(key)
+        return True
+
+    def _remember(self, key: str, now: float):
+        self._seen[key] = now + self.ttl_seconds
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+    def claim(self, event) -> bool:
+        """
+        登記事件
+
+        Returns:
+            True 表示第一次收到、應該處理；False 表示重複事件
+        """
+        key = event_key(event)
+        redelivered = is_redelivery(event)
+        now = time.monotonic()
+
+        with self._lock:
+            self._stats.events += 1
+            if redelivered:
+                self._stats.redeliveries += 1
+            if key is None:
+                return True
+            if self._seen_recently(key, now):
+                self._stats.duplicates += 1
+                logger.info(f"♻️ 略過重複的 webhook 事件 {key}（重送: {redelivered}）")
+                return False
+            # 先記下，處理期間收到的重送也會被略過
+            self._remember(key, now)
+
+        if self.shared_store is not None:
+            try:
+                claimed = self.shared_store.claim(key)
+            except Exception as e:
+                # 共用存儲失敗時仍處理事件，只依靠本機去重
+                logger.warning(f"webhook 事件共用去重失敗: {e}")
+                with self._lock:
+                    self._stats.shared_errors += 1
+                return True
+            if not claimed:
+                with self._lock:
+                    self._stats.duplicates += 1
+                    self._stats.shared_duplicates += 1
+                logger.info(f"♻️ 略過其他 worker 已處理的 webhook 事件 {key}")
+                return False
+        return True
+
+    def release(self, event) -> None:
+        """
+        撤銷事件登記（處理失敗時呼叫），讓 LINE 的重送可以再次處理
+        """
+        key = event_key(event)
+        if key is None:
+            return
+        with self._lock:
+            self._seen.pop(key, None)
+            self._stats.released += 1
+        if self.shared_store is not None:
+            try:
+                self.shared_store.release(key)
+            except Exception as e:
+                logger.warning(f"撤銷 webhook 事件共用登記失敗: {e}")
+                with self._lock:
+                    self._stats.shared_errors += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = self._stats.to_dict()
+            stats["tracked_events"] = len(self._seen)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+            self._stats = DedupStats()
+
+
+def _create_default_deduplicator() -> WebhookEventDeduplicator:
+    """依環境變數建立去重器（WEBHOOK_DEDUP_SHARED_STORE=true 時使用資料表共用存儲）"""
+    use_shared_store = os.getenv("WEBHOOK_DEDUP_SHARED_STORE", "false").lower() == "true"
+    return WebhookEventDeduplicator(
+        max_entries=int(os.getenv("WEBHOOK_DEDUP_MAX_ENTRIES", str(DEFAULT_DEDUP_MAX_ENTRIES))),
+        shared_store=DatabaseEventStore() if use_shared_store else None,
+    )
+
+
+# 全局 webhook 事件去重器實例
+webhook_deduplicator = _create_default_deduplicator()
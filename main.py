@@ -6,10 +6,15 @@
 
 import sys
 import os
-from datetime import datetime, timedelta, timezone
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, date, timedelta, timezone
 import logging
+from typing import Iterator, List, Optional, Sequence, Tuple
 from fastapi.staticfiles import StaticFiles
 
+from app.utils.logging_config import configure_logging
+
 # 嘗試導入sxtwl（壽星萬年曆）庫
 try:
     import sxtwl
@@ -22,22 +27,15 @@ except ImportError:
 # 台北時區
 TAIPEI_TZ = timezone(timedelta(hours=8))
 
-class TaipeiFormatter(logging.Formatter):
-    """台北時區的日誌格式化器"""
-    def formatTime(self, record, datefmt=None):
-        dt = datetime.fromtimestamp(record.created, tz=TAIPEI_TZ)
-        if datefmt:
-            return dt.strftime(datefmt)
-        else:
-            return dt.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
-
 # 設置日誌，使用台北時區
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# 為所有處理程序設置台北時區格式化器
-for handler in logging.root.handlers:
-    handler.setFormatter(TaipeiFormatter('%(asctime)s - %(levelname)s - %(message)s'))
+# 舊版批量生成只取四個關鍵時辰
+KEY_HOURS = [0, 6, 12, 18]
+# 十二時辰各取一個代表小時（0=子、2=丑 … 22=亥）
+BRANCH_HOURS = list(range(0, 24, 2))
+
 
 class SixTailCalendar:
     """使用6tail（壽星萬年曆）的完整時間資料處理類"""
@@ -84,66 +82,7 @@ class SixTailCalendar:
             raise ValueError(f"年份必須在{self.year_range[0]}-{self.year_range[1]}範圍內")
         
         try:
-            # 使用sxtwl的fromSolar方法獲取農曆日期
-            day_obj = sxtwl.fromSolar(year, month, day)
-            
-            # 獲取干支四柱（GZ對象）
-            year_gz_obj = day_obj.getYearGZ()
-            month_gz_obj = day_obj.getMonthGZ() 
-            day_gz_obj = day_obj.getDayGZ()
-            hour_gz_obj = day_obj.getHourGZ(hour)
-            
-            # 轉換GZ對象為中文干支
-            year_gz = self.gan_names[year_gz_obj.tg] + self.zhi_names[year_gz_obj.dz]
-            month_gz = self.gan_names[month_gz_obj.tg] + self.zhi_names[month_gz_obj.dz]
-            day_gz = self.gan_names[day_gz_obj.tg] + self.zhi_names[day_gz_obj.dz]
-            hour_gz = self.gan_names[hour_gz_obj.tg] + self.zhi_names[hour_gz_obj.dz]
-            
-            # 獲取農曆信息
-            lunar_year = day_obj.getLunarYear()
-            lunar_month = day_obj.getLunarMonth()
-            lunar_day = day_obj.getLunarDay()
-            is_leap = day_obj.isLunarLeap()
-            
-            # 獲取農曆月份和日期的中文表示
-            lunar_month_chinese = self._get_lunar_month_chinese(lunar_month, is_leap)
-            lunar_day_chinese = self._get_lunar_day_chinese(lunar_day)
-            
-            # 獲取節氣信息
-            solar_term = ""
-            if day_obj.hasJieQi():
-                solar_term = day_obj.getJieQi()
-            
-            # 構建完整信息
-            calendar_info = {
-                "gregorian": {
-                    "year": year,
-                    "month": month,
-                    "day": day,
-                    "hour": hour,
-                    "minute": minute,
-                    "datetime": f"{year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}"
-                },
-                "lunar": {
-                    "year": lunar_year,
-                    "month": lunar_month,
-                    "day": lunar_day,
-                    "is_leap": is_leap,
-                    "year_chinese": f"{year_gz}年",
-                    "month_chinese": lunar_month_chinese,
-                    "day_chinese": lunar_day_chinese,
-                    "is_leap_month": is_leap
-                },
-                "ganzhi": {
-                    "year": year_gz,
-                    "month": month_gz,
-                    "day": day_gz,
-                    "hour": hour_gz
-                },
-                "solar_term": solar_term,
-                "data_source": "sxtwl_6tail",
-                "year_range": f"{self.year_range[0]}-{self.year_range[1]}"
-            }
+            calendar_info = self._build_calendar_info(sxtwl.fromSolar(year, month, day), year, month, day, hour, minute)
             
             logger.info(f"成功計算 {year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d} 的完整農曆信息")
             return calendar_info
@@ -152,6 +91,70 @@ class SixTailCalendar:
             logger.error(f"計算農曆信息失敗：{e}")
             raise
     
+    def _build_calendar_info(self, day_obj, year: int, month: int, day: int, hour: int, minute: int = 0) -> dict:
+        """
+        由已取得的sxtwl Day對象組裝完整日曆信息（不記錄日誌，供批量生成重用同一天的Day對象）
+        """
+        # 獲取干支四柱（GZ對象）
+        year_gz_obj = day_obj.getYearGZ()
+        month_gz_obj = day_obj.getMonthGZ() 
+        day_gz_obj = day_obj.getDayGZ()
+        hour_gz_obj = day_obj.getHourGZ(hour)
+        
+        # 轉換GZ對象為中文干支
+        year_gz = self.gan_names[year_gz_obj.tg] + self.zhi_names[year_gz_obj.dz]
+        month_gz = self.gan_names[month_gz_obj.tg] + self.zhi_names[month_gz_obj.dz]
+        day_gz = self.gan_names[day_gz_obj.tg] + self.zhi_names[day_gz_obj.dz]
+        hour_gz = self.gan_names[hour_gz_obj.tg] + self.zhi_names[hour_gz_obj.dz]
+        
+        # 獲取農曆信息
+        lunar_year = day_obj.getLunarYear()
+        lunar_month = day_obj.getLunarMonth()
+        lunar_day = day_obj.getLunarDay()
+        is_leap = day_obj.isLunarLeap()
+        
+        # 獲取農曆月份和日期的中文表示
+        lunar_month_chinese = self._get_lunar_month_chinese(lunar_month, is_leap)
+        lunar_day_chinese = self._get_lunar_day_chinese(lunar_day)
+        
+        # 獲取節氣信息
+        solar_term = ""
+        if day_obj.hasJieQi():
+            solar_term = day_obj.getJieQi()
+        
+        # 構建完整信息
+        calendar_info = {
+            "gregorian": {
+                "year": year,
+                "month": month,
+                "day": day,
+                "hour": hour,
+                "minute": minute,
+                "datetime": f"{year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}"
+            },
+            "lunar": {
+                "year": lunar_year,
+                "month": lunar_month,
+                "day": lunar_day,
+                "is_leap": is_leap,
+                "year_chinese": f"{year_gz}年",
+                "month_chinese": lunar_month_chinese,
+                "day_chinese": lunar_day_chinese,
+                "is_leap_month": is_leap
+            },
+            "ganzhi": {
+                "year": year_gz,
+                "month": month_gz,
+                "day": day_gz,
+                "hour": hour_gz
+            },
+            "solar_term": solar_term,
+            "data_source": "sxtwl_6tail",
+            "year_range": f"{self.year_range[0]}-{self.year_range[1]}"
+        }
+        
+        return calendar_info
+    
     def _get_year_ganzhi(self, lunar_year: int) -> str:
         """獲取年干支（已經在Day對象中提供，這裡保留作為參考）"""
         # 計算天干地支索引（以甲子年為起點）
@@ -215,10 +218,59 @@ class SixTailCalendar:
         """獲取農曆日期的中文表示"""
         return self.lunar_day_names.get(lunar_day, f"{lunar_day}日")
     
+    def iter_year_records(
+        self, year: int, hours: Sequence[int] = BRANCH_HOURS, failures: Optional[List[str]] = None
+    ) -> Iterator[dict]:
+        """
+        逐日逐時產生指定年份的完整時間資料（生成器，不在記憶體中累積整年資料）
+        
+        Args:
+            year: 西元年份
+            hours: 每天要生成的小時列表，預設為十二時辰各一筆
+            failures: 若提供，計算失敗而略過的日期 / 時辰會附加到此列表
+            
+        Yields:
+            與 get_complete_calendar_info 相同結構的字典；單筆計算失敗時記錄錯誤並略過該筆
+        """
+        if not (self.year_range[0] <= year <= self.year_range[1]):
+            raise ValueError(f"年份必須在{self.year_range[0]}-{self.year_range[1]}範圍內")
+        
+        current_date = date(year, 1, 1)
+        while current_date.year == year:
+            # 同一天的所有時辰共用一個Day對象
+            try:
+                day_obj = sxtwl.fromSolar(current_date.year, current_date.month, current_date.day)
+            except Exception as e:
+                logger.error(f"生成 {current_date} 資料失敗：{e}")
+                if failures is not None:
+                    failures.extend(f"{current_date} {hour}:00" for hour in hours)
+                current_date += timedelta(days=1)
+                continue
+            
+            for hour in hours:
+                try:
+                    calendar_info = self._build_calendar_info(
+                        day_obj, current_date.year, current_date.month, current_date.day, hour
+                    )
+                except Exception as e:
+                    logger.error(f"生成 {current_date} {hour}:00 資料失敗：{e}")
+                    if failures is not None:
+                        failures.append(f"{current_date} {hour}:00")
+                    continue
+                yield calendar_info
+            current_date += timedelta(days=1)
+    
+    def iter_records(self, start_year: int, end_year: int, hours: Sequence[int] = BRANCH_HOURS) -> Iterator[dict]:
+        """逐筆產生指定年份範圍的完整時間資料"""
+        for year in range(start_year, end_year + 1):
+            yield from self.iter_year_records(year, hours)
+    
     def batch_generate_data(self, start_year: int, end_year: int, save_to_file: bool = True) -> list:
         """
         批量生成指定年份範圍的完整時間資料
         
+        大範圍資料請改用 stream_generate_data，避免整個範圍累積在記憶體中。
+        
         Args:
             start_year: 開始年份
             end_year: 結束年份
@@ -230,44 +282,115 @@ class SixTailCalendar:
         logger.info(f"開始批量生成 {start_year}-{end_year} 年的完整時間資料...")
         
         all_data = []
-        total_records = 0
+        for calendar_info in self.iter_records(start_year, end_year, KEY_HOURS):  # 只生成四個關鍵時辰的資料
+            all_data.append(calendar_info)
+            if len(all_data) % 1000 == 0:
+                logger.info(f"已生成 {len(all_data)} 條記錄...")
         
-        for year in range(start_year, end_year + 1):
-            logger.info(f"處理 {year} 年...")
-            
-            # 處理該年的每一天
-            current_date = datetime(year, 1, 1)
-            year_end = datetime(year, 12, 31)
-            
-            while current_date <= year_end:
-                # 為每一天的每個小時生成資料（可選擇只生成關鍵時辰）
-                for hour in [0, 6, 12, 18]:  # 只生成四個關鍵時辰的資料
-                    try:
-                        calendar_info = self.get_complete_calendar_info(
-                            current_date.year, current_date.month, current_date.day, hour
-                        )
-                        all_data.append(calendar_info)
-                        total_records += 1
-                        
-                        if total_records % 1000 == 0:
-                            logger.info(f"已生成 {total_records} 條記錄...")
-                            
-                    except Exception as e:
-                        logger.error(f"生成 {current_date.date()} {hour}:00 資料失敗：{e}")
-                
-                current_date += timedelta(days=1)
-        
-        logger.info(f"✅ 批量生成完成！總共生成 {total_records} 條記錄")
+        logger.info(f"✅ 批量生成完成！總共生成 {len(all_data)} 條記錄")
         
         if save_to_file:
             self._save_to_json(all_data, f"complete_6tail_data_{start_year}_{end_year}.json")
         
         return all_data
     
+    def stream_generate_data(
+        self,
+        start_year: int,
+        end_year: int,
+        output_path: Optional[str] = None,
+        hours: Sequence[int] = BRANCH_HOURS,
+        workers: Optional[int] = None,
+        resume: bool = True
+    ) -> int:
+        """
+        串流生成指定年份範圍的完整時間資料，以NDJSON（每行一筆JSON）寫出
+        
+        每個年份由進程池獨立計算並寫入 `<output_path>.parts/<year>.ndjson`，
+        分片完整寫完才以原子方式改名，因此中斷後重新執行會跳過已完成的年份。
+        有記錄計算失敗的年份只留下暫存檔，不產生最終輸出；重新執行時會重試這些年份。
+        全部年份完成後依年份順序串接為最終輸出檔並移除分片目錄。
+        
+        Args:
+            start_year: 開始年份
+            end_year: 結束年份
+            output_path: 輸出檔路徑，預設為 complete_6tail_data_<start>_<end>.ndjson
+            hours: 每天要生成的小時列表，預設為十二時辰各一筆
+            workers: 進程數，預設為CPU核心數；1 表示在目前進程中執行
+            resume: 是否沿用已完成的年份分片
+            
+        Returns:
+            輸出檔中的總記錄數
+            
+        Raises:
+            RuntimeError: 有年份的記錄計算失敗（已完成的分片保留供下次續跑）
+        """
+        if output_path is None:
+            output_path = f"complete_6tail_data_{start_year}_{end_year}.ndjson"
+        parts_dir = f"{output_path}.parts"
+        os.makedirs(parts_dir, exist_ok=True)
+        
+        years = list(range(start_year, end_year + 1))
+        pending_years = []
+        for year in years:
+            part_path = _year_part_path(parts_dir, year)
+            if resume and os.path.exists(part_path):
+                logger.info(f"沿用已完成的 {year} 年分片：{part_path}")
+            else:
+                pending_years.append(year)
+        
+        logger.info(
+            f"開始串流生成 {start_year}-{end_year} 年資料，待處理 {len(pending_years)}/{len(years)} 個年份，"
+            f"每天 {len(hours)} 個時辰"
+        )
+        
+        incomplete_years = []
+        
+        def record_result(year: int, count: int, skipped: int):
+            if skipped:
+                incomplete_years.append(year)
+                logger.error(f"{year} 年有 {skipped} 條記錄生成失敗，分片未完成（{count} 條記錄）")
+            else:
+                logger.info(f"{year} 年完成，{count} 條記錄")
+        
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(pending_years) <= 1:
+            for year in pending_years:
+                record_result(year, *_write_year_part(year, list(hours), parts_dir, self))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(_write_year_part, year, list(hours), parts_dir): year
+                    for year in pending_years
+                }
+                for future in as_completed(futures):
+                    record_result(futures[future], *future.result())
+        
+        if incomplete_years:
+            raise RuntimeError(
+                f"{sorted(incomplete_years)} 年份資料不完整，已完成的分片保留於 {parts_dir}，重新執行以重試"
+            )
+        
+        # 依年份順序串接分片
+        total_records = 0
+        tmp_output = f"{output_path}.tmp"
+        with open(tmp_output, 'wb') as out:
+            for year in years:
+                with open(_year_part_path(parts_dir, year), 'rb') as part:
+                    for line in part:
+                        out.write(line)
+                        total_records += 1
+        os.replace(tmp_output, output_path)
+        
+        for year in years:
+            os.remove(_year_part_path(parts_dir, year))
+        os.rmdir(parts_dir)
+        
+        logger.info(f"✅ 串流生成完成！總共 {total_records} 條記錄，已保存到 {output_path}")
+        return total_records
+    
     def _save_to_json(self, data: list, filename: str):
         """保存資料到JSON文件"""
-        import json
-        
         try:
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
@@ -276,6 +399,38 @@ class SixTailCalendar:
             logger.error(f"保存資料失敗：{e}")
 
 
+def _year_part_path(parts_dir: str, year: int) -> str:
+    """年份分片檔路徑"""
+    return os.path.join(parts_dir, f"{year}.ndjson")
+
+
+def _write_year_part(
+    year: int, hours: List[int], parts_dir: str, calendar: Optional[SixTailCalendar] = None
+) -> Tuple[int, int]:
+    """
+    生成單一年份的NDJSON分片（進程池工作函數）
+    
+    先寫入暫存檔，全部記錄成功才改名為正式分片，確保中斷或部分失敗時不會留下
+    會被續跑視為完成的分片。
+    
+    Returns:
+        (寫入的記錄數, 計算失敗而略過的記錄數)
+    """
+    calendar = calendar or SixTailCalendar()
+    part_path = _year_part_path(parts_dir, year)
+    tmp_path = f"{part_path}.tmp"
+    count = 0
+    failures: List[str] = []
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for calendar_info in calendar.iter_year_records(year, hours, failures):
+            f.write(json.dumps(calendar_info, ensure_ascii=False, separators=(',', ':')))
+            f.write('\n')
+            count += 1
+    if not failures:
+        os.replace(tmp_path, part_path)
+    return count, len(failures)
+
+
 def test_6tail_calendar():
     """測試6tail農曆計算功能"""
     if not HAS_SXTWL:
@@ -346,10 +501,27 @@ if __name__ == "__main__":
             calendar = SixTailCalendar()
             calendar.batch_generate_data(start_year, end_year)
         
+        elif command == "stream":
+            if not HAS_SXTWL:
+                print("請先安裝sxtwl庫：pip install sxtwl")
+                sys.exit(1)
+            
+            start_year = int(sys.argv[2]) if len(sys.argv) > 2 else 1900
+            end_year = int(sys.argv[3]) if len(sys.argv) > 3 else 2100
+            workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+            
+            calendar = SixTailCalendar()
+            try:
+                calendar.stream_generate_data(start_year, end_year, workers=workers)
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+        
         else:
             print("用法：")
             print("  python main.py test          # 測試功能")
             print("  python main.py generate 2020 2030  # 生成指定年份資料")
+            print("  python main.py stream 1900 2100 [進程數]  # 串流生成十二時辰NDJSON資料（可續傳）")
     
     else:
         # 默認執行測試
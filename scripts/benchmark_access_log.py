@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+存取日誌基準測試
+比較 SecurityMiddleware.log_request 在請求執行緒增加的延遲：
+1. 原本：請求執行緒 json.dumps 後同步寫入檔案
+2. 佇列：請求執行緒只放入佇列，背景執行緒批次格式化並寫入
+
+用法：
+    python scripts/benchmark_access_log.py
+    python scripts/benchmark_access_log.py --rounds 50000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import logging
+import queue
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.utils import security_middleware as security_module
+from app.utils.logging_config import (
+    LOG_FORMAT, BatchFileHandler, BatchingQueueListener, BoundedQueueHandler, TaipeiFormatter,
+)
+from app.utils.security_middleware import SecurityMiddleware
+from app.utils.timezone_helper import TAIPEI_TZ
+
+
+def make_request():
+    return SimpleNamespace(
+        method="POST",
+        url="https://example.com/api/chart?target_year=2025",
+        headers={"user-agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X)", "referer": ""},
+        client=SimpleNamespace(host="203.0.113.10"),
+    )
+
+
+def legacy_log_request(middleware: SecurityMiddleware, request, response_status: int):
+    """原本的寫法：在請求執行緒組 JSON"""
+    log_data = {
+        "timestamp": datetime.now(TAIPEI_TZ).isoformat(),
+        "method": request.method,
+        "url": str(request.url),
+        "client_ip": middleware.get_client_ip(request),
+        "user_agent": request.headers.get("user-agent", ""),
+        "referer": request.headers.get("referer", ""),
+        "response_status": response_status,
+    }
+    security_module.logger.info(f"API 請求: {json.dumps(log_data, ensure_ascii=False)}")
+
+
+def measure(label: str, log_fn, rounds: int) -> float:
+    middleware = SecurityMiddleware()
+    request = make_request()
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        log_fn(middleware, request, 200)
+        samples.append(time.perf_counter() - started)
+    mean = statistics.fmean(samples) * 1_000_000
+    p99 = sorted(samples)[int(len(samples) * 0.99)] * 1_000_000
+    print(f"   {label}：平均 {mean:.2f}µs，p99 {p99:.2f}µs")
+    return mean
+
+
+def install(handler: logging.Handler):
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存取日誌基準測試")
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"\n📊 每個請求記錄存取日誌增加的延遲（{args.rounds} 次，寫入檔案）")
+
+        sync_handler = logging.FileHandler(os.path.join(tmp, "sync.log"), encoding="utf-8")
+        sync_handler.setFormatter(TaipeiFormatter(LOG_FORMAT))
+        install(sync_handler)
+        before = measure("同步寫入", legacy_log_request, args.rounds)
+        sync_handler.close()
+
+        file_handler = BatchFileHandler(os.path.join(tmp, "queued.log"), encoding="utf-8")
+        file_handler.setFormatter(TaipeiFormatter(LOG_FORMAT))
+        log_queue = queue.Queue(maxsize=args.rounds + 1)
+        queue_handler = BoundedQueueHandler(log_queue)
+        listener = BatchingQueueListener(log_queue, file_handler, queue_handler=queue_handler)
+        install(queue_handler)
+        listener.start()
+        after = measure("佇列＋批次寫入", SecurityMiddleware.log_request, args.rounds)
+        listener.stop()
+        file_handler.close()
+
+        print(f"   ⚡ {before / after:.1f}x，丟棄 {queue_handler.dropped} 筆")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Rich Menu 按鈕重新生成基準測試
+依 assets/button_image_config.json 重新生成整組按鈕，比較無快取、命中快取與平行渲染的耗時
+
+用法：
+    python scripts/benchmark_button_render.py
+    python scripts/benchmark_button_render.py --workers 4
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import tempfile
+import time
+
+from app.utils.custom_button_generator import CustomButtonGenerator, PROJECT_ROOT
+
+ASSETS_DIR = os.path.join(PROJECT_ROOT, "assets")
+
+
+def load_button_configs() -> list:
+    """將按鈕圖片配置轉換為 create_button_set_from_images 的格式"""
+    with open(os.path.join(ASSETS_DIR, "button_image_config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+    size = config.get("image_settings", {}).get("button_size", 380)
+    return [
+        {
+            "image_path": os.path.join(ASSETS_DIR, item["image_file"]),
+            "button_text": item["text"],
+            "button_size": (size, size),
+            "output_name": f"{key}.png",
+        }
+        for key, item in config["button_images"].items()
+    ]
+
+
+def timed(label: str, generator: CustomButtonGenerator, configs: list, output_dir: str, workers=None) -> float:
+    started = time.perf_counter()
+    paths = generator.create_button_set_from_images(configs, output_dir, workers=workers)
+    elapsed = time.perf_counter() - started
+    print(f"   {label}：{elapsed * 1000:,.0f} ms（{len(paths)} 個按鈕）")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按鈕渲染基準測試")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    configs = load_button_configs()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_dir = os.path.join(tmp_dir, "buttons")
+        results = {}
+
+        print("\n" + "=" * 60)
+        print(f"📊 按鈕重新生成基準（{len(configs)} 個按鈕）")
+        print("=" * 60)
+        results["no_cache"] = timed("無快取、依序渲染", CustomButtonGenerator(cache_dir=None), configs, output_dir)
+        results["parallel"] = timed(
+            f"無快取、{args.workers} 進程平行渲染", CustomButtonGenerator(cache_dir=None), configs, output_dir, args.workers
+        )
+
+        cached = CustomButtonGenerator(cache_dir=os.path.join(tmp_dir, "cache"))
+        results["cold"] = timed("快取未命中（首次建置）", cached, configs, output_dir)
+        results["warm"] = timed("快取命中（重新生成）", cached, configs, output_dir)
+
+    print(f"   平行加速：{results['no_cache'] / results['parallel']:.1f}x")
+    print(f"   快取加速：{results['no_cache'] / results['warm']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+calendar_data 導入速度基準測試
+比較舊版逐筆 ORM 導入與 CalendarBulkLoader（COPY / executemany）的 rows/s
+
+用法：
+    python scripts/benchmark_calendar_loader.py                 # 本地 SQLite
+    python scripts/benchmark_calendar_loader.py 2000 2004 --database-url postgresql://...
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from main import SixTailCalendar
+from app.db.migrate_calendar_data import CalendarBulkLoader, iter_rows
+from app.models.calendar import Base, CalendarData
+
+
+def benchmark_orm(engine, source_path: str, limit: int) -> tuple:
+    """舊版做法：每筆建立 ORM 物件並以 session 寫入，只取前 limit 筆"""
+    Base.metadata.drop_all(engine, tables=[CalendarData.__table__])
+    Base.metadata.create_all(engine, tables=[CalendarData.__table__])
+    session = sessionmaker(bind=engine)()
+    started = time.perf_counter()
+    count = 0
+    try:
+        for row in iter_rows(source_path):
+            session.add(CalendarData(**row))
+            count += 1
+            if count % 10000 == 0:
+                session.commit()
+            if count >= limit:
+                break
+        session.commit()
+    finally:
+        session.close()
+    return count, count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="calendar_data 導入基準測試")
+    parser.add_argument("start_year", type=int, nargs="?", default=2000)
+    parser.add_argument("end_year", type=int, nargs="?", default=2009)
+    parser.add_argument("--database-url", help="預設為暫存目錄中的 SQLite 檔案")
+    parser.add_argument("--orm-limit", type=int, default=20000, help="舊版 ORM 導入的取樣筆數")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_path = os.path.join(tmp_dir, "calendar.ndjson")
+        SixTailCalendar().stream_generate_data(args.start_year, args.end_year, source_path)
+
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        engine = create_engine(database_url)
+        try:
+            orm_count, orm_rate = benchmark_orm(engine, source_path, args.orm_limit)
+            stats = CalendarBulkLoader(engine).load(iter_rows(source_path))
+        finally:
+            engine.dispose()
+
+    print("\n" + "=" * 60)
+    print(f"📊 calendar_data 導入基準（{engine.dialect.name}，{args.start_year}-{args.end_year}）")
+    print("=" * 60)
+    print(f"   舊版 ORM 逐筆導入：{orm_rate:,.0f} rows/s（取樣 {orm_count:,} 筆）")
+    print(f"   批量導入：{stats.rows_per_second:,.0f} rows/s（{stats.rows:,} 筆，{stats.seconds:.1f}s）")
+    if orm_rate:
+        print(f"   加速倍數：{stats.rows_per_second / orm_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+命盤建構基準測試
+1. 建構 N 張完整命盤（PurpleStarChart）的耗時與保留記憶體
+2. 排盤資料容器比較：ORM CalendarData + 一般 dataclass 宮位 vs LunarInfo + slots 宮位
+
+用法：
+    python scripts/benchmark_chart_construction.py            # 10000 張
+    python scripts/benchmark_chart_construction.py --count 2000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import List
+
+from app.logic.purple_star_chart import LunarInfo, Palace, PurpleStarChart
+from app.models.birth_info import BirthInfo
+from app.models.calendar import CalendarData
+from app.utils.chinese_calendar import ChineseCalendar
+
+SIXTAIL_SAMPLE = {
+    "ganzhi": {"year": "庚午", "month": "辛巳", "day": "丁卯", "hour": "甲辰"},
+    "lunar": {"year_chinese": "庚午年", "month_chinese": "四月", "day_chinese": "十八"},
+    "solar_term": "",
+}
+
+
+@dataclass
+class LegacyPalace:
+    """變更前的宮位 dataclass（沒有 __slots__）"""
+    name: str
+    stars: List[str]
+    element: str
+    stem: str
+    branch: str
+    body_palace: bool = False
+
+
+def measure(label: str, build, count: int):
+    """執行 build(count)，返回（秒數, 保留的記憶體 bytes）"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build(count)
+    elapsed = time.perf_counter() - started
+    retained, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {label}：{elapsed:.2f}s，{count / elapsed:,.0f} 個/s，保留 {retained / 1024 / 1024:.1f}MB")
+    del result
+    return elapsed, retained
+
+
+def build_charts(count: int):
+    charts, failures = [], 0
+    for i in range(count):
+        birth_info = BirthInfo(
+            year=1950 + i % 70, month=1 + i % 12, day=1 + i % 28, hour=i % 24, minute=i % 60,
+            gender="M" if i % 2 else "F", longitude=121.5654, latitude=25.0330
+        )
+        try:
+            charts.append(PurpleStarChart(birth_info=birth_info))
+        except Exception:
+            failures += 1
+    if failures:
+        print(f"   （{failures} 張命盤建構失敗，已略過）")
+    return charts
+
+
+def _palaces(palace_cls, count: int):
+    branches = ChineseCalendar.EARTHLY_BRANCHES
+    return [
+        [palace_cls(name=f"宮{j}", stars=["紫微", "天府（旺地）"], element="木", stem="甲", branch=branches[j])
+         for j in range(12)]
+        for _ in range(count)
+    ]
+
+
+def build_orm_holders(count: int):
+    holders = []
+    for i in range(count):
+        calendar_data = CalendarData()
+        calendar_data.gregorian_year = 1990
+        calendar_data.gregorian_month = 5
+        calendar_data.gregorian_day = 12
+        calendar_data.gregorian_hour = i % 24
+        calendar_data.gregorian_minute = 0
+        calendar_data.year_gan_zhi = "".join(SIXTAIL_SAMPLE["ganzhi"]["year"])
+        calendar_data.month_gan_zhi = "".join(SIXTAIL_SAMPLE["ganzhi"]["month"])
+        calendar_data.day_gan_zhi = "".join(SIXTAIL_SAMPLE["ganzhi"]["day"])
+        calendar_data.hour_gan_zhi = "".join(SIXTAIL_SAMPLE["ganzhi"]["hour"])
+        calendar_data.minute_gan_zhi = calendar_data.hour_gan_zhi
+        calendar_data.lunar_year_in_chinese = "".join(SIXTAIL_SAMPLE["lunar"]["year_chinese"])
+        calendar_data.lunar_month_in_chinese = "".join(SIXTAIL_SAMPLE["lunar"]["month_chinese"])
+        calendar_data.lunar_day_in_chinese = "".join(SIXTAIL_SAMPLE["lunar"]["day_chinese"])
+        holders.append(calendar_data)
+    return holders, _palaces(LegacyPalace, count)
+
+
+def build_value_objects(count: int):
+    holders = []
+    for i in range(count):
+        # "".join 模擬 6tail 每次返回新的字串物件
+        holders.append(LunarInfo(
+            gregorian_year=1990, gregorian_month=5, gregorian_day=12, gregorian_hour=i % 24, gregorian_minute=0,
+            year_gan_zhi="".join(SIXTAIL_SAMPLE["ganzhi"]["year"]),
+            month_gan_zhi="".join(SIXTAIL_SAMPLE["ganzhi"]["month"]),
+            day_gan_zhi="".join(SIXTAIL_SAMPLE["ganzhi"]["day"]),
+            hour_gan_zhi="".join(SIXTAIL_SAMPLE["ganzhi"]["hour"]),
+            minute_gan_zhi="".join(SIXTAIL_SAMPLE["ganzhi"]["hour"]),
+            lunar_year_in_chinese="".join(SIXTAIL_SAMPLE["lunar"]["year_chinese"]),
+            lunar_month_in_chinese="".join(SIXTAIL_SAMPLE["lunar"]["month_chinese"]),
+            lunar_day_in_chinese="".join(SIXTAIL_SAMPLE["lunar"]["day_chinese"]),
+        ))
+    return holders, _palaces(Palace, count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命盤建構基準測試")
+    parser.add_argument("--count", type=int, default=10000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print("\n" + "=" * 60)
+    print(f"📊 命盤建構基準（{args.count:,} 張）")
+    print("=" * 60)
+    measure("完整命盤建構", build_charts, args.count)
+
+    print("\n📦 排盤資料容器（每張命盤 1 份農曆資料 + 12 宮位）")
+    orm_time, orm_memory = measure("ORM CalendarData + dataclass 宮位", build_orm_holders, args.count)
+    value_time, value_memory = measure("LunarInfo + slots 宮位", build_value_objects, args.count)
+    print(f"   加速：{orm_time / value_time:.1f}x，記憶體：{value_memory / orm_memory:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+命盤 JSON 序列化基準測試
+以一張包含大限與小限的完整命盤（/chart/full-limits 的回應）比較：
+1. FastAPI 預設路徑（jsonable_encoder + 標準庫 json）vs fast_json
+2. 占卜記錄：各欄位分別 json.dumps + 深拷貝 vs 序列化一次後共用位元組
+
+用法：
+    python scripts/benchmark_json_serialization.py
+    python scripts/benchmark_json_serialization.py --rounds 5000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import copy
+import json
+import logging
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from app.logic.purple_star_chart import PurpleStarChart
+from app.models.birth_info import BirthInfo
+from app.utils import fast_json
+from app.utils.fast_json import SerializedJSON
+
+
+def timed(label: str, fn, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    per_call = (time.perf_counter() - started) / rounds * 1000
+    print(f"   {label}：{per_call:.3f}ms/次")
+    return per_call
+
+
+def build_full_limits_chart() -> dict:
+    birth_info = BirthInfo(year=1990, month=5, day=12, hour=8, minute=30, gender="M",
+                           longitude=121.5654, latitude=25.0330)
+    chart = PurpleStarChart(birth_info=birth_info)
+    return chart.get_chart(include_major_limits=True, current_age=35, include_minor_limits=True, target_age=35)
+
+
+def build_taichi_parts() -> tuple:
+    chart = PurpleStarChart(year=2025, month=3, day=5, hour=10, minute=23, gender="M")
+    chart.apply_taichi("午")
+    stem = chart.palaces["命宮"].stem
+    return chart.get_chart()["palaces"], chart.get_taichi_sihua_explanations(stem), chart.taichi_palace_mapping
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命盤 JSON 序列化基準測試")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    print(f"\n📊 JSON 序列化基準（orjson：{'有' if fast_json.HAS_ORJSON else '無'}，{args.rounds} 次）")
+
+    chart = build_full_limits_chart()
+    print(f"\n🗂 完整命盤（含大限小限），{len(fast_json.dumps_bytes(chart)):,} bytes")
+    stdlib = timed("jsonable_encoder + json.dumps", lambda: json.dumps(
+        jsonable_encoder(chart), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8"), args.rounds)
+    plain = timed("json.dumps", lambda: json.dumps(chart, ensure_ascii=False).encode("utf-8"), args.rounds)
+    fast = timed("fast_json.dumps_bytes", lambda: fast_json.dumps_bytes(chart), args.rounds)
+    print(f"   加速：相對 FastAPI 預設 {stdlib / fast:.1f}x，相對 json.dumps {plain / fast:.1f}x")
+
+    palaces, sihua_results, mapping = build_taichi_parts()
+    print("\n🔮 占卜記錄（太極盤宮位 + 四化解釋 + 太極映射）")
+
+    def legacy():
+        parts = copy.deepcopy((palaces, sihua_results, mapping))
+        return [json.dumps(part, ensure_ascii=False) for part in parts]
+
+    shared = [SerializedJSON.of(part) for part in (palaces, sihua_results, mapping)]
+
+    def reuse():
+        # 欄位字串與回應物件都來自同一份位元組
+        return [part.text for part in shared], [part.load() for part in shared]
+
+    before = timed("深拷貝 + 各欄位 json.dumps", legacy, args.rounds)
+    after = timed("共用序列化位元組 + load", reuse, args.rounds)
+    print(f"   加速：{before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
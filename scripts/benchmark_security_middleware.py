@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+安全檢查中間件基準測試
+比較每個請求的篩檢成本：
+1. 原本的逐一子字串檢查與每次解析 CIDR
+2. 預先編譯的 SecurityMiddleware
+
+並以隨機請求確認兩者的允許 / 拒絕判定完全相同。
+
+用法：
+    python scripts/benchmark_security_middleware.py
+    python scripts/benchmark_security_middleware.py --rounds 100000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import ipaddress
+import logging
+import random
+import time
+from types import SimpleNamespace
+
+from app.utils.security_middleware import SecurityMiddleware
+
+REQUESTS = [
+    ("/api/webhook_new/webhook-new", "", "LineBotWebhook/2.0", "147.92.150.193"),
+    ("/api/chart", "", "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X)", "203.0.113.10"),
+    ("/api/fortune", "target_year=2025&target_month=5", "Mozilla/5.0 (Windows NT 10.0; Win64; x64)", "198.51.100.7"),
+    ("/static/images/buttons/chart.5f3a9c.png", "", "Mozilla/5.0 (Linux; Android 14)", "203.0.113.11"),
+    ("/api/chart", "id=1 union select", "curl/8.0", "192.0.2.1"),
+]
+
+
+class LegacySecurityCheck:
+    """原本的檢查方式（作為基準）"""
+
+    def __init__(self, middleware: SecurityMiddleware):
+        self.middleware = middleware
+
+    def check_line_ip(self, client_ip: str) -> bool:
+        try:
+            client_ip_obj = ipaddress.ip_address(client_ip)
+            for ip_range in self.middleware.line_ip_whitelist:
+                if client_ip_obj in ipaddress.ip_network(ip_range):
+                    return True
+            return False
+        except Exception:
+            return False
+
+    def detect_suspicious_request(self, request) -> str:
+        path = str(request.url.path).lower()
+        for pattern in self.middleware.suspicious_patterns:
+            if pattern in path:
+                return f"可疑路徑模式: {pattern}"
+        query_params = str(request.url.query).lower()
+        for pattern in self.middleware.suspicious_patterns:
+            if pattern in query_params:
+                return f"可疑查詢參數: {pattern}"
+        user_agent = request.headers.get("user-agent", "").lower()
+        for agent in ["bot", "crawler", "spider", "scan", "hack"]:
+            if agent in user_agent and "linebot" not in user_agent:
+                return f"可疑 User-Agent: {agent}"
+        return None
+
+
+def make_request(path: str, query: str, user_agent: str):
+    return SimpleNamespace(url=SimpleNamespace(path=path, query=query), headers={"user-agent": user_agent})
+
+
+def screen(checker, request, client_ip: str):
+    """中間件對每個請求做的檢查"""
+    return checker.detect_suspicious_request(request), checker.check_line_ip(client_ip)
+
+
+def timed(label: str, checker, requests, rounds: int) -> float:
+    started = time.perf_counter()
+    for i in range(rounds):
+        request, client_ip = requests[i % len(requests)]
+        screen(checker, request, client_ip)
+    per_call = (time.perf_counter() - started) / rounds * 1_000_000
+    print(f"   {label}：{per_call:.2f}µs/請求")
+    return per_call
+
+
+def random_requests(count: int, seed: int = 7):
+    """混合正常與可疑片段的隨機請求"""
+    rng = random.Random(seed)
+    fragments = ["api", "chart", "SELECT", "Union", "..\\", "../", "admin", "LineBot", "Bot", "scan",
+                 "spider", "%20", "eval(", "/proc/", "Script", "onError", "x", "年", "İ", "ſ"]
+    ips = ["147.92.150.1", "147.92.155.255", "147.92.156.0", "147.92.149.255", "::1", "2001:db8::1",
+           "unknown", "10.0.0.1", "147.92.152.80"]
+    result = []
+    for _ in range(count):
+        text = lambda: "".join(rng.choice(fragments) for _ in range(rng.randint(0, 5)))
+        result.append((make_request("/" + text(), text(), text()), rng.choice(ips)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="安全檢查中間件基準測試")
+    parser.add_argument("--rounds", type=int, default=50000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    compiled = SecurityMiddleware()
+    legacy = LegacySecurityCheck(compiled)
+
+    mismatches = sum(
+        screen(legacy, request, client_ip) != screen(compiled, request, client_ip)
+        for request, client_ip in random_requests(20000)
+    )
+    print(f"\n🔍 判定一致性（20000 個隨機請求）：{'✅ 完全相同' if mismatches == 0 else f'❌ {mismatches} 個不同'}")
+
+    requests = [(make_request(path, query, agent), ip) for path, query, agent, ip in REQUESTS]
+    print(f"\n📊 每個請求的篩檢成本（{args.rounds} 次）")
+    before = timed("逐一檢查", legacy, requests, args.rounds)
+    after = timed("預先編譯", compiled, requests, args.rounds)
+    print(f"   ⚡ {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
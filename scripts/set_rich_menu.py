@@ -114,7 +114,9 @@ def main():
             print(f"Rich menu object created successfully. ID: {rich_menu_id}")
 
             # 2. 上傳對應的圖片 (使用 requests 手動上傳)
-            image_path = project_root / 'richmenu_final.png'
+            # 優先使用建置後的壓縮版本（python -m app.utils.static_assets）
+            from app.utils.static_assets import asset_manifest
+            image_path = Path(asset_manifest.resolve_file('richmenu_final.png', 'rich_menu'))
             if not image_path.exists():
                 print(f"Error: Rich menu image not found at {image_path}")
                 messaging_api.delete_rich_menu(rich_menu_id)
@@ -125,7 +127,7 @@ def main():
             
             headers = {
                 'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'image/png'
+                'Content-Type': 'image/jpeg' if image_path.suffix in ('.jpg', '.jpeg') else 'image/png'
             }
             
             with open(image_path, 'rb') as f:
@@ -104,7 +104,9 @@ def setup_rich_menu():
             print(f"✅ Rich Menu 創建成功: {rich_menu_id}")
 
             # 上傳圖片
-            image_path = project_root / 'richmenu_final.png'
+            # 優先使用建置後的壓縮版本（python -m app.utils.static_assets）
+            from app.utils.static_assets import asset_manifest
+            image_path = Path(asset_manifest.resolve_file('richmenu_final.png', 'rich_menu'))
             if not image_path.exists():
                 print(f"❌ 找不到圖片檔案: {image_path}")
                 messaging_api.delete_rich_menu(rich_menu_id)
@@ -115,7 +117,7 @@ def setup_rich_menu():
             # 使用 requests 上傳圖片
             headers = {
                 'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'image/png'
+                'Content-Type': 'image/jpeg' if image_path.suffix in ('.jpg', '.jpeg') else 'image/png'
             }
             
             with open(image_path, 'rb') as f:
@@ -0,0 +1,192 @@
+"""
+簽章權杖單元測試
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.api import permission_routes
+from app.api.permission_routes import TokenRequest, issue_access_token
+from app.logic.device_manager import DeviceManager
+from app.models.linebot_models import LineBotUser
+from app.models.revoked_tokens import RevokedAuthToken
+from app.models.user_devices import UserDevice
+from app.models.user_permissions import UserPermissions
+from app.utils import permission_middleware
+from app.utils.auth_tokens import AuthTokenService, InvalidTokenError
+from app.utils.line_id_token import IdTokenVerificationError, verify_line_id_token
+from app.utils.permission_middleware import PermissionLevel, get_user_permission_check
+from app.utils.rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_760_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    UserPermissions.__table__.create(engine)
+    RevokedAuthToken.__table__.create(engine)
+    LineBotUser.__table__.create(engine)
+    UserDevice.__table__.create(engine)
+    return engine
+
+
+def _request(token: str, device: str = None):
+    headers = {"Authorization": f"Bearer {token}"}
+    if device:
+        headers["X-Device-Fingerprint"] = device
+    return SimpleNamespace(headers=headers, state=SimpleNamespace())
+
+
+def _fake_line_verify(id_token: str) -> str:
+    if id_token != "valid-id-token":
+        raise IdTokenVerificationError("ID token 無效")
+    return "U1"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self) -> dict:
+        return self._body
+
+
+class TestAuthTokens:
+    """權杖發行、驗證與撤銷測試"""
+
+    def test_round_trip_and_tampering(self):
+        service = AuthTokenService(secret=b"s" * 32)
+        token = service.issue("U1", role="premium", daily_limit=1000, device_fingerprint="device-a")
+        claims = service.verify(token, "device-a")
+        assert (claims.user_id, claims.role, claims.daily_limit) == ("U1", "premium", 1000)
+        assert claims.is_premium()
+
+        payload, signature = token.split(".")
+        with pytest.raises(InvalidTokenError):
+            service.verify(payload[:-2] + "xx." + signature, "device-a")
+        with pytest.raises(InvalidTokenError):
+            service.verify(token, "device-b")
+        with pytest.raises(InvalidTokenError):
+            AuthTokenService(secret=b"t" * 32).verify(token, "device-a")
+
+    def test_expiry_and_premium_until(self):
+        clock = FakeClock()
+        service = AuthTokenService(secret=b"s" * 32, ttl_seconds=60, clock=clock)
+        claims = service.verify(service.issue("U1", role="premium", daily_limit=1000, premium_until=clock.now - 1))
+        assert not claims.is_premium()
+        token = service.issue("U1", role="free", daily_limit=100)
+        clock.now += 61
+        with pytest.raises(InvalidTokenError, match="過期"):
+            service.verify(token)
+
+    def test_revocation_is_shared_through_refresh(self, engine):
+        db = sessionmaker(bind=engine)()
+        worker_a = AuthTokenService(secret=b"s" * 32)
+        worker_b = AuthTokenService(secret=b"s" * 32)
+        token = worker_a.issue("U1", role="premium", daily_limit=1000)
+
+        worker_a.revoke_user(db, "U1")
+        assert worker_b.verify(token).user_id == "U1"
+        worker_b.revocations.refresh(db)
+        with pytest.raises(InvalidTokenError, match="撤銷"):
+            worker_b.verify(token)
+
+    def test_protected_dependency_skips_database(self, engine, monkeypatch):
+        """權杖路徑除了第一次的用量與設備讀取外不查詢資料庫"""
+        service = AuthTokenService(secret=b"s" * 32)
+        monkeypatch.setattr(permission_middleware, "auth_token_service", service)
+        monkeypatch.setattr(permission_middleware, "rate_limiter", RateLimiter())
+        monkeypatch.setattr(permission_middleware, "device_manager", DeviceManager())
+        db = sessionmaker(bind=engine)()
+
+        premium = get_user_permission_check(PermissionLevel.PREMIUM)
+        token = service.issue("U1", role="premium", daily_limit=1000, device_fingerprint="device-a")
+        assert premium(_request(token, "device-a"), db) == "U1"
+        queries = []
+        event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+        for _ in range(5):
+            assert premium(_request(token, "device-a"), db) == "U1"
+        assert queries == []
+        assert permission_middleware.device_manager.last_seen_recorder.pending() == 1
+
+        free_token = service.issue("U2", role="free", daily_limit=100, device_fingerprint="device-a")
+        with pytest.raises(HTTPException) as error:
+            premium(_request(free_token, "device-a"), db)
+        assert error.value.status_code == 402
+        with pytest.raises(HTTPException) as error:
+            premium(_request(token, "device-b"), db)
+        assert error.value.status_code == 401
+        unbound = service.issue("U1", role="premium", daily_limit=1000)
+        with pytest.raises(HTTPException) as error:
+            premium(_request(unbound), db)
+        assert error.value.status_code == 401
+
+    def test_token_path_enforces_device_limit(self, engine, monkeypatch):
+        service = AuthTokenService(secret=b"s" * 32)
+        monkeypatch.setattr(permission_middleware, "auth_token_service", service)
+        monkeypatch.setattr(permission_middleware, "rate_limiter", RateLimiter())
+        monkeypatch.setattr(permission_middleware, "device_manager", DeviceManager())
+        db = sessionmaker(bind=engine)()
+        free = get_user_permission_check(PermissionLevel.FREE)
+
+        for device in ("device-a", "device-b", "device-c"):
+            token = service.issue("U1", role="free", daily_limit=100, device_fingerprint=device)
+            assert free(_request(token, device), db) == "U1"
+        token = service.issue("U1", role="free", daily_limit=100, device_fingerprint="device-d")
+        with pytest.raises(HTTPException) as error:
+            free(_request(token, "device-d"), db)
+        assert error.value.status_code == 403
+        assert db.query(UserDevice).count() == 3
+
+    def test_issue_requires_proof_of_identity(self, engine, monkeypatch):
+        service = AuthTokenService(secret=b"s" * 32)
+        monkeypatch.setattr(permission_routes, "auth_token_service", service)
+        monkeypatch.setattr(permission_routes, "verify_line_id_token", _fake_line_verify)
+        db = sessionmaker(bind=engine)()
+
+        def issue(body: TokenRequest, headers: dict = None):
+            return asyncio.run(issue_access_token(body, SimpleNamespace(headers=headers or {}), db))
+
+        for body in (TokenRequest(device_fingerprint="device-a"),
+                     TokenRequest(device_fingerprint="device-a", id_token="forged")):
+            with pytest.raises(HTTPException) as error:
+                issue(body)
+            assert error.value.status_code == 401
+
+        issued = issue(TokenRequest(device_fingerprint="device-a", id_token="valid-id-token"))
+        claims = service.verify(issued["access_token"], "device-a")
+        assert (claims.user_id, claims.role) == ("U1", "free")
+        assert db.query(LineBotUser).count() == 0  # 發行權杖不建立用戶
+
+        renewed = issue(TokenRequest(device_fingerprint="device-a"),
+                        {"Authorization": f"Bearer {issued['access_token']}"})
+        assert service.verify(renewed["access_token"], "device-a").user_id == "U1"
+        with pytest.raises(HTTPException) as error:
+            issue(TokenRequest(device_fingerprint="device-b"), {"Authorization": f"Bearer {issued['access_token']}"})
+        assert error.value.status_code == 401
+
+    def test_verify_line_id_token(self):
+        calls = []
+
+        def post(url, data, timeout):
+            calls.append(data)
+            if data["id_token"] == "good":
+                return FakeResponse(200, {"sub": "U1", "aud": data["client_id"]})
+            return FakeResponse(400, {"error": "invalid_request", "error_description": "IdToken expired."})
+
+        assert verify_line_id_token("good", channel_id="123", post=post) == "U1"
+        with pytest.raises(IdTokenVerificationError, match="expired"):
+            verify_line_id_token("old", channel_id="123", post=post)
+        assert calls[0] == {"id_token": "good", "client_id": "123"}
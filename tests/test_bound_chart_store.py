@@ -0,0 +1,82 @@
+"""
+綁定命盤快照單元測試
+"""
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.logic.bound_chart_store import BoundChartStore
+from app.logic.chart_version import (
+    CHART_ALGORITHM_VERSION, CHART_RULES_REVISION, CHART_SOURCE_MODULES, compute_algorithm_version,
+)
+from app.models.linebot_models import Base, ChartBinding, LineBotUser
+
+BIRTH_DATA = {"year": 1990, "month": 5, "day": 12, "hour": 8, "minute": 30, "gender": "M"}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[LineBotUser.__table__, ChartBinding.__table__])
+    session = sessionmaker(bind=engine)()
+    session.add(LineBotUser(line_user_id="U123"))
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestBoundChartStore:
+    """綁定命盤快照測試"""
+
+    def test_load_uses_snapshot(self, db, monkeypatch):
+        """綁定後查詢直接讀取快照，不重新排盤"""
+        store = BoundChartStore(algorithm_version="v1")
+        store.bind(db, "U123", BIRTH_DATA)
+
+        def fail(_birth_info):
+            raise AssertionError("不應重新計算命盤")
+
+        monkeypatch.setattr(store, "compute_chart", fail)
+        chart = store.load(db, "U123")
+        assert chart["birth_info"]["year"] == 1990
+        assert len(chart["palaces"]) == 12
+        assert store.load(db, "U999") is None
+
+    def test_stale_version_recomputed(self, db):
+        """演算法版本變更時重新計算並寫回"""
+        BoundChartStore(algorithm_version="v1").bind(db, "U123", BIRTH_DATA)
+
+        chart = BoundChartStore(algorithm_version="v2").load(db, "U123")
+        assert chart["birth_info"]["month"] == 5
+
+        snapshot = json.loads(db.query(ChartBinding).one().chart_data)
+        assert snapshot["algorithm_version"] == "v2"
+
+    def test_completing_binding_stores_snapshot(self, db, monkeypatch):
+        """完成綁定時計算一次命盤，之後查詢不重新排盤"""
+        from types import SimpleNamespace
+
+        from app.logic import user_binding
+
+        monkeypatch.setattr(user_binding, "bound_chart_store", BoundChartStore(algorithm_version="v1"))
+        pending = SimpleNamespace(birth_data=dict(BIRTH_DATA), is_used=False, used_at=None)
+        line_user = db.query(LineBotUser).filter(LineBotUser.line_user_id == "U123").one()
+        user_binding.UserBindingManager().complete_binding(db, pending, line_user, "system-1")
+
+        assert pending.is_used
+        snapshot = json.loads(db.query(ChartBinding).one().chart_data)
+        assert snapshot["algorithm_version"] == "v1"
+
+        store = BoundChartStore(algorithm_version="v1")
+        monkeypatch.setattr(store, "compute_chart", lambda _birth_info: pytest.fail("不應重新計算命盤"))
+        assert store.load(db, "U123")["birth_info"]["day"] == 12
+
+    def test_algorithm_version_covers_chart_modules(self):
+        """演算法版本涵蓋四化資料與疊盤模組，規則修訂號變更時版本改變"""
+        assert "app.logic.sihua_overlay" in CHART_SOURCE_MODULES
+        assert "app.data.heavenly_stems.four_transformations" in CHART_SOURCE_MODULES
+        assert compute_algorithm_version() == CHART_ALGORITHM_VERSION
+        assert compute_algorithm_version(revision=CHART_RULES_REVISION + 1) != CHART_ALGORITHM_VERSION
+        assert compute_algorithm_version(CHART_SOURCE_MODULES[:2]) != CHART_ALGORITHM_VERSION
@@ -0,0 +1,89 @@
+"""
+農曆資料查詢快取單元測試
+"""
+import dataclasses
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.calendar_cache import CalendarLookupCache
+from app.models.calendar import Base, CalendarData
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[CalendarData.__table__])
+    factory = sessionmaker(bind=engine)
+
+    session = factory()
+    for day in (1, 2):
+        for hour in (0, 4, 12):
+            session.add(CalendarData(
+                gregorian_datetime=datetime(2025, 3, day, hour),
+                gregorian_year=2025, gregorian_month=3, gregorian_day=day, gregorian_hour=hour,
+                lunar_year_in_chinese="乙巳年", lunar_month_in_chinese="二月", lunar_day_in_chinese="初二",
+                is_leap_month_in_chinese=False,
+                year_gan_zhi="乙巳", month_gan_zhi="己卯", day_gan_zhi="甲子", hour_gan_zhi=f"H{hour}",
+            ))
+    session.commit()
+    session.close()
+    return factory
+
+
+class TestCalendarLookupCache:
+    """農曆資料快取測試"""
+
+    def test_month_prefetched_once(self, session_factory):
+        """同月份的查詢只打一次資料庫"""
+        cache = CalendarLookupCache()
+        assert cache.get(session_factory(), 2025, 3, 1, 0).hour_gan_zhi == "H0"
+        assert cache.get(session_factory(), 2025, 3, 2, 12).hour_gan_zhi == "H12"
+
+        stats = cache.get_stats()
+        assert stats["prefetch_queries"] == 1
+        assert stats["hits"] == 1
+
+    def test_hour_branch_fallback(self, session_factory):
+        """缺少對應小時時優先使用同一時辰的記錄"""
+        cache = CalendarLookupCache()
+        assert cache.get(session_factory(), 2025, 3, 1, 3).hour_gan_zhi == "H4"
+        assert cache.get(session_factory(), 2025, 3, 1, 20).hour_gan_zhi == "H0"
+
+    def test_negative_cache(self, session_factory):
+        """缺漏日期不重複查詢，失效後重新查詢"""
+        cache = CalendarLookupCache()
+        assert cache.get(session_factory(), 2025, 3, 15, 0) is None
+        assert cache.get(session_factory(), 2025, 3, 15, 0) is None
+        assert cache.get_stats()["prefetch_queries"] == 1
+        assert cache.get_stats()["negative_hits"] == 2
+
+        cache.invalidate(2025, 3)
+        cache.get(session_factory(), 2025, 3, 15, 0)
+        assert cache.get_stats()["prefetch_queries"] == 2
+
+    def test_cached_records_are_immutable_values(self, session_factory):
+        """快取的是不可變的值，會話關閉後與多執行緒下都可共用，統計不遺漏"""
+        cache = CalendarLookupCache()
+        session = session_factory()
+        record = cache.get(session, 2025, 3, 1, 0)
+        session.close()
+        assert record.hour_gan_zhi == "H0" and record.year_gan_zhi == "乙巳"
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            record.hour_gan_zhi = "X"
+        cache.get_day(session_factory(), 2025, 3, 1).clear()
+        assert len(cache.get_day(session_factory(), 2025, 3, 1)) == 3
+
+        def lookup():
+            for _ in range(200):
+                cache.get(session_factory(), 2025, 3, 2, 12)
+
+        threads = [threading.Thread(target=lookup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert cache.get_stats()["hits"] == 2 + 800
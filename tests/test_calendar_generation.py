@@ -0,0 +1,115 @@
+"""
+6tail 時間資料批量生成單元測試（需要 sxtwl）
+"""
+import pytest
+
+pytest.importorskip("sxtwl")
+
+import main  # noqa: E402
+from main import KEY_HOURS, SixTailCalendar  # noqa: E402
+
+
+class TestBatchGenerate:
+    """批量生成的單筆錯誤處理"""
+
+    def test_failed_record_is_logged_and_skipped(self, monkeypatch, caplog):
+        """單筆計算失敗只略過該筆，其餘記錄照常生成"""
+        calendar = SixTailCalendar()
+        build = calendar._build_calendar_info
+
+        def flaky_build(day_obj, year, month, day, hour, minute=0):
+            if (month, day, hour) == (1, 2, 6):
+                raise RuntimeError("boom")
+            return build(day_obj, year, month, day, hour, minute)
+
+        monkeypatch.setattr(calendar, "_build_calendar_info", flaky_build)
+        data = calendar.batch_generate_data(2024, 2024, save_to_file=False)
+
+        assert len(data) == 366 * len(KEY_HOURS) - 1
+        assert "2024-01-02 06:00" not in {record["gregorian"]["datetime"] for record in data}
+        assert "生成 2024-01-02 6:00 資料失敗：boom" in caplog.text
+
+    def test_failed_day_is_skipped(self, monkeypatch):
+        """整天無法取得 Day 對象時略過該天"""
+        from_solar = main.sxtwl.fromSolar
+
+        def flaky_from_solar(year, month, day):
+            if (month, day) == (3, 1):
+                raise RuntimeError("boom")
+            return from_solar(year, month, day)
+
+        monkeypatch.setattr(main.sxtwl, "fromSolar", flaky_from_solar)
+        data = SixTailCalendar().batch_generate_data(2023, 2023, save_to_file=False)
+
+        assert len(data) == 364 * len(KEY_HOURS)
+
+
+class TestStreamGenerate:
+    """串流生成的分片續跑"""
+
+    HOURS = (0, 12)
+
+    def fresh_output(self, tmp_path):
+        path = tmp_path / "fresh" / "data.ndjson"
+        path.parent.mkdir()
+        SixTailCalendar().stream_generate_data(2023, 2024, str(path), hours=self.HOURS, workers=1)
+        return path.read_bytes()
+
+    def test_resume_skips_finished_parts(self, tmp_path, monkeypatch):
+        """已完成的年份分片直接沿用，不重新計算"""
+        output = tmp_path / "data.ndjson"
+        parts_dir = tmp_path / "data.ndjson.parts"
+        parts_dir.mkdir()
+        (parts_dir / "2023.ndjson").write_text('{"sentinel":true}\n', encoding="utf-8")
+
+        calendar = SixTailCalendar()
+        generated = []
+        iter_year_records = calendar.iter_year_records
+
+        def tracking_iter(year, hours, failures=None):
+            generated.append(year)
+            return iter_year_records(year, hours, failures)
+
+        monkeypatch.setattr(calendar, "iter_year_records", tracking_iter)
+        total = calendar.stream_generate_data(2023, 2024, str(output), hours=self.HOURS, workers=1)
+
+        assert generated == [2024]
+        lines = output.read_text(encoding="utf-8").splitlines()
+        assert lines[0] == '{"sentinel":true}'
+        assert total == 1 + 366 * len(self.HOURS)
+        assert not parts_dir.exists()
+
+    def test_incomplete_year_is_retried(self, tmp_path, monkeypatch):
+        """部分記錄失敗的年份不改名為正式分片，續跑時重新生成，結果與全新生成相同"""
+        output = tmp_path / "data.ndjson"
+        parts_dir = tmp_path / "data.ndjson.parts"
+        calendar = SixTailCalendar()
+        build = calendar._build_calendar_info
+
+        def flaky_build(day_obj, year, month, day, hour, minute=0):
+            if (year, month, day, hour) == (2024, 5, 1, 12):
+                raise RuntimeError("boom")
+            return build(day_obj, year, month, day, hour, minute)
+
+        monkeypatch.setattr(calendar, "_build_calendar_info", flaky_build)
+        with pytest.raises(RuntimeError, match="2024"):
+            calendar.stream_generate_data(2023, 2024, str(output), hours=self.HOURS, workers=1)
+
+        assert (parts_dir / "2023.ndjson").exists()
+        assert not (parts_dir / "2024.ndjson").exists()
+        assert (parts_dir / "2024.ndjson.tmp").exists()
+        assert not output.exists()
+
+        monkeypatch.undo()
+        SixTailCalendar().stream_generate_data(2023, 2024, str(output), hours=self.HOURS, workers=1)
+        assert output.read_bytes() == self.fresh_output(tmp_path)
+
+    def test_interrupted_part_is_regenerated(self, tmp_path):
+        """中斷留下的暫存分片不被視為完成"""
+        output = tmp_path / "data.ndjson"
+        parts_dir = tmp_path / "data.ndjson.parts"
+        parts_dir.mkdir()
+        (parts_dir / "2024.ndjson.tmp").write_text('{"partial":true}\n', encoding="utf-8")
+
+        SixTailCalendar().stream_generate_data(2023, 2024, str(output), hours=self.HOURS, workers=1)
+        assert output.read_bytes() == self.fresh_output(tmp_path)
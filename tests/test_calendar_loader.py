@@ -0,0 +1,152 @@
+"""
+calendar_data 批量導入與 007 索引遷移單元測試（記憶體 SQLite）
+"""
+import csv
+import importlib.util
+import json
+import os
+from datetime import date, datetime
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+
+from app.db.migrate_calendar_data import CALENDAR_COLUMNS, CalendarBulkLoader, iter_rows
+from app.models.calendar import CalendarData
+
+MIGRATION_007 = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "alembic", "versions", "007_calendar_data_lookup_idx.py",
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    yield engine
+    engine.dispose()
+
+
+def _ndjson_record(day: int, hour: int) -> dict:
+    return {
+        "gregorian": {"year": 2025, "month": 1, "day": day, "hour": hour, "minute": 0},
+        "lunar": {"year_chinese": "甲辰年", "month_chinese": "臘月", "day_chinese": f"初{day}", "is_leap_month": False},
+        "ganzhi": {"year": "甲辰", "month": "丁丑", "day": "甲子", "hour": "甲子"},
+        "solar_term": "小寒" if day == 5 else "",
+    }
+
+
+def _write_ndjson(path, days=range(1, 6), hours=(0, 12)) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        for day in days:
+            for hour in hours:
+                f.write(json.dumps(_ndjson_record(day, hour), ensure_ascii=False) + "\n")
+    return str(path)
+
+
+def _count(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT count(*) FROM calendar_data")).scalar()
+
+
+def _index_names(engine) -> set:
+    return {index["name"] for index in inspect(engine).get_indexes("calendar_data")}
+
+
+class TestCalendarBulkLoader:
+    """批量導入、範圍覆寫與冪等性測試"""
+
+    def test_full_reload_is_idempotent_and_rebuilds_indexes(self, engine, tmp_path):
+        """整表重建可重複執行，分批寫入後索引存在"""
+        source = _write_ndjson(tmp_path / "calendar.ndjson")
+        loader = CalendarBulkLoader(engine, batch_size=3)
+
+        first = loader.load(iter_rows(source))
+        second = loader.load(iter_rows(source))
+
+        assert (first.rows, first.deleted) == (10, 0)
+        assert (second.rows, second.deleted) == (10, 10)
+        assert _count(engine) == 10
+        assert {"ix_calendar_data_gregorian_datetime", "ix_calendar_data_ymdh"} <= _index_names(engine)
+        with engine.connect() as connection:
+            row = connection.execute(text(
+                "SELECT solar_term_today, minute_gan_zhi, is_leap_month_in_chinese FROM calendar_data "
+                "WHERE gregorian_day = 5 AND gregorian_hour = 12"
+            )).one()
+        assert tuple(row) == ("小寒", "甲子", 0)
+
+    def test_date_range_only_replaces_rows_in_range(self, engine, tmp_path):
+        """指定日期範圍時只刪除並重寫範圍內的資料"""
+        source = _write_ndjson(tmp_path / "calendar.ndjson")
+        loader = CalendarBulkLoader(engine)
+        loader.load(iter_rows(source))
+
+        start, end = date(2025, 1, 2), date(2025, 1, 3)
+        stats = loader.load(iter_rows(source, start, end), start, end)
+
+        assert (stats.rows, stats.deleted) == (4, 4)
+        assert _count(engine) == 10
+        with engine.connect() as connection:
+            days = connection.execute(text(
+                "SELECT gregorian_day FROM calendar_data ORDER BY id DESC LIMIT 4"
+            )).scalars().all()
+        assert sorted(days) == [2, 2, 3, 3]
+
+    def test_csv_source(self, engine, tmp_path):
+        """舊版 CSV 欄位格式，空值與 nan 轉為 NULL"""
+        path = tmp_path / "calendar.csv"
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=CALENDAR_COLUMNS)
+            writer.writeheader()
+            for hour, term in ((0, "nan"), (2, "立春")):
+                writer.writerow({
+                    "gregorian_datetime": datetime(2025, 2, 3, hour).isoformat(), "gregorian_year": 2025,
+                    "gregorian_month": 2, "gregorian_day": 3, "gregorian_hour": hour,
+                    "lunar_year_in_chinese": "乙巳年", "lunar_month_in_chinese": "正月",
+                    "lunar_day_in_chinese": "初六", "is_leap_month_in_chinese": "否",
+                    "year_gan_zhi": "乙巳", "month_gan_zhi": "戊寅", "day_gan_zhi": "甲子",
+                    "hour_gan_zhi": "甲子", "minute_gan_zhi": "", "solar_term_today": term,
+                    "solar_term_in_hour": term,
+                })
+
+        assert CalendarBulkLoader(engine).load(iter_rows(str(path))).rows == 2
+        with engine.connect() as connection:
+            terms = connection.execute(text(
+                "SELECT solar_term_today FROM calendar_data ORDER BY gregorian_hour"
+            )).scalars().all()
+        assert terms == [None, "立春"]
+
+
+class TestCalendarLookupIndexMigration:
+    """007 遷移：年月日時查詢索引"""
+
+    def test_upgrade_and_downgrade(self, engine):
+        spec = importlib.util.spec_from_file_location("migration_007", MIGRATION_007)
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+        # 模擬 007 之前的表結構（沒有查詢索引）
+        CalendarData.__table__.create(engine)
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_calendar_data_ymdh"))
+
+        with engine.begin() as connection, Operations.context(MigrationContext.configure(connection)):
+            migration.upgrade()
+        indexes = {index["name"]: index["column_names"] for index in inspect(engine).get_indexes("calendar_data")}
+        assert indexes["ix_calendar_data_ymdh"] == ["gregorian_year", "gregorian_month", "gregorian_day", "gregorian_hour"]
+
+        with engine.begin() as connection, Operations.context(MigrationContext.configure(connection)):
+            migration.downgrade()
+        assert "ix_calendar_data_ymdh" not in _index_names(engine)
+
+    def test_revision_ids_fit_alembic_version(self):
+        """alembic_version.version_num 是 VARCHAR(32)，過長的 revision ID 會讓升級中斷"""
+        versions_dir = os.path.dirname(MIGRATION_007)
+        for filename in sorted(os.listdir(versions_dir)):
+            if not filename.endswith(".py"):
+                continue
+            spec = importlib.util.spec_from_file_location(filename[:-3], os.path.join(versions_dir, filename))
+            migration = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(migration)
+            assert len(migration.revision) <= 32, filename
@@ -0,0 +1,135 @@
+"""
+命盤條件請求與壓縮單元測試
+"""
+from typing import Optional
+
+import pytest
+from fastapi import APIRouter, FastAPI, Query
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.db.database import get_db
+from app.services.sixtail_service import sixtail_service
+from app.utils.conditional_response import ConditionalChartRoute, compute_chart_etag, etag_matches
+from app.utils.fast_json import FastJSONResponse
+
+
+@pytest.fixture
+def client_and_calls():
+    calls = []
+    router = APIRouter(default_response_class=FastJSONResponse, route_class=ConditionalChartRoute)
+
+    @router.post("/chart")
+    def chart(payload: dict):
+        calls.append(payload)
+        return {"palaces": ["紫微"] * 500}
+
+    @router.get("/chart/{year}")
+    def chart_by_year(year: int):
+        calls.append({"year": year})
+        return {"palaces": ["紫微"] * 500}
+
+    @router.post("/fortune")
+    def fortune(payload: dict, target_year: Optional[int] = Query(None)):
+        return {"year": target_year}
+
+    @router.post("/limits")
+    def limits(payload: dict, current_age: Optional[int] = Query(None)):
+        return {"age": current_age}
+
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app), calls
+
+
+class TestConditionalChartRoute:
+    """ETag / 304 / 壓縮測試"""
+
+    def test_not_modified_skips_computation(self, client_and_calls):
+        """GET 請求 If-None-Match 符合時直接 304，不執行路由"""
+        client, calls = client_and_calls
+        first = client.get("/chart/1990")
+        etag = first.headers["etag"]
+
+        second = client.get("/chart/1990", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+        assert len(calls) == 1
+
+    def test_post_with_matching_etag_is_processed(self, client_and_calls):
+        """POST 不回應 304（RFC 9110），仍執行路由並附上相同 ETag"""
+        client, calls = client_and_calls
+        first = client.post("/chart", json={"year": 1990, "month": 5})
+        etag = first.headers["etag"]
+
+        second = client.post("/chart", json={"month": 5, "year": 1990}, headers={"If-None-Match": etag})
+        assert second.status_code == 200
+        assert second.headers["etag"] == etag
+        assert second.json()["palaces"][0] == "紫微"
+        assert len(calls) == 2
+
+    def test_large_response_is_compressed(self, client_and_calls):
+        client, _ = client_and_calls
+        response = client.post("/chart", json={"year": 1990}, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json()["palaces"][0] == "紫微"
+
+        small = client.post("/fortune?target_year=2025", json={}, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
+
+    def test_default_date_changes_etag(self):
+        """使用預設日期的請求 ETag 隨日期變化，查詢參數順序不影響 ETag"""
+        assert compute_chart_etag("/f", "", b"{}", "2025-01-01") != compute_chart_etag("/f", "", b"{}", "2025-01-02")
+        assert compute_chart_etag("/f", "a=1&b=2", b"{}") == compute_chart_etag("/f", "b=2&a=1", b"{}")
+        assert compute_chart_etag("/f", "", b"not json") is None
+
+    def test_etag_matching(self):
+        etag = 'W/"abc"'
+        assert etag_matches('"abc"', etag)
+        assert etag_matches('W/"x", W/"abc"', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"abd"', etag)
+        assert not etag_matches(None, etag)
+
+    def test_age_params_fold_default_date(self, client_and_calls):
+        """未指定年齡時結果取決於今年，ETag 需帶入今天日期"""
+        client, _ = client_and_calls
+        route = next(r for r in client.app.routes if getattr(r, "path", None) == "/limits")
+        assert route.date_default_params == ("current_age",)
+
+
+class TestChartRoutes:
+    """實際命盤路由的條件請求範圍"""
+
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.include_router(routes.router, prefix="/api")
+        app.dependency_overrides[get_db] = lambda: None
+        return TestClient(app)
+
+    def test_current_lunar_never_returns_304(self, client, monkeypatch):
+        """/calendar/current-lunar 回應當下時間，不提供 ETag 也不回應 304"""
+        minutes = iter(range(100))
+        monkeypatch.setattr(sixtail_service, "get_complete_info",
+                            lambda *args: {"minute": next(minutes)})
+
+        first = client.get("/api/calendar/current-lunar")
+        assert first.status_code == 200
+        assert "etag" not in first.headers
+
+        for _ in range(3):
+            response = client.get("/api/calendar/current-lunar", headers={"If-None-Match": "*"})
+            assert response.status_code == 200
+        assert response.json()["lunar_data"]["minute"] == 3
+
+    def test_only_chart_routes_are_conditional(self):
+        for route in routes.router.routes:
+            if route.path.startswith("/chart"):
+                assert isinstance(route, ConditionalChartRoute), route.path
+            else:
+                assert not isinstance(route, ConditionalChartRoute), route.path
+
+    def test_chart_get_variants_exist(self):
+        get_paths = {route.path for route in routes.router.routes if "GET" in route.methods}
+        assert {"/chart", "/chart/annual-fortune", "/chart/monthly-fortune", "/chart/daily-fortune"} <= get_paths
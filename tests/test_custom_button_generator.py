@@ -0,0 +1,60 @@
+"""
+自定義按鈕渲染快取單元測試
+"""
+from PIL import Image
+
+from app.utils.custom_button_generator import CustomButtonGenerator, _file_hash, _hash_file_contents
+
+
+def _source(tmp_path):
+    path = tmp_path / "source.png"
+    Image.new("RGBA", (64, 64), (120, 80, 200, 255)).save(path)
+    return str(path)
+
+
+class TestButtonRenderCache:
+    """渲染快取鍵測試"""
+
+    def test_font_size_is_part_of_cache_key(self, tmp_path):
+        """不同字體大小的生成器不共用快取結果"""
+        source = _source(tmp_path)
+        cache_dir = str(tmp_path / "cache")
+
+        small = CustomButtonGenerator(cache_dir=cache_dir)
+        small.create_button_from_image(source, "命盤")
+        small.create_button_from_image(source, "命盤")
+        assert (small.render_cache.hits, small.render_cache.misses) == (1, 1)
+
+        large = CustomButtonGenerator(cache_dir=cache_dir)
+        large.font_size = 40
+        large.create_button_from_image(source, "命盤")
+        assert (large.render_cache.hits, large.render_cache.misses) == (0, 1)
+
+    def test_file_hash_cache_is_bounded(self, tmp_path):
+        source = _source(tmp_path)
+        assert _file_hash(source) == _file_hash(source)
+        assert _hash_file_contents.cache_info().maxsize is not None
+
+    def test_parallel_render_keeps_font_size(self, tmp_path):
+        """平行渲染沿用生成器的字體大小，結果與依序渲染相同並寫入同一組快取鍵"""
+        source = _source(tmp_path)
+        configs = [{"image_path": source, "button_text": text} for text in ("命盤", "占卜")]
+        cache_dir = str(tmp_path / "cache")
+
+        parallel = CustomButtonGenerator(cache_dir=cache_dir)
+        parallel.font_size = 40
+        parallel_paths = parallel.create_button_set_from_images(configs, str(tmp_path / "parallel"), workers=2)
+
+        sequential = CustomButtonGenerator(cache_dir=None)
+        sequential.font_size = 40
+        sequential_paths = sequential.create_button_set_from_images(configs, str(tmp_path / "sequential"))
+
+        for parallel_path, sequential_path in zip(parallel_paths, sequential_paths):
+            with Image.open(parallel_path) as a, Image.open(sequential_path) as b:
+                assert a.tobytes() == b.tobytes()
+
+        cached = CustomButtonGenerator(cache_dir=cache_dir)
+        cached.font_size = 40
+        for config in configs:
+            cached.create_button_from_image(config["image_path"], config["button_text"])
+        assert (cached.render_cache.hits, cached.render_cache.misses) == (len(configs), 0)
@@ -0,0 +1,119 @@
+"""
+設備快取與清理單元測試
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.logic import device_manager as device_manager_module
+from app.logic.device_manager import DeviceManager, get_current_taipei_time
+from app.utils.maintenance import _create_default_scheduler
+from app.models.user_devices import UserDevice
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    UserDevice.__table__.create(engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+class TestDeviceManager:
+    """設備權限、last_seen 寫回與背景清理測試"""
+
+    def test_known_device_is_served_from_cache(self, engine, db):
+        manager = DeviceManager()
+        assert manager.check_device_permission("U1", "fp-a", db)["can_access"]
+
+        queries = []
+        event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+        for _ in range(5):
+            result = manager.check_device_permission("U1", "fp-a", db)
+            assert result["can_access"] and result["registered_devices"] == 1
+        assert queries == []
+        assert manager.last_seen_recorder.pending() == 1
+
+        assert manager.last_seen_recorder.flush(db) == 1
+        device = db.query(UserDevice).one()
+        assert device.total_api_calls == 5
+
+    def test_device_limit(self, db):
+        manager = DeviceManager()
+        for fingerprint in ("fp-a", "fp-b", "fp-c"):
+            assert manager.check_device_permission("U1", fingerprint, db)["can_access"]
+        result = manager.check_device_permission("U1", "fp-d", db)
+        assert not result["can_access"]
+        assert result["registered_devices"] == 3
+
+    def test_sweeper_deletes_stale_devices_in_batches(self, db):
+        manager = DeviceManager()
+        now = get_current_taipei_time()
+        stale = now - timedelta(days=manager.device_inactive_days + 1)
+        db.add_all([
+            UserDevice(user_id=f"U{i}", device_fingerprint="old", last_seen=stale, last_activity=stale)
+            for i in range(5)
+        ])
+        db.add(UserDevice(user_id="U0", device_fingerprint="fresh", last_seen=stale, last_activity=stale))
+        db.commit()
+        manager.get_device_fingerprints("U0", db)
+        # 記憶體中尚未寫回的使用記錄不應被清理
+        manager.last_seen_recorder.touch("U0", "fresh", now)
+
+        result = manager.sweep_inactive_devices(db, now=now, batch_size=2)
+
+        assert result.deleted == 5
+        assert result.last_seen_flushed == 1
+        assert result.duration_ms >= 0
+        assert [row.device_fingerprint for row in db.query(UserDevice).all()] == ["fresh"]
+        assert manager.cache.get("U0") is None
+        assert manager.get_stats()["last_sweep"]["deleted"] == 5
+
+    def test_naive_last_seen_is_compared_in_taipei_time(self, db):
+        """last_seen 以不帶時區的台北時間儲存；帶時區的閾值（含 UTC）先轉成台北時間再比較"""
+        manager = DeviceManager()
+        now_utc = datetime(2026, 10, 18, 4, 0, tzinfo=timezone.utc)  # 台北 12:00
+        cutoff = datetime(2026, 10, 11, 12, 0)  # 台北時間的 7 天前
+        db.add_all([
+            UserDevice(user_id="U1", device_fingerprint="stale", last_seen=cutoff - timedelta(hours=1)),
+            UserDevice(user_id="U1", device_fingerprint="kept", last_seen=cutoff + timedelta(hours=1)),
+        ])
+        db.commit()
+        manager.last_seen_recorder.touch("U2", "fp", now_utc)
+
+        assert manager.sweep_inactive_devices(db, now=now_utc).deleted == 1
+        assert [row.device_fingerprint for row in db.query(UserDevice).all()] == ["kept"]
+
+        db.add(UserDevice(user_id="U2", device_fingerprint="fp", last_seen=cutoff))
+        db.commit()
+        manager.last_seen_recorder.touch("U2", "fp", now_utc)
+        manager.last_seen_recorder.flush(db)
+        device = db.query(UserDevice).filter(UserDevice.user_id == "U2").one()
+        assert device.last_seen == datetime(2026, 10, 18, 12, 0)
+
+    def test_register_device_stores_naive_taipei_time(self, db, monkeypatch):
+        """註冊設備寫入不帶時區的台北時間，與 last_seen 寫回及清理一致"""
+        now_utc = datetime(2026, 10, 18, 4, 0, tzinfo=timezone.utc)  # 台北 12:00
+        monkeypatch.setattr(device_manager_module, "get_current_taipei_time", lambda: now_utc)
+
+        result = DeviceManager().register_device("U1", {"device_fingerprint": "fp"}, db)
+
+        assert result["success"]
+        device = db.query(UserDevice).one()
+        assert device.first_seen == device.last_seen == device.last_activity == datetime(2026, 10, 18, 12, 0)
+
+    def test_sweep_runs_as_maintenance_job(self):
+        """last_seen 寫回與非活躍設備清理登記在維護排程中"""
+        tasks = _create_default_scheduler().tasks
+
+        assert tasks["device_last_seen"].interval_seconds == 60
+        assert tasks["inactive_devices"].interval_seconds == 3600
+        assert tasks["inactive_devices"].in_thread
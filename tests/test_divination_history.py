@@ -0,0 +1,107 @@
+"""
+占卜歷史保留、歸檔與熱門查詢單元測試（SQLite 為一般資料表，分區操作略過）
+"""
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.logic.divination_history import (
+    NdjsonArchiveSink, add_months, archive_old_divinations, count_divinations_since,
+    ensure_monthly_partitions, latest_divination, load_divination_payload, partition_name,
+)
+from app.models.linebot_models import DivinationHistory, DivinationHistoryArchive, LineBotUser
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    for model in (LineBotUser, DivinationHistory, DivinationHistoryArchive):
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _add(db, user_id: int, days_ago: int) -> DivinationHistory:
+    record = DivinationHistory(
+        user_id=user_id, gender="M", divination_time=NOW - timedelta(days=days_ago),
+        taichi_palace="子宮", minute_dizhi="子",
+        sihua_results=json.dumps([{"type": "祿", "star": "廉貞"}], ensure_ascii=False),
+        taichi_palace_mapping=json.dumps({"子": "命宮"}, ensure_ascii=False),
+        taichi_chart_data=json.dumps({"命宮": {"stars": ["紫微"] * 50}}, ensure_ascii=False),
+    )
+    db.add(record)
+    db.commit()
+    return record
+
+
+class TestDivinationHistory:
+    """保留期歸檔與帶時間下界的查詢測試"""
+
+    def test_partition_helpers_and_noop_on_sqlite(self, db):
+        assert add_months(datetime(2026, 11, 1), 2) == datetime(2027, 1, 1)
+        assert add_months(datetime(2026, 1, 1), -1) == datetime(2025, 12, 1)
+        assert partition_name(datetime(2027, 1, 1)) == "divination_history_2027_01"
+        assert ensure_monthly_partitions(db, now=NOW) == 0
+
+    def test_latest_prefers_recent_window_and_falls_back(self, db):
+        _add(db, 1, days_ago=400)
+        old_latest = _add(db, 1, days_ago=90)
+        recent = _add(db, 2, days_ago=2)
+        _add(db, 2, days_ago=10)
+
+        assert latest_divination(db, 2, now=NOW).id == recent.id
+        assert latest_divination(db, 1, now=NOW).id == old_latest.id
+        assert latest_divination(db, 3, now=NOW) is None
+        assert count_divinations_since(db, 2, NOW - timedelta(days=7)) == 1
+
+    def test_archive_moves_json_and_keeps_rows(self, db):
+        old = _add(db, 1, days_ago=400)
+        original = {"taichi_chart_data": old.taichi_chart_data, "sihua_results": old.sihua_results}
+        for days_ago in (380, 370):
+            _add(db, 1, days_ago=days_ago)
+        recent = _add(db, 1, days_ago=5)
+
+        assert archive_old_divinations(db, retention_days=365, batch_size=2, now=NOW) == 3
+        assert archive_old_divinations(db, retention_days=365, now=NOW) == 0
+        assert db.query(DivinationHistory).count() == 4
+
+        db.refresh(old)
+        assert old.taichi_chart_data is None and old.sihua_results is None
+        archive = db.get(DivinationHistoryArchive, old.id)
+        assert len(archive.payload) < archive.raw_bytes
+        payload = load_divination_payload(db, old)
+        assert payload["taichi_chart_data"] == original["taichi_chart_data"]
+        assert payload["sihua_results"] == original["sihua_results"]
+        assert load_divination_payload(db, recent)["taichi_palace_mapping"] == recent.taichi_palace_mapping
+
+    def test_archive_to_ndjson_files(self, db, tmp_path):
+        old = _add(db, 1, days_ago=400)
+        sink = NdjsonArchiveSink(str(tmp_path / "archive"))
+
+        assert archive_old_divinations(db, retention_days=365, sink=sink, now=NOW) == 1
+        with gzip.open(sink.path_for(old.divination_time), "rt", encoding="utf-8") as handle:
+            lines = [json.loads(line) for line in handle]
+        assert [line["id"] for line in lines] == [old.id]
+        assert json.loads(lines[0]["taichi_palace_mapping"]) == {"子": "命宮"}
+        assert db.query(DivinationHistoryArchive).count() == 0
+
+    def test_ndjson_archived_record_loads_back(self, db, tmp_path, monkeypatch):
+        directory = str(tmp_path / "archive")
+        monkeypatch.setenv("DIVINATION_ARCHIVE_DIR", directory)
+        records = [_add(db, 1, days_ago=400) for _ in range(3)]
+        original = {"sihua_results": records[1].sihua_results, "taichi_chart_data": records[1].taichi_chart_data}
+
+        assert archive_old_divinations(db, retention_days=365, sink=NdjsonArchiveSink(directory), now=NOW) == 3
+        db.refresh(records[1])
+        assert records[1].sihua_results is None
+        payload = load_divination_payload(db, records[1])
+        assert payload["sihua_results"] == original["sihua_results"]
+        assert payload["taichi_chart_data"] == original["taichi_chart_data"]
@@ -0,0 +1,43 @@
+"""
+快速 JSON 序列化單元測試
+"""
+import json
+
+from app.utils import fast_json
+from app.utils.fast_json import FastJSONResponse, SerializedJSON
+
+
+class TestFastJSON:
+    """fast_json 測試"""
+
+    def test_matches_stdlib_semantics(self):
+        """中文不轉義、數字鍵轉為字串，與 json.loads 結果一致"""
+        data = {"命宮": {"stars": ["紫微（入廟）化祿"]}, 12: [1, 2.5, None, True]}
+        body = fast_json.dumps_bytes(data)
+        assert "紫微".encode("utf-8") in body
+        assert json.loads(body) == json.loads(json.dumps(data))
+
+    def test_serialized_json_is_shared_and_loads_copies(self):
+        """同一份位元組用於回應與欄位，load() 每次返回獨立物件"""
+        serialized = SerializedJSON.of({"palaces": {"命宮": {"stars": ["天府"]}}})
+        assert FastJSONResponse(serialized).body is serialized.body
+        assert serialized.text == serialized.body.decode("utf-8")
+
+        first = serialized.load()
+        first["palaces"]["命宮"]["stars"].append("文昌")
+        assert serialized.load()["palaces"]["命宮"]["stars"] == ["天府"]
+
+    def test_chart_route_documents_schema_without_response_model(self):
+        """/api/chart 直接回傳序列化回應：不設 response_model，OpenAPI 仍記錄命盤結構"""
+        from fastapi import FastAPI
+
+        from app.api import routes
+
+        route = next(route for route in routes.router.routes if route.path == "/chart")
+        assert route.response_model is None
+        assert route.response_class is FastJSONResponse
+
+        app = FastAPI()
+        app.include_router(routes.router, prefix="/api")
+        schema = app.openapi()["paths"]["/api/chart"]["post"]["responses"]["200"]
+        assert schema["content"]["application/json"]["schema"]["$ref"].endswith("/PurpleStarChartSchema")
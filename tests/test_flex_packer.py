@@ -0,0 +1,64 @@
+"""
+Flex / 文字訊息封裝器單元測試
+"""
+from linebot.v3.messaging import FlexBox, FlexBubble, FlexCarousel, FlexText
+
+from app.utils.flex_packer import FlexBubblePacker, json_size, pack_text, split_text
+
+
+def _bubble(contents):
+    return FlexBubble(body=FlexBox(layout="vertical", contents=contents))
+
+
+def _block(text: str, count: int = 1):
+    return [FlexText(text=text, wrap=True) for _ in range(count)]
+
+
+class TestFlexBubblePacker:
+    """bubble / carousel 封裝測試"""
+
+    def test_tracked_size_is_exact(self):
+        """記錄的大小與實際序列化後的大小一致"""
+        packer = FlexBubblePacker(_bubble, max_bubble_bytes=2000)
+        bubbles = packer.pack([_block("紫微星入命宮", 3) for _ in range(10)], header=_block("標題"),
+                              footer=_block("結尾"), continuation_header=lambda page: _block(f"續 {page}"))
+        assert len(bubbles) > 1
+        for packed in bubbles:
+            assert packed.size == json_size(packed.bubble)
+            assert packed.size <= 2000
+
+    def test_blocks_stay_together_and_order_is_kept(self):
+        packer = FlexBubblePacker(_bubble, max_bubble_bytes=600)
+        blocks = [_block(f"星{i}", 2) for i in range(6)]
+        bubbles = packer.pack(blocks)
+        texts = [component.text for packed in bubbles for component in packed.bubble.body.contents]
+        assert texts == [f"星{i}" for i in range(6) for _ in range(2)]
+        for packed in bubbles:
+            contents = packed.bubble.body.contents
+            assert all(contents[i].text == contents[i + 1].text for i in range(0, len(contents), 2))
+
+    def test_containers_respect_carousel_limits(self):
+        packer = FlexBubblePacker(_bubble, max_bubble_bytes=400, max_bubbles=3)
+        bubbles = packer.pack([_block("天府", 3) for _ in range(7)])
+        containers = packer.to_containers(bubbles)
+        assert sum(len(c.contents) if isinstance(c, FlexCarousel) else 1 for c in containers) == len(bubbles)
+        assert all(len(c.contents) <= 3 for c in containers if isinstance(c, FlexCarousel))
+
+        single = FlexBubblePacker(_bubble).pack([_block("天府")])
+        assert isinstance(packer.to_containers(single)[0], FlexBubble)
+
+
+class TestTextPacking:
+    """文字切分與封裝測試"""
+
+    def test_split_text_prefers_sentence_boundaries(self):
+        text = "今年財運穩定。投資宜謹慎！感情宜多溝通；健康注意作息。"
+        assert split_text(text, 14) == ["今年財運穩定。投資宜謹慎！", "感情宜多溝通；健康注意作息。"]
+        assert all(len(part) <= 5 for part in split_text("一二三四五六七八九十", 5))
+
+    def test_pack_text_fills_messages(self):
+        paragraphs = ["甲" * 40] * 10
+        messages = pack_text(paragraphs, max_chars=100, separator="\n")
+        assert len(messages) == 5
+        assert all(len(message) <= 100 for message in messages)
+        assert "".join(messages).count("甲") == 400
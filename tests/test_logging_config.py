@@ -0,0 +1,95 @@
+"""
+日誌佇列單元測試
+"""
+import io
+import logging
+import queue
+
+from app.utils import logging_config
+from app.utils.logging_config import (
+    LOG_FORMAT, BatchingQueueListener, BatchStreamHandler, BoundedQueueHandler, StructuredLogPayload, TaipeiFormatter,
+)
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+class TestLoggingPipeline:
+    """佇列、批次寫入與丟棄策略測試"""
+
+    def test_records_are_formatted_by_listener(self):
+        stream = io.StringIO()
+        handler = BatchStreamHandler(stream)
+        handler.setFormatter(TaipeiFormatter(LOG_FORMAT))
+        log_queue = queue.Queue(maxsize=100)
+        queue_handler = BoundedQueueHandler(log_queue)
+        listener = BatchingQueueListener(log_queue, handler, queue_handler=queue_handler)
+        logger = _logger("test.logging.pipeline", queue_handler)
+
+        listener.start()
+        logger.info("API 請求: %s", StructuredLogPayload(method="GET", url="/api/chart"))
+        logger.info("第二筆")
+        listener.stop()
+
+        lines = stream.getvalue().splitlines()
+        assert lines[0].endswith('INFO - API 請求: {"method": "GET", "url": "/api/chart"}')
+        assert lines[1].endswith("INFO - 第二筆")
+
+    def test_full_queue_drops_info_but_keeps_warnings(self):
+        log_queue = queue.Queue(maxsize=2)
+        queue_handler = BoundedQueueHandler(log_queue)
+        logger = _logger("test.logging.drop", queue_handler)
+
+        for i in range(3):
+            logger.info(f"info {i}")
+        logger.warning("重要")
+
+        assert queue_handler.get_stats()["dropped"] == 2
+        messages = [log_queue.get_nowait().getMessage() for _ in range(log_queue.qsize())]
+        assert messages == ["info 1", "重要"]
+
+    def test_mutable_arguments_are_formatted_eagerly(self):
+        log_queue = queue.Queue()
+        logger = _logger("test.logging.mutable", BoundedQueueHandler(log_queue))
+        items = [1]
+        logger.info("items %s", items)
+        items.append(2)
+        assert log_queue.get_nowait().getMessage() == "items [1]"
+
+    def test_stop_with_full_queue_does_not_raise(self):
+        """佇列已滿且背景執行緒無法消化時，關閉流程擠掉最舊的記錄放入結束標記"""
+        log_queue = queue.Queue(maxsize=2)
+        listener = BatchingQueueListener(log_queue, BatchStreamHandler(io.StringIO()), stop_timeout=0.01)
+        for i in range(2):
+            log_queue.put_nowait(f"record {i}")
+
+        listener.enqueue_sentinel()
+        assert [log_queue.get_nowait() for _ in range(2)] == ["record 1", listener._sentinel]
+
+    def test_listener_restarts_after_fork(self, monkeypatch):
+        """fork 後的子行程以新的佇列重新啟動背景執行緒，沿用原本的 handler"""
+        root = logging.getLogger()
+        saved_handlers = list(root.handlers)
+        stream = io.StringIO()
+        handler = BatchStreamHandler(stream)
+        handler.setFormatter(TaipeiFormatter(LOG_FORMAT))
+        parent_queue = queue.Queue(maxsize=7)
+        monkeypatch.setattr(logging_config, "_listener", BatchingQueueListener(parent_queue, handler))
+        try:
+            logging_config._restart_after_fork()
+            listener = logging_config._listener
+            assert listener.queue is not parent_queue and listener.queue.maxsize == 7
+            assert listener.handlers == (handler,)
+            assert root.handlers == [logging_config._queue_handler]
+
+            logging.getLogger("test.logging.fork").warning("子行程")
+            listener.stop()
+            assert stream.getvalue().strip().endswith("WARNING - 子行程")
+        finally:
+            root.handlers = saved_handlers
+            monkeypatch.setattr(logging_config, "_queue_handler", None)
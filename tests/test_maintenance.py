@@ -0,0 +1,79 @@
+"""
+背景維護排程單元測試
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.linebot_models import UserSession
+from app.models.pending_binding import PendingBinding
+from app.states.divination_state import DivinationStateMachine
+from app.utils.maintenance import (
+    MaintenanceScheduler, purge_expired_pending_bindings, purge_in_batches, purge_stale_user_sessions,
+)
+from app.utils.timezone_helper import TAIPEI_TZ
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    PendingBinding.__table__.create(engine)
+    UserSession.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+class TestExpirySweeper:
+    """過期資料清理與排程統計測試"""
+
+    def test_purges_only_expired_rows_in_bounded_batches(self, db):
+        now = datetime.now(TAIPEI_TZ)
+        db.add_all([PendingBinding(birth_data={}, expires_at=now - timedelta(minutes=1)) for _ in range(5)])
+        db.add(PendingBinding(birth_data={}, expires_at=now + timedelta(minutes=10)))
+        db.commit()
+
+        condition = PendingBinding.expires_at < now
+        assert purge_in_batches(db, PendingBinding, condition, batch_size=2, max_batches=2) == 4
+        assert purge_expired_pending_bindings(db) == 1
+        assert db.query(PendingBinding).count() == 1
+
+    def test_purges_stale_user_sessions(self, db):
+        db.add(UserSession(line_user_id="old", updated_at=datetime.utcnow() - timedelta(hours=25)))
+        db.add(UserSession(line_user_id="new"))
+        db.commit()
+
+        assert purge_stale_user_sessions(db) == 1
+        assert [row.line_user_id for row in db.query(UserSession).all()] == ["new"]
+
+    def test_memory_sessions_are_cleaned_with_limit(self):
+        machine = DivinationStateMachine()
+        for i in range(3):
+            machine.get_session(f"U{i}").updated_at = datetime.now() - timedelta(hours=25)
+        machine.get_session("active")
+
+        assert machine.cleanup_old_sessions(24, limit=2) == 2
+        assert machine.cleanup_old_sessions(24) == 1
+        assert list(machine.sessions) == ["active"]
+
+    def test_scheduler_runs_due_tasks_and_records_failures(self):
+        clock = [0.0]
+        scheduler = MaintenanceScheduler(clock=lambda: clock[0])
+        calls = []
+
+        def broken():
+            raise RuntimeError("db down")
+
+        scheduler.register("ok", lambda: calls.append(1) or 3, interval_seconds=60, in_thread=False)
+        scheduler.register("broken", broken, interval_seconds=60)
+
+        assert asyncio.run(scheduler.run_due()) == 2
+        clock[0] = 30
+        assert asyncio.run(scheduler.run_due()) == 0
+
+        stats = scheduler.get_stats()
+        assert stats["ok"]["purged_total"] == 3 and stats["ok"]["runs"] == 1
+        assert stats["broken"]["failures"] == 1 and stats["broken"]["last_error"] == "db down"
@@ -0,0 +1,79 @@
+"""
+LINE 回覆訊息組合器單元測試
+"""
+from types import SimpleNamespace
+
+from linebot.v3.messaging import FlexBox, FlexBubble, FlexMessage, PostbackAction, QuickReply, QuickReplyItem, TextMessage
+from linebot.v3.messaging.exceptions import ApiException
+
+from app.utils.outbound_messages import OutboundComposer, PushQuotaTracker, merge_text_messages
+
+
+class FakeMessagingApi:
+    """記錄呼叫的 MessagingApi"""
+
+    def __init__(self, reply_error: Exception = None):
+        self.reply_error = reply_error
+        self.replies = []
+        self.pushes = []
+
+    def reply_message(self, request):
+        if self.reply_error is not None:
+            raise self.reply_error
+        self.replies.append(request.messages)
+
+    def push_message(self, request):
+        self.pushes.append(request.messages)
+
+
+def _api_error(status: int, body: bytes) -> ApiException:
+    return ApiException(http_resp=SimpleNamespace(status=status, reason="", data=body, getheaders=lambda: {}))
+
+
+def _flex(index: int) -> FlexMessage:
+    return FlexMessage(alt_text=f"flex {index}", contents=FlexBubble(body=FlexBox(layout="vertical", contents=[])))
+
+
+class TestOutboundComposer:
+    """訊息組合器測試"""
+
+    def test_fills_reply_slots_before_pushing(self):
+        api = FakeMessagingApi()
+        tracker = PushQuotaTracker()
+        pushed = OutboundComposer(api, "token", "U1", tracker).add([_flex(i) for i in range(7)]).send()
+
+        assert [len(batch) for batch in api.replies] == [5]
+        assert [len(batch) for batch in api.pushes] == [2]
+        assert pushed == 2
+        assert tracker.get_usage("U1") == 2
+        assert tracker.get_stats()["reply_messages"] == 5
+
+    def test_small_texts_are_merged(self):
+        api = FakeMessagingApi()
+        quick = TextMessage(text="選單", quickReply=QuickReply(items=[
+            QuickReplyItem(action=PostbackAction(label="a", data="a"))
+        ]))
+        OutboundComposer(api, "token", "U1", PushQuotaTracker()).add(
+            TextMessage(text="一"), TextMessage(text="二"), _flex(0), TextMessage(text="三"), quick
+        ).send()
+
+        texts = [getattr(message, "text", None) for message in api.replies[0]]
+        assert texts == ["一\n\n二", None, "三", "選單"]
+        assert api.pushes == []
+
+    def test_expired_reply_token_falls_back_to_push(self):
+        api = FakeMessagingApi(_api_error(400, b'{"message":"Invalid reply token"}'))
+        OutboundComposer(api, "expired", "U1", PushQuotaTracker()).add([_flex(i) for i in range(3)]).send()
+        assert [len(batch) for batch in api.pushes] == [3]
+
+    def test_ambiguous_reply_failure_is_not_pushed_again(self):
+        """逾時或其他錯誤時第一批可能已送達，不以 push 重送，只推播剩餘的批次"""
+        for error in (TimeoutError("read timed out"), _api_error(500, b'{"message":"Internal error"}')):
+            api = FakeMessagingApi(error)
+            pushed = OutboundComposer(api, "token", "U1", PushQuotaTracker()).add([_flex(i) for i in range(7)]).send()
+            assert [len(batch) for batch in api.pushes] == [2]
+            assert pushed == 2
+
+    def test_merge_respects_text_limit(self):
+        merged = merge_text_messages([TextMessage(text="甲" * 3000), TextMessage(text="乙" * 3000)])
+        assert len(merged) == 2
@@ -0,0 +1,67 @@
+"""
+旋轉宮位視圖單元測試
+"""
+from app.logic.palace_view import EARTHLY_BRANCHES, RotatedChartView
+from app.logic.purple_star_chart import TAICHI_PALACE_NAMES, Palace
+from app.logic.star_calculator import StarCalculator
+
+
+def make_palaces():
+    return {
+        f"宮{i}": Palace(name=f"宮{i}", stars=[f"星{i}"], element="木", stem="甲", branch=branch)
+        for i, branch in enumerate(EARTHLY_BRANCHES)
+    }
+
+
+class TestRotatedChartView:
+    """旋轉視圖測試"""
+
+    def test_rotation_maps_names_to_branches(self):
+        """命宮落在起始地支，依序順時針排列"""
+        view = RotatedChartView.from_palaces(make_palaces(), "辰", TAICHI_PALACE_NAMES)
+        assert list(view) == list(TAICHI_PALACE_NAMES)
+        assert view["命宮"].branch == "辰"
+        assert view["父母宮"].branch == "巳"
+        assert view["兄弟宮"].branch == "卯"
+        assert view.name_at_branch("辰") == "命宮"
+
+    def test_view_shares_star_data(self):
+        """視圖不複製星曜，寫入直接反映在原宮位；render 後才獨立"""
+        palaces = make_palaces()
+        view = RotatedChartView.from_palaces(palaces, "子", TAICHI_PALACE_NAMES)
+        assert view["命宮"].stars is palaces["宮0"].stars
+
+        view["命宮"].stars = ["紫微"]
+        assert palaces["宮0"].stars == ["紫微"]
+
+        rendered = view.render(Palace)
+        rendered["命宮"].stars.append("天機")
+        assert palaces["宮0"].stars == ["紫微"]
+
+    def test_rerotation_reuses_base(self):
+        """對視圖再旋轉時共用同一個底層陣列"""
+        view = RotatedChartView.from_palaces(make_palaces(), "寅", TAICHI_PALACE_NAMES)
+        rotated = RotatedChartView.from_palaces(view, "午", TAICHI_PALACE_NAMES)
+        assert rotated.base is view.base
+        assert rotated["命宮"].branch == "午"
+
+
+class TestPeriodPalaces:
+    """流月 / 流日宮位不共用星曜列表"""
+
+    def test_period_star_lists_are_copies(self):
+        annual = {"流年宮位": {
+            f"流年宮{i}": {"本命宮位": f"宮{i}", "地支": branch, "天干": "甲", "五行": "木", "星曜": [f"星{i}"]}
+            for i, branch in enumerate(EARTHLY_BRANCHES)
+        }}
+        calculator = StarCalculator()
+        monthly = {"流月宮位": calculator._calculate_monthly_palaces(annual, "子", 1)}
+        daily = calculator._calculate_daily_palaces(annual, monthly, "子", 1)
+
+        for palace in monthly["流月宮位"].values():
+            palace["星曜"].append("天機")
+        for palace in daily.values():
+            palace["星曜"].append("太陽")
+
+        assert annual["流年宮位"]["流年宮0"]["星曜"] == ["星0"]
+        assert "太陽" not in next(iter(monthly["流月宮位"].values()))["星曜"]
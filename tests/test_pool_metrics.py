@@ -0,0 +1,104 @@
+"""
+連線池監控與自適應大小單元測試
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, exc, text
+
+from app.api.metrics_routes import get_metrics
+from app.db.pool_metrics import (
+    AdaptivePoolSizer, InstrumentedQueuePool, LatencyHistogram, PoolMetrics, plan_pool_size,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    yield engine
+    engine.dispose()
+
+
+class TestPoolMetrics:
+    """等待時間、逾時與 overflow 調整測試"""
+
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram(buckets_ms=(1, 10, 100))
+        for value in (0.5, 0.5, 5, 50, 500):
+            histogram.observe(value)
+        stats = histogram.to_dict()
+        assert stats["buckets"] == {"le_1ms": 2, "le_10ms": 1, "le_100ms": 1, "inf": 1}
+        assert stats["p50_ms"] == 10.0
+        assert LatencyHistogram(buckets_ms=(1, 10)).to_dict()["p95_ms"] == 0.0
+        assert stats["p99_ms"] == 500
+
+    def test_plan_divides_connections_between_workers(self):
+        plan = plan_pool_size(workers=4, max_connections=100, reserved_connections=4,
+                              requested_size=5, requested_overflow=30)
+        assert (plan.connection_budget, plan.pool_size, plan.max_overflow, plan.overflow_ceiling) == (24, 5, 19, 19)
+        tight = plan_pool_size(workers=20, max_connections=25, reserved_connections=5,
+                               requested_size=5, requested_overflow=10)
+        assert (tight.pool_size, tight.overflow_ceiling) == (1, 1)
+
+    def test_saturated_pool_times_out_then_grows(self, engine):
+        metrics = PoolMetrics("test")
+        metrics.attach(engine.pool)
+        sizer = AdaptivePoolSizer(engine.pool, metrics, overflow_ceiling=2, step=2, idle_windows_before_shrink=1)
+
+        held = engine.connect()
+        held.execute(text("SELECT 1"))
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        stats = metrics.get_stats()
+        assert stats["timeouts"] == 1 and stats["in_use"] == 1
+        assert stats["checkout_latency"]["count"] == 2
+        assert stats["connection_age_seconds"]["open"] == 1
+
+        assert sizer.adjust() == 2
+        results = []
+
+        def worker():
+            with engine.connect() as connection:
+                results.append(connection.execute(text("SELECT 1")).scalar())
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        held.close()
+
+        assert results == [1, 1]
+        assert metrics.get_stats()["timeouts"] == 1
+        # 之後的區間使用量低於 pool_size，overflow 收回
+        metrics.take_window()
+        with engine.connect():
+            pass
+        assert sizer.adjust() == 0
+        assert [resize["max_overflow"] for resize in metrics.get_stats()["resizes"]] == [2, 0]
+
+    def test_pinned_sqlalchemy_supports_overflow_resize(self, engine):
+        """固定版本的 QueuePool 仍提供調整 overflow 所需的內部屬性"""
+        assert engine.pool.supports_overflow_resize()
+        engine.pool.set_max_overflow(3)
+        assert engine.pool.overflow() == -1 and engine.pool.max_overflow() == 3
+
+    def test_metrics_endpoint_fails_closed_without_token(self, monkeypatch):
+        monkeypatch.delenv("METRICS_TOKEN", raising=False)
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(get_metrics(SimpleNamespace(headers={})))
+        assert error.value.status_code == 503
+
+    def test_metrics_endpoint_requires_token(self, monkeypatch):
+        monkeypatch.setenv("METRICS_TOKEN", "secret")
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(get_metrics(SimpleNamespace(headers={})))
+        assert error.value.status_code == 403
+
+        body = asyncio.run(get_metrics(SimpleNamespace(headers={"X-Metrics-Token": "secret"})))
+        assert "primary" in body["db_pool"]["pools"]
+        assert "checkout_latency" in body["db_pool"]["pools"]["primary"]
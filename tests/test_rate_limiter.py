@@ -0,0 +1,135 @@
+"""
+速率限制單元測試
+"""
+import asyncio
+import threading
+from datetime import datetime
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.user_permissions import UserPermissions
+from app.utils.rate_limiter import MemoryRateLimitBackend, RateLimit, RateLimiter, SQLRateLimitBackend
+from app.utils.timezone_helper import TAIPEI_TZ
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_760_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    UserPermissions.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+class TestRateLimiter:
+    """token bucket 與每日上限測試"""
+
+    def test_parse(self):
+        assert RateLimit.parse("10/minute") == RateLimit(10, 60)
+        assert RateLimit.parse("100 / 2 hours") == RateLimit(100, 7200)
+        with pytest.raises(ValueError):
+            RateLimit.parse("often")
+
+    def test_token_bucket_refills(self):
+        clock = FakeClock()
+        limiter = RateLimiter(MemoryRateLimitBackend(), clock=clock)
+        limit = RateLimit(3, 60)
+        assert [limiter.hit("ip", limit).allowed for _ in range(4)] == [True, True, True, False]
+        clock.now += 20
+        assert limiter.hit("ip", limit).allowed
+        assert not limiter.hit("ip", limit).allowed
+
+    def test_shared_backend_across_workers(self, tmp_path):
+        """兩個 worker 共用 SQLite 計數"""
+        url = f"sqlite:///{tmp_path / 'rate_limit.db'}"
+        clock = FakeClock()
+        worker_a = RateLimiter(SQLRateLimitBackend(url), clock=clock)
+        worker_b = RateLimiter(SQLRateLimitBackend(url), clock=clock)
+        limit = RateLimit(4, 60)
+
+        results = [worker.hit("ip", limit).allowed for worker in (worker_a, worker_b) * 3]
+        assert results == [True, True, True, True, False, False]
+        clock.now += 15
+        assert worker_b.hit("ip", limit).allowed
+        assert not worker_a.hit("ip", limit).allowed
+
+    def test_daily_quota_is_flushed_in_batches(self, db):
+        today = datetime.now(TAIPEI_TZ).replace(tzinfo=None)
+        db.add(UserPermissions(user_id="U1", daily_api_limit=5, daily_api_calls=3, last_api_call_date=today))
+        db.commit()
+        limiter = RateLimiter()
+
+        results = [limiter.check_daily_api_quota("U1", db)["can_call"] for _ in range(3)]
+        assert results == [True, True, False]
+        # 檢查期間不寫資料庫
+        assert db.query(UserPermissions).one().daily_api_calls == 3
+        assert limiter.usage_recorder.pending() == 2
+
+        assert limiter.usage_recorder.flush(db) == 1
+        assert db.query(UserPermissions).one().daily_api_calls == 5
+        assert limiter.usage_recorder.pending() == 0
+
+    def test_permission_change_invalidates_cached_limit(self, db):
+        """會員等級變更後立即使用新的每日上限，不等快取過期"""
+        db.add(UserPermissions(user_id="U1", daily_api_limit=1))
+        db.commit()
+        limiter = RateLimiter()
+        assert limiter.check_daily_api_quota("U1", db)["daily_limit"] == 1
+
+        db.query(UserPermissions).one().daily_api_limit = 3
+        db.commit()
+        assert limiter.check_daily_api_quota("U1", db)["daily_limit"] == 1
+        limiter.invalidate_user_limit("U1")
+        assert limiter.check_daily_api_quota("U1", db)["daily_limit"] == 3
+
+    def test_blocking_backend_runs_off_event_loop(self, tmp_path):
+        """共用資料表的檢查在執行緒池執行，不阻塞 async 端點的事件迴圈"""
+        backend = SQLRateLimitBackend(f"sqlite:///{tmp_path / 'limits.db'}")
+        checked_on = []
+        take_token = backend.take_token
+
+        def recording_take_token(*args):
+            checked_on.append(threading.get_ident())
+            return take_token(*args)
+
+        backend.take_token = recording_take_token
+        limiter = RateLimiter(backend=backend)
+
+        @limiter.limit("1/minute")
+        async def endpoint(request: Request):
+            return threading.get_ident()
+
+        request = Request({"type": "http", "client": ("1.2.3.4", 1), "headers": []})
+        loop_thread = asyncio.run(endpoint(request=request))
+        assert checked_on and checked_on[0] != loop_thread
+        backend.engine.dispose()
+
+    def test_endpoint_decorator(self):
+        limiter = RateLimiter()
+        app = FastAPI()
+
+        @app.get("/")
+        @limiter.limit("2/minute")
+        async def index(request: Request):
+            return {"ok": True}
+
+        async def call_three_times():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return [await client.get("/") for _ in range(3)]
+
+        responses = asyncio.run(call_three_times())
+        assert [response.status_code for response in responses] == [200, 200, 429]
+        assert "retry-after" in responses[2].headers
@@ -0,0 +1,176 @@
+"""
+讀取副本路由單元測試（以兩個 SQLite 檔案模擬主資料庫與副本）
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.replica_routing import READ_YOUR_WRITES_COOKIE, ReplicaRouter, request_write_deadline
+from app.models.user_permissions import UserPermissions
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def engines(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine, role in ((primary, "premium"), (replica, "free")):
+        UserPermissions.__table__.create(engine)
+        with sessionmaker(bind=engine)() as db:
+            db.add(UserPermissions(user_id="U1", role=role))
+            db.commit()
+    return primary, replica
+
+
+def _role(db, user_id: str) -> str:
+    return db.query(UserPermissions).filter(UserPermissions.user_id == user_id).one().role
+
+
+class TestReplicaRouting:
+    """副本選擇、延遲退回與 read-your-writes 測試"""
+
+    def test_reads_go_to_replica_and_writes_to_primary(self, engines):
+        primary, replica = engines
+        router = ReplicaRouter(primary, {"replica1": replica})
+
+        with router.read_session() as db:
+            assert _role(db, "U1") == "free"
+            db.add(UserPermissions(user_id="U2"))
+            db.commit()
+
+        with sessionmaker(bind=primary)() as db:
+            assert db.query(UserPermissions).filter(UserPermissions.user_id == "U2").count() == 1
+        assert router.get_stats()["replica_reads"] == 1
+
+    def test_read_your_writes_window(self, engines):
+        primary, replica = engines
+        clock = FakeClock()
+        router = ReplicaRouter(primary, {"replica1": replica}, read_your_writes_seconds=10, clock=clock)
+        primary_sessions = sessionmaker(bind=primary)
+        router.track_writes(primary_sessions)
+
+        with primary_sessions() as db:
+            db.query(UserPermissions).filter(UserPermissions.user_id == "U1").one().role = "admin"
+            db.commit()
+
+        with router.read_session("U1") as db:
+            assert _role(db, "U1") == "admin"
+        with router.read_session("U9") as db:
+            assert db.info.get("read_engine") is replica
+        clock.now += 11
+        with router.read_session("U1") as db:
+            assert _role(db, "U1") == "free"
+        assert router.get_stats()["read_your_writes"] == 1
+
+    def test_lagging_or_unreachable_replica_falls_back_to_primary(self, engines):
+        primary, replica = engines
+        clock = FakeClock()
+        lag = {"value": 30.0}
+
+        def probe(engine):
+            if lag["value"] is None:
+                raise ConnectionError("replica down")
+            return lag["value"]
+
+        router = ReplicaRouter(primary, {"replica1": replica}, max_lag_seconds=5, lag_check_seconds=5,
+                               lag_probe=probe, clock=clock)
+        with router.read_session() as db:
+            assert _role(db, "U1") == "premium"
+
+        lag["value"] = 1.0
+        assert router.choose_engine() is None  # 量測結果在間隔內沿用
+        clock.now += 5
+        assert router.choose_engine() is replica
+
+        lag["value"] = None
+        clock.now += 5
+        assert router.choose_engine() is None
+        stats = router.get_stats()
+        assert stats["lag_fallbacks"] == 3 and stats["probe_errors"] == 1
+
+    def test_fall_back_to_primary_for_missing_rows(self, engines):
+        primary, replica = engines
+        with sessionmaker(bind=primary)() as db:
+            db.add(UserPermissions(user_id="NEW"))
+            db.commit()
+        router = ReplicaRouter(primary, {"replica1": replica})
+
+        with router.read_session() as db:
+            assert db.query(UserPermissions).filter(UserPermissions.user_id == "NEW").first() is None
+            assert db.fall_back_to_primary()
+            assert db.query(UserPermissions).filter(UserPermissions.user_id == "NEW").first() is not None
+            assert not db.fall_back_to_primary()
+
+    def test_write_cookie_routes_other_workers_to_primary(self, engines):
+        """寫入的回應帶 ryw_until cookie，另一個 worker 收到後改讀主資料庫"""
+        primary, replica = engines
+        worker_a = ReplicaRouter(primary, {"replica1": replica})
+        worker_b = ReplicaRouter(primary, {"replica1": replica})
+        app = FastAPI()
+        app.middleware("http")(worker_a.read_your_writes_middleware)
+
+        @app.post("/role")
+        def set_role():
+            with worker_a.session_factory() as db:
+                db.query(UserPermissions).filter(UserPermissions.user_id == "U1").one().role = "admin"
+                db.commit()
+            return {"ok": True}
+
+        @app.get("/role")
+        def get_role(request: Request):
+            with worker_b.read_session(wrote_until=request_write_deadline(request)) as db:
+                return {"role": _role(db, "U1")}
+
+        client = TestClient(app)
+        assert READ_YOUR_WRITES_COOKIE not in client.get("/role").cookies
+        assert READ_YOUR_WRITES_COOKIE in client.post("/role").cookies
+        assert client.get("/role").json() == {"role": "admin"}
+        assert worker_b.get_stats()["read_your_writes"] == 1
+        # 超出時間窗的期限不採用
+        assert worker_b.choose_engine(wrote_until=worker_b.wall_clock() + 3600) is replica
+
+    def test_background_probe_keeps_lag_checks_off_request_path(self, engines):
+        """背景量測啟用後，選擇副本不會同步量測延遲，過舊的結果也不採用"""
+        primary, replica = engines
+        clock = FakeClock()
+        probes = []
+
+        def probe(engine):
+            probes.append(engine)
+            return 0.0
+
+        router = ReplicaRouter(primary, {"replica1": replica}, lag_check_seconds=5, lag_probe=probe, clock=clock)
+        router.background_probe = True
+        assert router.choose_engine() is None and probes == []
+
+        assert router.refresh_lags() == 1
+        assert router.choose_engine() is replica and len(probes) == 1
+        clock.now += 16
+        assert router.choose_engine() is None and len(probes) == 1
+
+    def test_lag_monitor_probes_in_thread(self, engines):
+        primary, replica = engines
+        router = ReplicaRouter(primary, {"replica1": replica}, lag_check_seconds=0.01)
+
+        async def monitor_briefly():
+            task = asyncio.create_task(router.run_lag_monitor())
+            await asyncio.sleep(0.05)
+            assert router.background_probe
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(monitor_briefly())
+        assert not router.background_probe
+        assert router.replicas[0].lag_seconds == 0.0
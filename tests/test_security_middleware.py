@@ -0,0 +1,47 @@
+"""
+安全中間件篩檢單元測試
+"""
+import ipaddress
+from types import SimpleNamespace
+
+from app.utils.security_middleware import IPNetworkSet, SecurityMiddleware, SubstringMatcher
+
+
+def _request(path: str = "/api/chart", query: str = "", user_agent: str = "Mozilla/5.0"):
+    return SimpleNamespace(url=SimpleNamespace(path=path, query=query), headers={"user-agent": user_agent})
+
+
+class TestSecurityScreening:
+    """可疑請求與 IP 白名單測試"""
+
+    def test_first_pattern_follows_list_order(self):
+        """同時出現多個字串時回報清單中較前面的一個"""
+        matcher = SubstringMatcher(["select", "union", "../"])
+        assert matcher.first("id=1 union select") == "select"
+        assert matcher.first("../etc") == "../"
+        assert matcher.first("chart") is None
+
+    def test_suspicious_request_reasons(self):
+        middleware = SecurityMiddleware()
+        assert middleware.detect_suspicious_request(_request()) is None
+        assert middleware.detect_suspicious_request(_request(path="/static/../../etc/passwd")) == "可疑路徑模式: ../"
+        assert middleware.detect_suspicious_request(_request(query="q=<Script>")) == "可疑查詢參數: script"
+        assert middleware.detect_suspicious_request(_request(user_agent="Googlebot/2.1")) == "可疑 User-Agent: bot"
+        assert middleware.detect_suspicious_request(_request(user_agent="LineBotWebhook/2.0")) is None
+
+    def test_line_ip_networks(self):
+        middleware = SecurityMiddleware()
+        assert middleware.check_line_ip("147.92.150.1")
+        assert middleware.check_line_ip("147.92.155.255")
+        assert not middleware.check_line_ip("147.92.156.0")
+        assert not middleware.check_line_ip("2001:db8::1")
+        assert not middleware.check_line_ip("unknown")
+        # 重複查詢走判定快取
+        assert middleware.check_line_ip("147.92.150.1")
+        assert middleware._line_ip_verdict.cache_info().hits >= 1
+
+    def test_network_set_merges_ranges(self):
+        networks = IPNetworkSet(["10.0.0.0/24", "10.0.1.0/24", "2001:db8::/32"])
+        assert ipaddress.ip_address("10.0.1.200") in networks
+        assert ipaddress.ip_address("10.0.2.0") not in networks
+        assert ipaddress.ip_address("2001:db8:ffff::1") in networks
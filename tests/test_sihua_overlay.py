@@ -0,0 +1,33 @@
+"""
+四化疊加層單元測試
+"""
+from app.logic.sihua_overlay import SihuaOverlay, base_star_name
+
+
+class TestSihuaOverlay:
+    """四化疊加層測試"""
+
+    def test_render_single_layer(self):
+        """生年四化組合成原本的字串格式"""
+        overlay = SihuaOverlay()
+        overlay.set_layer("natal", "甲")  # 廉貞祿、破軍權、武曲科、太陽忌
+        assert overlay.render_star("太陽（入廟）", ("natal",)) == "太陽（入廟）化忌"
+        assert overlay.render_star("廉貞", ("natal",)) == "廉貞化祿"
+        assert overlay.render_star("天機", ("natal",)) == "天機"
+
+    def test_layers_compose_without_mutation(self):
+        """同一組星曜可依不同層組合輸出"""
+        overlay = SihuaOverlay()
+        overlay.set_layer("natal", "甲")
+        overlay.set_layer("annual", "庚")  # 太陽祿、武曲權、太陰科、天同忌
+        stars = ["太陽（入廟）", "武曲"]
+
+        assert overlay.render_stars(stars, ("natal",)) == ["太陽（入廟）化忌", "武曲化科"]
+        assert overlay.render_stars(stars, ("annual",)) == ["太陽（入廟）化祿", "武曲化權"]
+        assert overlay.render_stars(stars, ("natal", "annual")) == ["太陽（入廟）化忌化祿", "武曲化科化權"]
+        assert overlay.render_stars(stars, ()) == stars
+        assert stars == ["太陽（入廟）", "武曲"]
+
+    def test_base_star_name(self):
+        assert base_star_name("太陽（入廟）化祿") == "太陽"
+        assert base_star_name("文昌化忌") == "文昌"
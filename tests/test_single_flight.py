@@ -0,0 +1,137 @@
+"""
+單飛請求合併單元測試
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.utils.single_flight import AsyncSingleFlight, SingleFlight
+
+
+class TestSingleFlight:
+    """執行緒版本測試"""
+
+    def test_concurrent_identical_keys_share_one_execution(self):
+        """並發的相同鍵只計算一次並共用結果"""
+        flight = SingleFlight("test")
+        executions = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            executions.append(1)
+            started.set()
+            release.wait(5)
+            return {"value": 42}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", compute))) for _ in range(5)]
+        threads[0].start()
+        assert started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while flight.get_stats()["coalesced"] < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(executions) == 1
+        assert len(results) == 5
+        assert all(result is results[0] for result in results)
+        stats = flight.get_stats()
+        assert stats["executions"] == 1
+        assert stats["coalesced"] == 4
+        assert stats["in_flight"] == 0
+
+    def test_error_propagates_and_key_is_released(self):
+        """計算失敗時拋出例外，之後的請求重新計算"""
+        flight = SingleFlight("test")
+
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            flight.do("k", fail)
+        assert flight.do("k", lambda: "ok") == "ok"
+        assert flight.get_stats()["errors"] == 1
+
+
+class TestAsyncSingleFlight:
+    """asyncio 版本測試"""
+
+    def test_concurrent_coroutines_share_one_execution(self):
+        flight = AsyncSingleFlight("test")
+        executions = []
+
+        async def compute():
+            executions.append(1)
+            await asyncio.sleep(0.01)
+            return "chart"
+
+        async def main():
+            return await asyncio.gather(*(flight.do("k", compute) for _ in range(10)))
+
+        results = asyncio.run(main())
+        assert results == ["chart"] * 10
+        assert len(executions) == 1
+        assert flight.get_stats()["coalesced"] == 9
+        assert flight.in_flight() == 0
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        """發起的請求被取消時其他等待者仍取得結果"""
+        flight = AsyncSingleFlight("test")
+
+        async def compute():
+            await asyncio.sleep(0.02)
+            return "chart"
+
+        async def main():
+            first = asyncio.ensure_future(flight.do("k", compute))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(flight.do("k", compute))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(main()) == "chart"
+
+
+class TestAsyncDivinationCoalescing:
+    """異步占卜路徑的合併統計"""
+
+    def test_async_divination_counts_each_request_once(self, monkeypatch):
+        """異步路徑只經過一層合併：每個請求計數一次，同步實例不受影響"""
+        from datetime import datetime
+        from types import SimpleNamespace
+
+        from app.logic import divination_logic as module
+
+        sync_flight, async_flight = SingleFlight("sync"), AsyncSingleFlight("async")
+        monkeypatch.setattr(module, "chart_single_flight", sync_flight)
+        monkeypatch.setattr(module, "async_chart_single_flight", async_flight)
+        builds = []
+
+        def build(current_time, gender, minute_dizhi, db=None):
+            builds.append(1)
+            time.sleep(0.05)
+            return "taichi"
+
+        monkeypatch.setattr(module.divination_logic, "_build_taichi_chart", build)
+        monkeypatch.setattr(module.divination_logic, "perform_divination",
+                            lambda user, gender, current_time, db, taichi_result=None: taichi_result)
+        user = SimpleNamespace(id=1, line_user_id="U1")
+        when = datetime(2026, 10, 18, 12, 30)
+
+        async def main():
+            return await asyncio.gather(*(
+                module.get_divination_result_async(None, user, "M", when) for _ in range(5)
+            ))
+
+        assert asyncio.run(main()) == ["taichi"] * 5
+        assert len(builds) == 1
+        stats = async_flight.get_stats()
+        assert (stats["calls"], stats["executions"], stats["coalesced"]) == (5, 1, 4)
+        assert sync_flight.get_stats()["calls"] == 0
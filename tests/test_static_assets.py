@@ -0,0 +1,89 @@
+"""
+靜態圖片資源管線單元測試
+"""
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.utils.static_assets import (
+    DEFAULT_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL, AssetManifest, AssetPipeline, CachedStaticFiles,
+)
+
+SOURCES = {"static/*.png": ["carousel"], "richmenu_final.png": ["rich_menu"]}
+
+
+def _project(tmp_path):
+    """建立含原始大圖的專案目錄"""
+    os.makedirs(tmp_path / "static")
+    Image.new("RGBA", (2048, 2048), (200, 120, 40, 255)).save(tmp_path / "static" / "2-1.png")
+    Image.new("RGB", (3000, 1000), (30, 30, 60)).save(tmp_path / "richmenu_final.png")
+    return AssetPipeline(project_root=str(tmp_path), build_dir=str(tmp_path / "static" / "build"))
+
+
+class TestAssetPipeline:
+    """變體尺寸、雜湊檔名與 manifest 測試"""
+
+    def test_build_writes_sized_hashed_variants(self, tmp_path):
+        manifest = _project(tmp_path).build(SOURCES)
+
+        carousel = manifest["static/2-1.png"]["carousel"]
+        assert (carousel["width"], carousel["height"]) == (512, 512)
+        assert carousel["png"].startswith("build/2-1.carousel.") and "webp" in carousel
+        rich_menu = manifest["richmenu_final.png"]["rich_menu"]
+        # 3:1 原圖選擇最接近的 2500x843 並精確裁切
+        assert (rich_menu["width"], rich_menu["height"]) == (2500, 843)
+        assert rich_menu["bytes"] <= 1024 * 1024
+        with Image.open(tmp_path / "static" / rich_menu["jpeg"]) as image:
+            assert image.size == (2500, 843) and image.format == "JPEG"
+
+    def test_rebuild_removes_stale_files(self, tmp_path):
+        pipeline = _project(tmp_path)
+        first = pipeline.build(SOURCES)["static/2-1.png"]["carousel"]["png"]
+        Image.new("RGBA", (1024, 1024), (10, 200, 90, 255)).save(tmp_path / "static" / "2-1.png")
+
+        second = pipeline.build(SOURCES)["static/2-1.png"]["carousel"]["png"]
+
+        assert second != first
+        assert not os.path.exists(tmp_path / "static" / first)
+        assert os.path.exists(tmp_path / "static" / second)
+
+
+class TestAssetManifest:
+    """manifest 解析與退回原始圖片測試"""
+
+    def test_resolves_built_variant_url(self, tmp_path):
+        manifest = _project(tmp_path).build(SOURCES)
+        assets = AssetManifest(str(tmp_path / "static" / "build" / "manifest.json"))
+        png = manifest["static/2-1.png"]["carousel"]["png"]
+
+        assert assets.url("static/2-1.png", "carousel", base_url="https://example.com/") == \
+            f"https://example.com/static/{png}"
+        assert assets.resolve_path("static/2-1.png", "carousel", fmt="webp").endswith(".webp")
+
+    def test_missing_manifest_falls_back_to_original(self, tmp_path):
+        assets = AssetManifest(str(tmp_path / "missing.json"))
+
+        assert assets.resolve_path("static/2-2.png", "carousel") == "static/2-2.png"
+        assert assets.url("static/2-2.png", "carousel", base_url="https://example.com") == \
+            "https://example.com/static/2-2.png"
+
+
+class TestCachedStaticFiles:
+    """Cache-Control 標頭測試"""
+
+    def test_hashed_build_files_are_immutable(self, tmp_path):
+        manifest = _project(tmp_path).build(SOURCES)
+        app = FastAPI()
+        app.mount("/static", CachedStaticFiles(directory=str(tmp_path / "static")), name="static")
+        client = TestClient(app)
+
+        built = client.get(f"/static/{manifest['static/2-1.png']['carousel']['png']}")
+        original = client.get("/static/2-1.png")
+        manifest_file = client.get("/static/build/manifest.json")
+
+        assert built.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert "etag" in built.headers
+        assert original.headers["cache-control"] == DEFAULT_CACHE_CONTROL
+        assert manifest_file.headers["cache-control"] == DEFAULT_CACHE_CONTROL
@@ -0,0 +1,132 @@
+"""
+太極盤快照存儲單元測試
+"""
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.logic.divination_history import load_divination_payload
+from app.logic.chart_version import CHART_ALGORITHM_VERSION
+from app.logic.divination_logic import DivinationLogic, TaichiChartResult
+from app.logic.taichi_snapshots import TaichiSnapshotStore, compact_inline_divinations, taichi_slot_key
+from app.models.linebot_models import DivinationHistory, LineBotUser, TaichiChartSnapshot
+from app.utils.fast_json import SerializedJSON
+
+SIHUA = [{"type": "祿", "star": "廉貞", "explanation": "說明" * 20}]
+MAPPING = {"子": "命宮"}
+PALACES = {"命宮": {"stars": ["紫微", "天府"] * 20, "dizhi": "子"}}
+
+
+def _contents(palaces=PALACES):
+    return {
+        "sihua_results": json.dumps(SIHUA, ensure_ascii=False),
+        "taichi_palace_mapping": json.dumps(MAPPING, ensure_ascii=False),
+        "taichi_chart_data": json.dumps(palaces, ensure_ascii=False),
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'snapshots.db'}")
+    for model in (LineBotUser, DivinationHistory, TaichiChartSnapshot):
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+class TestTaichiSnapshots:
+    """快照去重、快取還原與舊記錄轉換測試"""
+
+    def test_identical_charts_are_stored_once(self, db):
+        store = TaichiSnapshotStore()
+        first = store.save(db, _contents())
+        assert store.save(db, _contents()) == first
+        other = store.save(db, _contents({"命宮": {"stars": ["太陽"]}}))
+        db.commit()
+
+        assert other != first
+        assert db.query(TaichiChartSnapshot).count() == 2
+        snapshot = db.get(TaichiChartSnapshot, first)
+        assert len(snapshot.payload) < snapshot.raw_bytes
+        stats = store.get_stats()
+        assert (stats["inserted"], stats["deduplicated"]) == (2, 1)
+
+    def test_load_rehydrates_through_cache(self, db):
+        store = TaichiSnapshotStore(max_entries=1)
+        digest = store.save(db, _contents())
+        db.commit()
+        store.clear()
+
+        assert store.load(db, digest) == _contents()
+        loaded = store.load(db, digest)
+        loaded["taichi_chart_data"] = None
+        assert store.load(db, digest)["taichi_chart_data"] is not None
+        assert store.load(db, "0" * 64) is None
+        stats = store.get_stats()
+        assert (stats["cache_misses"], stats["cache_hits"], stats["missing"]) == (2, 2, 1)
+
+    def test_divination_stores_reference_instead_of_json(self, db):
+        taichi_result = TaichiChartResult(
+            palace_tiangan="甲",
+            palaces=SerializedJSON.of(PALACES),
+            sihua_results=SerializedJSON.of(SIHUA),
+            taichi_palace_mapping=SerializedJSON.of(MAPPING),
+        )
+        user = SimpleNamespace(id=1, line_user_id="U1")
+        when = datetime(2026, 10, 18, 12, 30)
+        for _ in range(2):
+            DivinationLogic().perform_divination(user, "M", when, db=db, taichi_result=taichi_result)
+
+        records = db.query(DivinationHistory).all()
+        assert len(records) == 2 and db.query(TaichiChartSnapshot).count() == 1
+        record = records[0]
+        assert record.taichi_chart_data is None and record.sihua_results is None
+        assert record.chart_version == CHART_ALGORITHM_VERSION
+        assert record.chart_slot.startswith("202610181230-")
+        payload = load_divination_payload(db, record)
+        assert json.loads(payload["taichi_chart_data"]) == PALACES
+        assert json.loads(payload["sihua_results"]) == SIHUA
+
+    def test_same_slot_reuses_snapshot_of_current_version(self, db, monkeypatch):
+        """同一時段、算法版本相符的快照直接沿用；版本不符時重新排盤"""
+        palaces = {"命宮": {"tiangan": "丙", "stars": ["紫微"]}}
+        when = datetime(2026, 10, 18, 12, 30)
+        store = TaichiSnapshotStore()
+        digest = store.save(db, _contents(palaces))
+        db.add(DivinationHistory(user_id=1, gender="M", divination_time=when, chart_slot=taichi_slot_key(when, "M"),
+                                 chart_version="stale", snapshot_hash=digest))
+        db.commit()
+        monkeypatch.setattr("app.logic.divination_logic.taichi_snapshot_store", store)
+        logic = DivinationLogic()
+
+        assert logic._load_taichi_snapshot(db, taichi_slot_key(when, "M")) is None
+        db.query(DivinationHistory).one().chart_version = CHART_ALGORITHM_VERSION
+        db.commit()
+        reused = logic._load_taichi_snapshot(db, taichi_slot_key(when, "M"))
+        assert reused.palace_tiangan == "丙"
+        assert reused.palaces.load() == palaces and reused.sihua_results.load() == SIHUA
+        assert logic._load_taichi_snapshot(db, taichi_slot_key(when, "F")) is None
+        stats = store.get_stats()
+        assert (stats["slot_hits"], stats["slot_misses"]) == (1, 2)
+
+    def test_compact_inline_records(self, db):
+        when = datetime(2025, 1, 2, 3, 4)
+        for _ in range(3):
+            db.add(DivinationHistory(user_id=1, gender="F", divination_time=when, taichi_palace="子宮",
+                                     minute_dizhi="子", **_contents()))
+        db.commit()
+        store = TaichiSnapshotStore()
+
+        assert compact_inline_divinations(db, store=store, batch_size=2) == 3
+        assert compact_inline_divinations(db, store=store) == 0
+        record = db.query(DivinationHistory).first()
+        assert record.chart_slot == taichi_slot_key(when, "F") == "202501020304-F"
+        assert record.chart_version is None and record.taichi_palace_mapping is None
+        assert db.query(TaichiChartSnapshot).count() == 1
+        assert load_divination_payload(db, record) == _contents()
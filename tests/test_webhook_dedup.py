@@ -0,0 +1,124 @@
+"""
+Webhook 事件去重單元測試
+"""
+import asyncio
+import json
+
+from linebot.v3.webhooks import MessageEvent
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api import webhook_new
+from app.models.linebot_models import Base, ProcessedWebhookEvent
+from app.utils.webhook_dedup import DatabaseEventStore, WebhookEventDeduplicator
+
+
+def _text_event(event_id: str, redelivery: bool = False) -> dict:
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": 1760000000000,
+        "source": {"type": "user", "userId": "U123"},
+        "webhookEventId": event_id,
+        "deliveryContext": {"isRedelivery": redelivery},
+        "replyToken": "reply-token",
+        "message": {"id": "1", "type": "text", "quoteToken": "q", "text": "占卜"},
+    }
+
+
+class StubRequest:
+    """重送同一個 webhook 請求本文的 Request"""
+
+    def __init__(self, events):
+        self.headers = {"X-Line-Signature": "stub"}
+        self._body = json.dumps({"destination": "bot", "events": events}).encode()
+
+    async def body(self):
+        return self._body
+
+
+class TestWebhookEventDeduplicator:
+    """事件去重測試"""
+
+    def test_replayed_events_are_handled_once(self, monkeypatch):
+        """LINE 重送的事件不會再進入處理流程"""
+        deduplicator = WebhookEventDeduplicator()
+        handled = []
+
+        async def handle_text_message(self, text):
+            handled.append(text)
+
+        async def update_user_activity(self, user_id, db):
+            pass
+
+        monkeypatch.setattr(webhook_new, "webhook_deduplicator", deduplicator)
+        monkeypatch.setattr(webhook_new.parser, "parse",
+                            lambda body, signature: [MessageEvent.from_dict(e) for e in json.loads(body)["events"]])
+        monkeypatch.setattr(webhook_new.WebhookHandler, "handle_text_message", handle_text_message)
+        monkeypatch.setattr(webhook_new.WebhookHandler, "update_user_activity", update_user_activity)
+
+        asyncio.run(webhook_new.line_bot_webhook_new(StubRequest([_text_event("E1")]), db=None))
+        for _ in range(3):
+            asyncio.run(webhook_new.line_bot_webhook_new(
+                StubRequest([_text_event("E1", redelivery=True), _text_event("E2")]), db=None
+            ))
+
+        assert handled == ["占卜", "占卜"]
+        stats = deduplicator.get_stats()
+        assert stats["events"] == 7
+        assert stats["duplicates"] == 5
+        assert stats["redeliveries"] == 3
+
+    def test_failed_event_is_processed_on_redelivery(self, monkeypatch):
+        """處理失敗的事件會撤銷登記，LINE 重送時再處理一次"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine, tables=[ProcessedWebhookEvent.__table__])
+        deduplicator = WebhookEventDeduplicator(shared_store=DatabaseEventStore(sessionmaker(bind=engine)))
+        attempts = []
+
+        async def handle_text_message(self, text):
+            attempts.append(text)
+            if len(attempts) == 1:
+                raise RuntimeError("資料庫暫時無法連線")
+
+        async def update_user_activity(self, user_id, db):
+            pass
+
+        monkeypatch.setattr(webhook_new, "webhook_deduplicator", deduplicator)
+        monkeypatch.setattr(webhook_new.parser, "parse",
+                            lambda body, signature: [MessageEvent.from_dict(e) for e in json.loads(body)["events"]])
+        monkeypatch.setattr(webhook_new.WebhookHandler, "handle_text_message", handle_text_message)
+        monkeypatch.setattr(webhook_new.WebhookHandler, "update_user_activity", update_user_activity)
+
+        asyncio.run(webhook_new.line_bot_webhook_new(StubRequest([_text_event("E1")]), db=None))
+        for _ in range(2):
+            asyncio.run(webhook_new.line_bot_webhook_new(
+                StubRequest([_text_event("E1", redelivery=True)]), db=None
+            ))
+
+        assert attempts == ["占卜", "占卜"]
+        stats = deduplicator.get_stats()
+        assert (stats["released"], stats["duplicates"]) == (1, 1)
+
+    def test_lru_is_bounded(self):
+        deduplicator = WebhookEventDeduplicator(max_entries=2)
+        events = [MessageEvent.from_dict(_text_event(f"E{i}")) for i in range(3)]
+        assert all(deduplicator.claim(event) for event in events)
+        assert deduplicator.get_stats()["tracked_events"] == 2
+        # 最舊的事件已被淘汰
+        assert deduplicator.claim(events[0])
+        assert not deduplicator.claim(events[2])
+
+    def test_shared_store_catches_other_workers(self):
+        """另一個 worker 已登記的事件也會被略過"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine, tables=[ProcessedWebhookEvent.__table__])
+        store = DatabaseEventStore(sessionmaker(bind=engine))
+        worker_a = WebhookEventDeduplicator(shared_store=store)
+        worker_b = WebhookEventDeduplicator(shared_store=store)
+
+        event = MessageEvent.from_dict(_text_event("E1"))
+        assert worker_a.claim(event)
+        assert not worker_b.claim(MessageEvent.from_dict(_text_event("E1", redelivery=True)))
+        assert worker_b.get_stats()["shared_duplicates"] == 1
+        assert store.purge(older_than_seconds=0) == 1